@@ -30,6 +30,9 @@ python src/rcvresults/scripts/build_demo.py \
   --commit-hash "${CIRCLE_SHA1}"
 
 rm "${BUILD_DIR}/index-test.html"
+# The render manifests only record build state (see
+# src/rcvresults/change_detection.py), so don't deploy them.
+find "${BUILD_DIR}" -name .render-manifest.json -delete
 # Copy the non-html files.
 cp data/output-html/default.css "${BUILD_DIR}"
 # The -L flag resolves resolves symlinks.
@@ -0,0 +1,203 @@
+"""
+Supports reading result reports that are compressed or bundled.
+
+A report can be a plain file (e.g. "d1_short.xml"), a compressed file
+(e.g. "d1_short.xml.gz" or "d1_short.xml.zst"), or a member of a zip
+bundle (e.g. the "d1_short.xml" member of "2022-11-08.zip"), which can
+itself be compressed. Reports are decompressed as a stream while they
+are parsed, without writing any temporary files.
+
+Reading ".zst" files requires the zstandard package to be installed.
+"""
+
+import contextlib
+import gzip
+import io
+from pathlib import Path, PurePosixPath
+import zipfile
+
+
+GZIP_SUFFIX = '.gz'
+ZSTD_SUFFIX = '.zst'
+ZIP_SUFFIX = '.zip'
+
+COMPRESSION_SUFFIXES = [GZIP_SUFFIX, ZSTD_SUFFIX]
+
+
+class ZipMember:
+
+    """
+    A file inside a zip archive, with the parts of the pathlib.Path API
+    that the parsing code uses.
+
+    Unlike zipfile.Path, this doesn't keep the archive open, so it can be
+    pickled (e.g. to send to a worker process).
+    """
+
+    def __init__(self, archive_path, name):
+        """
+        Args:
+          archive_path: the path to the zip file, as a Path object.
+          name: the member's name within the archive.
+        """
+        self.archive_path = archive_path
+        self.member_name = name
+
+    def __repr__(self):
+        return f'ZipMember({str(self.archive_path)!r}, {self.member_name!r})'
+
+    def __str__(self):
+        return f'{self.archive_path}/{self.member_name}'
+
+    def __eq__(self, other):
+        if not isinstance(other, ZipMember):
+            return NotImplemented
+        return (
+            (self.archive_path, self.member_name)
+            == (other.archive_path, other.member_name)
+        )
+
+    def __hash__(self):
+        return hash((self.archive_path, self.member_name))
+
+    @property
+    def _pure_path(self):
+        return PurePosixPath(self.member_name)
+
+    @property
+    def name(self):
+        return self._pure_path.name
+
+    @property
+    def suffix(self):
+        return self._pure_path.suffix
+
+    @property
+    def stem(self):
+        return self._pure_path.stem
+
+    def open(self, mode='rb'):
+        """
+        Open the member for reading, and return a binary file object.
+        """
+        if mode != 'rb':
+            raise ValueError(f'unsupported mode: {mode!r}')
+
+        # The returned file keeps the underlying zip file open until it
+        # is closed, even after the ZipFile object is closed.
+        with zipfile.ZipFile(self.archive_path) as archive:
+            return archive.open(self.member_name)
+
+
+def is_zip_bundle(path):
+    return isinstance(path, Path) and path.suffix == ZIP_SUFFIX
+
+
+def split_compression_suffix(name):
+    """
+    Return (base_name, compression_suffix) for a file name, where
+    compression_suffix is None if the name has no compression suffix.
+    """
+    for suffix in COMPRESSION_SUFFIXES:
+        if name.endswith(suffix):
+            return (name.removesuffix(suffix), suffix)
+
+    return (name, None)
+
+
+def get_report_suffix(path):
+    """
+    Return the suffix of a report, ignoring any compression suffix (e.g.
+    ".xml" for "d1_short.xml.gz").
+    """
+    base_name, _ = split_compression_suffix(path.name)
+    return PurePosixPath(base_name).suffix
+
+
+def get_report_stem(path):
+    """
+    Return the stem of a report, ignoring any compression suffix (e.g.
+    "d1_short" for "d1_short.xml.gz").
+    """
+    base_name, _ = split_compression_suffix(path.name)
+    return PurePosixPath(base_name).stem
+
+
+def iter_zip_members(archive_path, suffix=None):
+    """
+    Yield a ZipMember for each report in a zip bundle, in name order.
+
+    Args:
+      suffix: an optional report suffix without the leading dot (e.g.
+        "xml"). If given, only reports with that suffix are yielded
+        (ignoring any compression suffix).
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        names = sorted(
+            info.filename for info in archive.infolist() if not info.is_dir()
+        )
+
+    for name in names:
+        member = ZipMember(archive_path, name)
+        if suffix is not None and get_report_suffix(member) != f'.{suffix}':
+            continue
+        yield member
+
+
+def expand_bundles(paths, suffixes):
+    """
+    Yield the given report paths, replacing each zip bundle with the
+    reports it contains.
+
+    Args:
+      suffixes: the report suffixes to include from the bundles, without
+        the leading dot (e.g. ["xlsx", "xml"]).
+    """
+    for path in paths:
+        if not is_zip_bundle(path):
+            yield path
+            continue
+
+        for member in iter_zip_members(path):
+            if get_report_suffix(member).removeprefix('.') in suffixes:
+                yield member
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(
+            'the zstandard package must be installed to read .zst files'
+        ) from None
+
+    return zstandard
+
+
+@contextlib.contextmanager
+def open_report(path, seekable=False):
+    """
+    Open a report for reading, decompressing it as it is read, and yield
+    a binary file object.
+
+    Args:
+      path: a Path or ZipMember object.
+      seekable: whether the file object needs to support seeking freely
+        (e.g. for reading an .xlsx file, which is itself a zip archive).
+        If the report is compressed or in a zip bundle, the decompressed
+        contents are read into memory in this case.
+    """
+    _, compression = split_compression_suffix(path.name)
+    with contextlib.ExitStack() as stack:
+        f = stack.enter_context(path.open('rb'))
+        if compression == GZIP_SUFFIX:
+            f = stack.enter_context(gzip.GzipFile(fileobj=f))
+        elif compression == ZSTD_SUFFIX:
+            zstandard = _import_zstandard()
+            decompressor = zstandard.ZstdDecompressor()
+            f = stack.enter_context(decompressor.stream_reader(f))
+
+        if seekable and (compression is not None or isinstance(path, ZipMember)):
+            f = io.BytesIO(f.read())
+
+        yield f
@@ -0,0 +1,219 @@
+"""
+Supports rendering only the contests whose data changed since they were
+last rendered into an output directory.
+
+A new report often differs from the previous one only in e.g. a
+generated timestamp or the order of its elements, which the parse cache
+can't tell apart from a real change since it hashes the report file. So
+before rendering, each contest's parsed data is normalized and hashed
+(see fingerprint_contest()), and compared with the fingerprint recorded
+when the contest was last rendered. The fingerprints are stored in a
+manifest file in the HTML output directory, along with a hash of the
+other render inputs (e.g. the templates and translations). If those
+inputs change, every contest is treated as changed.
+"""
+
+from collections.abc import Mapping, Sequence
+import hashlib
+import json
+import logging
+
+from rcvresults.results import as_mapping
+
+
+_log = logging.getLogger(__name__)
+
+# The file name starts with a dot so it's easy to tell apart from the
+# rendered files.
+MANIFEST_NAME = '.render-manifest.json'
+
+# The version of the manifest file format.
+MANIFEST_VERSION = 1
+
+# The reasons a contest is rendered (or not).
+REASON_CHANGED = 'changed'
+REASON_FORCED = 'forced'
+REASON_INPUTS_CHANGED = 'render inputs changed'
+REASON_MISSING_OUTPUT = 'missing output'
+REASON_NEW = 'new'
+REASON_UNCHANGED = 'unchanged'
+
+
+def _normalize(value):
+    """
+    Return a value in a canonical form for hashing.
+    """
+    if isinstance(value, Mapping):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    # This also covers e.g. the read-only row views of a ContestResults
+    # object.
+    if isinstance(value, Sequence) and not isinstance(value, str):
+        return [_normalize(item) for item in value]
+    # Treat e.g. 0 and 0.0 as the same value, since they render the same.
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+
+    return value
+
+
+def fingerprint_contest(results):
+    """
+    Return the SHA-256 hex digest of a contest's data, normalized so the
+    digest doesn't depend on e.g. the order of dict keys, or on whether
+    the contest is a results dict or a ContestResults object.
+
+    Args:
+      results: a results dict or ContestResults object.
+    """
+    data = _normalize(as_mapping(results))
+    text = json.dumps(
+        data, sort_keys=True, separators=(',', ':'), ensure_ascii=False,
+    )
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def hash_render_inputs(sources):
+    """
+    Return the SHA-256 hex digest of the inputs to rendering other than
+    the contest data.
+
+    Args:
+      sources: an iterable of (name, text) pairs, e.g. the name and
+        source of each template, and the path and contents of the
+        translations file.
+    """
+    digest = hashlib.sha256()
+    for name, text in sorted(sources):
+        for part in (name, text):
+            encoded = str(part).encode()
+            # Include the lengths so the parts can't run together.
+            digest.update(f'{len(encoded)}:'.encode())
+            digest.update(encoded)
+    return digest.hexdigest()
+
+
+class ChangeDetector:
+
+    """
+    The manifest of the contests rendered into an HTML output directory.
+
+    Attributes:
+      reasons: a dict mapping each checked contest's base name to the
+        reason it was rendered (or REASON_UNCHANGED), in check order.
+    """
+
+    def __init__(self, output_dir, render_key, force=False):
+        """
+        Args:
+          output_dir: the HTML output directory.
+          render_key: the return value of hash_render_inputs() for the
+            current render inputs.
+          force: whether every contest should be treated as changed
+            (e.g. to render every contest). The manifest is still
+            updated.
+        """
+        self.output_dir = output_dir
+        self.render_key = render_key
+        self.force = force
+        self.reasons = {}
+        # Whether the manifest was written with different render inputs.
+        self._inputs_changed = False
+        self._entries = self._read_entries()
+
+    @property
+    def manifest_path(self):
+        return self.output_dir / MANIFEST_NAME
+
+    @property
+    def changed(self):
+        return [
+            name for name, reason in self.reasons.items()
+            if reason != REASON_UNCHANGED
+        ]
+
+    @property
+    def unchanged(self):
+        return [
+            name for name, reason in self.reasons.items()
+            if reason == REASON_UNCHANGED
+        ]
+
+    def _read_entries(self):
+        path = self.manifest_path
+        if not path.exists():
+            return {}
+
+        try:
+            with path.open() as f:
+                data = json.load(f)
+        except ValueError:
+            _log.warning(f'ignoring invalid manifest: {path}')
+            return {}
+
+        if data.get('version') != MANIFEST_VERSION:
+            _log.info(f'ignoring manifest with a different version: {path}')
+            return {}
+
+        if data['render_key'] != self.render_key:
+            _log.info(f'render inputs changed since last render: {path}')
+            self._inputs_changed = True
+            return {}
+
+        return data['contests']
+
+    def _get_reason(self, base_name, fingerprint, output_paths):
+        if self.force:
+            return REASON_FORCED
+        previous = self._entries.get(base_name)
+        if previous is None:
+            return REASON_INPUTS_CHANGED if self._inputs_changed else REASON_NEW
+        if previous != fingerprint:
+            return REASON_CHANGED
+        if not all(path.exists() for path in output_paths):
+            return REASON_MISSING_OUTPUT
+
+        return REASON_UNCHANGED
+
+    def check(self, base_name, results, output_paths):
+        """
+        Return whether a contest needs to be rendered, and record its
+        fingerprint. The manifest isn't written until save() is called.
+
+        Args:
+          base_name: the contest base name (e.g. "da_short").
+          results: the contest data, as a dict or ContestResults object.
+          output_paths: the paths of the files rendering the contest
+            writes. The contest is rendered if any is missing.
+        """
+        fingerprint = fingerprint_contest(results)
+        reason = self._get_reason(
+            base_name, fingerprint=fingerprint, output_paths=output_paths,
+        )
+        self.reasons[base_name] = reason
+        self._entries[base_name] = fingerprint
+        return reason != REASON_UNCHANGED
+
+    def save(self):
+        """
+        Write the manifest to the output directory.
+        """
+        path = self.manifest_path
+        data = {
+            'contests': self._entries,
+            'render_key': self.render_key,
+            'version': MANIFEST_VERSION,
+        }
+        # Write to a temporary file first so an interrupted run can't
+        # leave a partial manifest.
+        temp_path = path.with_name(f'{path.name}.tmp')
+        with temp_path.open('w') as f:
+            json.dump(data, f, indent='    ', sort_keys=True)
+        temp_path.replace(path)
+
+    def log_summary(self):
+        for base_name, reason in self.reasons.items():
+            _log.info(f'contest {base_name}: {reason}')
+        _log.info(
+            f'change detection: {len(self.changed)} changed, '
+            f'{len(self.unchanged)} unchanged'
+        )
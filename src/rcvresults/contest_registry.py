@@ -0,0 +1,159 @@
+"""
+Supports sharing parsed contests between the stages of a build (e.g.
+parsing, rendering the contest snippets, and rendering the index pages),
+rather than passing them through the JSON files.
+
+A ContestRegistry maps (election, file_stem) keys to contests. Each key
+is registered with a loader (a function that returns the contest, e.g.
+by reading its JSON file or parsing its report), and optionally the
+contest itself, if it is already in memory. At most max_size contests
+are kept in memory: when there are more, the least recently used is
+evicted, and it is loaded again the next time it is requested.
+"""
+
+import collections
+import logging
+import threading
+
+
+_log = logging.getLogger(__name__)
+
+# The default number of contests to keep in memory.
+DEFAULT_MAX_SIZE = 256
+
+_default_registry = None
+
+
+class ContestRegistry:
+
+    """
+    An LRU cache of contests, keyed by (election, file_stem).
+
+    Attributes:
+      max_size: the number of contests to keep in memory.
+      hits: the number of get() calls that found the contest in memory.
+      misses: the number of get() calls that had to load the contest.
+      evictions: the number of contests evicted from memory.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        if max_size < 1:
+            raise ValueError(f'max_size must be at least 1: {max_size}')
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Mapping from key to loader, in registration order.
+        self._loaders = {}
+        # Mapping from key to contest, from least to most recently used.
+        self._contests = collections.OrderedDict()
+        # The stages can call get() from more than one thread.
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return (
+            f'<ContestRegistry: {len(self._loaders)} contests '
+            f'({len(self._contests)} in memory, max_size={self.max_size})>'
+        )
+
+    def __len__(self):
+        return len(self._loaders)
+
+    def __contains__(self, key):
+        return key in self._loaders
+
+    def _store(self, key, contest):
+        contests = self._contests
+        contests[key] = contest
+        contests.move_to_end(key)
+        while len(contests) > self.max_size:
+            evicted_key, _ = contests.popitem(last=False)
+            self.evictions += 1
+            _log.debug(f'evicted contest: {evicted_key}')
+
+    def register(self, election, stem, loader, contest=None):
+        """
+        Register a contest (replacing any contest with the same key).
+
+        Args:
+          election: the election the contest is in (e.g. its directory
+            name, like "2022-11-08").
+          stem: the contest's file stem (e.g. "da_short").
+          loader: a function that takes no arguments and returns the
+            contest, for loading it when it isn't in memory.
+          contest: the contest, if it is already in memory (e.g. just
+            after parsing). This can be a results dict or a
+            ContestResults object.
+        """
+        key = (election, stem)
+        with self._lock:
+            self._loaders[key] = loader
+            self._contests.pop(key, None)
+            if contest is not None:
+                self._store(key, contest)
+
+    def get(self, election, stem):
+        """
+        Return a contest, loading it if it isn't in memory.
+        """
+        key = (election, stem)
+        with self._lock:
+            try:
+                contest = self._contests[key]
+            except KeyError:
+                pass
+            else:
+                self.hits += 1
+                self._contests.move_to_end(key)
+                return contest
+
+            try:
+                loader = self._loaders[key]
+            except KeyError:
+                raise KeyError(f'contest not registered: {key}') from None
+
+            self.misses += 1
+            contest = loader()
+            self._store(key, contest)
+
+        return contest
+
+    def get_stems(self, election):
+        """
+        Return the file stems of an election's contests, in registration
+        order.
+        """
+        return [
+            stem for key_election, stem in self._loaders
+            if key_election == election
+        ]
+
+    def iter_contests(self, election):
+        """
+        Yield a (stem, contest) pair for each of an election's contests,
+        in registration order.
+        """
+        for stem in self.get_stems(election):
+            yield (stem, self.get(election, stem))
+
+    def clear(self):
+        with self._lock:
+            self._loaders.clear()
+            self._contests.clear()
+
+    def log_counts(self):
+        _log.info(
+            f'contest registry: {self.hits} hit(s), {self.misses} miss(es), '
+            f'{self.evictions} eviction(s)'
+        )
+
+
+def get_default_registry():
+    """
+    Return the process-wide ContestRegistry, creating it if needed.
+    """
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = ContestRegistry()
+    return _default_registry
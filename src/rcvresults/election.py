@@ -1,15 +1,29 @@
 """
 Support for generating RCV HTML snippets for an election.
+
+The snippets can be rendered in parallel (see the "jobs" argument of
+process_contests()). In that case, each (contest, template) pair is
+rendered in a worker process, in every language, and the html files are
+written from a pool of threads in the main process. Each worker creates
+its own Renderer (and so Jinja2 environment) the first time it renders a
+contest, and reuses it for every other contest, of any election.
 """
 
 import functools
 import logging
+from pathlib import Path
 
 import jinja2
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment
 
+import rcvresults.change_detection as change_detection
+import rcvresults.election_bundle as election_bundle
+import rcvresults.intermediate as intermediate
 import rcvresults.rendering as rendering
 from rcvresults.rendering import CONTEXT_KEY_PAGE_NAMES
+from rcvresults.parsing import get_job_count
+from rcvresults.results import ContestResults
+import rcvresults.template_cache as template_cache
 import rcvresults.utils as utils
 from rcvresults.utils import NonCandidateLabel, LANG_CODE_ENGLISH, LANGUAGES
 
@@ -39,6 +53,26 @@ HTML_FILE_SUFFIXES = {
     'rcv-complete.html': 'rounds',
     'rcv-summary.html': 'summary',
 }
+# The templates to render for each contest, in order.
+CONTEST_TEMPLATE_NAMES = ('rcv-summary.html', 'rcv-complete.html')
+# Mapping from template name to a (context_key, function) pair, for the
+# templates that render a precomputed model of the contest. The function
+# is called with the contest's context once per contest (for all
+# languages), and its return value added to the context as context_key.
+RENDER_MODEL_BUILDERS = {
+    'rcv-complete.html': (
+        rendering.CONTEXT_KEY_ROUNDS_TABLE, rendering.make_rounds_table,
+    ),
+}
+
+# The number of threads to write the html files with, when rendering in
+# parallel.
+WRITER_THREAD_COUNT = 4
+
+# The options of the Jinja2 Environment, other than the loader and the
+# bytecode cache. These are passed to template_cache.make_loader(), too,
+# since the compiled templates depend on them.
+ENVIRONMENT_OPTIONS = {'autoescape': True}
 
 
 def make_html_base_name(template_name, contest_base):
@@ -123,12 +157,43 @@ def make_subtotal_translations(label_translations):
     return subtotal_translations
 
 
-def make_environment(translations_path):
+def make_translation_slots(label_translations):
+    """
+    Return the rendering.TranslationSlots object for the translation
+    filters of the environment make_environment() returns.
+    """
+    return rendering.TranslationSlots({
+        rendering.TABLE_LABELS: label_translations,
+        rendering.TABLE_SUBTOTALS: (
+            make_subtotal_translations(label_translations)
+        ),
+    })
+
+
+def make_environment(
+    translations_path, compiled=True, label_translations=None,
+):
+    """
+    Create and return the Jinja2 Environment object for rendering the
+    templates in the repo's templates directory.
+
+    Args:
+      compiled: whether to load the templates precompiled by
+        template_cache.precompile_templates(), if any (see
+        template_cache.py). Otherwise, the templates are compiled from
+        source (using the bytecode cache).
+      label_translations: the labels read from translations_path, if
+        already read (see read_label_translations()).
+    """
+    loader, bytecode_cache = template_cache.make_loader(
+        compiled=compiled, env_options=ENVIRONMENT_OPTIONS,
+    )
     env = Environment(
-        loader=FileSystemLoader('templates'), autoescape=True,
+        loader=loader, bytecode_cache=bytecode_cache, **ENVIRONMENT_OPTIONS,
     )
 
-    label_translations = read_label_translations(translations_path)
+    if label_translations is None:
+        label_translations = read_label_translations(translations_path)
     translate_label = functools.partial(
         rendering.translate_label, label_translations=label_translations,
     )
@@ -136,6 +201,7 @@ def make_environment(translations_path):
     subtotal_translations = make_subtotal_translations(label_translations)
     translate_subtotal_name = functools.partial(
         rendering.translate_label, label_translations=subtotal_translations,
+        table_name=rendering.TABLE_SUBTOTALS,
     )
 
     phrases = make_phrase_translations(label_translations)
@@ -154,86 +220,484 @@ def make_environment(translations_path):
     return env
 
 
-def _make_globals(css_dir=None):
+def _make_globals():
     """
-    Return the globals to pass to env.get_template().
+    Return the globals to add to the environment, which are the same for
+    every election.
     """
-    global_vars = {
+    return {
         'iter_languages': jinja2.pass_context(rendering.iter_languages),
         'is_contest_leader': jinja2.pass_context(rendering.is_contest_leader),
-        'get_candidate_class_prefix': (
-            jinja2.pass_context(rendering.get_candidate_class_prefix)
-        ),
-        'candidate_was_eliminated': (
-            jinja2.pass_context(rendering.candidate_was_eliminated)
-        ),
+        'per_language': jinja2.pass_context(rendering.per_language),
+    }
+
+
+def make_election_vars(config_path, css_dir=None):
+    """
+    Return the template variables specific to an election, to pass in the
+    context when rendering the election's contests.
+
+    Args:
+      config_path, css_dir: the same as for process_contests().
+    """
+    election_vars = {
+        'election': read_election_config(config_path),
     }
     if css_dir is not None:
-        global_vars.update({
-            'css_dir': str(css_dir),
-        })
+        election_vars['css_dir'] = str(css_dir)
 
-    return global_vars
+    return election_vars
 
 
-def make_rcv_contest_html(template, rcv_data, output_dir, contest_base):
+def iter_contest_html(
+    template, rcv_data, output_dir, contest_base, election_vars=None,
+    translation_slots=None,
+):
     """
-    Create the html snippets for an RCV contest, one for each language.
+    Render the html snippets for an RCV contest, one for each language,
+    and yield an (output_path, html) pair for each.
 
     Args:
-      template: a jinja2 Template object for the contest html (e.g.
-        constructed from "rcv-complete.html" or "rcv-summary.html").
-      rcv_data: the contest data parsed from the xml or Excel results
-        report for the contest. This can also be read from a contest
-        json file.
-      output_dir: the directory to which to write the rendered html files.
-      contest_base: the contest base name (e.g. "da_short").
+      the same as for make_rcv_contest_html().
     """
     # This is the output file stem without the language code suffix.
     html_base_name = make_html_base_name(template.name, contest_base=contest_base)
 
     # Make the initial template context. We start by copying the rcv_data
     # dict so we can add to it without affecting the original.
-    context = rcv_data.copy()
+    if isinstance(rcv_data, ContestResults):
+        context = rcv_data.make_context()
+    else:
+        context = rcv_data.copy()
+    if election_vars is not None:
+        context.update(election_vars)
+    if template.name in RENDER_MODEL_BUILDERS:
+        context_key, make_model = RENDER_MODEL_BUILDERS[template.name]
+        context[context_key] = make_model(context)
     page_names = utils.make_page_names(html_base_name)
     context[CONTEXT_KEY_PAGE_NAMES] = page_names
 
+    html_by_lang = None
+    if translation_slots is not None:
+        html_by_lang = rendering.render_all_languages(
+            template, translation_slots=translation_slots, context=context,
+        )
+
     for lang_code in LANGUAGES:
         html_name = page_names[lang_code]
         output_path = output_dir / html_name
-        rendering.render_template(
-            template, output_path=output_path, context=context,
-            lang_code=lang_code,
+        rendering.log_rendering(
+            template, output_path=output_path, lang_code=lang_code,
         )
+        if html_by_lang is None:
+            html = rendering.render_html(
+                template, context=context, lang_code=lang_code,
+            )
+        else:
+            html = html_by_lang[lang_code]
+        yield (output_path, html)
+
+
+def make_rcv_contest_html(
+    template, rcv_data, output_dir, contest_base, election_vars=None,
+    translation_slots=None,
+):
+    """
+    Create the html snippets for an RCV contest, one for each language.
 
+    Args:
+      template: a jinja2 Template object for the contest html (e.g.
+        constructed from "rcv-complete.html" or "rcv-summary.html").
+      rcv_data: the contest data parsed from the xml or Excel results
+        report for the contest. This can also be read from a contest
+        json file. This can be a dict or a ContestResults object.
+      output_dir: the directory to which to write the rendered html files.
+      contest_base: the contest base name (e.g. "da_short").
+      election_vars: the election's template variables (see
+        make_election_vars()).
+      translation_slots: a rendering.TranslationSlots object, to render
+        every language in a single pass (see make_translation_slots()).
+        Otherwise, the template is rendered once for each language.
+    """
+    for output_path, html in iter_contest_html(
+        template, rcv_data=rcv_data, output_dir=output_dir,
+        contest_base=contest_base, election_vars=election_vars,
+        translation_slots=translation_slots,
+    ):
+        output_path.write_text(html)
 
-# TODO: pass in HTML_FILE_SUFFIXES similar to output_dirs?
-# TODO: make base_name optional?
-def make_html_snippets(json_path, templates, output_dirs, base_name):
+
+def render_contest(
+    rcv_data, templates, output_dirs, base_name, election_vars=None,
+    translation_slots=None,
+):
     """
     Render the html snippets for a single contest.
 
     Args:
-      json_path: path to a json file of contest data, as a Path object.
-      templates: a list of jinja2 Template objects.
+      rcv_data: the contest data, as a dict or ContestResults object.
+      templates: an iterable of jinja2 Template objects.
       output_dirs: a dict mapping string template name to the output
         directory for the template.
       base_name: the contest base name (e.g. "da_short").
+      election_vars, translation_slots: the same as for
+        make_rcv_contest_html().
     """
-    _log.info(f'making RCV html snippets from: {json_path}')
-    rcv_data = utils.read_json(json_path)
     for template in templates:
         output_dir = output_dirs[template.name]
         make_rcv_contest_html(
             template, rcv_data=rcv_data, output_dir=output_dir,
-            contest_base=base_name,
+            contest_base=base_name, election_vars=election_vars,
+            translation_slots=translation_slots,
+        )
+
+
+def _get_output_paths(templates, output_dirs, base_name):
+    """
+    Return the paths of the html files render_contest() writes.
+    """
+    output_paths = []
+    for template in templates:
+        html_base_name = make_html_base_name(template.name, contest_base=base_name)
+        output_dir = output_dirs[template.name]
+        for html_name in utils.make_page_names(html_base_name).values():
+            output_paths.append(output_dir / html_name)
+
+    return output_paths
+
+
+def make_render_key(config_path, translations_path, css_dir=None):
+    """
+    Return the change_detection.hash_render_inputs() value for the
+    inputs to rendering other than the contest data.
+    """
+    # The templates are read from the templates directory rather than
+    # through the environment's loader, since precompiled templates have
+    # no source.
+    sources = [
+        (f'template:{name}', source)
+        for name, source in template_cache.iter_template_sources()
+    ]
+    sources.extend(
+        (f'file:{path.name}', Path(path).read_text())
+        for path in (config_path, translations_path)
+    )
+    # Also include the rendering code, so changing it doesn't leave
+    # stale html for the unchanged contests.
+    sources.extend(
+        (f'module:{Path(path).name}', Path(path).read_text())
+        for path in (__file__, rendering.__file__, utils.__file__)
+    )
+    sources.append(('css_dir', str(css_dir)))
+    return change_detection.hash_render_inputs(sources)
+
+
+# TODO: pass in HTML_FILE_SUFFIXES similar to output_dirs?
+# TODO: make base_name optional?
+def make_html_snippets(
+    json_path, templates, output_dirs, base_name, election_vars=None,
+):
+    """
+    Render the html snippets for a single contest, from a file.
+
+    Args:
+      json_path: path to a json file of contest data, as a Path object.
+        This can also be a file in another intermediate format (see
+        intermediate.read_contest()).
+      templates: a list of jinja2 Template objects.
+      output_dirs: a dict mapping string template name to the output
+        directory for the template.
+      base_name: the contest base name (e.g. "da_short").
+      election_vars: the election's template variables (see
+        make_election_vars()).
+    """
+    _log.info(f'making RCV html snippets from: {json_path}')
+    rcv_data = intermediate.read_contest(json_path)
+    render_contest(
+        rcv_data, templates=templates, output_dirs=output_dirs,
+        base_name=base_name, election_vars=election_vars,
+    )
+
+
+@functools.cache
+def _get_worker_renderer(translations_path, single_pass):
+    """
+    Return the Renderer object for rendering in a worker process.
+
+    The renderer is created the first time it's needed in each worker,
+    and then reused for every contest (of any election).
+    """
+    return Renderer(translations_path, single_pass=single_pass)
+
+
+def _render_in_worker(
+    template_name, rcv_data, output_dir, contest_base, translations_path,
+    single_pass, election_vars,
+):
+    """
+    Render one template for a contest in every language, and return a
+    list of (output_path, html) pairs.
+    """
+    renderer = _get_worker_renderer(translations_path, single_pass)
+    return list(iter_contest_html(
+        renderer.templates[template_name], rcv_data=rcv_data,
+        output_dir=output_dir, contest_base=contest_base,
+        election_vars=election_vars,
+        translation_slots=renderer.translation_slots,
+    ))
+
+
+def _render_in_pool(
+    contests, output_dirs, jobs, translations_path, single_pass,
+    election_vars,
+):
+    """
+    Render the html snippets for the given contests in a pool of worker
+    processes, and return the number of contests rendered.
+
+    Args:
+      contests: an iterable of (base_name, rcv_data) pairs.
+      jobs: the number of worker processes.
+    """
+    # These are imported here since they're slow to import and not
+    # needed for a single job.
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    render_kwargs = {
+        'translations_path': translations_path,
+        'single_pass': single_pass,
+        'election_vars': election_vars,
+    }
+    contest_count = 0
+    render_executor = ProcessPoolExecutor(max_workers=jobs)
+    write_executor = ThreadPoolExecutor(max_workers=WRITER_THREAD_COUNT)
+    with render_executor, write_executor:
+        render_futures = []
+        for base_name, rcv_data in contests:
+            for template_name in CONTEST_TEMPLATE_NAMES:
+                future = render_executor.submit(
+                    _render_in_worker, template_name, rcv_data=rcv_data,
+                    output_dir=output_dirs[template_name],
+                    contest_base=base_name, **render_kwargs,
+                )
+                render_futures.append(future)
+            contest_count += 1
+
+        # Collect the renders in the order they were submitted, so the
+        # output doesn't depend on which worker finishes first. Each
+        # file is written as soon as its render is collected.
+        write_futures = []
+        for future in render_futures:
+            for output_path, html in future.result():
+                write_futures.append(
+                    write_executor.submit(output_path.write_text, html)
+                )
+        for future in write_futures:
+            # This raises any error from writing the file.
+            future.result()
+
+    return contest_count
+
+
+def _iter_changed_contests(contests, detector, templates, output_dirs):
+    """
+    Yield the (base_name, rcv_data) pairs of the contests that need to
+    be rendered (see change_detection.ChangeDetector.check()).
+    """
+    for base_name, rcv_data in contests:
+        output_paths = _get_output_paths(
+            templates, output_dirs=output_dirs, base_name=base_name,
+        )
+        if detector.check(base_name, rcv_data, output_paths=output_paths):
+            yield (base_name, rcv_data)
+
+
+def _iter_json_contests(json_paths):
+    """
+    Yield a (base_name, rcv_data) pair for each contest in the given
+    json files (or election bundles).
+    """
+    file_count = len(json_paths)
+    _log.info(f'processing {file_count} contests (json files)...')
+    for i, json_path in enumerate(json_paths, start=1):
+        _log.info(f'reading json file {i} (of {file_count}): {json_path}')
+        if not election_bundle.is_bundle(json_path):
+            yield (json_path.stem, intermediate.read_contest(json_path))
+            continue
+
+        with election_bundle.ElectionBundle(json_path) as bundle:
+            yield from bundle.iter_contests()
+
+
+class Renderer:
+
+    """
+    Renders the html snippets of the contests of any number of elections.
+
+    A Renderer reads the translations and compiles the templates once,
+    when it's created, so a single Renderer should be used for every
+    election in a build. The values specific to an election (see
+    make_election_vars()) are passed in the context when rendering,
+    rather than as template globals, so the same Template objects can be
+    used for every election.
+
+    By default, each contest template is rendered once per contest, and
+    the html in each language made from that by filling in the
+    translations (see rendering.render_all_languages()).
+
+    Attributes:
+      env: the jinja2.Environment object. Other templates (e.g. index
+        pages) can also be rendered with it.
+      templates: a dict mapping template name to Template object, for
+        the templates to render for each contest (in the order of
+        CONTEST_TEMPLATE_NAMES).
+      translation_slots: the rendering.TranslationSlots object, or None
+        if not rendering in a single pass.
+    """
+
+    def __init__(self, translations_path, single_pass=True):
+        """
+        Args:
+          single_pass: whether to render every language in a single
+            pass. Otherwise, each template is rendered once per language.
+            The html is the same either way.
+        """
+        self.translations_path = translations_path
+        self.single_pass = single_pass
+
+        label_translations = read_label_translations(translations_path)
+        env = make_environment(
+            translations_path, label_translations=label_translations,
+        )
+        env.globals.update(_make_globals())
+        self.env = env
+        self.templates = {
+            name: env.get_template(name) for name in CONTEST_TEMPLATE_NAMES
+        }
+        if single_pass:
+            translation_slots = make_translation_slots(label_translations)
+        else:
+            translation_slots = None
+        self.translation_slots = translation_slots
+
+    def process_contests(
+        self, contests, config_path, output_dir, css_dir=None, force=False,
+        jobs=1,
+    ):
+        """
+        Render the html snippets for an election's contests, and return
+        the number of contests rendered.
+
+        Args:
+          the same as for the process_contests() function.
+        """
+        translations_path = self.translations_path
+        output_dirs = {}
+        for template_name, output_dir_name in HTML_OUTPUT_DIR_NAMES.items():
+            template_output_dir = output_dir / output_dir_name
+            template_output_dir.mkdir(parents=True, exist_ok=True)
+            output_dirs[template_name] = template_output_dir
+
+        election_vars = make_election_vars(config_path, css_dir=css_dir)
+        templates = self.templates.values()
+        render_key = make_render_key(
+            config_path=config_path, translations_path=translations_path,
+            css_dir=css_dir,
+        )
+        detector = change_detection.ChangeDetector(
+            output_dir, render_key=render_key, force=force,
+        )
+
+        changed_contests = _iter_changed_contests(
+            contests, detector=detector, templates=templates,
+            output_dirs=output_dirs,
+        )
+        jobs = get_job_count(jobs)
+        if jobs == 1:
+            contest_count = 0
+            for base_name, rcv_data in changed_contests:
+                render_contest(
+                    rcv_data, templates=templates, output_dirs=output_dirs,
+                    base_name=base_name, election_vars=election_vars,
+                    translation_slots=self.translation_slots,
+                )
+                contest_count += 1
+        else:
+            _log.info(f'rendering contests in parallel (jobs: {jobs})...')
+            contest_count = _render_in_pool(
+                changed_contests, output_dirs=output_dirs, jobs=jobs,
+                translations_path=translations_path,
+                single_pass=self.single_pass, election_vars=election_vars,
+            )
+        detector.log_summary()
+        # Only record the fingerprints once everything has been rendered.
+        detector.save()
+        _log.info(
+            f'wrote output files for {contest_count} contests to directory: '
+            f'{output_dir}'
+        )
+        return contest_count
+
+    def process_election(
+        self, json_paths, config_path, output_dir, css_dir=None, force=False,
+        jobs=1,
+    ):
+        """
+        Render the html snippets for the contests in the given json files.
+
+        Args:
+          the same as for the process_election() function.
+        """
+        return self.process_contests(
+            _iter_json_contests(json_paths), config_path=config_path,
+            output_dir=output_dir, css_dir=css_dir, force=force, jobs=jobs,
         )
 
 
 # TODO: pass in dict mapping template name to output_dir?
+def process_contests(
+    contests, config_path, translations_path, output_dir, css_dir=None,
+    force=False, jobs=1,
+):
+    """
+    Render the html snippets for an election's contests.
+
+    Only the contests whose data (or other render inputs) changed since
+    they were last rendered into output_dir are rendered (see
+    change_detection.py). This function creates the output_dir
+    directories if they don't already exist.
+
+    To render more than one election, it's faster to create a single
+    Renderer object and call its process_contests() method for each.
+
+    Args:
+      contests: an iterable of (base_name, rcv_data) pairs, one per
+        contest, where base_name is the contest base name (e.g.
+        "da_short") and rcv_data is a dict or ContestResults object.
+      config_path: path to an election.yml config, as a Path object.
+      output_dir: the directory to which to write the RCV html snippets,
+        as a Path object.
+      css_dir: the path to the directory containing the default.css file,
+        as a Path object, for use in the rcv-complete.html template.
+        This can be a relative path.
+      force: whether to render every contest, even ones unchanged since
+        they were last rendered.
+      jobs: the number of worker processes to render with, or 0 (or
+        None) to use one per CPU. The output is the same for any number.
+
+    Returns the number of contests rendered.
+    """
+    renderer = Renderer(translations_path)
+    return renderer.process_contests(
+        contests, config_path=config_path, output_dir=output_dir,
+        css_dir=css_dir, force=force, jobs=jobs,
+    )
+
+
 # TODO: choose a better name for this function.
 def process_election(
     json_paths, config_path, translations_path, output_dir, css_dir=None,
+    force=False, jobs=1,
 ):
     """
     This function creates the json_dir and output_dir directories if they
@@ -241,38 +705,22 @@ def process_election(
 
     Args:
       json_paths: iterable of paths of json files of contest data (one
-        per contest), as Path objects.
+        per contest), as Path objects. These can also be election
+        bundles (see election_bundle.py), in which case every contest in
+        the bundle is rendered.
       config_path: path to an election.yml config, as a Path object.
       output_dir: the directory to which to write the RCV html snippets,
         as a Path object.
       css_dir: the path to the directory containing the default.css file,
         as a Path object, for use in the rcv-complete.html template.
         This can be a relative path.
+      force: whether to render every contest, even ones unchanged since
+        they were last rendered.
+      jobs: the number of worker processes to render with (see
+        process_contests()).
     """
-    output_dirs = {}
-    for template_name, output_dir_name in HTML_OUTPUT_DIR_NAMES.items():
-        template_output_dir = output_dir / output_dir_name
-        template_output_dir.mkdir(parents=True, exist_ok=True)
-        output_dirs[template_name] = template_output_dir
-
-    election_data = read_election_config(config_path)
-
-    env = make_environment(translations_path)
-    global_vars = _make_globals(css_dir=css_dir)
-    global_vars['election'] = election_data
-
-    templates = [
-        env.get_template(name, globals=global_vars) for name in
-        ('rcv-summary.html', 'rcv-complete.html')
-    ]
-
-    file_count = len(json_paths)
-    _log.info(f'processing {file_count} contests (json files)...')
-    for i, json_path in enumerate(json_paths, start=1):
-        _log.info(f'reading json file {i} (of {file_count}): {json_path}')
-        base_name = json_path.stem
-        make_html_snippets(
-            json_path, templates=templates, output_dirs=output_dirs,
-            base_name=base_name,
-        )
-    _log.info(f'wrote output files for {file_count} contests to directory: {output_dir}')
+    renderer = Renderer(translations_path)
+    renderer.process_election(
+        json_paths, config_path=config_path, output_dir=output_dir,
+        css_dir=css_dir, force=force, jobs=jobs,
+    )
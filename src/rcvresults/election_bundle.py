@@ -0,0 +1,211 @@
+"""
+Supports election bundles: single files holding the parsed data of all
+the contests of an election, as an alternative to a directory of one
+intermediate file per contest (e.g. data/output-json/2022-11-08).
+
+A bundle starts with BUNDLE_MAGIC, the format version and the length of
+the header, and then the header itself (as UTF-8 JSON), which indexes the
+contests by file stem. Each index entry gives the byte offset and length
+of the contest's data (relative to the end of the header), and the
+suffix of its intermediate format (see rcvresults/intermediate.py).
+
+Bundles are read through mmap, so loading one contest reads only that
+contest's bytes (and the header), rather than the whole file, and
+opening the bundle once replaces opening one file per contest.
+(These are different from the zip bundles of result reports supported
+by rcvresults/archives.py.)
+"""
+
+import json
+import logging
+import mmap
+import struct
+
+import rcvresults.intermediate as intermediate
+from rcvresults.intermediate import FORMAT_COLUMNAR, FORMAT_COMPACT_JSON
+
+
+_log = logging.getLogger(__name__)
+
+BUNDLE_SUFFIX = '.rcvbundle'
+
+BUNDLE_MAGIC = b'RCVBNDL\x00'
+BUNDLE_VERSION = 1
+# The format version and the header length.
+_BUNDLE_HEADER = struct.Struct('<II')
+
+# The formats a bundle can store the contests in.
+BUNDLE_FORMAT_NAMES = [FORMAT_COLUMNAR, FORMAT_COMPACT_JSON]
+DEFAULT_BUNDLE_FORMAT = FORMAT_COLUMNAR
+
+
+def is_bundle(path):
+    return path.suffix == BUNDLE_SUFFIX
+
+
+def write_bundle(path, contests, election=None, format_name=None):
+    """
+    Write an election bundle, and return the number of contests written.
+
+    Args:
+      path: the path of the bundle, as a Path object.
+      contests: an iterable of (stem, results) pairs, one per contest,
+        where results is a results dict or ContestResults object.
+      election: the name of the election, e.g. "2022-11-08". Defaults
+        to the stem of path.
+      format_name: the format to store the contests in (one of
+        BUNDLE_FORMAT_NAMES). Defaults to DEFAULT_BUNDLE_FORMAT.
+    """
+    if format_name is None:
+        format_name = DEFAULT_BUNDLE_FORMAT
+    if format_name not in BUNDLE_FORMAT_NAMES:
+        raise ValueError(f'unsupported bundle format: {format_name!r}')
+    if election is None:
+        election = path.stem
+
+    suffix = intermediate.get_suffix(format_name)
+    entries = []
+    blobs = []
+    offset = 0
+    for stem, results in contests:
+        data = intermediate.dump_contest(results, format_name=format_name)
+        entries.append([stem, suffix, offset, len(data)])
+        blobs.append(data)
+        offset += len(data)
+
+    stems = [entry[0] for entry in entries]
+    if len(set(stems)) < len(stems):
+        raise ValueError(f'duplicate contest stems: {stems}')
+
+    header = {
+        'contests': entries,
+        'election': election,
+    }
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+    # Write to a temporary file first so an interrupted run can't leave
+    # a partial bundle.
+    temp_path = path.with_name(f'{path.name}.tmp')
+    with temp_path.open('wb') as f:
+        f.write(BUNDLE_MAGIC)
+        f.write(_BUNDLE_HEADER.pack(BUNDLE_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for data in blobs:
+            f.write(data)
+    temp_path.replace(path)
+    _log.info(f'wrote {len(entries)} contests to bundle: {path}')
+
+    return len(entries)
+
+
+def write_bundle_from_files(
+    path, json_paths, election=None, format_name=None,
+):
+    """
+    Write an election bundle from intermediate files (one per contest),
+    using each file's stem as the contest's stem.
+    """
+    contests = (
+        (json_path.stem, intermediate.read_contest(json_path))
+        for json_path in json_paths
+    )
+    return write_bundle(
+        path, contests=contests, election=election, format_name=format_name,
+    )
+
+
+class ElectionBundle:
+
+    """
+    An open election bundle.
+
+    Attributes:
+      election: the name of the election.
+      stems: the file stems of the contests, in the order written.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+          path: the path of the bundle, as a Path object.
+        """
+        self.path = path
+        with path.open('rb') as f:
+            # The map stays valid after the file is closed.
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def __repr__(self):
+        return (
+            f'<ElectionBundle {self.election!r}: {len(self.stems)} contests>'
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.stems)
+
+    def __contains__(self, stem):
+        return stem in self._index
+
+    def _read_header(self):
+        data = self._mmap
+        magic_size = len(BUNDLE_MAGIC)
+        if data[:magic_size] != BUNDLE_MAGIC:
+            raise ValueError(f'file is not an election bundle: {self.path}')
+        start = magic_size + _BUNDLE_HEADER.size
+        version, header_size = _BUNDLE_HEADER.unpack(data[magic_size:start])
+        if version != BUNDLE_VERSION:
+            raise ValueError(
+                f'unsupported bundle version {version}: {self.path}'
+            )
+        header = json.loads(data[start:start + header_size])
+        data_start = start + header_size
+
+        self.election = header['election']
+        self.stems = []
+        # Mapping from stem to (suffix, start, end).
+        self._index = {}
+        for stem, suffix, offset, length in header['contests']:
+            self.stems.append(stem)
+            contest_start = data_start + offset
+            self._index[stem] = (suffix, contest_start, contest_start + length)
+
+        end = max((end for _, _, end in self._index.values()), default=0)
+        if end > len(data):
+            raise ValueError(f'bundle is truncated: {self.path}')
+
+    def close(self):
+        self._mmap.close()
+
+    def read_contest(self, stem):
+        """
+        Load one contest, reading only its bytes.
+
+        Returns a results dict or ContestResults object, depending on the
+        format the bundle stores the contests in.
+        """
+        try:
+            suffix, start, end = self._index[stem]
+        except KeyError:
+            raise KeyError(
+                f'contest not in bundle {self.path}: {stem!r}'
+            ) from None
+
+        with memoryview(self._mmap) as view:
+            return intermediate.load_contest(view[start:end], suffix=suffix)
+
+    def iter_contests(self):
+        """
+        Yield a (stem, results) pair for each contest, in the order
+        written.
+        """
+        for stem in self.stems:
+            yield (stem, self.read_contest(stem))
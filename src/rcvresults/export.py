@@ -0,0 +1,196 @@
+"""
+Supports exporting the round values of many contests as one long-format
+table, e.g. for loading into a spreadsheet or database.
+
+The table has one row per contest, row (candidate or non-candidate
+subtotal), and round, with the columns in EXPORT_COLUMNS. It can be
+written as CSV or as NDJSON (one JSON object per line).
+
+The contests are parsed (or read) one at a time and their table rows
+are written as they are produced, so memory use doesn't grow with the
+number of contests or elections exported.
+"""
+
+import csv
+import json
+import logging
+
+import rcvresults.archives as archives
+import rcvresults.intermediate as intermediate
+import rcvresults.parsing as parsing
+from rcvresults.results import as_mapping
+import rcvresults.utils as utils
+
+
+_log = logging.getLogger(__name__)
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+
+FORMAT_NAMES = [FORMAT_CSV, FORMAT_NDJSON]
+
+EXPORT_COLUMNS = (
+    'election', 'contest', 'row', 'row_type', 'round', 'votes', 'percent',
+    'transfer',
+)
+
+ROW_TYPE_CANDIDATE = 'candidate'
+ROW_TYPE_NON_CANDIDATE = 'non_candidate'
+
+# The report suffixes to look for in an election directory, in order of
+# preference. (XML is preferred since it's more structured.)
+REPORT_SUFFIXES = ['xml', 'xlsx']
+
+
+def get_election_name(path):
+    """
+    Return the election name for an election directory or zip bundle
+    (e.g. "2022-11-08" for "data/input-reports/2022-11-08").
+    """
+    if archives.is_zip_bundle(path):
+        return path.stem
+    return path.name
+
+
+def get_contest_paths(election_path):
+    """
+    Return the paths of the contests to export from an election
+    directory or zip bundle.
+
+    These are the XML reports if there are any, and otherwise the Excel
+    reports. If there are no reports, any intermediate files written by
+    parse_results.py (e.g. JSON files) are used instead.
+    """
+    for suffix in [*REPORT_SUFFIXES, *intermediate.get_suffixes()]:
+        paths = utils.get_paths(election_path, suffix=suffix)
+        if paths:
+            return paths
+
+    return []
+
+
+def read_contest(path, xml_parser=None):
+    """
+    Parse a report, or read an intermediate file, and return the contest.
+    """
+    suffix = archives.get_report_suffix(path)
+    if suffix in intermediate.FORMAT_SUFFIXES.values():
+        return intermediate.read_contest(path)
+
+    return parsing.parse_report(path, xml_parser=xml_parser)
+
+
+def iter_contest_rows(election, contest, results):
+    """
+    Yield a tuple of values for each table row of a contest, in the
+    order of EXPORT_COLUMNS.
+
+    Args:
+      election: the election name (e.g. "2022-11-08").
+      contest: the contest's file stem (e.g. "da_short").
+      results: a results dict or ContestResults object.
+    """
+    results = as_mapping(results)
+    candidates = set(results['candidate_names'])
+    rounds = results['rounds']
+    for name in results['row_names']:
+        if name in candidates:
+            row_type = ROW_TYPE_CANDIDATE
+        else:
+            row_type = ROW_TYPE_NON_CANDIDATE
+        for round_number, round_data in enumerate(rounds[name], start=1):
+            yield (
+                election, contest, name, row_type, round_number,
+                round_data['votes'], round_data['percent'],
+                round_data['transfer'],
+            )
+
+
+def iter_election_rows(election_paths, xml_parser=None):
+    """
+    Yield the table rows of every contest in the given elections, one
+    contest at a time.
+
+    Args:
+      election_paths: an iterable of election directories or zip bundles.
+    """
+    for election_path in election_paths:
+        election = get_election_name(election_path)
+        contest_paths = get_contest_paths(election_path)
+        if not contest_paths:
+            _log.warning(f'no contests found in: {election_path}')
+            continue
+
+        _log.info(
+            f'exporting {len(contest_paths)} contests for election: {election}'
+        )
+        for path in contest_paths:
+            results = read_contest(path, xml_parser=xml_parser)
+            contest = archives.get_report_stem(path)
+            yield from iter_contest_rows(election, contest, results=results)
+
+
+def _to_csv_value(value):
+    # Write values that aren't numbers (None or "") as empty cells.
+    if value is None:
+        return ''
+    return value
+
+
+def write_csv(rows, f):
+    """
+    Write table rows to a text file as CSV, with a header row, and
+    return the number of rows written (not counting the header).
+    """
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow([_to_csv_value(value) for value in row])
+        count += 1
+
+    return count
+
+
+def _to_json_value(value):
+    # Write values that aren't numbers (None or "") as null.
+    if value == '':
+        return None
+    return value
+
+
+def write_ndjson(rows, f):
+    """
+    Write table rows to a text file as NDJSON, and return the number of
+    rows written.
+    """
+    count = 0
+    for row in rows:
+        data = {
+            column: _to_json_value(value)
+            for column, value in zip(EXPORT_COLUMNS, row)
+        }
+        f.write(json.dumps(data, ensure_ascii=False))
+        f.write('\n')
+        count += 1
+
+    return count
+
+
+WRITERS = {
+    FORMAT_CSV: write_csv,
+    FORMAT_NDJSON: write_ndjson,
+}
+
+
+def write_rows(rows, f, format_name):
+    """
+    Write table rows to a text file in the given format (one of
+    FORMAT_NAMES), and return the number of rows written.
+    """
+    try:
+        writer = WRITERS[format_name]
+    except KeyError:
+        raise ValueError(f'unknown export format: {format_name!r}') from None
+
+    return writer(rows, f)
@@ -0,0 +1,199 @@
+"""
+Registries of the report formats and renderers, loaded on first use.
+
+A report format is a module (or other object) that parses result reports
+with a particular suffix, e.g. ".xml". It has the following attributes:
+
+  * get_report_parser(parser_name=None): return a function that accepts
+    a path or binary file object and returns a dict of results.
+  * scan_report(source): return a dict with just the "_metadata" and
+    "candidate_names" values of the results.
+  * SEEKABLE: whether the file objects passed to the functions above
+    need to be seekable.
+
+A format can also be registered under a name rather than a suffix (e.g.
+"rctab"), in which case it is only used when selected explicitly (e.g.
+with the --report-format option of parse_results.py), and must also
+have a SUFFIXES attribute listing the suffixes of its files. This is for
+formats whose suffixes are also used for other files, like the ".json"
+of RCTab summary files and of the intermediate files (see
+rcvresults/intermediate.py).
+
+The built-in formats read the rows of each contest as the row events in
+rcvresults/parsers/events.py, so the results dicts they return have the
+same form whatever the format.
+
+A renderer is a module (or other object) with a process_election()
+function, like the one in rcvresults/election.py (including its "force"
+keyword argument, for rendering contests whose data is unchanged, and
+its "jobs" keyword argument, for rendering in parallel).
+
+Only the backend for a suffix (or renderer name) that is actually used
+gets imported, so e.g. parsing XML reports doesn't import the Excel
+parsing code, and scripts that don't render don't import Jinja2.
+Other packages can add formats and renderers through the entry point
+groups below, with the suffix (e.g. ".csv"), format name, or renderer
+name as the entry point name.
+"""
+
+import importlib
+import logging
+import sys
+
+
+_log = logging.getLogger(__name__)
+
+REPORT_FORMATS_GROUP = 'rcvresults.report_formats'
+RENDERERS_GROUP = 'rcvresults.renderers'
+
+RENDERER_HTML = 'html'
+
+REPORT_FORMAT_RCTAB = 'rctab'
+
+# Mapping from report suffix (or format name) to the name of the module
+# implementing it.
+BUILTIN_REPORT_FORMATS = {
+    # RCTab summary files. Only the CSV files are recognized by suffix,
+    # since ".json" files are taken to be intermediate files.
+    '.csv': 'rcvresults.parsers.rctab',
+    '.xlsx': 'rcvresults.parsers.xslx',
+    '.xml': 'rcvresults.parsers.xml',
+    REPORT_FORMAT_RCTAB: 'rcvresults.parsers.rctab',
+}
+
+# Mapping from renderer name to the name of the module implementing it.
+BUILTIN_RENDERERS = {
+    RENDERER_HTML: 'rcvresults.election',
+}
+
+
+class Registry:
+
+    """
+    A mapping from name to backend, where each backend is imported the
+    first time it's requested.
+    """
+
+    def __init__(self, builtins, group, kind):
+        """
+        Args:
+          builtins: a dict mapping name to module name.
+          group: the name of the entry point group to search for names
+            not in builtins.
+          kind: a description of the backends, for error messages.
+        """
+        self.builtins = builtins
+        self.group = group
+        self.kind = kind
+        self._backends = {}
+
+    def _iter_entry_points(self):
+        # Import this lazily since it's only needed for third-party
+        # backends.
+        from importlib.metadata import entry_points
+
+        if sys.version_info >= (3, 10):
+            return entry_points(group=self.group)
+
+        # Before Python 3.10, entry_points() doesn't accept a group
+        # argument, and returns a dict mapping group to entry points.
+        return entry_points().get(self.group, [])
+
+    def _find_entry_point(self, name):
+        for entry_point in self._iter_entry_points():
+            if entry_point.name == name:
+                return entry_point
+
+        return None
+
+    def _load(self, name):
+        module_name = self.builtins.get(name)
+        if module_name is not None:
+            return importlib.import_module(module_name)
+
+        entry_point = self._find_entry_point(name)
+        if entry_point is None:
+            raise ValueError(f'unknown {self.kind}: {name!r}')
+
+        _log.info(f'loading {self.kind} {name!r} from: {entry_point.value}')
+        return entry_point.load()
+
+    def get(self, name):
+        """
+        Return the backend with the given name, importing it if needed.
+        """
+        try:
+            return self._backends[name]
+        except KeyError:
+            pass
+
+        backend = self._load(name)
+        self._backends[name] = backend
+        return backend
+
+    def names(self):
+        """
+        Return the names of all the available backends (built-in and
+        installed), without importing them.
+        """
+        names = set(self.builtins)
+        names.update(
+            entry_point.name for entry_point in self._iter_entry_points()
+        )
+        return sorted(names)
+
+
+REPORT_FORMATS = Registry(
+    BUILTIN_REPORT_FORMATS, group=REPORT_FORMATS_GROUP, kind='report format',
+)
+RENDERERS = Registry(BUILTIN_RENDERERS, group=RENDERERS_GROUP, kind='renderer')
+
+
+def _is_suffix(name):
+    return name.startswith('.')
+
+
+def get_report_format(suffix):
+    """
+    Return the report format for a suffix (e.g. ".xml"), or for the name
+    of a format (e.g. "rctab").
+    """
+    return REPORT_FORMATS.get(suffix)
+
+
+def get_format_names():
+    """
+    Return the names of the report formats that can be selected
+    explicitly (i.e. the ones registered under a name), without
+    importing them.
+    """
+    return [name for name in REPORT_FORMATS.names() if not _is_suffix(name)]
+
+
+def get_report_suffixes(format_name=None):
+    """
+    Return the suffixes of the report files to look for, without the
+    leading dot (e.g. ["csv", "xlsx", "xml"]).
+
+    Args:
+      format_name: the name of a report format selected explicitly (e.g.
+        "rctab"), in which case the suffixes are the ones of that format.
+        Defaults to the suffixes of all the formats registered by suffix,
+        which are found without importing them.
+    """
+    if format_name is None:
+        suffixes = [
+            name for name in REPORT_FORMATS.names() if _is_suffix(name)
+        ]
+    else:
+        suffixes = get_report_format(format_name).SUFFIXES
+    return [suffix.removeprefix('.') for suffix in suffixes]
+
+
+def get_renderer(name=None):
+    """
+    Return the renderer with the given name. Defaults to RENDERER_HTML.
+    """
+    if name is None:
+        name = RENDERER_HTML
+    return RENDERERS.get(name)
@@ -0,0 +1,187 @@
+"""
+Supports the intermediate files that pass the parsed contests from the
+parsing step (parsing.make_jsons()) to the rendering step (e.g.
+election.process_election()).
+
+There are three formats, one file per contest:
+
+  * "json": pretty-printed JSON with sorted keys (the default). This is
+    the human-readable form, and the form of the reference files in
+    data/output-json.
+  * "compact-json": JSON without whitespace. This is written and read
+    with orjson if it is installed (and with the json module otherwise).
+  * "columnar": the binary form of a ContestResults object (see
+    ContestResults.to_bytes()), which loads without creating an object
+    per round value.
+
+The format of a file is determined by its suffix when reading, so the
+rendering step doesn't need to be told which format was written. (The
+two JSON formats share the ".json" suffix, and are read the same way.)
+When a contest is written in one format, any file for it in another
+format is deleted (see remove_other_formats()), so the rendering step
+never finds two files for the same contest.
+"""
+
+import functools
+import json
+
+from rcvresults.results import as_contest_results, ContestResults
+import rcvresults.utils as utils
+
+
+FORMAT_JSON = 'json'
+FORMAT_COMPACT_JSON = 'compact-json'
+FORMAT_COLUMNAR = 'columnar'
+
+FORMAT_NAMES = [FORMAT_JSON, FORMAT_COMPACT_JSON, FORMAT_COLUMNAR]
+DEFAULT_FORMAT = FORMAT_JSON
+
+JSON_SUFFIX = '.json'
+COLUMNAR_SUFFIX = '.rcvcols'
+
+# Mapping from format name to file suffix.
+FORMAT_SUFFIXES = {
+    FORMAT_JSON: JSON_SUFFIX,
+    FORMAT_COMPACT_JSON: JSON_SUFFIX,
+    FORMAT_COLUMNAR: COLUMNAR_SUFFIX,
+}
+
+
+@functools.cache
+def _import_orjson():
+    """
+    Return the orjson module, or None if orjson isn't installed.
+    """
+    try:
+        import orjson
+    except ImportError:
+        return None
+
+    return orjson
+
+
+def get_suffix(format_name=None):
+    """
+    Return the file suffix for a format (e.g. ".json").
+
+    Args:
+      format_name: one of FORMAT_NAMES. Defaults to DEFAULT_FORMAT.
+    """
+    if format_name is None:
+        format_name = DEFAULT_FORMAT
+    try:
+        return FORMAT_SUFFIXES[format_name]
+    except KeyError:
+        raise ValueError(f'unknown intermediate format: {format_name!r}') from None
+
+
+def get_suffixes():
+    """
+    Return the suffixes of all the formats, without the leading dot and
+    without duplicates (e.g. for utils.get_paths()).
+    """
+    return sorted({suffix.removeprefix('.') for suffix in FORMAT_SUFFIXES.values()})
+
+
+def _dump_compact_json(results):
+    orjson = _import_orjson()
+    if orjson is not None:
+        return orjson.dumps(results)
+
+    return json.dumps(results, separators=(',', ':')).encode()
+
+
+def dump_contest(results, format_name):
+    """
+    Return a contest as bytes in the given format, other than the
+    pretty-printed "json" format (e.g. for storing in a bundle).
+
+    Args:
+      results: a results dict or ContestResults object.
+      format_name: FORMAT_COMPACT_JSON or FORMAT_COLUMNAR.
+    """
+    if format_name == FORMAT_COLUMNAR:
+        return as_contest_results(results).to_bytes()
+
+    if format_name != FORMAT_COMPACT_JSON:
+        raise ValueError(f'unsupported format for dumping: {format_name!r}')
+    if isinstance(results, ContestResults):
+        results = results.to_results()
+    return _dump_compact_json(results)
+
+
+def load_contest(data, suffix):
+    """
+    Load a contest from the bytes of a file written by write_contest().
+
+    Args:
+      data: a bytes-like object (e.g. a memoryview of an mmap).
+      suffix: the suffix of the format (e.g. JSON_SUFFIX).
+
+    Returns a results dict for JSON data, and a ContestResults object for
+    columnar data.
+    """
+    if suffix == COLUMNAR_SUFFIX:
+        return ContestResults.from_bytes(data)
+    if suffix != JSON_SUFFIX:
+        raise ValueError(f'unknown intermediate file suffix: {suffix!r}')
+
+    orjson = _import_orjson()
+    if orjson is None:
+        return json.loads(bytes(data))
+
+    return orjson.loads(data)
+
+
+def write_contest(results, path, format_name=None):
+    """
+    Write a contest to a file in the given format.
+
+    Args:
+      results: a results dict or ContestResults object.
+      format_name: one of FORMAT_NAMES. Defaults to DEFAULT_FORMAT.
+    """
+    if format_name is None:
+        format_name = DEFAULT_FORMAT
+
+    if format_name == FORMAT_JSON:
+        if isinstance(results, ContestResults):
+            results = results.to_results()
+        utils.write_json(results, path=path)
+    elif format_name in (FORMAT_COMPACT_JSON, FORMAT_COLUMNAR):
+        path.write_bytes(dump_contest(results, format_name=format_name))
+    else:
+        raise ValueError(f'unknown intermediate format: {format_name!r}')
+
+
+def remove_other_formats(path):
+    """
+    Delete any files for the same contest as the given file but with the
+    suffix of another format (e.g. "a.rcvcols" for "a.json"), so that
+    only one file per contest is left in the directory.
+
+    Returns the paths deleted.
+    """
+    removed = []
+    for suffix in sorted(set(FORMAT_SUFFIXES.values())):
+        if suffix == path.suffix:
+            continue
+        other_path = path.with_suffix(suffix)
+        if other_path.exists():
+            other_path.unlink()
+            removed.append(other_path)
+
+    return removed
+
+
+def read_contest(path):
+    """
+    Read a contest from a file written by write_contest(), in any format.
+
+    Returns a results dict for JSON files, and a ContestResults object for
+    columnar files.
+    """
+    if path.suffix not in (COLUMNAR_SUFFIX, JSON_SUFFIX):
+        raise ValueError(f'unknown intermediate file suffix: {path}')
+
+    return load_contest(path.read_bytes(), suffix=path.suffix)
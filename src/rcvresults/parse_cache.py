@@ -0,0 +1,144 @@
+"""
+Supports skipping the parsing of reports that haven't changed.
+
+The cache is a manifest file stored in the JSON output directory. For
+each report parsed into that directory, it records the SHA-256 hash of
+the report's contents, the version of the parser used, and the name of
+the JSON file written. A report whose three values all match (and whose
+JSON file still exists) doesn't need to be parsed again.
+"""
+
+import hashlib
+import json
+import logging
+
+
+_log = logging.getLogger(__name__)
+
+# The file name starts with a dot so utils.get_paths() doesn't include
+# it when collecting the JSON files in the directory.
+MANIFEST_NAME = '.parse-manifest.json'
+
+# The version of the manifest file format.
+MANIFEST_VERSION = 1
+
+# The number of bytes to read at a time when hashing a file.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """
+    Return the SHA-256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with path.open('rb') as f:
+        # Read in chunks (rather than using hashlib.file_digest(), which
+        # needs Python 3.11) so large reports aren't read all at once.
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+
+    """
+    The manifest of the reports parsed into a JSON output directory.
+
+    Attributes:
+      hits: the number of lookups that found an up-to-date JSON file.
+      misses: the number of lookups that didn't.
+    """
+
+    def __init__(self, output_dir, force=False):
+        """
+        Args:
+          force: whether lookups should always miss (e.g. to re-parse
+            every report). The manifest is still updated.
+        """
+        self.output_dir = output_dir
+        self.force = force
+        self.hits = 0
+        self.misses = 0
+        self._entries = self._read_entries()
+
+    @property
+    def manifest_path(self):
+        return self.output_dir / MANIFEST_NAME
+
+    def _read_entries(self):
+        path = self.manifest_path
+        if not path.exists():
+            return {}
+
+        try:
+            with path.open() as f:
+                data = json.load(f)
+        except ValueError:
+            _log.warning(f'ignoring invalid manifest: {path}')
+            return {}
+
+        if data.get('version') != MANIFEST_VERSION:
+            _log.info(f'ignoring manifest with a different version: {path}')
+            return {}
+
+        return data['reports']
+
+    def lookup(self, report_path, content_hash, parser_version, json_path):
+        """
+        Return whether the JSON file for a report is up to date, and
+        update the hit and miss counts.
+
+        Args:
+          report_path: the path to the report.
+          content_hash: the return value of hash_file() for the report.
+          parser_version: the version string of the parser that would
+            parse the report.
+          json_path: the path of the JSON file the report would be
+            written to.
+        """
+        entry = self._entries.get(str(report_path))
+        is_hit = (
+            not self.force and entry is not None
+            and entry['sha256'] == content_hash
+            and entry['parser_version'] == parser_version
+            and entry['json_name'] == json_path.name
+            and json_path.exists()
+        )
+        if is_hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        return is_hit
+
+    def add(self, report_path, content_hash, parser_version, json_path):
+        """
+        Record that a report was parsed to the given JSON file. The
+        manifest isn't written until save() is called.
+        """
+        self._entries[str(report_path)] = {
+            'json_name': json_path.name,
+            'parser_version': parser_version,
+            'sha256': content_hash,
+        }
+
+    def save(self):
+        """
+        Write the manifest to the output directory.
+        """
+        path = self.manifest_path
+        data = {
+            'reports': self._entries,
+            'version': MANIFEST_VERSION,
+        }
+        # Write to a temporary file first so an interrupted run can't
+        # leave a partial manifest.
+        temp_path = path.with_name(f'{path.name}.tmp')
+        with temp_path.open('w') as f:
+            json.dump(data, f, indent='    ', sort_keys=True)
+        temp_path.replace(path)
+
+    def log_counts(self):
+        _log.info(
+            f'parse cache: {self.hits} hit(s), {self.misses} miss(es)'
+        )
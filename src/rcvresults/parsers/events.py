@@ -0,0 +1,155 @@
+"""
+Defines the row events that the report parsers emit, and builds results
+dicts from them.
+
+Each parser yields an (event, data) pair for each piece of a contest's
+data as it reads it (like ElementTree's iterparse()), so the code that
+consumes the data doesn't depend on the report format. A contest is the
+following sequence of events:
+
+  * (EVENT_CONTEST, metadata): the contest header, where metadata is the
+    "_metadata" dict of the results (e.g. with the contest name).
+  * For each row (candidate or non-candidate subtotal), in order:
+    * (EVENT_ROW_START, (name, is_candidate)): where name is the
+      candidate name or non-candidate label (see
+      utils.NON_CANDIDATE_SUBTOTAL_LABELS).
+    * (EVENT_ROUND, (votes, percent, transfer)): one for each round.
+    * (EVENT_ROW_END, name).
+
+A stream can contain more than one contest, each starting with its own
+contest header.
+"""
+
+from rcvresults.utils import NON_CANDIDATE_SUBTOTAL_LABELS
+
+
+EVENT_CONTEST = 'contest'
+EVENT_ROW_START = 'row_start'
+EVENT_ROUND = 'round'
+EVENT_ROW_END = 'row_end'
+
+
+def iter_row_events(name, is_candidate, rounds):
+    """
+    Yield the events for one row.
+
+    Args:
+      rounds: an iterable of (votes, percent, transfer) triples, one for
+        each round.
+    """
+    yield (EVENT_ROW_START, (name, is_candidate))
+    for round_values in rounds:
+        yield (EVENT_ROUND, round_values)
+    yield (EVENT_ROW_END, name)
+
+
+def _make_round_dict(round_values):
+    votes, percent, transfer = round_values
+    return {
+        'votes': votes,
+        'percent': percent,
+        'transfer': transfer,
+    }
+
+
+class ResultsBuilder:
+
+    """
+    Builds the results dict of one contest from its events (not
+    including the contest header).
+    """
+
+    def __init__(self, metadata):
+        self.metadata = metadata
+        self.candidates = []
+        self.non_candidate_names = []
+        self.row_names = []
+        self.rounds = {}
+        # The rounds of the row currently being read, or None if outside
+        # a row.
+        self._row_rounds = None
+
+    def start_row(self, name, is_candidate):
+        if self._row_rounds is not None:
+            raise RuntimeError(
+                f'row started before the previous row ended: {name!r}'
+            )
+        if name in self.rounds:
+            raise RuntimeError(f'duplicate row: {name!r}')
+        if is_candidate:
+            self.candidates.append(name)
+        else:
+            if name not in NON_CANDIDATE_SUBTOTAL_LABELS:
+                raise RuntimeError(f'unknown non-candidate label: {name!r}')
+            self.non_candidate_names.append(name)
+
+        self.row_names.append(name)
+        self._row_rounds = []
+        self.rounds[name] = self._row_rounds
+
+    def add_round(self, round_values):
+        if self._row_rounds is None:
+            raise RuntimeError(f'round outside a row: {round_values!r}')
+        self._row_rounds.append(_make_round_dict(round_values))
+
+    def end_row(self, name):
+        if self._row_rounds is None or self.row_names[-1] != name:
+            raise RuntimeError(f'unexpected end of row: {name!r}')
+        self._row_rounds = None
+
+    def get_results(self):
+        if self._row_rounds is not None:
+            raise RuntimeError(f'row not ended: {self.row_names[-1]!r}')
+        return {
+            '_metadata': self.metadata,
+            'candidate_names': self.candidates,
+            'non_candidate_names': self.non_candidate_names,
+            'row_names': self.row_names,
+            'rounds': self.rounds,
+        }
+
+
+def iter_contests(events):
+    """
+    Yield a results dict for each contest in a stream of events.
+
+    Each contest is yielded once the next contest header (or the end of
+    the stream) is reached.
+    """
+    builder = None
+    for event, data in events:
+        if builder is None and event != EVENT_CONTEST:
+            raise RuntimeError(f'{event!r} event before the contest header')
+
+        if event == EVENT_ROUND:
+            builder.add_round(data)
+        elif event == EVENT_ROW_START:
+            builder.start_row(*data)
+        elif event == EVENT_ROW_END:
+            builder.end_row(data)
+        elif event == EVENT_CONTEST:
+            if builder is not None:
+                yield builder.get_results()
+            builder = ResultsBuilder(data)
+        else:
+            raise ValueError(f'unknown event: {event!r}')
+
+    if builder is not None:
+        yield builder.get_results()
+
+
+def build_results(events):
+    """
+    Return the results dict of the single contest in a stream of events.
+    """
+    contests = iter_contests(events)
+    try:
+        results = next(contests, None)
+        if results is None:
+            raise RuntimeError('no contest found')
+        if next(contests, None) is not None:
+            raise RuntimeError('found more than one contest')
+    finally:
+        contests.close()
+
+    return results
@@ -0,0 +1,487 @@
+"""
+Supports parsing RCTab summary reports, in either JSON (".json") or CSV
+(".csv") format.
+
+RCTab (https://www.rcvresources.org/rctab) writes a summary file for
+each contest it tabulates, with the candidates' vote totals in each
+round and the counts of inactive ballots. The format of a file is
+detected from its first character, so the same functions read both.
+
+The rows are mapped to the rows of the Dominion reports as follows:
+
+  * continuing: the active ballots, i.e. the sum of the candidates' votes.
+  * blanks: the undervotes (ballots with no rankings), which are the same
+    in every round.
+  * exhausted: the ballots inactive by exhausted choices, skipped
+    rankings, or repeated rankings.
+  * overvotes: the ballots inactive by overvotes.
+  * non_transferable: the sum of the three rows above.
+
+Like in the Dominion reports, percentages are relative to the continuing
+ballots, and the transfer in a round is the change in votes from that
+round to the next (so it's zero in the last round). Both are computed
+from the vote totals rather than read from the file.
+
+A JSON file can also contain a list of summaries (e.g. an export of many
+contests). JSON is read incrementally, so iter_rctab_contests() parses
+and yields the summaries one at a time, without loading the whole file.
+The report format interface only supports files with a single contest,
+though (since parsing.make_jsons() writes one file per report), so
+parse_rctab_file() raises an error for a file with more than one.
+"""
+
+import contextlib
+import csv
+import io
+import itertools
+import json
+import re
+
+import rcvresults.parsers.events as events
+from rcvresults.parsers.events import EVENT_CONTEST
+import rcvresults.utils as utils
+from rcvresults.utils import NonCandidateLabel
+
+
+# The number of characters to read at a time from a JSON file.
+CHUNK_SIZE = 64 * 1024
+
+# The keys in a round's "inactiveBallots" object (in the JSON format)
+# that count towards the "exhausted" row.
+JSON_EXHAUSTED_KEYS = [
+    'exhaustedChoices', 'repeatedRankings', 'skippedRankings',
+]
+JSON_OVERVOTES_KEY = 'overvotes'
+
+# The first cells of rows in the CSV format.
+CSV_CONTEST = 'Contest'
+CSV_ROUNDS = 'Rounds'
+CSV_ACTIVE_BALLOTS = 'Active Ballots'
+# The label of the undervotes row starts with this (e.g. "Number of
+# Undervotes (No Rankings)", depending on the RCTab version).
+CSV_UNDERVOTES_PREFIX = 'Number of Undervotes'
+# The rows that can come before the candidate rows in the rounds table.
+CSV_SKIPPED_ROWS = {'Elected', 'Eliminated'}
+# Mapping from the label of an inactive ballots row in the rounds table
+# to the non-candidate label it counts towards. Other rows after the
+# candidate rows (e.g. "Current Round Threshold") are ignored.
+CSV_INACTIVE_LABELS = {
+    'Inactive Ballots by Exhausted Choices': NonCandidateLabel.EXHAUSTED,
+    'Inactive Ballots by Overvotes': NonCandidateLabel.OVERVOTE,
+    'Inactive Ballots by Repeated Rankings': NonCandidateLabel.EXHAUSTED,
+    'Inactive Ballots by Skipped Rankings': NonCandidateLabel.EXHAUSTED,
+}
+
+_WHITESPACE = re.compile(r'\s*')
+
+
+def _to_number(value):
+    """
+    Convert a vote count in a summary file to a float.
+
+    RCTab writes some counts as strings, and leaves out the counts of
+    eliminated candidates, so missing values count as zero.
+    """
+    if value is None or value == '':
+        return 0.0
+    if isinstance(value, str):
+        value = value.replace(',', '')
+    return float(value)
+
+
+def _make_rounds(votes_list, continuing_votes=None):
+    """
+    Return a list of (votes, percent, transfer) triples for a row.
+
+    Args:
+      votes_list: the row's vote totals, one per round.
+      continuing_votes: the continuing ballots in each round, for
+        computing the percentages. If None, the percents and transfers
+        are None, as for the "continuing" and "non_transferable" rows.
+    """
+    if continuing_votes is None:
+        return [(votes, None, None) for votes in votes_list]
+
+    next_votes = votes_list[1:] + votes_list[-1:]
+    rounds = []
+    for votes, next_round_votes, continuing in zip(
+        votes_list, next_votes, continuing_votes,
+    ):
+        percent = votes / continuing if continuing else 0.0
+        rounds.append((votes, percent, next_round_votes - votes))
+
+    return rounds
+
+
+def _iter_contest_events(contest_name, candidate_votes, inactive_votes):
+    """
+    Yield the row events for one contest, including the contest header.
+
+    Args:
+      candidate_votes: a dict mapping candidate name to the list of the
+        candidate's vote totals, one per round.
+      inactive_votes: a dict mapping each of the labels blanks,
+        exhausted, and overvotes to a list of vote totals.
+    """
+    yield (EVENT_CONTEST, {'contest_name': contest_name})
+
+    continuing_votes = [
+        sum(values) for values in zip(*candidate_votes.values())
+    ]
+    for name, votes_list in candidate_votes.items():
+        yield from events.iter_row_events(
+            name, is_candidate=True,
+            rounds=_make_rounds(votes_list, continuing_votes=continuing_votes),
+        )
+
+    all_votes = dict(inactive_votes)
+    all_votes[NonCandidateLabel.CONTINUING] = continuing_votes
+    all_votes[NonCandidateLabel.NON_TRANSFERABLE] = [
+        sum(values) for values in zip(*inactive_votes.values())
+    ]
+    for label in utils.NON_CANDIDATE_SUBTOTAL_LABELS:
+        if label in inactive_votes:
+            rounds = _make_rounds(
+                all_votes[label], continuing_votes=continuing_votes,
+            )
+        else:
+            rounds = _make_rounds(all_votes[label])
+        yield from events.iter_row_events(
+            label, is_candidate=False, rounds=rounds,
+        )
+
+
+class _JsonReader:
+
+    """
+    Reads JSON values from a text file a chunk at a time.
+    """
+
+    def __init__(self, f, chunk_size=None):
+        if chunk_size is None:
+            chunk_size = CHUNK_SIZE
+        self._f = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._position = 0
+        self._at_end = False
+
+    def _read_more(self):
+        """
+        Read the next chunk into the buffer, and return whether there was
+        more text.
+        """
+        if self._at_end:
+            return False
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            self._at_end = True
+            return False
+        # Drop the text that was already read.
+        self._buffer = self._buffer[self._position:] + chunk
+        self._position = 0
+        return True
+
+    def peek(self):
+        """
+        Skip any whitespace, and return the next character (or the empty
+        string at the end of the file).
+        """
+        while True:
+            match = _WHITESPACE.match(self._buffer, self._position)
+            self._position = match.end()
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._read_more():
+                return ''
+
+    def advance(self):
+        self._position += 1
+
+    def read_value(self):
+        """
+        Read and return the next JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(
+                    self._buffer, self._position,
+                )
+            except json.JSONDecodeError:
+                # Then the value may continue in the next chunk.
+                if self._read_more():
+                    continue
+                raise
+            # A number at the end of the buffer could also continue.
+            if (
+                end == len(self._buffer)
+                and isinstance(value, (int, float))
+                and self._read_more()
+            ):
+                continue
+
+            self._position = end
+            return value
+
+    def read_rest(self):
+        """
+        Return the text not yet read, up to the end of the current line.
+        """
+        text = self._buffer[self._position:]
+        self._buffer = ''
+        self._position = 0
+        return text + self._f.readline()
+
+
+def _iter_json_values(reader):
+    """
+    Yield the top-level JSON value, or each of its items if it's a list.
+    """
+    if reader.peek() != '[':
+        yield reader.read_value()
+    else:
+        reader.advance()
+        if reader.peek() == ']':
+            reader.advance()
+        else:
+            while True:
+                yield reader.read_value()
+                char = reader.peek()
+                reader.advance()
+                if char == ']':
+                    break
+                if char != ',':
+                    raise ValueError(
+                        f'expected "," or "]" in list, got: {char!r}'
+                    )
+
+    char = reader.peek()
+    if char:
+        raise ValueError(f'unexpected data after JSON value: {char!r}')
+
+
+def iter_json_summaries(f, chunk_size=None):
+    """
+    Yield each summary dict in a JSON file (either the file's one
+    summary, or each summary in a list), reading the file a chunk at a
+    time.
+
+    Args:
+      f: a text file object.
+    """
+    reader = _JsonReader(f, chunk_size=chunk_size)
+    yield from _iter_json_values(reader)
+
+
+def _iter_summary_events(summary):
+    """
+    Yield the row events for the summary dict of a contest in the JSON
+    format.
+    """
+    if not isinstance(summary, dict):
+        raise ValueError(f'summary is not a JSON object: {summary!r}')
+
+    contest_name = summary['config']['contest']
+    round_data_list = summary['results']
+    round_count = len(round_data_list)
+    candidate_votes = {}
+    exhausted = []
+    overvotes = []
+    for index, round_data in enumerate(round_data_list):
+        for name, votes in round_data['tally'].items():
+            votes_list = candidate_votes.setdefault(name, round_count * [0.0])
+            votes_list[index] = _to_number(votes)
+
+        inactive = round_data.get('inactiveBallots', {})
+        exhausted.append(
+            sum(_to_number(inactive.get(key)) for key in JSON_EXHAUSTED_KEYS)
+        )
+        overvotes.append(_to_number(inactive.get(JSON_OVERVOTES_KEY)))
+
+    undervotes = _to_number(summary.get('summary', {}).get('undervotes'))
+    inactive_votes = {
+        NonCandidateLabel.BLANK: round_count * [undervotes],
+        NonCandidateLabel.EXHAUSTED: exhausted,
+        NonCandidateLabel.OVERVOTE: overvotes,
+    }
+    yield from _iter_contest_events(
+        contest_name, candidate_votes=candidate_votes,
+        inactive_votes=inactive_votes,
+    )
+
+
+def _get_csv_votes(row, round_count):
+    """
+    Return the vote totals in a row of the rounds table in the CSV format.
+    """
+    # Each round has three columns: votes, percent, and transfer.
+    votes_list = [_to_number(value) for value in row[1::3]]
+    # Pad the rounds after a candidate's elimination, which can be left
+    # out.
+    return (votes_list + round_count * [0.0])[:round_count]
+
+
+def _iter_csv_events(rows):
+    """
+    Yield the row events for the rows of a summary in the CSV format.
+
+    Args:
+      rows: an iterable of lists of cell values.
+    """
+    rows = iter(rows)
+    contest_name = None
+    undervotes = 0.0
+    for row in rows:
+        if not row:
+            continue
+        label = row[0].strip()
+        if label == CSV_CONTEST:
+            contest_name = row[1]
+        elif label.startswith(CSV_UNDERVOTES_PREFIX):
+            undervotes = _to_number(row[1])
+        elif label == CSV_ROUNDS:
+            round_count = sum(
+                1 for cell in row[1:] if cell.startswith('Round ')
+            )
+            break
+    else:
+        raise RuntimeError(f'no {CSV_ROUNDS!r} table found')
+
+    candidate_votes = {}
+    inactive_votes = {
+        NonCandidateLabel.BLANK: round_count * [undervotes],
+        NonCandidateLabel.EXHAUSTED: round_count * [0.0],
+        NonCandidateLabel.OVERVOTE: round_count * [0.0],
+    }
+    is_candidate = True
+    for row in rows:
+        # A blank row ends the table.
+        if not row or not row[0].strip():
+            break
+        label = row[0].strip()
+        if label == CSV_ACTIVE_BALLOTS:
+            is_candidate = False
+        elif is_candidate:
+            if label not in CSV_SKIPPED_ROWS:
+                candidate_votes[label] = _get_csv_votes(row, round_count)
+        elif label in CSV_INACTIVE_LABELS:
+            totals = inactive_votes[CSV_INACTIVE_LABELS[label]]
+            votes_list = _get_csv_votes(row, round_count)
+            for index, votes in enumerate(votes_list):
+                totals[index] += votes
+
+    yield from _iter_contest_events(
+        contest_name, candidate_votes=candidate_votes,
+        inactive_votes=inactive_votes,
+    )
+
+
+@contextlib.contextmanager
+def _open_text(source):
+    """
+    Open a path or binary file object as a UTF-8 text file.
+    """
+    if not hasattr(source, 'read'):
+        with open(source, encoding='utf-8-sig', newline='') as f:
+            yield f
+        return
+
+    f = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+    try:
+        yield f
+    finally:
+        # Leave the binary file open for the caller to close.
+        f.detach()
+
+
+def iter_rctab_events(source, chunk_size=None):
+    """
+    Parse an RCTab summary file (JSON or CSV), and yield its row events
+    (see rcvresults/parsers/events.py), one contest at a time.
+
+    Args:
+      source: a path or binary file object.
+      chunk_size: the number of characters to read at a time from a JSON
+        file. Defaults to CHUNK_SIZE.
+    """
+    with _open_text(source) as f:
+        reader = _JsonReader(f, chunk_size=chunk_size)
+        if reader.peek() in ('[', '{'):
+            for summary in _iter_json_values(reader):
+                yield from _iter_summary_events(summary)
+            return
+
+        # Otherwise, the file is CSV.
+        text = reader.read_rest()
+        lines = itertools.chain(io.StringIO(text, newline=''), f)
+        yield from _iter_csv_events(csv.reader(lines))
+
+
+def iter_rctab_contests(source, chunk_size=None):
+    """
+    Parse an RCTab summary file, and yield a dict of results for each
+    contest in it.
+    """
+    yield from events.iter_contests(
+        iter_rctab_events(source, chunk_size=chunk_size)
+    )
+
+
+def parse_rctab_file(source):
+    """
+    Parse an RCTab summary file containing a single contest, and return
+    a dict of results.
+
+    Raises RuntimeError if the file contains more than one contest (use
+    iter_rctab_contests() to read those).
+    """
+    return events.build_results(iter_rctab_events(source))
+
+
+def scan_rctab_file(source):
+    """
+    Read only the contest name and candidate names from the first
+    contest in an RCTab summary file.
+
+    Returns a dict with the same "_metadata" and "candidate_names" values
+    as parse_rctab_file().
+    """
+    contests = iter_rctab_contests(source)
+    try:
+        results = next(contests, None)
+    finally:
+        contests.close()
+
+    if results is None:
+        raise RuntimeError('no contest found')
+
+    return {
+        '_metadata': results['_metadata'],
+        'candidate_names': results['candidate_names'],
+    }
+
+
+# The names below implement the report format interface (see
+# rcvresults/formats.py).
+
+SEEKABLE = False
+
+# The suffixes of RCTab summary files. The format is selected by name
+# (e.g. with "--report-format rctab"), since ".json" is also the suffix
+# of the intermediate files.
+SUFFIXES = ['.csv', '.json']
+
+
+def get_report_parser(parser_name=None):
+    """
+    Return a function that parses an RCTab summary file and returns a
+    dict of results.
+    """
+    if parser_name is not None:
+        raise ValueError(f'unknown RCTab parser: {parser_name!r}')
+    return parse_rctab_file
+
+
+scan_report = scan_rctab_file
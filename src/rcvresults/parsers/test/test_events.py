@@ -0,0 +1,89 @@
+"""
+Unit tests of rcvresults/parsers/events.py.
+"""
+
+from pathlib import Path
+from unittest import TestCase
+
+import rcvresults.parsers.events as events
+from rcvresults.parsers.events import (
+    EVENT_CONTEST, EVENT_ROUND, EVENT_ROW_END, EVENT_ROW_START,
+)
+import rcvresults.parsers.xml as xml_parsing
+import rcvresults.utils as utils
+
+
+REPORTS_DIR = Path('data/input-reports')
+
+
+def make_events(contest_name, candidates):
+    yield (EVENT_CONTEST, {'contest_name': contest_name})
+    for name in candidates:
+        yield from events.iter_row_events(
+            name, is_candidate=True, rounds=[(10, 0.5, 0), (10, 0.5, 0)],
+        )
+    for label in utils.NON_CANDIDATE_SUBTOTAL_LABELS:
+        yield from events.iter_row_events(
+            label, is_candidate=False, rounds=[(20, None, None)] * 2,
+        )
+
+
+class EventsTestCase(TestCase):
+
+    def test_iter_contests(self):
+        stream = [
+            *make_events('A', ['Alice', 'Bob']),
+            *make_events('B', ['Carol']),
+        ]
+        contests = list(events.iter_contests(stream))
+        self.assertEqual(len(contests), 2)
+        results = contests[0]
+        self.assertEqual(results['_metadata'], {'contest_name': 'A'})
+        self.assertEqual(results['candidate_names'], ['Alice', 'Bob'])
+        self.assertEqual(
+            results['non_candidate_names'], utils.NON_CANDIDATE_SUBTOTAL_LABELS,
+        )
+        self.assertEqual(
+            results['row_names'],
+            ['Alice', 'Bob', *utils.NON_CANDIDATE_SUBTOTAL_LABELS],
+        )
+        self.assertEqual(results['rounds']['Bob'][1], {
+            'votes': 10, 'percent': 0.5, 'transfer': 0,
+        })
+
+        with self.assertRaisesRegex(RuntimeError, 'more than one contest'):
+            events.build_results(stream)
+        with self.assertRaisesRegex(RuntimeError, 'no contest found'):
+            events.build_results([])
+
+    def test_iter_contests__invalid(self):
+        header = (EVENT_CONTEST, {})
+        cases = [
+            ([(EVENT_ROW_START, ('Alice', True))], 'before the contest header'),
+            ([header, (EVENT_ROUND, (1, 0, 0))], 'round outside a row'),
+            ([header, (EVENT_ROW_START, ('other', False))],
+             'unknown non-candidate label'),
+            ([header, (EVENT_ROW_START, ('Alice', True)),
+              (EVENT_ROW_END, 'Bob')], 'unexpected end of row'),
+            ([header, (EVENT_ROW_START, ('Alice', True))], 'row not ended'),
+            ([header, *events.iter_row_events('Alice', True, []),
+              (EVENT_ROW_START, ('Alice', True))], 'duplicate row'),
+        ]
+        for stream, message in cases:
+            with self.subTest(message=message):
+                with self.assertRaisesRegex(RuntimeError, message):
+                    list(events.iter_contests(stream))
+
+    def test_xml_events(self):
+        """
+        Check that the tree and streaming XML parsers emit the same events.
+        """
+        backend = xml_parsing.get_backend(xml_parsing.BACKEND_ETREE)
+        for path in utils.get_paths(REPORTS_DIR / '*', suffix='xml'):
+            with self.subTest(path=path):
+                root = backend.parse(path)
+                expected = list(
+                    xml_parsing.iter_tree_events(root, backend=backend)
+                )
+                actual = list(xml_parsing.iter_xml_events(path))
+                self.assertEqual(actual, expected)
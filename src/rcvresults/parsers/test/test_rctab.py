@@ -0,0 +1,244 @@
+"""
+Unit tests of rcvresults/parsers/rctab.py.
+"""
+
+from io import BytesIO
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from rcvresults.formats import REPORT_FORMAT_RCTAB
+import rcvresults.intermediate as intermediate
+import rcvresults.parsers.rctab as rctab
+import rcvresults.parsing as parsing
+
+
+CONTEST_NAME = 'Mayor'
+
+# A summary in the JSON format, with a candidate (Carol) eliminated in
+# round 1.
+SUMMARY = {
+    'config': {
+        'contest': CONTEST_NAME,
+        'generatedBy': 'RCTab 1.3.1',
+    },
+    'jsonFormatVersion': '1',
+    'results': [
+        {
+            'inactiveBallots': {
+                'exhaustedChoices': '0',
+                'overvotes': '2',
+                'repeatedRankings': '0',
+                'skippedRankings': '0',
+            },
+            'round': 1,
+            'tally': {'Alice': '40', 'Bob': '35', 'Carol': '15'},
+            'tallyResults': [{
+                'eliminated': 'Carol',
+                'transfers': {'Alice': '8', 'Bob': '4', 'exhausted': '3'},
+            }],
+            'threshold': '46',
+        },
+        {
+            'inactiveBallots': {
+                'exhaustedChoices': '1',
+                'overvotes': '3',
+                'repeatedRankings': '0',
+                'skippedRankings': '1',
+            },
+            'round': 2,
+            'tally': {'Alice': '48', 'Bob': '39'},
+            'tallyResults': [{'elected': 'Alice', 'transfers': {}}],
+            'threshold': '44',
+        },
+    ],
+    'summary': {
+        'finalThreshold': '44',
+        'numCandidates': 3,
+        'numWinners': 1,
+        'totalNumBallots': '100',
+        'undervotes': 8,
+    },
+}
+
+# The same summary in the CSV format.
+SUMMARY_CSV = """\
+Contest Information
+Generated By,RCTab 1.3.1
+CSV Format Version,1
+Contest,Mayor
+Winner(s),Alice
+
+Contest Summary
+Number to be Elected,1
+Number of Candidates,3
+Total Number of Ballots,100
+Number of Undervotes (No Rankings),8
+
+Rounds,Round 1 Votes,% of vote,transfer,Round 2 Votes,% of vote,transfer
+Eliminated,Carol,,,,,
+Elected,,,,Alice,,
+Alice,40,44.44%,8,48,55.17%,0
+Bob,35,38.89%,4,39,44.83%,0
+Carol,15,16.67%,-15,,,
+Active Ballots,90,,,87,,
+Current Round Threshold,46,,,44,,
+Inactive Ballots by Overvotes,2,,,3,,
+Inactive Ballots by Skipped Rankings,0,,,1,,
+Inactive Ballots by Exhausted Choices,0,,,1,,
+Inactive Ballots by Repeated Rankings,0,,,0,,
+Inactive Ballots Total,2,,,5,,
+"""
+
+
+def make_summary(contest_name):
+    summary = json.loads(json.dumps(SUMMARY))
+    summary['config']['contest'] = contest_name
+    return summary
+
+
+class RCTabTestCase(TestCase):
+
+    def check_results(self, results):
+        self.assertEqual(results['_metadata'], {'contest_name': CONTEST_NAME})
+        self.assertEqual(results['candidate_names'], ['Alice', 'Bob', 'Carol'])
+        self.assertEqual(results['non_candidate_names'], [
+            'continuing', 'blanks', 'exhausted', 'overvotes',
+            'non_transferable',
+        ])
+        rounds = results['rounds']
+        self.assertEqual(rounds['Alice'], [
+            {'votes': 40.0, 'percent': 40 / 90, 'transfer': 8.0},
+            {'votes': 48.0, 'percent': 48 / 87, 'transfer': 0.0},
+        ])
+        self.assertEqual(rounds['Carol'][1], {
+            'votes': 0.0, 'percent': 0.0, 'transfer': 0.0,
+        })
+        self.assertEqual(rounds['continuing'], [
+            {'votes': 90.0, 'percent': None, 'transfer': None},
+            {'votes': 87.0, 'percent': None, 'transfer': None},
+        ])
+        self.assertEqual(
+            [round_data['votes'] for round_data in rounds['blanks']],
+            [8.0, 8.0],
+        )
+        self.assertEqual(rounds['exhausted'][0], {
+            'votes': 0.0, 'percent': 0.0, 'transfer': 2.0,
+        })
+        self.assertEqual(
+            [round_data['votes'] for round_data in rounds['non_transferable']],
+            [10.0, 13.0],
+        )
+
+    def test_parse_rctab_file__json(self):
+        f = BytesIO(json.dumps(SUMMARY, indent=2).encode())
+        results = rctab.parse_rctab_file(f)
+        self.check_results(results)
+
+    def test_parse_rctab_file__csv(self):
+        f = BytesIO(SUMMARY_CSV.encode())
+        results = rctab.parse_rctab_file(f)
+        self.check_results(results)
+
+        expected = rctab.parse_rctab_file(BytesIO(json.dumps(SUMMARY).encode()))
+        self.assertEqual(results, expected)
+
+    def test_iter_rctab_contests(self):
+        """
+        Test a JSON list of summaries, read in chunks smaller than a
+        single value.
+        """
+        names = [f'Contest {i}' for i in range(5)]
+        data = json.dumps([make_summary(name) for name in names]).encode()
+        for chunk_size in (3, 50, None):
+            with self.subTest(chunk_size=chunk_size):
+                contests = list(rctab.iter_rctab_contests(
+                    BytesIO(data), chunk_size=chunk_size,
+                ))
+                self.assertEqual(
+                    [results['_metadata']['contest_name'] for results in contests],
+                    names,
+                )
+                self.assertEqual(contests[-1]['rounds'], contests[0]['rounds'])
+
+        self.assertEqual(list(rctab.iter_rctab_contests(BytesIO(b' [ ] '))), [])
+
+        with self.assertRaisesRegex(RuntimeError, 'more than one contest'):
+            rctab.parse_rctab_file(BytesIO(data))
+
+    def test_iter_rctab_contests__invalid(self):
+        summary = json.dumps(SUMMARY)
+        data = f'[{summary}, {summary}]'
+        cases = [
+            (f'[{summary} 1]', 'expected "," or "]"'),
+            # A missing closing bracket.
+            (data[:-1], 'expected "," or "]"'),
+            (data + ' {}', 'unexpected data'),
+            (data[:-10], 'Unterminated string'),
+            ('[1]', 'not a JSON object'),
+        ]
+        for text, message in cases:
+            with self.subTest(message=message):
+                with self.assertRaisesRegex(ValueError, message):
+                    list(rctab.iter_rctab_contests(BytesIO(text.encode())))
+
+    def test_scan_rctab_file(self):
+        f = BytesIO(SUMMARY_CSV.encode())
+        actual = rctab.scan_rctab_file(f)
+        self.assertEqual(actual, {
+            '_metadata': {'contest_name': CONTEST_NAME},
+            'candidate_names': ['Alice', 'Bob', 'Carol'],
+        })
+
+    def test_parse_report(self):
+        """
+        Check parsing a summary file through the report format registry.
+        """
+        with TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            json_path = temp_dir / 'mayor_summary.json'
+            json_path.write_text(json.dumps(SUMMARY))
+            csv_path = temp_dir / 'mayor_summary.csv'
+            csv_path.write_text(SUMMARY_CSV)
+            # JSON summary files must be selected by format name, since
+            # ".json" is the suffix of the intermediate files.
+            with self.assertRaisesRegex(
+                ValueError, "unknown report format: '.json'",
+            ):
+                parsing.parse_report(json_path)
+            json_results = parsing.parse_report(
+                json_path, report_format=REPORT_FORMAT_RCTAB,
+            )
+            csv_results = parsing.parse_report(csv_path)
+            metadata = parsing.scan_report_metadata(
+                json_path, report_format=REPORT_FORMAT_RCTAB,
+            )
+
+        self.assertEqual(csv_results, json_results)
+        self.check_results(json_results)
+        self.assertEqual(json_results['highest_round'], 2)
+        self.assertEqual(metadata['contest_name'], CONTEST_NAME)
+
+    def test_make_jsons(self):
+        """
+        Check that the format name is part of the parse cache key.
+        """
+        with TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            csv_path = temp_dir / 'mayor_summary.csv'
+            csv_path.write_text(SUMMARY_CSV)
+            output_dir = temp_dir / 'output'
+            versions = [
+                parsing.get_parser_version(csv_path, report_format=name)
+                for name in (None, REPORT_FORMAT_RCTAB)
+            ]
+            json_paths = parsing.make_jsons(
+                [csv_path], output_dir=output_dir,
+                report_format=REPORT_FORMAT_RCTAB,
+            )
+            results = intermediate.read_contest(json_paths[0])
+
+        self.assertNotEqual(versions[0], versions[1])
+        self.assertEqual(json_paths, [output_dir / 'mayor_summary.json'])
+        self.check_results(results)
@@ -0,0 +1,55 @@
+from pathlib import Path
+from unittest import TestCase
+
+import rcvresults.parsers.xlsx_reader as xlsx_reader
+import rcvresults.utils as utils
+
+
+REPORTS_DIR = Path('data/input-reports')
+
+
+class FunctionTestCase(TestCase):
+
+    """
+    Tests of functions in the module.
+    """
+
+    def test_parse_coordinate(self):
+        cases = [
+            ('A1', (1, 1)),
+            ('C7', (7, 3)),
+            ('AA12', (12, 27)),
+            ('$B$3', (3, 2)),
+        ]
+        for coordinate, expected in cases:
+            with self.subTest(coordinate=coordinate):
+                actual = xlsx_reader.parse_coordinate(coordinate)
+                self.assertEqual(actual, expected)
+
+    def test_add_merged_range(self):
+        merged_columns = {}
+        max_col = xlsx_reader.add_merged_range(merged_columns, 'A5:B6')
+        self.assertEqual(max_col, 2)
+        max_col = xlsx_reader.add_merged_range(merged_columns, 'C5:G5')
+        self.assertEqual(max_col, 7)
+        # The top-left cell of each range isn't included.
+        self.assertEqual(merged_columns, {5: {2, 4, 5, 6, 7}, 6: {1, 2}})
+
+
+class XlsxReaderTestCase(TestCase):
+
+    def test_read_merged_columns(self):
+        """
+        Check that reading only the merged cell ranges gives the same
+        ranges as reading the whole sheet.
+        """
+        paths = utils.get_paths(REPORTS_DIR / '*', suffix='xlsx')
+        self.assertGreater(len(paths), 0)
+        for path in paths:
+            with xlsx_reader.XlsxReader(path) as reader:
+                for name in reader.sheet_names:
+                    with self.subTest(path=path, sheet=name):
+                        _, *expected = reader.read_sheet(name)
+                        actual = reader.read_merged_columns(name)
+                        self.assertEqual(actual, tuple(expected))
+                        self.assertGreater(len(actual[0]), 0)
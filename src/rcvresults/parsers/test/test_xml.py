@@ -0,0 +1,148 @@
+import copy
+from importlib.util import find_spec
+from io import BytesIO
+from pathlib import Path
+from unittest import skipUnless, TestCase
+import xml.etree.ElementTree as ET
+
+import rcvresults.parsers.xml as xml_parsing
+import rcvresults.utils as utils
+
+
+REPORTS_DIR = Path('data/input-reports')
+
+
+def get_xml_paths():
+    return utils.get_paths(REPORTS_DIR / '*', suffix='xml')
+
+
+def make_precinct_report(path, precinct_names):
+    """
+    Return a file object of an XML report with one copy of the given
+    report's precinctGroup per precinct name (without a precinctName
+    attribute if the name is None).
+    """
+    tree = ET.parse(path)
+    collection = tree.getroot().find(
+        './{RcvShortReport}Tablix1/{RcvShortReport}precinctGroup_Collection'
+    )
+    precinct_group, = collection
+    collection.remove(precinct_group)
+    for name in precinct_names:
+        new_group = copy.deepcopy(precinct_group)
+        if name is None:
+            del new_group.attrib['precinctName']
+        else:
+            new_group.attrib['precinctName'] = name
+        collection.append(new_group)
+
+    f = BytesIO()
+    tree.write(f)
+    f.seek(0)
+    return f
+
+
+class FunctionTestCase(TestCase):
+
+    """
+    Tests of functions in the module.
+    """
+
+    def test_stream_xml_file(self):
+        paths = get_xml_paths()
+        # Check that we got all the paths.
+        self.assertEqual(len(paths), 10)
+        for path in paths:
+            with self.subTest(path=path):
+                expected = xml_parsing.parse_xml_file(path, debug=False)
+                actual = xml_parsing.stream_xml_file(path)
+                self.assertEqual(actual, expected)
+                # Also check the key order (e.g. of the rounds dict).
+                self.assertEqual(list(actual['rounds']), list(expected['rounds']))
+
+    def test_scan_xml_file(self):
+        for path in get_xml_paths():
+            with self.subTest(path=path):
+                results = xml_parsing.parse_xml_file(path, debug=False)
+                expected = {
+                    '_metadata': results['_metadata'],
+                    'candidate_names': results['candidate_names'],
+                }
+                actual = xml_parsing.scan_xml_file(path)
+                self.assertEqual(actual, expected)
+
+    def _test_backend(self, backend):
+        for path in get_xml_paths():
+            with self.subTest(path=path):
+                # Compare with the original (debug) walker.
+                expected = xml_parsing.parse_xml_file(path)
+                actual = xml_parsing.parse_xml_file(path, backend=backend)
+                self.assertEqual(actual, expected)
+
+    def test_parse_xml_file__etree_backend(self):
+        backend = xml_parsing.get_backend(xml_parsing.BACKEND_ETREE)
+        self._test_backend(backend)
+
+    @skipUnless(find_spec('lxml'), 'lxml is not installed')
+    def test_parse_xml_file__lxml_backend(self):
+        backend = xml_parsing.get_backend(xml_parsing.BACKEND_LXML)
+        self._test_backend(backend)
+
+    def test_get_parser(self):
+        cases = [
+            (None, xml_parsing.stream_xml_file),
+            ('iterparse', xml_parsing.stream_xml_file),
+        ]
+        for name, expected in cases:
+            with self.subTest(name=name):
+                self.assertIs(xml_parsing.get_parser(name), expected)
+
+        with self.assertRaises(ValueError):
+            xml_parsing.get_parser('foo')
+
+    def test_stream_precinct_results__single_precinct(self):
+        for path in get_xml_paths():
+            with self.subTest(path=path):
+                expected = xml_parsing.stream_xml_file(path)
+                actual = xml_parsing.stream_precinct_results(path)
+                precincts = actual.pop('precincts')
+                self.assertEqual(len(precincts), 1)
+                self.assertEqual(actual, expected)
+
+    def test_stream_precinct_results__many_precincts(self):
+        path = REPORTS_DIR / '2020-11-03/20201201_d5_short.xml'
+        precinct_names = ['PCT 1101', 'PCT 1102', 'PCT 1103']
+        expected = xml_parsing.stream_xml_file(path)
+        f = make_precinct_report(path, precinct_names=precinct_names)
+        actual = xml_parsing.stream_precinct_results(f)
+
+        precincts = actual['precincts']
+        self.assertEqual(list(precincts), precinct_names)
+        # Spot-check a precinct's rounds table.
+        self.assertEqual(
+            precincts['PCT 1102']['DEAN PRESTON'], [21484.0, 21783.0, 22853.0],
+        )
+        self.assertEqual(actual['row_names'], expected['row_names'])
+        # Check that the totals are summed across the precincts.
+        expected_round = expected['rounds']['DEAN PRESTON'][1]
+        actual_round = actual['rounds']['DEAN PRESTON'][1]
+        self.assertEqual(actual_round, {
+            'percent': expected_round['percent'],
+            'transfer': 3 * expected_round['transfer'],
+            'votes': 3 * expected_round['votes'],
+        })
+        self.assertEqual(actual['rounds']['continuing'][2], {
+            'percent': None, 'transfer': None, 'votes': 3 * 41373.0,
+        })
+
+    def test_stream_precinct_results__bad_names(self):
+        path = REPORTS_DIR / '2020-11-03/20201201_d5_short.xml'
+        cases = [
+            (['PCT 1101', None, None], 'precinctGroup without precinctName'),
+            (['PCT 1101', 'PCT 1101'], "duplicate precinct: 'PCT 1101'"),
+        ]
+        for precinct_names, message in cases:
+            with self.subTest(precinct_names=precinct_names):
+                f = make_precinct_report(path, precinct_names=precinct_names)
+                with self.assertRaisesRegex(RuntimeError, message):
+                    xml_parsing.stream_precinct_results(f)
@@ -1,6 +1,15 @@
+from pathlib import Path
 from unittest import TestCase
 
 import rcvresults.parsers.xslx as excel_parsing
+import rcvresults.utils as utils
+
+
+REPORTS_DIR = Path('data/input-reports')
+
+
+def get_excel_paths():
+    return utils.get_paths(REPORTS_DIR / '*', suffix='xlsx')
 
 
 class FunctionTestCase(TestCase):
@@ -26,3 +35,35 @@ class FunctionTestCase(TestCase):
                 iterator = iter(range(n))
                 actual = list(excel_parsing.iter_triples(iterator))
                 self.assertEqual(actual, expected)
+
+    def _test_parse_excel_file(self, **kwargs):
+        paths = get_excel_paths()
+        # Check that we got all the paths.
+        self.assertEqual(len(paths), 9)
+        for path in paths:
+            with self.subTest(path=path):
+                expected = excel_parsing.parse_excel_file(
+                    path, engine=excel_parsing.ENGINE_OPENPYXL,
+                    read_only=False,
+                )
+                actual = excel_parsing.parse_excel_file(path, **kwargs)
+                self.assertEqual(actual, expected)
+
+    def test_parse_excel_file__read_only(self):
+        self._test_parse_excel_file(
+            engine=excel_parsing.ENGINE_OPENPYXL, read_only=True,
+        )
+
+    def test_parse_excel_file__native(self):
+        self._test_parse_excel_file(engine=excel_parsing.ENGINE_NATIVE)
+
+    def test_scan_excel_file(self):
+        for path in get_excel_paths():
+            with self.subTest(path=path):
+                results = excel_parsing.parse_excel_file(path)
+                expected = {
+                    '_metadata': results['_metadata'],
+                    'candidate_names': results['candidate_names'],
+                }
+                actual = excel_parsing.scan_excel_file(path)
+                self.assertEqual(actual, expected)
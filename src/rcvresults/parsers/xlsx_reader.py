@@ -0,0 +1,485 @@
+"""
+A minimal reader of the cell values in Excel (.xlsx) files.
+
+This reads just what is needed to parse Dominion's RCV short reports,
+without depending on openpyxl (which is slower to import and to run
+since it supports the whole format). It opens the .xlsx file as a zip
+archive and reads the shared strings and worksheet XML with an expat
+(SAX-style) parser.
+
+The cell values match the values openpyxl returns when loading a
+workbook with data_only=True, except that numbers formatted as dates
+aren't converted to datetimes (those cells don't occur in the parts of
+the reports that are parsed). Features the reader doesn't support raise
+UnsupportedWorkbookError, so the caller can fall back to openpyxl.
+"""
+
+import posixpath
+import re
+from xml.parsers import expat
+import xml.etree.ElementTree as ET
+import zipfile
+
+
+SHEET_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELATIONSHIPS_NS = (
+    'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+)
+PACKAGE_RELATIONSHIPS_NS = (
+    'http://schemas.openxmlformats.org/package/2006/relationships'
+)
+
+WORKBOOK_PATH = 'xl/workbook.xml'
+WORKBOOK_RELS_PATH = 'xl/_rels/workbook.xml.rels'
+SHARED_STRINGS_PATH = 'xl/sharedStrings.xml'
+
+# The number of bytes of a worksheet to parse at a time when iterating
+# over its rows.
+CHUNK_SIZE = 16 * 1024
+
+# The separator expat uses between the namespace and the local name.
+_NS_SEP = ' '
+
+
+def _make_tag(local_name):
+    return f'{SHEET_MAIN_NS}{_NS_SEP}{local_name}'
+
+
+CELL_TAG = _make_tag('c')
+INLINE_STRING_TAG = _make_tag('is')
+MERGE_CELL_TAG = _make_tag('mergeCell')
+PHONETIC_TAG = _make_tag('rPh')
+ROW_TAG = _make_tag('row')
+SHARED_STRING_TAG = _make_tag('si')
+TEXT_TAG = _make_tag('t')
+VALUE_TAG = _make_tag('v')
+
+COORDINATE_PATTERN = re.compile(r'\$?([A-Z]+)\$?(\d+)$')
+
+
+class UnsupportedWorkbookError(Exception):
+
+    """
+    Raised if a workbook uses a feature the reader doesn't support.
+    """
+
+
+def column_index_from_letters(letters):
+    """
+    Return the 1-based column index for the given column letters
+    (e.g. 1 for "A" or 27 for "AA").
+    """
+    index = 0
+    for letter in letters:
+        index = 26 * index + (ord(letter) - ord('A') + 1)
+    return index
+
+
+def parse_coordinate(coordinate):
+    """
+    Return the (row, column) 1-based indexes of a cell coordinate
+    (e.g. "C7").
+    """
+    match = COORDINATE_PATTERN.match(coordinate.upper())
+    if match is None:
+        raise UnsupportedWorkbookError(f'invalid coordinate: {coordinate!r}')
+    letters, row = match.groups()
+    return (int(row), column_index_from_letters(letters))
+
+
+def add_merged_range(merged_columns, ref):
+    """
+    Add the cells in a merged range (other than its top-left cell) to the
+    given merged_columns dict, and return the range's max column.
+
+    Args:
+      merged_columns: a dict mapping 1-based row index to the set of
+        1-based column indexes of the merged cells in the row.
+      ref: the range's reference (e.g. "A5:B6").
+    """
+    first, _, last = ref.partition(':')
+    min_row, min_col = parse_coordinate(first)
+    if last:
+        max_row, max_col = parse_coordinate(last)
+    else:
+        max_row, max_col = min_row, min_col
+
+    for row_index in range(min_row, max_row + 1):
+        columns = merged_columns.setdefault(row_index, set())
+        columns.update(range(min_col, max_col + 1))
+        if row_index == min_row:
+            columns.discard(min_col)
+
+    return max_col
+
+
+def _cast_number(value):
+    """
+    Convert a number string to an int or float, like openpyxl does.
+    """
+    if '.' in value or 'E' in value or 'e' in value:
+        return float(value)
+    return int(value)
+
+
+def _make_parser(handler):
+    """
+    Return an expat parser that calls the given handler's methods.
+    """
+    parser = expat.ParserCreate(namespace_separator=_NS_SEP)
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.start_element
+    parser.EndElementHandler = handler.end_element
+    parser.CharacterDataHandler = handler.character_data
+    return parser
+
+
+class _SharedStringsHandler:
+
+    """
+    Collects the strings in a sharedStrings.xml part.
+    """
+
+    def __init__(self):
+        self.strings = []
+        self._parts = None
+        # The depth inside rPh elements, whose text isn't included.
+        self._phonetic_depth = 0
+        self._in_text = False
+
+    def start_element(self, name, attrs):
+        if name == SHARED_STRING_TAG:
+            self._parts = []
+        elif name == PHONETIC_TAG:
+            self._phonetic_depth += 1
+        elif name == TEXT_TAG and not self._phonetic_depth:
+            self._in_text = True
+
+    def end_element(self, name):
+        if name == SHARED_STRING_TAG:
+            self.strings.append(''.join(self._parts))
+            self._parts = None
+        elif name == PHONETIC_TAG:
+            self._phonetic_depth -= 1
+        elif name == TEXT_TAG:
+            self._in_text = False
+
+    def character_data(self, data):
+        if self._in_text:
+            self._parts.append(data)
+
+
+class _SheetHandler:
+
+    """
+    Collects the cell values and merged cell ranges in a worksheet part.
+    """
+
+    def __init__(self, shared_strings):
+        self.shared_strings = shared_strings
+        # A list of (row_index, values) pairs, where values is a list of
+        # the row's values, starting with column "A".
+        self.rows = []
+        self.merged_columns = {}
+        # The max_column openpyxl would report for the worksheet.
+        self.max_column = 0
+
+        self._row_index = 0
+        self._values = None
+        self._column = 0
+        self._cell_type = None
+        # The text of the current cell's <v> element, if any.
+        self._value = None
+        # The text parts of the current value or inline string, or None
+        # if not inside a <v> element or an inline string <t> element.
+        self._parts = None
+        self._text_parts = None
+        self._in_inline_string = False
+        self._phonetic_depth = 0
+
+    def start_element(self, name, attrs):
+        if name == CELL_TAG:
+            coordinate = attrs.get('r')
+            if coordinate is None:
+                self._column += 1
+            else:
+                _, self._column = parse_coordinate(coordinate)
+            self._cell_type = attrs.get('t', 'n')
+            self._text_parts = None
+        elif name == VALUE_TAG:
+            self._parts = []
+        elif name == INLINE_STRING_TAG:
+            self._in_inline_string = True
+            self._text_parts = []
+        elif name == PHONETIC_TAG:
+            self._phonetic_depth += 1
+        elif (
+            name == TEXT_TAG and self._in_inline_string
+            and not self._phonetic_depth
+        ):
+            self._parts = self._text_parts
+        elif name == ROW_TAG:
+            row_index = attrs.get('r')
+            if row_index is None:
+                self._row_index += 1
+            else:
+                self._row_index = int(row_index)
+            self._values = []
+            self._column = 0
+        elif name == MERGE_CELL_TAG:
+            max_col = add_merged_range(self.merged_columns, attrs['ref'])
+            self.max_column = max(self.max_column, max_col)
+
+    def end_element(self, name):
+        if name == CELL_TAG:
+            self._end_cell()
+        elif name == VALUE_TAG:
+            self._value = ''.join(self._parts)
+            self._parts = None
+        elif name == INLINE_STRING_TAG:
+            self._in_inline_string = False
+        elif name == PHONETIC_TAG:
+            self._phonetic_depth -= 1
+        elif name == TEXT_TAG:
+            # This is a no-op if not inside an inline string.
+            self._parts = None
+        elif name == ROW_TAG:
+            self.rows.append((self._row_index, self._values))
+            self._values = None
+
+    def character_data(self, data):
+        if self._parts is not None:
+            self._parts.append(data)
+
+    def _get_cell_value(self):
+        cell_type = self._cell_type
+        if cell_type == 'inlineStr':
+            if self._text_parts is None:
+                return None
+            return ''.join(self._text_parts)
+
+        # Like openpyxl, treat an empty value as missing.
+        value = self._value or None
+        if value is None:
+            return None
+        if cell_type == 'n':
+            return _cast_number(value)
+        if cell_type == 's':
+            return self.shared_strings[int(value)]
+        if cell_type == 'b':
+            return bool(int(value))
+        if cell_type in ('str', 'e'):
+            return value
+
+        raise UnsupportedWorkbookError(f'unsupported cell type: {cell_type!r}')
+
+    def _end_cell(self):
+        value = self._get_cell_value()
+        self._value = None
+
+        values = self._values
+        column = self._column
+        missing = column - 1 - len(values)
+        if missing < 0:
+            raise UnsupportedWorkbookError(
+                f'cell out of order in row {self._row_index}: column {column}'
+            )
+        values.extend(missing * [None])
+        values.append(value)
+        self.max_column = max(self.max_column, column)
+
+
+class _MergedCellsHandler:
+
+    """
+    Collects just the merged cell ranges in a worksheet part (and the
+    max_column openpyxl would report), without reading the cell values.
+    """
+
+    def __init__(self):
+        self.merged_columns = {}
+        self.max_column = 0
+        self._column = 0
+
+    def start_element(self, name, attrs):
+        if name == CELL_TAG:
+            coordinate = attrs.get('r')
+            if coordinate is None:
+                self._column += 1
+            else:
+                _, self._column = parse_coordinate(coordinate)
+            self.max_column = max(self.max_column, self._column)
+        elif name == ROW_TAG:
+            self._column = 0
+        elif name == MERGE_CELL_TAG:
+            max_col = add_merged_range(self.merged_columns, attrs['ref'])
+            self.max_column = max(self.max_column, max_col)
+
+    def end_element(self, name):
+        pass
+
+    def character_data(self, data):
+        pass
+
+
+class XlsxReader:
+
+    """
+    Reads the sheets of an .xlsx file.
+
+    This can be used as a context manager to close the file.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+          path: a path or file object.
+        """
+        try:
+            self._archive = zipfile.ZipFile(path)
+        except zipfile.BadZipFile as exc:
+            raise UnsupportedWorkbookError(str(exc)) from None
+
+        try:
+            self._sheet_paths = self._read_sheet_paths()
+            self._shared_strings = self._read_shared_strings()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._archive.close()
+
+    @property
+    def sheet_names(self):
+        return list(self._sheet_paths)
+
+    def _read_xml(self, path):
+        try:
+            data = self._archive.read(path)
+        except KeyError:
+            raise UnsupportedWorkbookError(
+                f'archive has no part: {path!r}'
+            ) from None
+        return ET.fromstring(data)
+
+    def _read_sheet_paths(self):
+        """
+        Return a dict mapping sheet name to the sheet's path in the archive.
+        """
+        rels = self._read_xml(WORKBOOK_RELS_PATH)
+        targets = {}
+        for rel in rels.iter(f'{{{PACKAGE_RELATIONSHIPS_NS}}}Relationship'):
+            target = rel.get('Target')
+            if target.startswith('/'):
+                path = target[1:]
+            else:
+                path = posixpath.normpath(posixpath.join('xl', target))
+            targets[rel.get('Id')] = path
+
+        workbook = self._read_xml(WORKBOOK_PATH)
+        sheet_paths = {}
+        for sheet in workbook.iter(f'{{{SHEET_MAIN_NS}}}sheet'):
+            rel_id = sheet.get(f'{{{RELATIONSHIPS_NS}}}id')
+            sheet_paths[sheet.get('name')] = targets[rel_id]
+
+        return sheet_paths
+
+    def _read_shared_strings(self):
+        try:
+            f = self._archive.open(SHARED_STRINGS_PATH)
+        except KeyError:
+            # Then the workbook doesn't use shared strings.
+            return []
+
+        handler = _SharedStringsHandler()
+        with f:
+            parser = _make_parser(handler)
+            parser.ParseFile(f)
+        return handler.strings
+
+    def _open_sheet(self, name):
+        path = self._sheet_paths[name]
+        try:
+            return self._archive.open(path)
+        except KeyError:
+            raise UnsupportedWorkbookError(
+                f'archive has no part: {path!r}'
+            ) from None
+
+    def _iter_sheet(self, name, handler):
+        """
+        Parse a worksheet incrementally, and yield a tuple of values for
+        each row as it is read, starting with row 1.
+        """
+        f = self._open_sheet(name)
+        # The number of rows yielded so far.
+        count = 0
+        parser = _make_parser(handler)
+        with f:
+            while True:
+                data = f.read(CHUNK_SIZE)
+                is_final = not data
+                parser.Parse(data, is_final)
+                for row_index, values in handler.rows:
+                    # Fill in any missing rows.
+                    missing = row_index - 1 - count
+                    if missing < 0:
+                        raise UnsupportedWorkbookError(
+                            f'row out of order: {row_index}'
+                        )
+                    for _ in range(missing):
+                        yield ()
+                    yield tuple(values)
+                    count = row_index
+                handler.rows.clear()
+
+                if is_final:
+                    break
+
+    def iter_rows(self, name):
+        """
+        Yield a tuple of values for each row in a worksheet, starting with
+        row 1. The worksheet is read only as far as the rows are consumed.
+        """
+        handler = _SheetHandler(self._shared_strings)
+        yield from self._iter_sheet(name, handler)
+
+    def read_sheet(self, name):
+        """
+        Read a worksheet.
+
+        Returns (rows, merged_columns, max_column). Here, rows is a list
+        of tuples of values, one for each row starting with row 1.
+        merged_columns is a dict mapping 1-based row index to the set of
+        1-based column indexes of the merged cells in the row (excluding
+        the top-left cell of each merged range), and max_column is the
+        number of columns openpyxl would report for the worksheet.
+        """
+        handler = _SheetHandler(self._shared_strings)
+        rows = list(self._iter_sheet(name, handler))
+
+        return (rows, handler.merged_columns, handler.max_column)
+
+    def read_merged_columns(self, name):
+        """
+        Read only the merged cell ranges of a worksheet, without reading
+        its cell values (so this works even for the cell types that
+        read_sheet() doesn't support). This is for reading the rows with
+        openpyxl's read-only mode, which doesn't provide the ranges.
+
+        Returns (merged_columns, max_column), the same as the last two
+        values returned by read_sheet().
+        """
+        handler = _MergedCellsHandler()
+        parser = _make_parser(handler)
+        with self._open_sheet(name) as f:
+            parser.ParseFile(f)
+
+        return (handler.merged_columns, handler.max_column)
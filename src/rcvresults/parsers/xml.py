@@ -32,21 +32,45 @@ Report: Title, RcvStaticData, Tablix1
 
           roundGroup_Collection_2: each child is a roundGroup containing
             the majority threshold in that round.
+
+The module has two parsers: parse_xml_file(), which loads the whole
+element tree before walking it, and stream_xml_file(), which uses
+iterparse() to process each roundGroup and choiceGroup as soon as it
+closes and then discards it, so that memory use doesn't grow with the
+size of the report. Both read only the first precinctGroup. For
+precinct-level reports (with one precinctGroup per precinct),
+stream_precinct_results() reads every precinctGroup in the same way.
+scan_xml_file() reads only the contest and candidate names, stopping
+before the per-round totals.
+
+Both parsers read the rows through the row events in
+rcvresults/parsers/events.py: iter_tree_events() and iter_xml_events()
+yield the events, and the results dicts are built from them.
+
+parse_xml_file() accesses elements through a "backend" object: either
+EtreeBackend (the standard library, with the namespaced tag paths built
+once), or LxmlBackend (lxml, with compiled XPaths) if lxml is installed.
 """
 
+import functools
 import logging
+import os
 import xml.etree.ElementTree as ET
 
 import rcvresults.utils as utils
 from rcvresults.parsers.common import (
     NonCandidateName, NON_CANDIDATE_SUBTOTAL_LABELS,
 )
+import rcvresults.parsers.events as events
+from rcvresults.parsers.events import EVENT_CONTEST
 from rcvresults.utils import NonCandidateLabel
 
 
 _log = logging.getLogger(__name__)
 
 NAMESPACE = '{RcvShortReport}'
+# The prefix used for the report namespace in the lxml backend's XPaths.
+XPATH_NAMESPACES = {'r': 'RcvShortReport'}
 
 NON_CANDIDATE_CHOICE_NAMES = [
     NonCandidateName.BLANK,
@@ -55,83 +79,251 @@ NON_CANDIDATE_CHOICE_NAMES = [
     NonCandidateName.REMAINDER,
 ]
 
+# The name of the parser that uses stream_xml_file().
+PARSER_ITERPARSE = 'iterparse'
+# The name of the parser that uses stream_precinct_results().
+PARSER_PRECINCTS = 'precincts'
+# The names of the backends that can be passed to parse_xml_file().
+BACKEND_ETREE = 'etree'
+BACKEND_LXML = 'lxml'
+
+DEFAULT_PARSER_NAME = PARSER_ITERPARSE
+PARSER_NAMES = [
+    PARSER_ITERPARSE, PARSER_PRECINCTS, BACKEND_ETREE, BACKEND_LXML,
+]
 
-def _get_child(element, tag):
-    tag = f'{{RcvShortReport}}{tag}'
-    return element.find(tag)
 
+class EtreeBackend:
 
-def _get_child_value(element, tag, attr_name):
-    element = _get_child(element, tag=tag)
-    return element.attrib[attr_name]
+    """
+    Extraction backend using the standard library's ElementTree.
+
+    The namespaced tags and paths passed to find() are built once per
+    distinct tag or path and then reused.
+    """
 
+    debug = False
+
+    def __init__(self):
+        # Mapping from tag to namespaced tag.
+        self._tags = {}
+        # Mapping from tuple of tags to namespaced path.
+        self._paths = {}
+
+    def _get_tag(self, tag):
+        try:
+            return self._tags[tag]
+        except KeyError:
+            pass
+        namespaced_tag = f'{NAMESPACE}{tag}'
+        self._tags[tag] = namespaced_tag
+        return namespaced_tag
+
+    def _get_path(self, tags):
+        try:
+            return self._paths[tags]
+        except KeyError:
+            pass
+        path = '/'.join(['.', *(self._get_tag(tag) for tag in tags)])
+        self._paths[tags] = path
+        return path
+
+    def parse(self, source):
+        """
+        Parse the given path or file object, and return the root element.
+        """
+        tree = ET.parse(source)
+        return tree.getroot()
+
+    def get_child(self, element, tag):
+        return element.find(self._get_tag(tag))
+
+    def get_child_value(self, element, tag, attr_name):
+        element = self.get_child(element, tag=tag)
+        return element.attrib[attr_name]
+
+    def get_descendant(self, element, tags):
+        """
+        Args:
+          tags: a tuple of tags.
+        """
+        return element.find(self._get_path(tags))
+
+
+class DebugEtreeBackend(EtreeBackend):
 
-def _get_descendant(element, tags):
-    parts = ['.']
-    parts.extend(f'{{RcvShortReport}}{tag}' for tag in tags)
-    path = '/'.join(parts)
-    return element.find(path)
+    """
+    Equivalent to EtreeBackend but with verbose logging.
+    """
 
+    debug = True
+
+    def get_descendant(self, element, tags):
+        path = ' -> '.join(tags)
+        _log.info(f'getting descendant: {path}')
+        for tag in tags:
+            element_tag = element.tag.removeprefix(NAMESPACE)
+            child_tags = [
+                child.tag.removeprefix(NAMESPACE) for child in element
+            ]
+            # Put a star ("*") before the one we are getting.
+            child_tags = [
+                (('*' if child_tag == tag else '') + child_tag)
+                for child_tag in child_tags
+            ]
+            child_list = ', '.join(child_tags)
+            current_element = f'{element_tag} ({len(child_tags)})'
+            _log.info(
+                f'children: {current_element:>30}: {child_list}'
+            )
+            element = self.get_child(element, tag=tag)
+
+        return element
+
+
+class LxmlBackend:
 
-def _debug_get_descendant(element, tags):
     """
-    Equivalent to _get_descendant() but with verbose logging.
+    Extraction backend using lxml, with each XPath compiled once.
+
+    This requires lxml to be installed.
     """
-    path = ' -> '.join(tags)
-    _log.info(f'getting descendant: {path}')
-    for tag in tags:
-        element_tag = element.tag.removeprefix(NAMESPACE)
-        child_tags = [
-            child.tag.removeprefix(NAMESPACE) for child in element
-        ]
-        # Put a star ("*") before the one we are getting.
-        child_tags = [
-            (('*' if child_tag == tag else '') + child_tag)
-            for child_tag in child_tags
-        ]
-        child_list = ', '.join(child_tags)
-        current_element = f'{element_tag} ({len(child_tags)})'
-        _log.info(
-            f'children: {current_element:>30}: {child_list}'
+
+    debug = False
+
+    def __init__(self):
+        try:
+            from lxml import etree
+        except ImportError:
+            raise RuntimeError(
+                f'the {BACKEND_LXML!r} backend requires lxml to be installed'
+            ) from None
+
+        self._etree = etree
+        # Mapping from a key to a compiled XPath object.
+        self._xpaths = {}
+
+    def _get_xpath(self, key, make_expression):
+        try:
+            return self._xpaths[key]
+        except KeyError:
+            pass
+        xpath = self._etree.XPath(
+            make_expression(), namespaces=XPATH_NAMESPACES,
         )
-        element = _get_child(element, tag=tag)
+        self._xpaths[key] = xpath
+        return xpath
+
+    def parse(self, source):
+        """
+        Parse the given path or file object, and return the root element.
+        """
+        if isinstance(source, os.PathLike):
+            source = os.fspath(source)
+        tree = self._etree.parse(source)
+        return tree.getroot()
+
+    def get_child(self, element, tag):
+        return self.get_descendant(element, (tag, ))
+
+    def get_child_value(self, element, tag, attr_name):
+        def make_expression():
+            return f'r:{tag}/@{attr_name}'
+
+        xpath = self._get_xpath((tag, attr_name), make_expression)
+        values = xpath(element)
+        if not values:
+            raise KeyError(attr_name)
+        return str(values[0])
+
+    def get_descendant(self, element, tags):
+        """
+        Args:
+          tags: a tuple of tags.
+        """
+        def make_expression():
+            return '/'.join(f'r:{tag}' for tag in tags)
+
+        xpath = self._get_xpath(tags, make_expression)
+        elements = xpath(element)
+        if not elements:
+            return None
+        return elements[0]
+
+
+BACKEND_CLASSES = {
+    BACKEND_ETREE: EtreeBackend,
+    BACKEND_LXML: LxmlBackend,
+}
+
+
+@functools.cache
+def get_backend(name):
+    """
+    Return the (shared) backend object with the given name.
+    """
+    try:
+        cls = BACKEND_CLASSES[name]
+    except KeyError:
+        raise ValueError(f'unknown XML backend: {name!r}') from None
 
-    return element
+    return cls()
 
 
-def _get_contest_name(root, get_descendant):
+def get_parser(name=None):
+    """
+    Return a function that parses an XML file and returns a dict of results.
+
+    Args:
+      name: one of the names in PARSER_NAMES. Defaults to
+        DEFAULT_PARSER_NAME.
+    """
+    if name is None:
+        name = DEFAULT_PARSER_NAME
+    if name == PARSER_ITERPARSE:
+        return stream_xml_file
+    if name == PARSER_PRECINCTS:
+        return stream_precinct_results
+
+    backend = get_backend(name)
+    return functools.partial(parse_xml_file, backend=backend)
+
+
+def _get_contest_name(root, backend):
     """
     Extract and return the contest name.
     """
-    tablix2 = get_descendant(root, ['RcvStaticData', 'Report', 'Tablix2'])
+    tablix2 = backend.get_descendant(
+        root, ('RcvStaticData', 'Report', 'Tablix2'),
+    )
     # TODO: will this always be "Textbox24"?
     contest_name = tablix2.attrib['Textbox24']
 
     return contest_name
 
 
-def _iter_choice_groups(tablix_5):
+def _iter_choice_groups(tablix_5, backend):
     """
     Yield the choiceGroup elements in the choiceGroup_Collection.
     """
-    choice_group_collection = _get_child(
+    choice_group_collection = backend.get_child(
         tablix_5, tag='choiceGroup_Collection',
     )
     for choice_group in choice_group_collection:
-        text_box = _get_child(choice_group, tag='Textbox70')
-        name = text_box.attrib['choiceName']
+        name = backend.get_child_value(
+            choice_group, tag='Textbox70', attr_name='choiceName',
+        )
         yield (name, choice_group)
 
 
-def _get_choice_groups(tablix_5):
+def _split_choice_groups(choice_groups):
     """
-    Return a list of (name, choice_group) pairs, where name is either
-    a candidate name or non-candidate label and choice_group is a
-    choiceGroup element.
+    Split a list of (name, value) pairs into candidate and non-candidate
+    pairs, where name is a choiceName in the report.
+
+    Returns (candidate_groups, non_candidate_groups), where the names in
+    the second list are transformed to non-candidate labels.
     """
-    choice_groups = [
-        (name, group) for name, group in _iter_choice_groups(tablix_5)
-    ]
     candidate_groups = choice_groups[:-4]
     non_candidate_groups = choice_groups[-4:]
     choice_names = [name for name, group in choice_groups]
@@ -149,6 +341,30 @@ def _get_choice_groups(tablix_5):
     return (candidate_groups, non_candidate_groups)
 
 
+def _get_choice_groups(tablix_5, backend):
+    """
+    Return a list of (name, choice_group) pairs, where name is either
+    a candidate name or non-candidate label and choice_group is a
+    choiceGroup element.
+    """
+    choice_groups = [
+        (name, group) for name, group
+        in _iter_choice_groups(tablix_5, backend=backend)
+    ]
+    return _split_choice_groups(choice_groups)
+
+
+def _make_round_values(votes, percent=None, transfer=None):
+    """
+    Return the (votes, percent, transfer) triple of a round event.
+    """
+    return (
+        float(votes),
+        None if percent is None else float(percent),
+        None if transfer is None else float(transfer),
+    )
+
+
 def _make_round_dict(votes, percent=None, transfer=None):
     return {
         'percent': None if percent is None else float(percent),
@@ -157,115 +373,505 @@ def _make_round_dict(votes, percent=None, transfer=None):
     }
 
 
-def _iter_choice_rounds(choice_group):
+def _iter_choice_rounds(choice_group, backend):
     """
-    Yield the rounds data for all choices except "Continuing Ballots Total"
-    and "Non Transferable Total".
+    Yield the round values for all choices except "Continuing Ballots Total"
+    and "Non Transferable Total", as (votes, percent, transfer) triples.
 
     Args:
       choice_group: a choiceGroup inside choiceGroup_Collection, which is
         the first child of the Tablix5 element.
     """
-    round_group_collection = _get_child(
+    round_group_collection = backend.get_child(
         choice_group, tag='roundGroup_Collection',
     )
     for round_group in round_group_collection:
-        votes = _get_child_value(
-            round_group, tag='Textbox9', attr_name='votes',
-        )
-        percent = _get_child_value(
-            round_group, tag='Textbox16', attr_name='Textbox17',
-        )
-        transfer = _get_child_value(
-            round_group, tag='transferType', attr_name='voteTransfer',
-        )
-        yield _make_round_dict(votes, percent=percent, transfer=transfer)
+        yield _get_choice_round(round_group, backend=backend)
 
 
-def _iter_continuing_totals(tablix_5):
+def _get_choice_round(round_group, backend):
+    """
+    Return the round values in a roundGroup element of a choiceGroup.
+    """
+    votes = backend.get_child_value(
+        round_group, tag='Textbox9', attr_name='votes',
+    )
+    percent = backend.get_child_value(
+        round_group, tag='Textbox16', attr_name='Textbox17',
+    )
+    transfer = backend.get_child_value(
+        round_group, tag='transferType', attr_name='voteTransfer',
+    )
+    return _make_round_values(votes, percent=percent, transfer=transfer)
+
+
+def _get_continuing_round(round_group, backend):
+    """
+    Return the "Continuing Ballots Total" data in a roundGroup element.
+    """
+    votes = backend.get_child_value(
+        round_group, tag='Textbox9', attr_name='continuingVotes',
+    )
+    return _make_round_values(votes)
+
+
+def _get_non_transferable_round(round_group, backend):
+    """
+    Return the "Non Transferable Total" data in a roundGroup element.
+    """
+    votes = backend.get_child_value(
+        round_group, tag='Textbox9', attr_name='nonTransferableVotes',
+    )
+    return _make_round_values(votes)
+
+
+def _iter_continuing_totals(tablix_5, backend):
     """
     Yield the rounds data for the "Continuing Ballots Total".
     """
-    round_group_collection = _get_child(tablix_5, tag='roundGroup_Collection')
+    round_group_collection = backend.get_child(
+        tablix_5, tag='roundGroup_Collection',
+    )
     for round_group in round_group_collection:
-        votes = _get_child_value(
-            round_group, tag='Textbox9', attr_name='continuingVotes',
-        )
-        yield _make_round_dict(votes)
+        yield _get_continuing_round(round_group, backend=backend)
 
 
-def _iter_non_tranferable_totals(tablix_5):
+def _iter_non_tranferable_totals(tablix_5, backend):
     """
     Yield the rounds data for the "Non Transferable Total".
     """
-    round_group_collection = _get_child(
+    round_group_collection = backend.get_child(
         tablix_5, tag='roundGroup_Collection_1',
     )
     for round_group in round_group_collection:
-        votes = _get_child_value(
-            round_group, tag='Textbox9', attr_name='nonTransferableVotes',
+        yield _get_non_transferable_round(round_group, backend=backend)
+
+
+def _iter_row_events(candidate_rows, non_candidate_rows):
+    """
+    Yield the row events for a contest (without the contest header): the
+    candidate rows in order, followed by the non-candidate rows in the
+    order of utils.NON_CANDIDATE_SUBTOTAL_LABELS.
+
+    Args:
+      candidate_rows: a list of (name, rounds) pairs, where rounds is an
+        iterable of (votes, percent, transfer) triples.
+      non_candidate_rows: a dict mapping non-candidate label to rounds.
+    """
+    for name, rounds in candidate_rows:
+        yield from events.iter_row_events(
+            name, is_candidate=True, rounds=rounds,
+        )
+    for label in utils.NON_CANDIDATE_SUBTOTAL_LABELS:
+        yield from events.iter_row_events(
+            label, is_candidate=False, rounds=non_candidate_rows[label],
         )
-        yield _make_round_dict(votes)
 
 
-def _get_rounds(tablix_5, choice_groups):
+def _get_rounds(tablix_5, choice_groups, backend):
     """
-    Create and return the "rounds" dict.
+    Yield the row events for the rounds data (without the contest header).
+
+    Args:
+      choice_groups: a (candidate_groups, non_candidate_groups) pair, as
+        returned by _get_choice_groups().
     """
-    rounds = {}
-    for name, choice_group in choice_groups:
-        _log.info(f'processing choice: {name}')
-        # The "Remainder Points" subtotal isn't applicable.
-        if name == NonCandidateName.REMAINDER:
+    candidate_groups, non_candidate_groups = choice_groups
+    candidate_rows = []
+    for name, choice_group in candidate_groups:
+        if backend.debug:
+            _log.info(f'processing choice: {name}')
+        rounds = _iter_choice_rounds(choice_group, backend=backend)
+        candidate_rows.append((name, rounds))
+
+    non_candidate_rows = {
+        label: _iter_choice_rounds(choice_group, backend=backend)
+        for label, choice_group in non_candidate_groups
+    }
+    non_candidate_rows[NonCandidateLabel.CONTINUING] = (
+        _iter_continuing_totals(tablix_5, backend=backend)
+    )
+    non_candidate_rows[NonCandidateLabel.NON_TRANSFERABLE] = (
+        _iter_non_tranferable_totals(tablix_5, backend=backend)
+    )
+    yield from _iter_row_events(candidate_rows, non_candidate_rows)
+
+
+def iter_tree_events(root, backend):
+    """
+    Yield the row events for a parsed report (see
+    rcvresults/parsers/events.py).
+
+    Args:
+      root: the root element of the report.
+    """
+    contest_name = _get_contest_name(root, backend=backend)
+    metadata = {
+        'contest_name': contest_name,
+    }
+    yield (EVENT_CONTEST, metadata)
+
+    tablix_5 = backend.get_descendant(root, (
+        'Tablix1', 'precinctGroup_Collection', 'precinctGroup', 'Tablix5',
+    ))
+    choice_groups = _get_choice_groups(tablix_5, backend=backend)
+    yield from _get_rounds(tablix_5, choice_groups, backend=backend)
+
+
+def parse_xml_file(path, debug=True, backend=None):
+    """
+    Parse an XML file, and return a dict of results.
+
+    Args:
+      backend: the backend object to use (e.g. one returned by
+        get_backend()). Defaults to an EtreeBackend, with verbose logging
+        if debug is true.
+    """
+    if backend is None:
+        backend = DebugEtreeBackend() if debug else get_backend(BACKEND_ETREE)
+
+    root = backend.parse(path)
+    return events.build_results(iter_tree_events(root, backend=backend))
+
+
+# The tag paths below are relative to the root "Report" element and
+# don't include the namespace.
+CONTEST_NAME_TAGS = ('RcvStaticData', 'Report', 'Tablix2')
+PRECINCT_GROUP_TAGS = ('Tablix1', 'precinctGroup_Collection', 'precinctGroup')
+TABLIX_5_TAGS = PRECINCT_GROUP_TAGS + ('Tablix5', )
+CHOICE_GROUP_COLLECTION_TAGS = TABLIX_5_TAGS + ('choiceGroup_Collection', )
+CHOICE_GROUP_TAGS = CHOICE_GROUP_COLLECTION_TAGS + ('choiceGroup', )
+CHOICE_NAME_TAGS = CHOICE_GROUP_TAGS + ('Textbox70', )
+CHOICE_ROUND_TAGS = CHOICE_GROUP_TAGS + ('roundGroup_Collection', 'roundGroup')
+CONTINUING_ROUND_TAGS = TABLIX_5_TAGS + ('roundGroup_Collection', 'roundGroup')
+NON_TRANSFERABLE_ROUND_TAGS = (
+    TABLIX_5_TAGS + ('roundGroup_Collection_1', 'roundGroup')
+)
+
+# The tags of the elements that are removed from the tree as soon as
+# they close (after being yielded). Their children are still available
+# when the element itself is yielded.
+DISCARDED_TAGS = {
+    'choiceGroup', 'nonTransferableGroup', 'precinctGroup', 'roundGroup',
+}
+
+
+def _iter_closed_elements(source):
+    """
+    Parse the XML incrementally, and yield a (tags, element) pair for
+    each element as it closes.
+
+    Here, tags is the tuple of tags of the element's ancestors (not
+    including the root) followed by the element's own tag, without the
+    namespace. Elements whose tag is in DISCARDED_TAGS are cleared and
+    removed from their parent after being yielded.
+
+    Args:
+      source: a path or file object.
+    """
+    # The stacks of currently open elements and their tag paths, starting
+    # with the root.
+    elements = []
+    paths = []
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if paths:
+                tag = element.tag.removeprefix(NAMESPACE)
+                path = paths[-1] + (tag, )
+            else:
+                path = ()
+            elements.append(element)
+            paths.append(path)
             continue
 
-        choice_rounds = list(_iter_choice_rounds(choice_group))
-        rounds[name] = choice_rounds
+        path = paths.pop()
+        yield (path, element)
 
-    continuing_rounds = list(_iter_continuing_totals(tablix_5))
-    rounds[NonCandidateLabel.CONTINUING] = continuing_rounds
+        elements.pop()
+        if path and path[-1] in DISCARDED_TAGS:
+            element.clear()
+            elements[-1].remove(element)
 
-    non_tranferable_rounds = list(_iter_non_tranferable_totals(tablix_5))
-    rounds[NonCandidateLabel.NON_TRANSFERABLE] = non_tranferable_rounds
 
-    return rounds
+def _make_row_events(
+    choice_rounds, continuing_rounds, non_transferable_rounds,
+):
+    """
+    Return an iterator of the row events for a precinctGroup (without the
+    contest header).
 
+    Args:
+      choice_rounds: a list of (name, rounds) pairs, one for each
+        choiceGroup element in the report, where name is the choiceName.
+    """
+    candidate_rows, non_candidate_rows = _split_choice_groups(choice_rounds)
+    non_candidate_rows = dict(non_candidate_rows)
+    non_candidate_rows[NonCandidateLabel.CONTINUING] = continuing_rounds
+    non_candidate_rows[NonCandidateLabel.NON_TRANSFERABLE] = (
+        non_transferable_rounds
+    )
+    return _iter_row_events(candidate_rows, non_candidate_rows)
 
-def _get_results(root, get_descendant):
+
+def _iter_precinct_groups(source):
     """
-    Extract and return the contest rounds data.
+    Parse an XML file incrementally, and yield a (contest_name,
+    precinct_name, row_events) triple for each precinctGroup element as
+    it closes.
+
+    Here, row_events is an iterator of the row events for the
+    precinctGroup, without the contest header.
+
+    Args:
+      source: a path or file object.
     """
-    tablix_5 = get_descendant(root, [
-        'Tablix1', 'precinctGroup_Collection', 'precinctGroup', 'Tablix5',
-    ])
-    candidate_groups, non_candidate_groups = _get_choice_groups(tablix_5)
-    candidate_names = [name for name, group in candidate_groups]
-    results = utils.initialize_results(candidate_names)
+    # The backend is only used to read the small subtrees of the
+    # elements as they close.
+    backend = get_backend(BACKEND_ETREE)
+    contest_name = None
+    # A list of (name, rounds) pairs, one for each choiceGroup.
+    choice_rounds = []
+    # The rounds of the choiceGroup currently being read.
+    current_rounds = []
+    continuing_rounds = []
+    non_transferable_rounds = []
+    for path, element in _iter_closed_elements(source):
+        if path == CHOICE_ROUND_TAGS:
+            current_rounds.append(
+                _get_choice_round(element, backend=backend)
+            )
+        elif path == CHOICE_GROUP_TAGS:
+            name = backend.get_child_value(
+                element, tag='Textbox70', attr_name='choiceName',
+            )
+            choice_rounds.append((name, current_rounds))
+            current_rounds = []
+        elif path == CONTINUING_ROUND_TAGS:
+            continuing_rounds.append(
+                _get_continuing_round(element, backend=backend)
+            )
+        elif path == NON_TRANSFERABLE_ROUND_TAGS:
+            non_transferable_rounds.append(
+                _get_non_transferable_round(element, backend=backend)
+            )
+        elif path == CONTEST_NAME_TAGS:
+            # TODO: will this always be "Textbox24"?
+            contest_name = element.attrib['Textbox24']
+        elif path == PRECINCT_GROUP_TAGS:
+            precinct_name = element.attrib.get('precinctName')
+            row_events = _make_row_events(
+                choice_rounds, continuing_rounds=continuing_rounds,
+                non_transferable_rounds=non_transferable_rounds,
+            )
+            yield (contest_name, precinct_name, row_events)
+
+            choice_rounds = []
+            continuing_rounds = []
+            non_transferable_rounds = []
+
+
+def iter_xml_events(source, precincts=False):
+    """
+    Parse an XML file incrementally, and yield its row events (see
+    rcvresults/parsers/events.py).
 
-    choice_groups = candidate_groups + non_candidate_groups
-    rounds = _get_rounds(tablix_5, choice_groups)
-    results['rounds'] = rounds
+    Args:
+      source: a path or file object.
+      precincts: whether to read every precinctGroup element (e.g. in a
+        precinct-level report), as one contest each, with the precinct
+        name in the metadata under "precinct_name" (and RuntimeError is
+        raised for a precinctGroup without a precinctName). Otherwise,
+        only the first precinctGroup is read, like parse_xml_file() does.
+    """
+    precinct_groups = _iter_precinct_groups(source)
+    try:
+        for contest_name, precinct_name, row_events in precinct_groups:
+            metadata = {
+                'contest_name': contest_name,
+            }
+            if precincts:
+                if precinct_name is None:
+                    raise RuntimeError(
+                        'precinctGroup without precinctName in contest: '
+                        f'{contest_name!r}'
+                    )
+                metadata['precinct_name'] = precinct_name
+            yield (EVENT_CONTEST, metadata)
+            yield from row_events
+            if not precincts:
+                break
+    finally:
+        precinct_groups.close()
+
+
+def stream_xml_file(source):
+    """
+    Parse an XML file incrementally, and return a dict of results.
+
+    The return value is the same as parse_xml_file()'s. However, only the
+    rounds data is kept as the report is read, so peak memory doesn't
+    depend on the size of the report.
+
+    Args:
+      source: a path or file object.
+    """
+    return events.build_results(iter_xml_events(source))
+
+
+def scan_xml_file(source):
+    """
+    Read only the contest name and candidate names from an XML file,
+    without reading the vote totals.
 
+    Parsing stops at the end of the first choiceGroup_Collection element,
+    so the rest of the report isn't read. Returns a dict with the same
+    "_metadata" and "candidate_names" values as parse_xml_file().
+
+    Args:
+      source: a path or file object.
+    """
+    contest_name = None
+    # A list of (name, None) pairs, for _split_choice_groups().
+    choice_names = []
+    elements = _iter_closed_elements(source)
+    try:
+        for path, element in elements:
+            if path == CHOICE_NAME_TAGS:
+                choice_names.append((element.attrib['choiceName'], None))
+            elif path == CONTEST_NAME_TAGS:
+                contest_name = element.attrib['Textbox24']
+            elif path == CHOICE_GROUP_COLLECTION_TAGS:
+                break
+    finally:
+        elements.close()
+
+    candidate_groups, _ = _split_choice_groups(choice_names)
+    results = {
+        '_metadata': {
+            'contest_name': contest_name,
+        },
+        'candidate_names': [name for name, _ in candidate_groups],
+    }
     return results
 
 
-def parse_xml_file(path, debug=True):
+def _add_round_totals(totals, rounds, precinct_name):
     """
-    Parse an XML file, and return a dict of results.
+    Add a precinct's rounds data to the running totals, in place.
+
+    Args:
+      totals: a dict mapping row name to list of [votes, transfer] pairs,
+        one per round.
+      rounds: a "rounds" dict for a single precinct.
     """
-    if debug:
-        get_descendant = _debug_get_descendant
-    else:
-        get_descendant = _get_descendant
+    if list(rounds) != list(totals):
+        raise RuntimeError(
+            f'rows for precinct {precinct_name!r} not as expected: '
+            f'{list(rounds)}'
+        )
+    for name, row_rounds in rounds.items():
+        row_totals = totals[name]
+        if len(row_rounds) != len(row_totals):
+            raise RuntimeError(
+                f'precinct {precinct_name!r} has {len(row_rounds)} rounds '
+                f'for {name!r} (expected {len(row_totals)})'
+            )
+        for round_totals, round_data in zip(row_totals, row_rounds):
+            round_totals[0] += round_data['votes']
+            transfer = round_data['transfer']
+            if transfer is not None:
+                round_totals[1] += transfer
+
+
+def _make_total_rounds(totals):
+    """
+    Create and return a "rounds" dict from the running totals.
 
-    tree = ET.parse(path)
-    root = tree.getroot()
+    The percentages are recomputed from the vote totals. Like in the
+    reports, they are relative to the continuing ballots total.
+    """
+    continuing_votes = [
+        votes for votes, _ in totals[NonCandidateLabel.CONTINUING]
+    ]
+    rounds = {}
+    for name, row_totals in totals.items():
+        if name in (
+            NonCandidateLabel.CONTINUING, NonCandidateLabel.NON_TRANSFERABLE,
+        ):
+            row_rounds = [_make_round_dict(votes) for votes, _ in row_totals]
+        else:
+            row_rounds = []
+            for (votes, transfer), continuing in zip(
+                row_totals, continuing_votes,
+            ):
+                percent = votes / continuing if continuing else 0.0
+                round_dict = _make_round_dict(
+                    votes, percent=percent, transfer=transfer,
+                )
+                row_rounds.append(round_dict)
+
+        rounds[name] = row_rounds
+
+    return rounds
 
-    contest_name = _get_contest_name(root, get_descendant=get_descendant)
-    metadata = {
-        'contest_name': contest_name,
-    }
-    results = _get_results(root, get_descendant)
-    results['_metadata'] = metadata
 
+def stream_precinct_results(source):
+    """
+    Parse an XML file incrementally, reading every precinctGroup element
+    (e.g. in a precinct-level report), and return a dict of results.
+
+    The return value has the same keys as stream_xml_file()'s, where the
+    "rounds" value has the totals across all precincts. It also has a
+    "precincts" key whose value is a dict mapping precinct name to a
+    dict mapping row name to the list of vote totals in each round.
+
+    Args:
+      source: a path or file object.
+    """
+    results = None
+    precincts = {}
+    # A dict mapping row name to list of [votes, transfer] pairs.
+    totals = None
+    for precinct_results in events.iter_contests(
+        iter_xml_events(source, precincts=True)
+    ):
+        metadata = precinct_results.pop('_metadata')
+        contest_name = metadata['contest_name']
+        precinct_name = metadata['precinct_name']
+        rounds = precinct_results['rounds']
+        if results is None:
+            results = precinct_results
+            totals = {
+                name: [[0, 0] for _ in row_rounds]
+                for name, row_rounds in rounds.items()
+            }
+        if precinct_name in precincts:
+            raise RuntimeError(f'duplicate precinct: {precinct_name!r}')
+
+        _add_round_totals(totals, rounds=rounds, precinct_name=precinct_name)
+        precincts[precinct_name] = {
+            name: [round_data['votes'] for round_data in row_rounds]
+            for name, row_rounds in rounds.items()
+        }
+
+    if results is None:
+        raise RuntimeError('report has no precinctGroup elements')
+
+    _log.info(f'read {len(precincts)} precincts for: {contest_name!r}')
+    results.update({
+        '_metadata': {
+            'contest_name': contest_name,
+        },
+        'precincts': precincts,
+        'rounds': _make_total_rounds(totals),
+    })
     return results
+
+
+# The names below implement the report format interface (see
+# rcvresults/formats.py).
+
+SEEKABLE = False
+
+get_report_parser = get_parser
+scan_report = scan_xml_file
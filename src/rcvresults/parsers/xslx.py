@@ -1,18 +1,32 @@
 """
 Supports parsing Dominion Excel (.xlsx) RCV result reports.
+
+By default, workbooks are read with the "native" engine in xlsx_reader.py.
+openpyxl is used as a fallback if the native engine doesn't support a
+workbook, or if requested. openpyxl is only imported when needed since
+it is slow to import.
+
+The vote totals are read as the row events in rcvresults/parsers/events.py
+(see iter_workbook_events()), and the results dicts are built from them.
 """
 
+import contextlib
+import functools
 import itertools
 import logging
 
-import openpyxl
-from openpyxl.cell.cell import MergedCell
-
 import rcvresults.parsers.common as common
+import rcvresults.parsers.events as events
+from rcvresults.parsers.events import EVENT_CONTEST
+import rcvresults.parsers.xlsx_reader as xlsx_reader
 
 
 _log = logging.getLogger(__name__)
 
+ENGINE_NATIVE = 'native'
+ENGINE_OPENPYXL = 'openpyxl'
+DEFAULT_ENGINE = ENGINE_NATIVE
+
 
 def _iter_triples(iterator):
     # The "values" variable is the next triple to yield.
@@ -45,11 +59,14 @@ def iter_triples(iterator):
     yield from itertools.islice(iterator, 1, None)
 
 
-def parse_sheet_1(wb, sheet_name):
+def parse_sheet_1(rows):
     """
     Return a dict containing the contest name.
+
+    Args:
+      rows: an iterable of (name, values) pairs, as yielded by
+        iter_worksheet_rows().
     """
-    ws = wb[sheet_name]
     # The first cell of the first five rows has the following form:
     # 1: "Page: 1 / 2"
     # 2: None
@@ -57,16 +74,14 @@ def parse_sheet_1(wb, sheet_name):
     # 4: "Final RCV Short Report\nCity and County of San Francisco\n"
     #    "November 8, 2022, Consolidated General Election"
     # 5: "PUBLIC DEFENDER"
-    indexed_rows = enumerate(ws.iter_rows(values_only=True), start=1)
-    for i, row in indexed_rows:
-        value = row[0]
+    rows = iter(rows)
+    for value, _ in rows:
         if value is None:
             continue
         if 'Short Report' in value:
             break
 
-    for i, row in indexed_rows:
-        contest_name = row[0]
+    for contest_name, _ in rows:
         break
 
     results = {
@@ -75,39 +90,103 @@ def parse_sheet_1(wb, sheet_name):
     return results
 
 
-def iter_sheet2_rows(ws):
+def read_merged_columns(path, sheet_name):
+    """
+    Read the merged cell ranges of a worksheet, for reading it with
+    openpyxl's read-only mode (whose worksheets don't provide them).
+
+    The ranges are read with xlsx_reader, which only needs the
+    worksheet's XML (rather than openpyxl's internals).
+
+    Returns (merged_columns, max_column). Here, merged_columns is a dict
+    mapping 1-based row index to the set of 1-based column indexes of
+    the cells that would be MergedCell objects in a non-read-only
+    worksheet (i.e. the cells in a merged range other than its top-left
+    cell). Also, max_column is the worksheet's max_column if it weren't
+    read-only.
+
+    Args:
+      path: a path or seekable binary file object.
+    """
+    with xlsx_reader.XlsxReader(path) as reader:
+        return reader.read_merged_columns(sheet_name)
+
+
+def iter_worksheet_rows(ws):
+    """
+    Yield a (name, values) pair for each row in a non-read-only worksheet.
+
+    Here, name is the value of the row's first cell, and values is a list
+    of the values of the row's other cells, skipping the MergedCells.
+    """
+    for row in ws.iter_rows():
+        cell = row[0]
+        yield (cell.value, list(iter_sheet2_row(row)))
+
+
+def iter_value_rows(rows, merged_columns, max_column):
+    """
+    Yield a (name, values) pair for each row of values, like
+    iter_worksheet_rows() does for a non-read-only worksheet.
+
+    Args:
+      rows: an iterable of tuples of values, one for each row starting
+        with row 1 (e.g. from a read-only worksheet).
+      merged_columns, max_column: the return value of
+        read_merged_columns().
+    """
+    for row_index, row in enumerate(rows, start=1):
+        # Rows of values don't include missing cells at the end of the
+        # row, so add them back.
+        missing = max_column - len(row)
+        if missing > 0:
+            row = row + missing * (None, )
+
+        skipped = merged_columns.get(row_index)
+        if skipped is None:
+            values = list(row[1:])
+        else:
+            values = [
+                value for column, value in enumerate(row[1:], start=2)
+                if column not in skipped
+            ]
+        yield (row[0], values)
+
+
+def iter_sheet2_rows(rows):
     """
     Yield the vote-total rows in "Sheet2" of the workbook.
+
+    Args:
+      rows: an iterable of (name, values) pairs, as yielded by
+        iter_worksheet_rows().
     """
-    indexed_rows = enumerate(ws.iter_rows(), start=1)
+    indexed_rows = enumerate(rows, start=1)
     # First, skip to the rows containing the candidates.
-    for i, row in indexed_rows:
-        cell = row[0]
-        value = cell.value
-        if value == 'Candidate':
+    for i, (name, values) in indexed_rows:
+        if name == 'Candidate':
             break
 
-    i, row = next(indexed_rows)
-    cell = row[0]
-    value = cell.value
-    assert value is None
+    i, (name, values) = next(indexed_rows)
+    assert name is None
 
     is_candidate = True
-    for i, row in indexed_rows:
-        cell = row[0]
-        name = cell.value
+    for i, (name, values) in indexed_rows:
         if name is None:
             break
         if name == 'Continuing Ballots Total':
             is_candidate = False
 
-        yield (i, name, row, is_candidate)
+        yield (i, name, values, is_candidate)
 
 
 def iter_sheet2_row(row):
     """
-    Yield the values corresponding to the non-MergedCells in the given row.
+    Yield the values corresponding to the non-MergedCells in the given row
+    (excluding the first cell).
     """
+    from openpyxl.cell.cell import MergedCell
+
     for cell in row[1:]:
         if type(cell) is MergedCell:
             continue
@@ -115,62 +194,39 @@ def iter_sheet2_row(row):
         yield cell.value
 
 
-def iter_row_rounds(row):
+def iter_row_rounds(values):
     """
     Yield the data in each round, one triple per round.
-    """
-    values = iter_sheet2_row(row)
-    yield from iter_triples(values)
-
 
-def parse_sheet2_row(row, is_candidate):
-    rounds = []
-    for data in iter_row_rounds(row):
-        votes, percent, transfer = data
-        round_data = {
-            'votes': votes,
-            'percent': percent,
-            'transfer': transfer,
-        }
-        rounds.append(round_data)
-
-    return rounds
+    Args:
+      values: the values in a row after the first cell, skipping the
+        MergedCells.
+    """
+    yield from iter_triples(iter(values))
 
 
-def parse_sheet2(wb, sheet_name):
-    ws = wb[sheet_name]
+def iter_sheet2_events(rows):
+    """
+    Yield the row events for the vote-total rows in "Sheet2" (without the
+    contest header).
 
-    candidates = []
-    row_names = []
-    non_candidate_names = []
-    rounds = {}
-    for i, name, row, is_candidate in iter_sheet2_rows(ws):
-        if is_candidate:
-            candidates.append(name)
-        else:
+    Args:
+      rows: an iterable of (name, values) pairs, as yielded by
+        iter_worksheet_rows().
+    """
+    for i, name, values, is_candidate in iter_sheet2_rows(rows):
+        if not is_candidate:
             name = common.get_subtotal_label(name)
-            non_candidate_names.append(name)
-        row_names.append(name)
-        row_rounds = parse_sheet2_row(row, is_candidate=is_candidate)
-        rounds[name] = row_rounds
-
-    # TODO: assert the contents of non_candidate_names?
-    results = {
-        'candidate_names': candidates,
-        'non_candidate_names': non_candidate_names,
-        'row_names': row_names,
-        'rounds': rounds,
-    }
-    return results
+        yield from events.iter_row_events(
+            name, is_candidate=is_candidate, rounds=iter_row_rounds(values),
+        )
 
 
-def parse_excel_file(path):
+def get_sheet_names(sheet_names):
     """
-    Parse a workbook, and return a dict of results.
+    Return the names of the sheets to use as "Sheet1" and "Sheet2", as a
+    pair.
     """
-    results = {}
-    wb = openpyxl.load_workbook(filename=path)
-    sheet_names = wb.sheetnames
     if sheet_names == ['Sheet1', 'Sheet2']:
         sheet_name_1, sheet_name_2 = sheet_names
 
@@ -186,8 +242,218 @@ def parse_excel_file(path):
         raise AssertionError(
             f'unexpected sheet names: {sheet_names}'
         )
-    # Initialize the metadata dict with the contest name.
-    metadata = parse_sheet_1(wb, sheet_name=sheet_name_1)
-    results = parse_sheet2(wb, sheet_name=sheet_name_2)
-    results['_metadata'] = metadata
+
+    return (sheet_name_1, sheet_name_2)
+
+
+def iter_workbook_events(iter_rows, sheet_names):
+    """
+    Yield the row events for the rows of a workbook (see
+    rcvresults/parsers/events.py).
+
+    Args:
+      iter_rows: a function that accepts a sheet name and returns an
+        iterator of (name, values) pairs, as yielded by
+        iter_worksheet_rows().
+      sheet_names: the workbook's sheet names.
+    """
+    sheet_name_1, sheet_name_2 = get_sheet_names(sheet_names)
+    # The metadata dict contains the contest name.
+    metadata = parse_sheet_1(iter_rows(sheet_name_1))
+    yield (EVENT_CONTEST, metadata)
+    yield from iter_sheet2_events(iter_rows(sheet_name_2))
+
+
+def _parse_rows(iter_rows, sheet_names):
+    """
+    Parse the rows of a workbook, and return a dict of results.
+
+    Args:
+      iter_rows, sheet_names: the same as for iter_workbook_events().
+    """
+    return events.build_results(
+        iter_workbook_events(iter_rows, sheet_names=sheet_names)
+    )
+
+
+def _parse_native(path):
+    """
+    Parse a workbook using xlsx_reader.
+    """
+    # Mapping from sheet name to the return value of read_sheet(), so
+    # each sheet is only read once.
+    sheets = {}
+    with xlsx_reader.XlsxReader(path) as reader:
+        def iter_rows(sheet_name):
+            if sheet_name not in sheets:
+                sheets[sheet_name] = reader.read_sheet(sheet_name)
+            rows, merged_columns, max_column = sheets[sheet_name]
+            return iter_value_rows(
+                rows, merged_columns=merged_columns, max_column=max_column,
+            )
+
+        return _parse_rows(iter_rows, sheet_names=reader.sheet_names)
+
+
+def _parse_openpyxl(path, read_only):
+    """
+    Parse a workbook using openpyxl.
+    """
+    import openpyxl
+
+    wb = openpyxl.load_workbook(
+        filename=path, read_only=read_only, data_only=read_only,
+    )
+    try:
+        # Mapping from sheet name to the merged cell info for the sheet,
+        # so it's only read once per sheet.
+        merged_info = {}
+
+        def iter_rows(sheet_name):
+            ws = wb[sheet_name]
+            if not read_only:
+                return iter_worksheet_rows(ws)
+
+            if sheet_name not in merged_info:
+                merged_info[sheet_name] = read_merged_columns(path, sheet_name)
+            merged_columns, max_column = merged_info[sheet_name]
+            return iter_value_rows(
+                ws.iter_rows(values_only=True),
+                merged_columns=merged_columns, max_column=max_column,
+            )
+
+        return _parse_rows(iter_rows, sheet_names=wb.sheetnames)
+    finally:
+        # This is needed to close the archive in read-only mode.
+        wb.close()
+
+
+def _rewind(path):
+    """
+    Seek back to the start of the file, if path is a file object.
+    """
+    if hasattr(path, 'seek'):
+        path.seek(0)
+
+
+def parse_excel_file(path, engine=None, read_only=True):
+    """
+    Parse a workbook, and return a dict of results.
+
+    Args:
+      path: a path or seekable binary file object.
+      engine: ENGINE_NATIVE or ENGINE_OPENPYXL. Defaults to DEFAULT_ENGINE.
+        If the native engine doesn't support the workbook, openpyxl is
+        used instead.
+      read_only: whether to load the workbook in openpyxl's read-only
+        mode, which streams the cell values instead of creating every
+        cell object (and loading the styles) up front. This only applies
+        when openpyxl is used.
+    """
+    if engine is None:
+        engine = DEFAULT_ENGINE
+
+    if engine == ENGINE_NATIVE:
+        try:
+            return _parse_native(path)
+        except xlsx_reader.UnsupportedWorkbookError as exc:
+            _log.warning(f'falling back to openpyxl for {path}: {exc}')
+            _rewind(path)
+    elif engine != ENGINE_OPENPYXL:
+        raise ValueError(f'unknown Excel engine: {engine!r}')
+
+    return _parse_openpyxl(path, read_only=read_only)
+
+
+def _iter_name_rows(rows):
+    """
+    Yield a (name, values) pair for each tuple of values, leaving out the
+    values (for when only the row names are needed).
+    """
+    for row in rows:
+        yield (row[0] if row else None, None)
+
+
+def _scan_rows(iter_rows, sheet_names):
+    """
+    Read the metadata from the rows of a workbook, and return a dict.
+
+    Args:
+      iter_rows: a function that accepts a sheet name and returns an
+        iterator of tuples of values, one for each row starting with row 1.
+      sheet_names: the workbook's sheet names.
+    """
+    sheet_name_1, sheet_name_2 = get_sheet_names(sheet_names)
+    with contextlib.closing(iter_rows(sheet_name_1)) as rows:
+        metadata = parse_sheet_1(_iter_name_rows(rows))
+
+    candidates = []
+    with contextlib.closing(iter_rows(sheet_name_2)) as rows:
+        for i, name, values, is_candidate in iter_sheet2_rows(
+            _iter_name_rows(rows)
+        ):
+            if not is_candidate:
+                # Then there are no more candidate rows, so stop reading.
+                break
+            candidates.append(name)
+
+    results = {
+        '_metadata': metadata,
+        'candidate_names': candidates,
+    }
     return results
+
+
+def _scan_openpyxl(path):
+    """
+    Read the metadata from a workbook using openpyxl's read-only mode.
+    """
+    import openpyxl
+
+    wb = openpyxl.load_workbook(filename=path, read_only=True, data_only=True)
+    try:
+        def iter_rows(sheet_name):
+            return wb[sheet_name].iter_rows(values_only=True)
+
+        return _scan_rows(iter_rows, sheet_names=wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def scan_excel_file(path):
+    """
+    Read only the contest name and candidate names from a workbook,
+    without reading the vote totals.
+
+    Returns a dict with the same "_metadata" and "candidate_names" values
+    as parse_excel_file().
+    """
+    try:
+        with xlsx_reader.XlsxReader(path) as reader:
+            return _scan_rows(reader.iter_rows, sheet_names=reader.sheet_names)
+    except xlsx_reader.UnsupportedWorkbookError as exc:
+        _log.warning(f'falling back to openpyxl for {path}: {exc}')
+        _rewind(path)
+
+    return _scan_openpyxl(path)
+
+
+# The names below implement the report format interface (see
+# rcvresults/formats.py).
+
+# Workbooks are zip archives, which need random access.
+SEEKABLE = True
+
+
+def get_report_parser(parser_name=None):
+    """
+    Return a function that parses a workbook and returns a dict of results.
+
+    Args:
+      parser_name: ENGINE_NATIVE or ENGINE_OPENPYXL. Defaults to
+        DEFAULT_ENGINE.
+    """
+    return functools.partial(parse_excel_file, engine=parser_name)
+
+
+scan_report = scan_excel_file
@@ -1,102 +1,213 @@
 """
 Support for parsing XML and Excel result reports and writing the data to JSON.
+
+The parser for each report format is imported only when a report of
+that format is first parsed (see rcvresults/formats.py). The data can
+also be written in one of the other intermediate formats (see
+rcvresults/intermediate.py), e.g. to hand it off to rendering faster.
 """
 
+import functools
 import logging
+import os
+import traceback
 
-import rcvresults.parsers.xml as xml_parsing
-import rcvresults.parsers.xslx as excel_parsing
-import rcvresults.utils as utils
+import rcvresults.archives as archives
+import rcvresults.formats as formats
+import rcvresults.intermediate as intermediate
+from rcvresults.parse_cache import ParseCache, hash_file
+import rcvresults.summary as summary_mod
 
 
 _log = logging.getLogger(__name__)
 
+# The version of the parsing code, as recorded in the parse cache.
+# Increment this whenever a change could change the JSON output, so that
+# JSON files written by older code are regenerated.
+PARSER_VERSION = 1
 
-def make_candidate_summary(rounds, name):
-    # Initialize highest_round to 1 in case the candidate has zero
-    # votes in the first round.
-    highest_round = 1
-    highest_vote = 0
-    for round_number, round_data in enumerate(rounds, start=1):
-        votes = round_data['votes']
-        if not votes:
-            # Then the candidate had zero votes in the first round or is
-            # eliminated in this round.
-            break
-
-        highest_round = round_number
-        # The vote totals should only stay the same or increase.
-        if votes < highest_vote:
-            raise AssertionError(
-                f'votes decreased in round {round_number} for {name!r}: '
-                f'{votes} < {highest_vote}'
-            )
-        highest_vote = votes
-
-    summary = {
-        'highest_round': highest_round,
-        'highest_vote': highest_vote,
-    }
-    return summary
+
+class ReportErrors(RuntimeError):
+
+    """
+    Raised when one or more report files couldn't be processed.
+
+    Attributes:
+      errors: a list of (path, message) pairs, one for each report that
+        failed, in the order the reports were given. Here, message is the
+        formatted traceback.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(self.make_report())
+
+    def make_report(self):
+        """
+        Return a string describing all the errors.
+        """
+        lines = [f'error processing {len(self.errors)} report file(s):']
+        for path, message in self.errors:
+            lines.extend(('', f'{path}:', message.rstrip()))
+        return '\n'.join(lines)
 
 
-def add_summary(results):
+def add_summaries(results_list, engine=None):
+    """
+    Add summary data to each of the given parsed data dicts (or
+    ContestResults objects).
+
+    The summaries are computed for all the contests at once (see the
+    summary module).
+
+    Args:
+      engine: the name of the summary engine to use (see the summary
+        module). Defaults to summary.get_default_engine(), i.e. NumPy
+        only if every contest is a ContestResults object and NumPy is
+        installed, and otherwise (e.g. for the dicts the parsers
+        return) the Python engine.
+    """
+    summaries = summary_mod.summarize_contests(results_list, engine=engine)
+    for results, summary in zip(results_list, summaries):
+        results.update(summary)
+
+
+def add_summary(results, engine=None):
     """
     Add summary data to the parsed data dict.
     """
-    candidates = results['candidate_names']
-    rounds = results['rounds']
-    candidate_summaries = {}
-    for name in candidates:
-        candidate_rounds = rounds[name]
-        candidate_summaries[name] = make_candidate_summary(
-            candidate_rounds, name=name,
-        )
+    add_summaries([results], engine=engine)
+
 
-    highest_round = max(
-        summary['highest_round'] for summary in candidate_summaries.values()
+def _get_format_key(path, report_format=None):
+    """
+    Return the key to look up the report format of a report with (see
+    formats.get_report_format()): the name of the format if one was
+    selected explicitly, and otherwise the report's suffix.
+    """
+    if report_format is not None:
+        return report_format
+    return archives.get_report_suffix(path)
+
+
+def scan_report_metadata(path, report_format=None):
+    """
+    Read only the contest name and candidate names from a report file,
+    stopping as soon as they are known.
+
+    Returns a dict with keys "contest_name" and "candidate_names" (in
+    the order they appear in the report).
+
+    Args:
+      report_format: the name of the report format to read the report
+        with (e.g. "rctab"). Defaults to the format for its suffix.
+    """
+    format_module = formats.get_report_format(
+        _get_format_key(path, report_format=report_format),
     )
-    # Set the elimination_round for each candidate.
-    for name, candidate_summary in candidate_summaries.items():
-        highest_candidate_round = candidate_summary['highest_round']
-        if highest_candidate_round != highest_round:
-            # Then the candidate was eliminated in their highest round.
-            candidate_summary['elimination_round'] = highest_candidate_round
-
-    vote_totals = {
-        name: summary['highest_vote'] for name, summary in
-        candidate_summaries.items()
+    try:
+        with archives.open_report(path, seekable=format_module.SEEKABLE) as f:
+            results = format_module.scan_report(f)
+    except Exception:
+        raise RuntimeError(f'error scanning report file: {path}')
+
+    metadata = {
+        'contest_name': results['_metadata']['contest_name'],
+        'candidate_names': results['candidate_names'],
     }
-    def sort_key(name):
-        return vote_totals[name]
+    return metadata
 
-    # Sort candidates from highest to lowest vote total.
-    candidates = sorted(candidates, key=sort_key, reverse=True)
 
-    highest_vote = max(vote_totals.values())
-    # Use a list in case more than one candidate is tied.
-    leading_candidates = [
-        name for name, total in vote_totals.items() if total == highest_vote
-    ]
-    results.update({
-        'candidate_summaries': candidate_summaries,
-        'candidate_names': candidates,
-        'highest_round': highest_round,
-        'leading_candidates': leading_candidates,
-    })
+def _get_parser_name(format_key, xml_parser):
+    """
+    Return the parser name to pass to the report format for a suffix
+    (or format name).
+    """
+    return xml_parser if format_key == '.xml' else None
+
 
+def get_parser_version(
+    path, xml_parser=None, output_format=None, report_format=None,
+):
+    """
+    Return the version string of the parser that make_json_file() uses
+    for the given report (including the output format), for the parse
+    cache.
 
-def make_json_file(path, output_dir):
+    This doesn't import the parser, so that cache hits stay cheap.
+    """
+    if output_format is None:
+        output_format = intermediate.DEFAULT_FORMAT
+    format_key = _get_format_key(path, report_format=report_format)
+    parser_name = _get_parser_name(format_key, xml_parser=xml_parser)
+    return (
+        f'{PARSER_VERSION}:{format_key}:{parser_name or "default"}:'
+        f'{output_format}'
+    )
+
+
+def _remove_other_formats(json_path):
+    for path in intermediate.remove_other_formats(json_path):
+        _log.info(f'removed file in another intermediate format: {path}')
+
+
+def get_json_path(path, output_dir, output_format=None):
+    """
+    Return the path of the file to write a report's data to.
+
+    Args:
+      output_format: the intermediate format (see
+        intermediate.FORMAT_NAMES), which determines the suffix.
+        Defaults to intermediate.DEFAULT_FORMAT.
+    """
+    stem = archives.get_report_stem(path)
+    suffix = intermediate.get_suffix(output_format)
+    return output_dir / f'{stem}{suffix}'
+
+
+def check_report_stems(report_paths):
+    """
+    Raise ValueError if more than one report has the same stem (e.g.
+    "a.xml" and "a.xml.gz"), since their contests would be written to the
+    same file (and registered under the same name).
+    """
+    paths_by_stem = {}
+    for path in report_paths:
+        stem = archives.get_report_stem(path)
+        paths_by_stem.setdefault(stem, []).append(path)
+
+    duplicates = [paths for paths in paths_by_stem.values() if len(paths) > 1]
+    if duplicates:
+        descriptions = '; '.join(
+            ', '.join(str(path) for path in paths) for paths in duplicates
+        )
+        raise ValueError(f'reports have the same file stem: {descriptions}')
+
+
+def parse_report(path, xml_parser=None, report_format=None):
+    """
+    Parse a report, add the summary data, and return the results dict.
+
+    Args:
+      path: a Path or archives.ZipMember object.
+      xml_parser: the name of the parser to use for XML reports (see
+        xml_parsing.PARSER_NAMES). Defaults to xml_parsing.DEFAULT_PARSER_NAME.
+      report_format: the name of the report format to parse the report
+        with (see formats.get_format_names()), e.g. "rctab" for RCTab
+        summary files. Defaults to the format for the report's suffix.
+    """
     _log.info(f'parsing: {path}')
-    suffix = path.suffix
-    if suffix == '.xlsx':
-        parse_report_file = excel_parsing.parse_excel_file
-    else:
-        assert suffix == '.xml'
-        parse_report_file = xml_parsing.parse_xml_file
+    format_key = _get_format_key(path, report_format=report_format)
+    format_module = formats.get_report_format(format_key)
+    parse_report_file = format_module.get_report_parser(
+        _get_parser_name(format_key, xml_parser=xml_parser),
+    )
 
     try:
-        results = parse_report_file(path)
+        # Reports are decompressed as they are parsed. Excel files need
+        # random access, though, since they are zip archives themselves.
+        with archives.open_report(path, seekable=format_module.SEEKABLE) as f:
+            results = parse_report_file(f)
     except Exception:
         raise RuntimeError(f'error parsing report file: {path}')
 
@@ -106,26 +217,326 @@ def make_json_file(path, output_dir):
     _log.info(f'parsed contest: {contest_name!r} ({len(candidates)} candidates)')
     add_summary(results)
 
-    json_path = output_dir / f'{path.stem}.json'
+    return results
+
+
+def _parse_to_file(
+    path, output_dir, xml_parser=None, output_format=None, report_format=None,
+):
+    """
+    Parse a report and write it to output_dir, and return a
+    (json_path, results) pair.
+    """
+    results = parse_report(
+        path, xml_parser=xml_parser, report_format=report_format,
+    )
+    json_path = get_json_path(
+        path, output_dir=output_dir, output_format=output_format,
+    )
     _log.info(f'writing: {json_path}')
-    utils.write_json(results, path=json_path)
+    intermediate.write_contest(
+        results, path=json_path, format_name=output_format,
+    )
+
+    return (json_path, results)
+
 
+def _make_json_file(
+    path, output_dir, xml_parser=None, output_format=None, report_format=None,
+):
+    json_path, _ = _parse_to_file(
+        path, output_dir=output_dir, xml_parser=xml_parser,
+        output_format=output_format, report_format=report_format,
+    )
     return json_path
 
 
-def make_jsons(report_paths, output_dir):
+def make_json_file(
+    path, output_dir, xml_parser=None, cache=None, output_format=None,
+    report_format=None,
+):
+    """
+    Args:
+      xml_parser: the name of the parser to use for XML reports (see
+        xml_parsing.PARSER_NAMES). Defaults to xml_parsing.DEFAULT_PARSER_NAME.
+      cache: an optional ParseCache object for output_dir. If the report
+        is unchanged since it was last parsed into output_dir (with the
+        same parser version), it isn't parsed again. The caller is
+        responsible for calling cache.save().
+      output_format: the intermediate format to write (see
+        intermediate.FORMAT_NAMES). Defaults to pretty-printed JSON.
+      report_format: the name of the report format to parse the report
+        with (see parse_report()).
+    """
+    kwargs = dict(
+        output_dir=output_dir, xml_parser=xml_parser,
+        output_format=output_format, report_format=report_format,
+    )
+    if cache is None:
+        json_path = _make_json_file(path, **kwargs)
+    else:
+        cache_key = _make_cache_key(path, **kwargs)
+        if cache.lookup(path, *cache_key):
+            _log.info(f'skipping unchanged report: {path}')
+            _, _, json_path = cache_key
+        else:
+            json_path = _make_json_file(path, **kwargs)
+            cache.add(path, *cache_key)
+
+    _remove_other_formats(json_path)
+    return json_path
+
+
+def _make_cache_key(
+    path, output_dir, xml_parser, output_format, report_format,
+):
+    """
+    Return the (content_hash, parser_version, json_path) values to look
+    up a report in the parse cache.
+    """
+    parser_version = get_parser_version(
+        path, xml_parser=xml_parser, output_format=output_format,
+        report_format=report_format,
+    )
+    json_path = get_json_path(
+        path, output_dir=output_dir, output_format=output_format,
+    )
+    return (hash_file(path), parser_version, json_path)
+
+
+def get_job_count(jobs):
+    """
+    Return the number of worker processes to use.
+
+    Args:
+      jobs: the number of workers requested, or 0 (or None) to use one
+        per CPU.
+    """
+    if not jobs:
+        jobs = os.cpu_count() or 1
+    return jobs
+
+
+def _try_call(func, path, **kwargs):
+    """
+    Call func(path, **kwargs), and return a (value, message) pair, where
+    value is the return value and message is None, or else value is None
+    and message is the formatted traceback of the error.
+
+    Errors are returned (rather than raised) so they can be collected
+    from worker processes.
+    """
+    try:
+        value = func(path, **kwargs)
+    except Exception:
+        return (None, traceback.format_exc())
+
+    return (value, None)
+
+
+def _iter_worker_results(func, report_paths, jobs, **kwargs):
+    """
+    Yield the return value of _try_call() for func and each report path,
+    in the same order as the paths.
+
+    Args:
+      func: a module-level function (so it can be sent to the workers).
+    """
+    try_call = functools.partial(_try_call, func, **kwargs)
+    if jobs == 1 or len(report_paths) <= 1:
+        for path in report_paths:
+            yield try_call(path)
+        return
+
+    # This is imported here since it's slow to import and not needed for
+    # a single job.
+    from concurrent.futures import ProcessPoolExecutor
+
+    file_count = len(report_paths)
+    with ProcessPoolExecutor(max_workers=min(jobs, file_count)) as executor:
+        # Executor.map() yields the results in the order of the inputs.
+        yield from executor.map(try_call, report_paths)
+
+
+def _collect_values(report_paths, results):
+    """
+    Return the values of the (value, message) pairs, in the order of
+    report_paths, or raise ReportErrors if any report failed.
+
+    Args:
+      results: a dict mapping the index of each report to its pair.
+    """
+    file_count = len(report_paths)
+    values = []
+    errors = []
+    for i, input_path in enumerate(report_paths):
+        value, message = results[i]
+        if message is not None:
+            _log.error(f'failed file {i + 1} (of {file_count}): {input_path}')
+            errors.append((input_path, message))
+            continue
+
+        values.append(value)
+
+    if errors:
+        raise ReportErrors(errors)
+
+    return values
+
+
+def iter_parsed_reports(
+    report_paths, xml_parser=None, jobs=1, report_format=None,
+):
+    """
+    Parse the given reports without writing any files, and yield a
+    (path, results) pair for each, in the same order as report_paths, as
+    soon as it is parsed (so the caller needn't hold every contest in
+    memory at once). The results dicts include the summary data.
+
+    If any report fails, the other reports are still parsed (and
+    yielded), and ReportErrors is raised at the end listing every
+    failure.
+
+    Args:
+      jobs: the number of worker processes to parse with (see
+        make_jsons()).
+      report_format: the name of the report format to parse the reports
+        with (see parse_report()).
+    """
+    check_report_stems(report_paths)
+    jobs = get_job_count(jobs)
+    file_count = len(report_paths)
+    _log.info(f'parsing {file_count} report paths (jobs: {jobs})...')
+    worker_results = _iter_worker_results(
+        parse_report, report_paths, jobs=jobs, xml_parser=xml_parser,
+        report_format=report_format,
+    )
+    errors = []
+    for i, (path, (results, message)) in enumerate(
+        zip(report_paths, worker_results)
+    ):
+        if message is not None:
+            _log.error(f'failed file {i + 1} (of {file_count}): {path}')
+            errors.append((path, message))
+            continue
+
+        yield (path, results)
+
+    if errors:
+        raise ReportErrors(errors)
+
+
+def parse_reports(report_paths, xml_parser=None, jobs=1, report_format=None):
+    """
+    Parse the given reports without writing any files, and return a list
+    of results dicts (with the summary data), in the same order as
+    report_paths.
+
+    If any report fails, the other reports are still parsed, and
+    ReportErrors is raised at the end listing every failure.
+
+    Args:
+      jobs: the number of worker processes to parse with (see
+        make_jsons()).
+      report_format: the name of the report format to parse the reports
+        with (see parse_report()).
+    """
+    return [
+        results for _, results in iter_parsed_reports(
+            report_paths, xml_parser=xml_parser, jobs=jobs,
+            report_format=report_format,
+        )
+    ]
+
+
+def make_jsons(
+    report_paths, output_dir, xml_parser=None, jobs=1, force=False,
+    output_format=None, on_parsed=None, report_format=None,
+):
+    """
+    Parse the given reports and write one JSON file per report (or one
+    file in another intermediate format).
+
+    Reports that are unchanged since they were last parsed into
+    output_dir are skipped (see the parse_cache module).
+
+    Returns the JSON paths, in the same order as report_paths. If any
+    report fails, the other reports are still processed, and ReportErrors
+    is raised at the end listing every failure. ValueError is raised
+    (before parsing anything) if two reports have the same stem (see
+    check_report_stems()).
+
+    Args:
+      jobs: the number of worker processes to parse with, or 0 (or None)
+        to use one per CPU. Defaults to 1, which parses in the current
+        process.
+      force: whether to parse every report, even unchanged ones.
+      output_format: the intermediate format to write (see
+        intermediate.FORMAT_NAMES). Defaults to pretty-printed JSON. Any
+        file for the same report in another format is deleted.
+      on_parsed: an optional function to call with (json_path, results)
+        as soon as each report is parsed, so the caller can use the
+        results dicts without reading the files back (or holding them
+        all in memory). It isn't called for the reports skipped by the
+        parse cache.
+      report_format: the name of the report format to parse the reports
+        with (see parse_report()).
+    """
+    check_report_stems(report_paths)
+    jobs = get_job_count(jobs)
     file_count = len(report_paths)
-    _log.info(f'processing {file_count} report paths...')
+    _log.info(f'processing {file_count} report paths (jobs: {jobs})...')
     if not output_dir.exists():
         _log.info(f'creating directory: {output_dir}')
         output_dir.mkdir(parents=True)
 
-    json_paths = []
-    for i, input_path in enumerate(report_paths, start=1):
-        _log.info(f'parsing file {i} (of {file_count}): {input_path}')
-        json_path = make_json_file(input_path, output_dir=output_dir)
-        json_paths.append(json_path)
+    # The cache is only read and written from this process, so the
+    # lookups happen here, and only the misses are sent to the workers.
+    cache = ParseCache(output_dir, force=force)
+    # Mapping from report index to its (json_path, message) pair.
+    results = {}
+    # Mapping from report index to its cache key, for the misses.
+    miss_keys = {}
+    for i, path in enumerate(report_paths):
+        cache_key = _make_cache_key(
+            path, output_dir=output_dir, xml_parser=xml_parser,
+            output_format=output_format, report_format=report_format,
+        )
+        if cache.lookup(path, *cache_key):
+            _log.info(f'skipping unchanged report: {path}')
+            _, _, json_path = cache_key
+            results[i] = (json_path, None)
+        else:
+            miss_keys[i] = cache_key
+
+    miss_paths = [report_paths[i] for i in miss_keys]
+    # Only return the parsed results from the workers if the caller
+    # wants them, since they have to be pickled.
+    make_file = _make_json_file if on_parsed is None else _parse_to_file
+    miss_results = _iter_worker_results(
+        make_file, miss_paths, jobs=jobs, output_dir=output_dir,
+        xml_parser=xml_parser, output_format=output_format,
+        report_format=report_format,
+    )
+    for i, (value, message) in zip(miss_keys, miss_results):
+        input_path = report_paths[i]
+        if message is None:
+            _log.info(f'parsed file {i + 1} (of {file_count}): {input_path}')
+            cache.add(input_path, *miss_keys[i])
+            if on_parsed is not None:
+                json_path, parsed = value
+                on_parsed(json_path, parsed)
+                value = json_path
+        results[i] = (value, message)
+
+    cache.save()
+    cache.log_counts()
 
+    json_paths = _collect_values(report_paths, results)
     _log.info(f'wrote {file_count} files to directory: {output_dir}')
+    # Also remove any files written by earlier runs with another output
+    # format (even for the reports skipped by the cache).
+    for json_path in json_paths:
+        _remove_other_formats(json_path)
 
     return json_paths
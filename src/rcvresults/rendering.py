@@ -1,11 +1,22 @@
 """
 Supports rendering Jinja2 templates.
+
+A template can also be rendered in every language in a single pass (see
+render_all_languages()). The translation filters then output language-
+neutral slot markers instead of translations, and the html in each
+language is made by replacing the markers with the translations from
+flattened per-language tables (see TranslationSlots). The parts of a
+template that depend on the language in other ways (e.g. through
+"current_lang") must be inside a "{% call(current_lang) per_language() %}"
+block, which is rendered separately for each language.
 """
 
 import logging
 
+from markupsafe import escape, Markup
+
 import rcvresults.utils as utils
-from rcvresults.utils import LANG_CODE_ENGLISH, LANGUAGES
+from rcvresults.utils import LANG_CODE_ENGLISH, LANGUAGES, NonCandidateLabel
 
 
 _log = logging.getLogger(__name__)
@@ -19,10 +30,42 @@ CONTEXT_KEY_CURRENT_LANG = 'current_lang'
 # The value is a dict mapping 2-letter language code to the name in that
 # language of the page being rendered.
 CONTEXT_KEY_PAGE_NAMES = 'page_names'
-
-
-def render_template(template, output_path, context=None, lang_code=None):
+# The value is the precomputed round-by-round table of a contest (see
+# make_rounds_table()).
+CONTEXT_KEY_ROUNDS_TABLE = 'rounds_table'
+
+# The value is the TranslationSlots object to use when rendering in every
+# language in a single pass (see render_all_languages()).
+CONTEXT_KEY_TRANSLATION_SLOTS = 'translation_slots'
+# The value is the list of the fragments rendered by per_language() so
+# far, when rendering in a single pass.
+CONTEXT_KEY_LANG_FRAGMENTS = 'lang_fragments'
+
+# The names of the tables of translations the translation filters use.
+TABLE_LABELS = 'labels'
+TABLE_SUBTOTALS = 'subtotals'
+
+# The characters around the slot numbers of the translation markers, and
+# the fragment numbers of the per_language() markers, when rendering in
+# a single pass. These characters can't occur in html.
+SLOT_DELIMITER = '\x00'
+FRAGMENT_DELIMITER = '\x01'
+
+# The contents of an empty table cell.
+EMPTY_CELL = Markup('&nbsp;')
+
+# The cells of an eliminated candidate in the rounds after the one in
+# which they were eliminated.
+_ELIMINATED_CELLS = (
+    'VotesCell', EMPTY_CELL, 'PercentageCell', EMPTY_CELL,
+    'VotesTransferredCell', EMPTY_CELL,
+)
+
+
+def render_html(template, context=None, lang_code=None):
     """
+    Render a template, and return the html.
+
     Args:
       context: the context to pass to template.render().
       lang_code: optional 2-letter language code (e.g. "en" for English
@@ -35,11 +78,124 @@ def render_template(template, output_path, context=None, lang_code=None):
         context = context.copy()
         context[CONTEXT_KEY_CURRENT_LANG] = lang_code
 
+    return template.render(context)
+
+
+class TranslationSlots:
+
+    """
+    Flattened per-language tables of the translations, for rendering a
+    template in every language in a single pass.
+
+    Each (table name, label) pair has a slot number, which the markers
+    output by the translation filters contain (see get_marker()).
+    """
+
+    def __init__(self, tables, languages=None):
+        """
+        Args:
+          tables: a dict mapping table name (e.g. TABLE_LABELS) to the
+            dict of translations of that table's labels.
+          languages: the language codes to make tables for. Defaults to
+            every language in utils.LANGUAGES.
+        """
+        if languages is None:
+            languages = LANGUAGES
+
+        self._markers = {}
+        values = {lang_code: [] for lang_code in languages}
+        for table_name, label_translations in tables.items():
+            for label in label_translations:
+                slot = len(self._markers)
+                marker = f'{SLOT_DELIMITER}{slot}{SLOT_DELIMITER}'
+                self._markers[(table_name, label)] = Markup(marker)
+                for lang_code, lang_values in values.items():
+                    translation = utils.get_translation(
+                        label_translations, label=label, lang=lang_code,
+                    )
+                    # Escape the translations since they replace the
+                    # markers after autoescaping.
+                    lang_values.append(str(escape(translation)))
+
+        self._values = values
+
+    def get_marker(self, table_name, label):
+        """
+        Return the marker to output in place of a label's translation.
+        """
+        try:
+            return self._markers[(table_name, label)]
+        except KeyError:
+            raise KeyError(label) from None
+
+    def fill(self, html, lang_code):
+        """
+        Return the html with the markers replaced by the translations in
+        the given language.
+        """
+        values = self._values[lang_code]
+        parts = html.split(SLOT_DELIMITER)
+        # Every other part is a slot number.
+        parts[1::2] = [values[int(slot)] for slot in parts[1::2]]
+        return ''.join(parts)
+
+
+def _fill_fragments(html, fragments, lang_code):
+    """
+    Return the html with the per_language() markers replaced by the
+    fragments in the given language.
+    """
+    parts = html.split(FRAGMENT_DELIMITER)
+    parts[1::2] = [fragments[int(index)][lang_code] for index in parts[1::2]]
+    return ''.join(parts)
+
+
+def render_all_languages(template, translation_slots, context=None):
+    """
+    Render a template in every language in a single pass, and return a
+    dict mapping language code to html.
+
+    The html is the same as render_html() returns for each language.
+
+    Args:
+      translation_slots: a TranslationSlots object.
+      context: the context to pass to template.render().
+    """
+    if context is None:
+        context = {}
+    # Copy the context since we are modifying it.
+    context = context.copy()
+    fragments = []
+    context[CONTEXT_KEY_TRANSLATION_SLOTS] = translation_slots
+    context[CONTEXT_KEY_LANG_FRAGMENTS] = fragments
+
+    html = template.render(context)
+    html_by_lang = {}
+    for lang_code in LANGUAGES:
+        lang_html = html
+        if fragments:
+            lang_html = _fill_fragments(html, fragments, lang_code=lang_code)
+        html_by_lang[lang_code] = translation_slots.fill(lang_html, lang_code)
+
+    return html_by_lang
+
+
+def log_rendering(template, output_path, lang_code=None):
     _log.info(
         f'rendering template {template.name!r} (lang={lang_code!r}) to:\n'
         f' {output_path}'
     )
-    html = template.render(context)
+
+
+def render_template(template, output_path, context=None, lang_code=None):
+    """
+    Render a template, and write the html to output_path.
+
+    Args:
+      context, lang_code: the same as for render_html().
+    """
+    log_rendering(template, output_path=output_path, lang_code=lang_code)
+    html = render_html(template, context=context, lang_code=lang_code)
     output_path.write_text(html)
 
 
@@ -71,38 +227,129 @@ def is_contest_leader(context, candidate):
     return candidate in context['leading_candidates']
 
 
-def candidate_was_eliminated(context, candidate, round_number):
+def _get_class_prefix(
+    is_leader, elimination_round, round_number, highest_round,
+):
+    """
+    Return one of: "Leader", "Winner", "Eliminated", or "", per the
+    pre-2019 RCV tables.
     """
-    Return whether the candidate was eliminated in a **previous** round.
+    if is_leader:
+        if round_number == highest_round:
+            return 'Winner'
+        return 'Leader'
 
-    Args:
-      context: the template context.
+    if round_number == elimination_round:
+        return 'Eliminated'
+
+    return ''
+
+
+def _make_candidate_cells(context, candidate):
+    """
+    Return the cells of a candidate's row of the round-by-round table.
     """
-    summaries = context['candidate_summaries']
-    summary = summaries[candidate]
+    highest_round = context['highest_round']
+    is_leader = is_contest_leader(context, candidate=candidate)
+    summary = context['candidate_summaries'][candidate]
     elimination_round = summary.get('elimination_round')
-    if elimination_round is None:
-        return False
+    row_rounds = context['rounds'][candidate]
+
+    cells = []
+    for round_number in range(1, highest_round + 1):
+        # Leave the cells empty after the round the candidate was
+        # eliminated in.
+        if elimination_round is not None and elimination_round < round_number:
+            cells.append(_ELIMINATED_CELLS)
+            continue
+
+        class_prefix = _get_class_prefix(
+            is_leader, elimination_round=elimination_round,
+            round_number=round_number, highest_round=highest_round,
+        )
+        # Subtract 1 to get a 0-based index.
+        round_data = row_rounds[round_number - 1]
+        if round_number == highest_round:
+            transfer_class, transfer = ('VotesTransferredCell', EMPTY_CELL)
+        else:
+            transfer_class = f'{class_prefix}VotesTransferredCell'
+            transfer = format_int(round_data['transfer'])
+        cells.append((
+            f'{class_prefix}VotesCell', format_int(round_data['votes']),
+            f'{class_prefix}PercentageCell',
+            format_percent(round_data['percent']),
+            transfer_class, transfer,
+        ))
+
+    return cells
+
+
+def _make_non_candidate_cells(context, label):
+    """
+    Return the cells of a non-candidate row of the round-by-round table.
+    """
+    highest_round = context['highest_round']
+    row_rounds = context['rounds'][label]
+    if label == NonCandidateLabel.CONTINUING:
+        percent = '100%'
+    else:
+        percent = EMPTY_CELL
+    has_transfers = label not in (
+        NonCandidateLabel.CONTINUING, NonCandidateLabel.NON_TRANSFERABLE,
+    )
 
-    return elimination_round < round_number
+    cells = []
+    for round_number in range(1, highest_round + 1):
+        round_data = row_rounds[round_number - 1]
+        if has_transfers and round_number < highest_round:
+            transfer = format_int(round_data['transfer'])
+        else:
+            transfer = EMPTY_CELL
+        cells.append((
+            'VotesCell', format_int(round_data['votes']),
+            'PercentageCell', percent, 'VotesTransferredCell', transfer,
+        ))
 
+    return cells
 
-def get_candidate_class_prefix(context, candidate, round_number):
-    """
-    Returns one of: "Leader", "Winner", "Eliminated", or "", per the
-    pre-2019 RCV tables.
+
+def make_rounds_table(context):
     """
-    if is_contest_leader(context, candidate=candidate):
-        if round_number == context['highest_round']:
-            return 'Winner'
-        return 'Leader'
+    Return the rows of the round-by-round table of a contest, for
+    rcv-complete.html.
 
-    summaries = context['candidate_summaries']
-    candidate_summary = summaries[candidate]
-    if round_number == candidate_summary.get('elimination_round'):
-        return 'Eliminated'
+    The CSS classes, which cells are empty, and the formatted numbers
+    don't depend on the language, so they are computed once per contest
+    (rather than for each cell while rendering each language).
 
-    return ''
+    Args:
+      context: the template context of the contest.
+
+    Returns a dict with the following keys:
+      candidate_rows: a list of (candidate, row_class, cells) tuples.
+      non_candidate_rows: a list of (label, cells) tuples.
+    Above, cells is a list with a tuple for each round: (votes_class,
+    votes, percent_class, percent, transfer_class, transfer), where the
+    classes are CSS classes and the others are the cell contents.
+    """
+    candidates = context['candidate_names']
+    candidate_rows = []
+    for index, candidate in enumerate(candidates):
+        row_class = 'AlternateCandidateRow' if index % 2 else 'CandidateRow'
+        if index == len(candidates) - 1:
+            row_class += ' LastCandidateRow'
+        cells = _make_candidate_cells(context, candidate=candidate)
+        candidate_rows.append((candidate, row_class, cells))
+
+    non_candidate_rows = [
+        (label, _make_non_candidate_cells(context, label=label))
+        for label in context['non_candidate_names']
+    ]
+
+    return {
+        'candidate_rows': candidate_rows,
+        'non_candidate_rows': non_candidate_rows,
+    }
 
 
 def _get_language(context):
@@ -113,6 +360,30 @@ def _get_language(context):
     return context.get(CONTEXT_KEY_CURRENT_LANG, LANG_CODE_ENGLISH)
 
 
+# We apply jinja2.pass_context() to this function elsewhere in our code.
+def per_language(context, caller):
+    """
+    Render the body of a "{% call(current_lang) per_language() %}" block
+    in the current language.
+
+    When rendering in a single pass (see render_all_languages()), the
+    body is rendered in each language instead, and a marker is output in
+    its place. These blocks can't be nested.
+
+    Args:
+      caller: the body of the block, which accepts the language code.
+    """
+    fragments = context.get(CONTEXT_KEY_LANG_FRAGMENTS)
+    if fragments is None:
+        return caller(_get_language(context))
+
+    index = len(fragments)
+    fragments.append({
+        lang_code: caller(lang_code) for lang_code in LANGUAGES
+    })
+    return Markup(f'{FRAGMENT_DELIMITER}{index}{FRAGMENT_DELIMITER}')
+
+
 def iter_languages(context):
     """
     Yield a dict of information about each language, in the order the
@@ -130,26 +401,37 @@ def iter_languages(context):
 
 
 # We apply jinja2.pass_context() to this function elsewhere in our code.
-def translate_label(context, label, lang=None, label_translations=None):
+def translate_label(
+    context, label, lang=None, label_translations=None,
+    table_name=TABLE_LABELS,
+):
     """
     Translate the given label into the language set in the given Jinja2
     context.
 
+    When rendering in a single pass (see render_all_languages()) and no
+    language is given, this returns the label's slot marker instead.
+
     Args:
       lang: an optional 2-letter language code.  Defaults to the context's
         current language.
       label_translations: the dict of translations, where the keys are the
         labels.
+      table_name: the name of label_translations' table of slots (e.g.
+        TABLE_LABELS).
     """
-    if lang is None:
-        lang = _get_language(context)
-
     if not label:
         raise ValueError(
             f'no label provided: {label!r}. '
             'Make sure to pass a string as the label.'
         )
 
+    if lang is None:
+        translation_slots = context.get(CONTEXT_KEY_TRANSLATION_SLOTS)
+        if translation_slots is not None:
+            return translation_slots.get_marker(table_name, label)
+        lang = _get_language(context)
+
     translation = utils.get_translation(
         label_translations, label=label, lang=lang,
     )
@@ -0,0 +1,486 @@
+"""
+Supports storing the results of an RCV contest in a compact, columnar form.
+
+The parsers (and the JSON files) represent a contest's rounds as a dict
+mapping row name to a list of round dicts, each with a "votes",
+"percent", and "transfer" value. ContestResults instead stores each of
+the three values as a single array('d') column of length
+len(row_names) * round_count, in row-major order (so the rounds of a row
+are contiguous). It converts to and from the dict form.
+
+Some reports have values that aren't floats (e.g. an int 0 or an empty
+string in some Excel reports). Those are stored as NaN in the columns
+and kept separately, so converting back to the dict form reproduces the
+original values exactly. None is also stored as NaN.
+
+ContestResults objects can also be serialized to bytes (see to_bytes()),
+in a binary form that stores each column as raw little-endian doubles, so
+loading one creates no per-value objects.
+"""
+
+from array import array
+from collections.abc import Mapping
+import json
+import math
+import struct
+import sys
+from types import MappingProxyType
+
+
+ROUND_FIELDS = ('votes', 'percent', 'transfer')
+
+# The start of the bytes returned by ContestResults.to_bytes().
+BYTES_MAGIC = b'RCVCOLS\x00'
+# The version of the binary form.
+BYTES_VERSION = 1
+# The format of the header following BYTES_MAGIC: the version and the
+# length of the JSON header that follows, as little-endian 32-bit ints.
+_BYTES_HEADER = struct.Struct('<II')
+
+# The keys of a results dict that ContestResults stores in its own
+# attributes. Other keys (e.g. the summary keys) are kept in "extra".
+_RESULTS_KEYS = {
+    '_metadata', 'candidate_names', 'non_candidate_names', 'row_names',
+    'rounds',
+}
+
+
+def _encode_value(value):
+    """
+    Return (number, is_exact), where number is the float to store in a
+    column for the value, and is_exact is whether the value can be
+    recovered from the number alone.
+    """
+    if type(value) is float:
+        return (value, not math.isnan(value))
+    if value is None:
+        return (math.nan, True)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return (float(value), False)
+
+    return (math.nan, False)
+
+
+def to_number(value):
+    """
+    Return a round value as a number, with NaN for values that aren't
+    numbers (e.g. None or an empty string).
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return math.nan
+
+
+class _RoundsView(Mapping):
+
+    """
+    A read-only view of the rounds of a ContestResults object, with the
+    same shape as the "rounds" value of a results dict.
+
+    The value for each row is a tuple of read-only round records (see
+    ContestResults.get_row_rounds()).
+    """
+
+    __slots__ = ('_results', )
+
+    def __init__(self, results):
+        self._results = results
+
+    def __getitem__(self, row_name):
+        row_index = self._results.get_row_index(row_name)
+        return self._results.get_row_rounds(row_index)
+
+    def __iter__(self):
+        return iter(self._results.row_names)
+
+    def __len__(self):
+        return len(self._results.row_names)
+
+
+class ContestResults:
+
+    """
+    The results of an RCV contest, with the round values stored in
+    array('d') columns.
+
+    Attributes:
+      metadata: the "_metadata" dict (e.g. with the contest name).
+      candidate_names: the list of candidate names.
+      non_candidate_names: the list of non-candidate row names (e.g.
+        "continuing" and "blanks").
+      row_names: the names of all the rows, in order.
+      round_count: the number of rounds.
+      votes, percents, transfers: the columns, as array('d') objects.
+      extra: a dict of the other keys in the results dict (e.g. the
+        summary keys added by parsing.add_summary()).
+
+    The columns should only be changed through the set_*() methods, since
+    the round records of the rows are cached (see get_row_rounds()).
+    """
+
+    __slots__ = (
+        'metadata', 'candidate_names', 'non_candidate_names', 'row_names',
+        'round_count', 'votes', 'percents', 'transfers', 'extra',
+        '_row_indexes', '_raw_values', '_row_rounds',
+    )
+
+    def __init__(
+        self, candidate_names, non_candidate_names, round_count,
+        row_names=None, metadata=None,
+    ):
+        """
+        Create an object with every value set to None.
+
+        Args:
+          row_names: the names of all the rows, in order. Defaults to the
+            candidate names followed by the non-candidate names.
+        """
+        if row_names is None:
+            row_names = [*candidate_names, *non_candidate_names]
+        if metadata is None:
+            metadata = {}
+
+        self.metadata = metadata
+        self.candidate_names = list(candidate_names)
+        self.non_candidate_names = list(non_candidate_names)
+        self.row_names = list(row_names)
+        self.round_count = round_count
+
+        size = len(self.row_names) * round_count
+        self.votes = array('d', [math.nan]) * size
+        self.percents = array('d', [math.nan]) * size
+        self.transfers = array('d', [math.nan]) * size
+        self.extra = {}
+
+        self._row_indexes = {
+            name: row_index for row_index, name in enumerate(self.row_names)
+        }
+        # Mapping from (field, index) to the original value, for values
+        # that can't be recovered from the column.
+        self._raw_values = {}
+        # Mapping from row index to the cached return value of
+        # get_row_rounds().
+        self._row_rounds = {}
+
+    def __getstate__(self):
+        # Leave out the cached round records, since they can't be pickled
+        # (e.g. to send the object to a worker process).
+        return {
+            name: getattr(self, name) for name in self.__slots__
+            if name != '_row_rounds'
+        }
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._row_rounds = {}
+
+    def __repr__(self):
+        contest_name = self.metadata.get('contest_name')
+        return (
+            f'<ContestResults {contest_name!r}: {len(self.row_names)} rows, '
+            f'{self.round_count} rounds>'
+        )
+
+    @classmethod
+    def from_results(cls, results):
+        """
+        Create an object from a results dict (e.g. as returned by a parser
+        or read from a JSON file).
+        """
+        rounds = results['rounds']
+        row_names = results['row_names']
+        round_counts = {len(rounds[name]) for name in row_names}
+        if len(round_counts) > 1:
+            raise ValueError(
+                f'rows have different numbers of rounds: {sorted(round_counts)}'
+            )
+        round_count, = round_counts or {0}
+
+        contest_results = cls(
+            results['candidate_names'], results['non_candidate_names'],
+            round_count=round_count, row_names=row_names,
+            metadata=dict(results['_metadata']),
+        )
+        raw_values = contest_results._raw_values
+        for field in ROUND_FIELDS:
+            # Build each column as a list first, since that is faster than
+            # setting the values one at a time.
+            numbers = []
+            for name in row_names:
+                for round_data in rounds[name]:
+                    value = round_data[field]
+                    number, is_exact = _encode_value(value)
+                    if not is_exact:
+                        raw_values[(field, len(numbers))] = value
+                    numbers.append(number)
+            contest_results.get_column(field)[:] = array('d', numbers)
+
+        contest_results.extra = {
+            key: value for key, value in results.items()
+            if key not in _RESULTS_KEYS
+        }
+        return contest_results
+
+    def to_results(self):
+        """
+        Return a results dict in the same form as the parsers return (and
+        as the JSON files store).
+        """
+        rounds = {
+            name: [
+                self.get_round_by_index(row_index, round_index)
+                for round_index in range(self.round_count)
+            ] for row_index, name in enumerate(self.row_names)
+        }
+        results = self._make_dict(rounds)
+        return results
+
+    def make_context(self):
+        """
+        Return a dict to use as a template context.
+
+        This is like to_results() except that the "rounds" value is a
+        read-only view that creates the round records of each row only
+        when the row is first accessed.
+        """
+        return self._make_dict(_RoundsView(self))
+
+    def _make_dict(self, rounds):
+        return {
+            '_metadata': dict(self.metadata),
+            'candidate_names': list(self.candidate_names),
+            'non_candidate_names': list(self.non_candidate_names),
+            'row_names': list(self.row_names),
+            'rounds': rounds,
+            **self.extra,
+        }
+
+    def to_bytes(self):
+        """
+        Return the object in a binary form, which from_bytes() loads.
+
+        The form is BYTES_MAGIC, the version and header length, a UTF-8
+        JSON header with the names and other non-column values, and then
+        the votes, percents, and transfers columns as little-endian
+        doubles.
+        """
+        header = {
+            'candidate_names': self.candidate_names,
+            'extra': self.extra,
+            'metadata': self.metadata,
+            'non_candidate_names': self.non_candidate_names,
+            'raw_values': [
+                [field, index, value] for (field, index), value
+                in self._raw_values.items()
+            ],
+            'round_count': self.round_count,
+            'row_names': self.row_names,
+        }
+        header_bytes = json.dumps(header, separators=(',', ':')).encode()
+        parts = [
+            BYTES_MAGIC, _BYTES_HEADER.pack(BYTES_VERSION, len(header_bytes)),
+            header_bytes,
+        ]
+        for column in (self.votes, self.percents, self.transfers):
+            if sys.byteorder != 'little':
+                column = array('d', column)
+                column.byteswap()
+            parts.append(column.tobytes())
+
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Create an object from the return value of to_bytes().
+
+        The columns are copied directly from the data, without creating
+        an object per value.
+        """
+        data = memoryview(data)
+        magic_size = len(BYTES_MAGIC)
+        if bytes(data[:magic_size]) != BYTES_MAGIC:
+            raise ValueError('data is not in the ContestResults binary form')
+        start = magic_size + _BYTES_HEADER.size
+        version, header_size = _BYTES_HEADER.unpack(data[magic_size:start])
+        if version != BYTES_VERSION:
+            raise ValueError(f'unsupported binary form version: {version}')
+        header = json.loads(bytes(data[start:start + header_size]))
+        start += header_size
+
+        contest_results = cls(
+            header['candidate_names'], header['non_candidate_names'],
+            round_count=header['round_count'], row_names=header['row_names'],
+            metadata=header['metadata'],
+        )
+        column_size = len(contest_results.votes) * contest_results.votes.itemsize
+        if len(data) != start + 3 * column_size:
+            raise ValueError(
+                f'data has the wrong size for its columns: {len(data)}'
+            )
+        for name in ('votes', 'percents', 'transfers'):
+            column = array('d')
+            column.frombytes(data[start:start + column_size])
+            if sys.byteorder != 'little':
+                column.byteswap()
+            setattr(contest_results, name, column)
+            start += column_size
+
+        contest_results.extra = header['extra']
+        contest_results._raw_values = {
+            (field, index): value
+            for field, index, value in header['raw_values']
+        }
+        return contest_results
+
+    def update(self, values):
+        """
+        Update the object from a dict of results-dict keys, like
+        dict.update() (e.g. with the summary keys).
+        """
+        for key, value in values.items():
+            if key == '_metadata':
+                self.metadata = dict(value)
+            elif key in ('candidate_names', 'non_candidate_names'):
+                setattr(self, key, list(value))
+            elif key in _RESULTS_KEYS:
+                raise ValueError(f'key can only be set on creation: {key!r}')
+            else:
+                self.extra[key] = value
+
+    @property
+    def rounds(self):
+        """
+        A read-only view of the rounds, with the same shape as the
+        "rounds" value of a results dict.
+        """
+        return _RoundsView(self)
+
+    def get_row_index(self, row_name):
+        try:
+            return self._row_indexes[row_name]
+        except KeyError:
+            raise KeyError(f'unknown row name: {row_name!r}') from None
+
+    def get_column(self, field):
+        """
+        Return the array('d') column for a field (e.g. "votes").
+        """
+        if field == 'votes':
+            return self.votes
+        if field == 'percent':
+            return self.percents
+        if field == 'transfer':
+            return self.transfers
+
+        raise ValueError(f'unknown field: {field!r}')
+
+    def get_row_values(self, field, row_name):
+        """
+        Return the values of a field for one row, as an array('d') (with
+        NaN for values that aren't numbers).
+        """
+        start = self.get_row_index(row_name) * self.round_count
+        return self.get_column(field)[start:start + self.round_count]
+
+    def _get_index(self, row_index, round_index):
+        if not 0 <= round_index < self.round_count:
+            raise IndexError(f'round index out of range: {round_index}')
+        return row_index * self.round_count + round_index
+
+    def set_value_by_index(self, field, row_index, round_index, value):
+        index = self._get_index(row_index, round_index)
+        number, is_exact = _encode_value(value)
+        self.get_column(field)[index] = number
+        key = (field, index)
+        if is_exact:
+            self._raw_values.pop(key, None)
+        else:
+            self._raw_values[key] = value
+        self._row_rounds.pop(row_index, None)
+
+    def get_value_by_index(self, field, row_index, round_index):
+        index = self._get_index(row_index, round_index)
+        try:
+            return self._raw_values[(field, index)]
+        except KeyError:
+            pass
+
+        number = self.get_column(field)[index]
+        return None if math.isnan(number) else number
+
+    def set_value(self, field, row_name, round_index, value):
+        """
+        Set one value (e.g. the "votes" value of a row in a round).
+
+        Args:
+          round_index: the 0-based index of the round.
+        """
+        row_index = self.get_row_index(row_name)
+        self.set_value_by_index(field, row_index, round_index, value)
+
+    def get_value(self, field, row_name, round_index):
+        row_index = self.get_row_index(row_name)
+        return self.get_value_by_index(field, row_index, round_index)
+
+    def set_round(
+        self, row_name, round_index, votes, percent=None, transfer=None,
+    ):
+        """
+        Set the values of a row in a round (e.g. while parsing a report).
+        """
+        row_index = self.get_row_index(row_name)
+        for field, value in zip(ROUND_FIELDS, (votes, percent, transfer)):
+            self.set_value_by_index(field, row_index, round_index, value)
+
+    def get_round_by_index(self, row_index, round_index):
+        """
+        Return the round dict for a row in a round.
+        """
+        return {
+            field: self.get_value_by_index(field, row_index, round_index)
+            for field in ROUND_FIELDS
+        }
+
+    def get_row_rounds(self, row_index):
+        """
+        Return the rounds of a row, as a tuple of read-only round records
+        (mappings with the keys of a round dict).
+
+        The tuple is created the first time a row is accessed, and reused
+        until one of its values is set, so reading the same cells again
+        (e.g. once per language when rendering) doesn't create any
+        objects.
+        """
+        try:
+            return self._row_rounds[row_index]
+        except KeyError:
+            pass
+
+        row_rounds = tuple(
+            MappingProxyType(self.get_round_by_index(row_index, round_index))
+            for round_index in range(self.round_count)
+        )
+        self._row_rounds[row_index] = row_rounds
+        return row_rounds
+
+
+def as_mapping(results):
+    """
+    Return a results dict or ContestResults object as a mapping with the
+    keys of a results dict.
+    """
+    if isinstance(results, ContestResults):
+        return results.make_context()
+    return results
+
+
+def as_contest_results(results):
+    """
+    Return a results dict or ContestResults object as a ContestResults
+    object (without copying it if it is one already).
+    """
+    if isinstance(results, ContestResults):
+        return results
+    return ContestResults.from_results(results)
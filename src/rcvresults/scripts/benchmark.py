@@ -0,0 +1,361 @@
+"""
+Script to time parts of the code on the sample result reports.
+
+Usage:
+
+  $ python src/rcvresults/scripts/benchmark.py --help
+
+For example (this should work from the repo root):
+
+  $ python src/rcvresults/scripts/benchmark.py excel \
+      data/input-reports/2022-11-08/*.xlsx
+
+  $ python src/rcvresults/scripts/benchmark.py startup
+
+  $ python src/rcvresults/scripts/benchmark.py handoff
+
+"""
+
+import argparse
+from argparse import RawDescriptionHelpFormatter
+import logging
+from pathlib import Path
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+import timeit
+
+import rcvresults.election_bundle as election_bundle
+import rcvresults.intermediate as intermediate
+import rcvresults.parsers.xslx as excel_parsing
+import rcvresults.utils as utils
+
+DEFAULT_REPEAT = 5
+
+DESCRIPTION = """\
+Time parts of the code on the sample result reports.
+
+Each timing is the best of several repeats, in milliseconds.
+"""
+
+DEFAULT_EXCEL_DIR = Path('data/input-reports/2022-11-08')
+
+# The ways of parsing Excel reports to compare, as a mapping from label
+# to the keyword arguments to pass to parse_excel_file().
+EXCEL_CASES = {
+    'native': dict(engine=excel_parsing.ENGINE_NATIVE),
+    'openpyxl (read-only)': dict(
+        engine=excel_parsing.ENGINE_OPENPYXL, read_only=True,
+    ),
+    'openpyxl (full)': dict(
+        engine=excel_parsing.ENGINE_OPENPYXL, read_only=False,
+    ),
+}
+
+SCRIPTS_DIR = Path(__file__).parent
+DEFAULT_STARTUP_XML_PATH = Path(
+    'data/input-reports/2020-11-03/20201201_d9_short.xml'
+)
+DEFAULT_STARTUP_EXCEL_PATH = DEFAULT_EXCEL_DIR / 'd4_short.xlsx'
+
+DEFAULT_JSON_DIR = Path('data/output-json')
+
+# Mapping from label to the module to import, for timing import cost.
+EXCEL_IMPORTS = {
+    'native': 'rcvresults.parsers.xlsx_reader',
+    'openpyxl': 'openpyxl',
+}
+
+# The modules whose import cost to time for the "startup" command.
+STARTUP_IMPORTS = [
+    'rcvresults.parsing',
+    'rcvresults.parsers.xml',
+    'rcvresults.parsers.xslx',
+    'rcvresults.election',
+]
+
+
+def time_call(func, number=1, repeat=DEFAULT_REPEAT):
+    """
+    Return the best time per call of calling func(), in milliseconds.
+    """
+    times = timeit.repeat(func, number=number, repeat=repeat)
+    return 1000 * min(times) / number
+
+
+def time_command(args, repeat=DEFAULT_REPEAT):
+    """
+    Return the best time of running a command, in milliseconds.
+    """
+    def run():
+        subprocess.run(args, check=True)
+
+    return time_call(run, repeat=repeat)
+
+
+def time_import(module_name, repeat=DEFAULT_REPEAT):
+    """
+    Return the best time of starting Python and importing a module, in
+    milliseconds.
+    """
+    args = [sys.executable, '-c', f'import {module_name}']
+    return time_command(args, repeat=repeat)
+
+
+def print_table(rows, headers):
+    """
+    Print rows of (label, *times) with the times in milliseconds.
+    """
+    label_width = max(len(label) for label, *_ in rows)
+    label_width = max(label_width, len(headers[0]))
+    header = f'{headers[0]:<{label_width}}' + ''.join(
+        f'  {name:>20}' for name in headers[1:]
+    )
+    print(header)
+    for label, *times in rows:
+        line = f'{label:<{label_width}}' + ''.join(
+            f'  {value:>20.2f}' for value in times
+        )
+        print(line)
+
+
+def get_excel_paths(dir_path):
+    return sorted(dir_path.glob('*.xlsx'))
+
+
+def benchmark_excel(paths, repeat):
+    if not paths:
+        paths = get_excel_paths(DEFAULT_EXCEL_DIR)
+
+    labels = list(EXCEL_CASES)
+    rows = []
+    totals = [0] * len(labels)
+    for path in paths:
+        times = []
+        for i, kwargs in enumerate(EXCEL_CASES.values()):
+            def parse():
+                excel_parsing.parse_excel_file(path, **kwargs)
+
+            elapsed = time_call(parse, number=5, repeat=repeat)
+            times.append(elapsed)
+            totals[i] += elapsed
+        rows.append((path.name, *times))
+
+    rows.append(('TOTAL', *totals))
+    print_table(rows, headers=['file (ms per parse)', *labels])
+    print()
+
+    rows = [
+        (label, time_import(module_name, repeat=repeat))
+        for label, module_name in EXCEL_IMPORTS.items()
+    ]
+    print_table(rows, headers=['import (ms incl. startup)', 'time'])
+
+
+def get_script_command(script_name, *args):
+    """
+    Return the command to run one of the scripts in this directory.
+    """
+    return [sys.executable, str(SCRIPTS_DIR / script_name), *args]
+
+
+def benchmark_startup(xml_path, excel_path, repeat):
+    """
+    Time running the scripts from a cold start (a new process each time).
+    """
+    with TemporaryDirectory() as temp_dir:
+        # Pass --force so every run parses the report rather than hitting
+        # the parse cache.
+        parse_args = ['--force', '--output-dir', temp_dir]
+        commands = {
+            'python (no imports)': [sys.executable, '-c', 'pass'],
+            'parse_results.py --help': get_script_command(
+                'parse_results.py', '--help',
+            ),
+            'make_reports.py --help': get_script_command(
+                'make_reports.py', '--help',
+            ),
+            f'parse_results.py {xml_path.name}': get_script_command(
+                'parse_results.py', *parse_args, str(xml_path),
+            ),
+            f'parse_results.py {excel_path.name}': get_script_command(
+                'parse_results.py', *parse_args, str(excel_path),
+            ),
+        }
+        rows = []
+        for label, args in commands.items():
+            def run():
+                subprocess.run(
+                    args, check=True, stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+
+            rows.append((label, time_call(run, repeat=repeat)))
+
+    print_table(rows, headers=['command (ms incl. startup)', 'time'])
+    print()
+
+    rows = [
+        (module_name, time_import(module_name, repeat=repeat))
+        for module_name in STARTUP_IMPORTS
+    ]
+    print_table(rows, headers=['import (ms incl. startup)', 'time'])
+
+
+# The ways of handing off the parsed contests to compare, as a mapping
+# from label to (format_name, read_function). The first is how the
+# contests were handed off before the intermediate module was added.
+HANDOFF_CASES = {
+    'json (json module)': (intermediate.FORMAT_JSON, utils.read_json),
+    'json': (intermediate.FORMAT_JSON, intermediate.read_contest),
+    'compact-json': (
+        intermediate.FORMAT_COMPACT_JSON, intermediate.read_contest,
+    ),
+    'columnar': (intermediate.FORMAT_COLUMNAR, intermediate.read_contest),
+}
+
+
+def benchmark_handoff(json_dir, repeat):
+    """
+    Time writing the parsed contests in each intermediate format, and
+    reading them back as the rendering step does.
+
+    Args:
+      json_dir: a directory of election directories of JSON files (e.g.
+        the reference files), to use as the parsed contests.
+    """
+    json_paths = utils.get_paths(json_dir / '*', suffix='json')
+    results_list = [utils.read_json(path) for path in json_paths]
+    rows = []
+    with TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        for label, (format_name, read_contest) in HANDOFF_CASES.items():
+            suffix = intermediate.get_suffix(format_name)
+            paths = [
+                temp_dir / f'{path.stem}{suffix}' for path in json_paths
+            ]
+
+            def write():
+                for results, path in zip(results_list, paths):
+                    intermediate.write_contest(
+                        results, path=path, format_name=format_name,
+                    )
+
+            def read():
+                for path in paths:
+                    read_contest(path)
+
+            write_time = time_call(write, number=10, repeat=repeat)
+            read_time = time_call(read, number=10, repeat=repeat)
+            size = sum(path.stat().st_size for path in paths) / 1024
+            rows.append(
+                (label, write_time, read_time, write_time + read_time, size)
+            )
+
+        # Also time a single election bundle of all the contests.
+        bundle_path = temp_dir / f'all{election_bundle.BUNDLE_SUFFIX}'
+        contests = [
+            (f'{path.parent.name}/{path.stem}', results)
+            for path, results in zip(json_paths, results_list)
+        ]
+
+        def write_bundle():
+            election_bundle.write_bundle(bundle_path, contests=contests)
+
+        def read_bundle():
+            with election_bundle.ElectionBundle(bundle_path) as bundle:
+                for _ in bundle.iter_contests():
+                    pass
+
+        write_time = time_call(write_bundle, number=10, repeat=repeat)
+        read_time = time_call(read_bundle, number=10, repeat=repeat)
+        size = bundle_path.stat().st_size / 1024
+        rows.append((
+            f'bundle ({election_bundle.DEFAULT_BUNDLE_FORMAT})', write_time,
+            read_time, write_time + read_time, size,
+        ))
+
+    print(f'{len(json_paths)} contests')
+    print_table(rows, headers=[
+        'format (ms per handoff)', 'write', 'read', 'total', 'size (KiB)',
+    ])
+
+
+def make_arg_parser():
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION, formatter_class=RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '--repeat', metavar='N', type=int, default=DEFAULT_REPEAT, help=(
+            f'the number of times to repeat each timing. '
+            f'Defaults to: {DEFAULT_REPEAT}.'
+        ),
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    excel_parser = subparsers.add_parser(
+        'excel', help='compare the ways of parsing Excel reports.',
+    )
+    excel_parser.add_argument(
+        'paths', metavar='PATH', type=Path, nargs='*', help=(
+            'path to one or more Excel result reports. '
+            f'Defaults to the reports in: {DEFAULT_EXCEL_DIR}.'
+        ),
+    )
+
+    startup_parser = subparsers.add_parser(
+        'startup', help=(
+            'time running the scripts from a cold start (e.g. --help and '
+            'parsing a single report).'
+        ),
+    )
+    startup_parser.add_argument(
+        '--xml-path', metavar='PATH', type=Path,
+        default=DEFAULT_STARTUP_XML_PATH, help=(
+            'the XML report to parse. '
+            f'Defaults to: {DEFAULT_STARTUP_XML_PATH}.'
+        ),
+    )
+    startup_parser.add_argument(
+        '--excel-path', metavar='PATH', type=Path,
+        default=DEFAULT_STARTUP_EXCEL_PATH, help=(
+            'the Excel report to parse. '
+            f'Defaults to: {DEFAULT_STARTUP_EXCEL_PATH}.'
+        ),
+    )
+
+    handoff_parser = subparsers.add_parser(
+        'handoff', help=(
+            'compare the intermediate formats for passing the parsed '
+            'contests to rendering.'
+        ),
+    )
+    handoff_parser.add_argument(
+        '--json-dir', metavar='DIR', type=Path, default=DEFAULT_JSON_DIR,
+        help=(
+            'a directory of election directories of JSON files, to use as '
+            f'the parsed contests. Defaults to: {DEFAULT_JSON_DIR}.'
+        ),
+    )
+    return parser
+
+
+def main():
+    parser = make_arg_parser()
+    args = parser.parse_args()
+
+    log_format = '[{levelname}] {name}: {message}'
+    logging.basicConfig(format=log_format, style='{', level=logging.WARNING)
+
+    if args.command == 'excel':
+        benchmark_excel(args.paths, repeat=args.repeat)
+    elif args.command == 'startup':
+        benchmark_startup(
+            args.xml_path, excel_path=args.excel_path, repeat=args.repeat,
+        )
+    elif args.command == 'handoff':
+        benchmark_handoff(args.json_dir, repeat=args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,7 @@ Usage:
 """
 
 import argparse
+import contextlib
 from datetime import datetime
 import functools
 import logging
@@ -16,15 +17,23 @@ from pathlib import Path
 import jinja2
 from markupsafe import Markup
 
+import rcvresults.archives as archives
+import rcvresults.contest_registry as contest_registry
 import rcvresults.election as election_mod
+import rcvresults.election_bundle as election_bundle
+import rcvresults.intermediate as intermediate
 from rcvresults.election import HTML_OUTPUT_DIR_NAMES
 import rcvresults.parsing as parsing
 import rcvresults.rendering as rendering
+import rcvresults.snapshots as snapshots
+import rcvresults.template_cache as template_cache
 from rcvresults.rendering import (
     CONTEXT_KEY_CURRENT_LANG, CONTEXT_KEY_PAGE_NAMES,
 )
+from rcvresults.results import as_contest_results, as_mapping
 from rcvresults.testing import TRANSLATIONS_PATH
 import rcvresults.utils as utils
+import rcvresults.validation as validation
 from rcvresults.utils import LANG_CODE_ENGLISH, LANGUAGES
 
 
@@ -67,6 +76,10 @@ def get_config_path(dir_name):
     return CONFIG_DIR / f'election-{dir_name}.yml'
 
 
+def get_bundle_path(bundle_dir, dir_name):
+    return bundle_dir / f'{dir_name}{election_bundle.BUNDLE_SUFFIX}'
+
+
 def get_xml_paths(dir_path):
     return utils.get_paths(dir_path, suffix='xml')
 
@@ -104,32 +117,190 @@ def get_demo_report_paths(parent_reports_dir, dir_name):
     return report_paths
 
 
-def make_all_json_files(parent_reports_dir, parent_output_dir, dir_names):
+def _load_contest(load, *args):
+    """
+    Call load(*args), and return the contest as a ContestResults object.
+
+    The contests are registered as ContestResults objects (built once,
+    when each contest is parsed or loaded), so that validate_all_contests()
+    checks them with the NumPy engine (if installed), and the later
+    stages share them.
+    """
+    return as_contest_results(load(*args))
+
+
+def _register_json_files(
+    registry, dir_name, report_paths, output_dir, jobs, force, output_format,
+):
+    # Register every contest first, so the registration order is the
+    # order of the reports, however the parsing goes.
+    for path in report_paths:
+        json_path = parsing.get_json_path(
+            path, output_dir=output_dir, output_format=output_format,
+        )
+        loader = functools.partial(
+            _load_contest, intermediate.read_contest, json_path,
+        )
+        registry.register(dir_name, json_path.stem, loader=loader)
+
+    # Then add each parsed contest to the registry as soon as it's
+    # parsed, so the registry's size limit applies while parsing, too.
+    # Reports skipped by the parse cache are read from their files when
+    # first needed.
+    def register_contest(json_path, results):
+        loader = functools.partial(
+            _load_contest, intermediate.read_contest, json_path,
+        )
+        registry.register(
+            dir_name, json_path.stem, loader=loader,
+            contest=as_contest_results(results),
+        )
+
+    parsing.make_jsons(
+        report_paths, output_dir=output_dir, jobs=jobs, force=force,
+        output_format=output_format, on_parsed=register_contest,
+    )
+
+
+def _register_reports(registry, dir_name, report_paths, jobs):
+    # Each contest is registered as soon as it's parsed, so the
+    # registry's size limit applies while parsing, too.
+    for path, results in parsing.iter_parsed_reports(report_paths, jobs=jobs):
+        stem = archives.get_report_stem(path)
+        # If the contest is evicted, it's parsed again when next needed.
+        loader = functools.partial(_load_contest, parsing.parse_report, path)
+        registry.register(
+            dir_name, stem, loader=loader, contest=as_contest_results(results),
+        )
+
+
+def parse_all_contests(
+    parent_reports_dir, dir_names, registry, parent_output_dir=None, jobs=1,
+    force=False, output_format=None,
+):
+    """
+    Parse the reports of each election, and register the contests in the
+    given registry, keyed by election directory name and file stem.
+
+    Args:
+      registry: a contest_registry.ContestRegistry object.
+      parent_output_dir: the parent directory to which to write the
+        contests as JSON files (or in another intermediate format), one
+        directory per election. If None, no files are written.
+      jobs: the number of worker processes to parse with (see
+        parsing.make_jsons()).
+      force: whether to parse every report, even ones unchanged since
+        they were last written to parent_output_dir.
+      output_format: the intermediate format to write (see
+        intermediate.FORMAT_NAMES). Defaults to pretty-printed JSON.
+    """
     for dir_name in dir_names:
-        _log.info(f'making json for election: {dir_name}')
+        _log.info(f'parsing contests for election: {dir_name}')
         report_paths = get_demo_report_paths(parent_reports_dir, dir_name=dir_name)
-        output_dir = parent_output_dir / dir_name
-        parsing.make_jsons(report_paths, output_dir=output_dir)
+        if parent_output_dir is None:
+            _register_reports(
+                registry, dir_name=dir_name, report_paths=report_paths,
+                jobs=jobs,
+            )
+            continue
+
+        _register_json_files(
+            registry, dir_name=dir_name, report_paths=report_paths,
+            output_dir=parent_output_dir / dir_name, jobs=jobs, force=force,
+            output_format=output_format,
+        )
+
+
+def register_bundle(registry, dir_name, bundle):
+    """
+    Register the contests of an election bundle in the given registry,
+    instead of parsing the election's reports.
+
+    The contests are loaded from the bundle only when first needed, so
+    the bundle must stay open until the registry is no longer used.
+
+    Args:
+      bundle: an election_bundle.ElectionBundle object.
+    """
+    _log.info(f'reading contests for election {dir_name} from: {bundle.path}')
+    for stem in bundle.stems:
+        loader = functools.partial(_load_contest, bundle.read_contest, stem)
+        registry.register(dir_name, stem, loader=loader)
+
+
+def validate_all_contests(registry, dir_names, report_path=None):
+    """
+    Check the round arithmetic of every contest (see the validation
+    module), and raise ValidationError if a check fails.
+
+    The contests are checked in batches of at most registry.max_size
+    contests, so no more contests are in memory at once than the
+    registry allows.
+    """
+    report = validation.ValidationReport(0, failures=[])
+    results_list = []
+    labels = []
+
+    def check_batch():
+        report.add(validation.validate_contests(results_list, labels=labels))
+        results_list.clear()
+        labels.clear()
+
+    for dir_name in dir_names:
+        for stem, contest in registry.iter_contests(dir_name):
+            results_list.append(contest)
+            labels.append(f'{dir_name}/{stem}')
+            if len(results_list) >= registry.max_size:
+                check_batch()
+    if results_list:
+        check_batch()
+
+    validation.check_report(report, report_path=report_path)
+
+
+def record_snapshots(store, registry, dir_names, label=None):
+    """
+    Record a snapshot of every contest in the registry as a new results
+    cycle (in a single transaction), and return the cycle id.
+
+    This should only be called after validate_all_contests() passes, so
+    that contests failing validation are never recorded.
+
+    Args:
+      store: a snapshots.SnapshotStore object.
+    """
+    contests = (
+        (dir_name, stem, contest)
+        for dir_name in dir_names
+        for stem, contest in registry.iter_contests(dir_name)
+    )
+    return store.record_cycle(contests, label=label)
 
 
 def make_all_rcv_snippets(
-    parent_json_dir, config_paths, parent_snippets_dir, translations_path,
+    renderer, registry, config_paths, parent_snippets_dir, force=False, jobs=1,
 ):
     """
     Args:
+      renderer: the election.Renderer object to render with.
+      registry: a contest_registry.ContestRegistry object containing the
+        contests of each election.
       config_paths: a dict mapping dir_name to config_path.
       parent_snippets_dir: the parent directory to which to write the
         intermediate RCV HTML snippets.
+      force: whether to render every contest, even ones unchanged since
+        they were last rendered.
+      jobs: the number of worker processes to render with (see
+        election.process_contests()).
     """
     css_dir = '../../..'
     for dir_name, config_path in config_paths.items():
         _log.info(f'generating html for election: {dir_name}')
-        json_dir = parent_json_dir / dir_name
-        json_paths = utils.get_paths(json_dir, suffix='json')
         html_snippets_dir = parent_snippets_dir / dir_name
-        election_mod.process_election(
-            json_paths, config_path=config_path, translations_path=translations_path,
-            output_dir=html_snippets_dir, css_dir=css_dir,
+        renderer.process_contests(
+            registry.iter_contests(dir_name), config_path=config_path,
+            output_dir=html_snippets_dir, css_dir=css_dir, force=force,
+            jobs=jobs,
         )
 
 
@@ -146,32 +317,38 @@ def _format_datetime(dt):
     return formatted
 
 
-def _make_index_jinja_env(snippets_dir, build_dt=None, commit_hash=None):
+def make_renderer(translations_path):
     """
-    Create and return a Jinja2 Environment object to use when rendering
-    one of the index.html templates.
+    Create and return the election.Renderer object to render all the
+    html of the build with (both the contest snippets and index pages).
+    """
+    renderer = election_mod.Renderer(translations_path)
+    renderer.env.filters.update({
+        'format_datetime': _format_datetime,
+    })
+    return renderer
+
+
+def _make_index_vars(snippets_dir, build_dt=None, commit_hash=None):
+    """
+    Return the template variables to use when rendering one of the
+    index.html templates.
     """
     if build_dt is None:
         build_dt = datetime.now()
     if commit_hash is None:
         commit_hash = 40 * '0'
 
-    env = election_mod.make_environment(TRANSLATIONS_PATH)
-
     def insert_html(rel_path):
         path = snippets_dir / rel_path
         html = path.read_text()
         return Markup(html)
 
-    env.filters.update({
-        'format_datetime': _format_datetime,
-    })
-    env.globals.update({
+    return {
         'build_time': build_dt,
         'commit_hash': commit_hash,
         'insert_html': insert_html,
-    })
-    return env
+    }
 
 
 def get_index_name(lang_code):
@@ -191,17 +368,19 @@ def make_index_page_names():
 
 
 def make_index_html(
-    output_dir, template, js_dir, env, output_name=None, lang_code=None,
+    output_dir, template, js_dir, index_vars, output_name=None,
+    lang_code=None,
 ):
     """
     Args:
       js_dir: the path to the directory containing the js files, relative
         to the location of the output path.
+      index_vars: a dict of the template variables for the page.
     """
     if output_name is None:
         output_name = template.name
 
-    context = {'js_dir': str(js_dir)}
+    context = {**index_vars, 'js_dir': str(js_dir)}
     output_path = output_dir / output_name
     rendering.render_template(
         template, output_path=output_path, context=context,
@@ -209,11 +388,13 @@ def make_index_html(
     )
 
 
-def make_test_index_html(output_dir, snippets_dir, js_dir):
+def make_test_index_html(renderer, output_dir, snippets_dir, js_dir):
     _log.info(f'creating: test index html')
-    env = _make_index_jinja_env(snippets_dir=snippets_dir)
-    template = env.get_template('index-test.html')
-    make_index_html(output_dir, template=template, js_dir=js_dir, env=env)
+    index_vars = _make_index_vars(snippets_dir=snippets_dir)
+    template = renderer.env.get_template('index-test.html')
+    make_index_html(
+        output_dir, template=template, js_dir=js_dir, index_vars=index_vars,
+    )
 
 
 def _get_rounds_report_url(context, election, contest_base):
@@ -264,18 +445,16 @@ def _get_contest_summary_path(context, election, contest_base):
     return str(rel_path)
 
 
-def _iter_contests(election, parent_json_dir):
+def _iter_contests(election, registry):
     """
     Yield information about each contest in an election.
     """
     dir_name = election['dir_name']
-    json_dir = parent_json_dir / dir_name
     contests = election['contests']
     for contest in contests:
         base_name = contest['file_stem']
         pdf_url = contest['pdf_url']
-        json_path = json_dir / f'{base_name}.json'
-        contest_data = utils.read_json(json_path)
+        contest_data = as_mapping(registry.get(dir_name, base_name))
 
         yield (base_name, contest_data, pdf_url)
 
@@ -301,15 +480,18 @@ def _build_elections_list(config_paths):
 
 
 def make_rcv_demo(
-    config_paths, snippets_dir, js_dir, parent_json_dir, output_dir,
+    renderer, config_paths, snippets_dir, js_dir, registry, output_dir,
     build_dt=None, commit_hash=None,
 ):
     """
     Args:
+      renderer: the Renderer object returned by make_renderer().
       config_paths: a dict mapping dir_name to config_path.
+      registry: a contest_registry.ContestRegistry object containing the
+        contests of each election.
     """
     _log.info(f'creating: RCV demo index html')
-    env = _make_index_jinja_env(
+    index_vars = _make_index_vars(
         snippets_dir=snippets_dir, build_dt=build_dt, commit_hash=commit_hash,
     )
 
@@ -317,26 +499,24 @@ def make_rcv_demo(
     # Create a single "elections" list for use from the template.
     elections = _build_elections_list(config_paths)
 
-    iter_contests = functools.partial(
-        _iter_contests, parent_json_dir=parent_json_dir,
-    )
+    iter_contests = functools.partial(_iter_contests, registry=registry)
 
-    global_vars = {
+    index_vars.update({
         'elections': elections,
         CONTEXT_KEY_PAGE_NAMES: page_names,
         'get_rounds_url': jinja2.pass_context(_get_rounds_report_url),
         'get_summary_path': jinja2.pass_context(_get_contest_summary_path),
         'iter_contests': iter_contests,
-        'iter_languages': jinja2.pass_context(rendering.iter_languages),
-    }
+    })
 
-    template = env.get_template(TEMPLATE_NAME_RCV_DEMO, globals=global_vars)
+    template = renderer.env.get_template(TEMPLATE_NAME_RCV_DEMO)
 
     for lang_code in LANGUAGES:
         output_name = get_index_name(lang_code)
         make_index_html(
-            output_dir, template=template, js_dir=js_dir, env=env,
-            output_name=output_name, lang_code=lang_code,
+            output_dir, template=template, js_dir=js_dir,
+            index_vars=index_vars, output_name=output_name,
+            lang_code=lang_code,
         )
 
 
@@ -360,6 +540,67 @@ def make_arg_parser():
             f'Defaults to a placeholder (e.g. "0000...").'
         ),
     )
+    parser.add_argument(
+        '--jobs', metavar='N', type=int, default=1, help=(
+            'the number of reports to parse, and contests to render, in '
+            'parallel (in separate processes), or 0 to use one process per '
+            'CPU. Defaults to: 1.'
+        ),
+    )
+    parser.add_argument(
+        '--force', action='store_true', help=(
+            'parse every report and render every contest, even ones that '
+            'are unchanged since they were last parsed into the output '
+            'directory (or rendered).'
+        ),
+    )
+    parser.add_argument(
+        '--format', metavar='NAME', dest='intermediate_format',
+        choices=intermediate.FORMAT_NAMES, default=intermediate.DEFAULT_FORMAT,
+        help=(
+            'the format of the files to write to the JSON directory (see '
+            '--no-json). One of: '
+            f'{", ".join(intermediate.FORMAT_NAMES)}. '
+            f'Defaults to: {intermediate.DEFAULT_FORMAT}.'
+        ),
+    )
+    parser.add_argument(
+        '--no-json', dest='write_json', action='store_false', help=(
+            'skip writing the parsed contests to the JSON directory. The '
+            'contests are passed from parsing to rendering in memory either '
+            'way, so this only skips the side effect.'
+        ),
+    )
+    parser.add_argument(
+        '--bundle-dir', metavar='DIR', type=Path, help=(
+            'an optional directory of election bundles, named like '
+            f'"2022-11-08{election_bundle.BUNDLE_SUFFIX}" (see the --bundle '
+            'option of parse_results.py). If given, the contests are read '
+            'from the bundles instead of parsing the reports.'
+        ),
+    )
+    parser.add_argument(
+        '--max-contests', metavar='N', type=int,
+        default=contest_registry.DEFAULT_MAX_SIZE, help=(
+            'the number of parsed contests to keep in memory at once. '
+            'Contests beyond this are read back (or parsed again) when '
+            f'needed. Defaults to: {contest_registry.DEFAULT_MAX_SIZE}.'
+        ),
+    )
+    parser.add_argument(
+        '--snapshot-db', metavar='PATH', type=Path, help=(
+            'an optional path to a SQLite database (created if needed) in '
+            'which to record a snapshot of every contest, as a new results '
+            'cycle. The cycle is recorded only if validation passes. See '
+            'query_snapshots.py.'
+        ),
+    )
+    parser.add_argument(
+        '--validation-report', metavar='PATH', type=Path, help=(
+            'an optional path to which to write the validation report of '
+            'the parsed contests, as JSON.'
+        ),
+    )
     return parser
 
 
@@ -382,7 +623,7 @@ def main():
         f'  commit_hash: {commit_hash}'
     )
 
-    parent_json_dir = DATA_DIR_JSON
+    parent_json_dir = DATA_DIR_JSON if args.write_json else None
     html_output_dir = Path(args.html_output_dir)
     # This is the parent directory to which to write the intermediate
     # RCV HTML snippets.
@@ -400,29 +641,74 @@ def main():
         DIR_NAME_2020_NOV,
         DIR_NAME_2019_NOV,
     ]
-    # First generate the json files for all the elections.
-    make_all_json_files(
-        DATA_DIR_REPORTS, parent_output_dir=parent_json_dir, dir_names=dir_names,
-    )
-
-    # Next generate the RCV summary html snippets for all the elections.
-    config_paths = {
-        dir_name: get_config_path(dir_name) for dir_name in dir_names
-    }
-    make_all_rcv_snippets(
-        parent_json_dir, config_paths=config_paths,
-        parent_snippets_dir=snippets_dir, translations_path=TRANSLATIONS_PATH,
-    )
-    # Finally, generate the index html pages.
-    # TODO: check that this still works.
-    make_test_index_html(
-        html_output_dir, snippets_dir=snippets_dir, js_dir=js_dir,
-    )
-    make_rcv_demo(
-        config_paths, snippets_dir=snippets_dir, js_dir=js_dir,
-        parent_json_dir=parent_json_dir, output_dir=html_output_dir,
-        build_dt=build_dt, commit_hash=commit_hash,
-    )
+    # The parsed contests are shared by all the stages below through
+    # this registry, rather than passed through the JSON files.
+    registry = contest_registry.get_default_registry()
+    registry.max_size = args.max_contests
+
+    # The bundles (if any) stay open until the build is done, since the
+    # registry loads the contests from them as needed.
+    with contextlib.ExitStack() as stack:
+        if args.bundle_dir is None:
+            # First parse the contests of all the elections (also writing
+            # the json files, unless --no-json was passed).
+            parse_all_contests(
+                DATA_DIR_REPORTS, dir_names=dir_names, registry=registry,
+                parent_output_dir=parent_json_dir, jobs=args.jobs,
+                force=args.force, output_format=args.intermediate_format,
+            )
+        else:
+            for dir_name in dir_names:
+                bundle_path = get_bundle_path(args.bundle_dir, dir_name)
+                bundle = stack.enter_context(
+                    election_bundle.ElectionBundle(bundle_path)
+                )
+                register_bundle(registry, dir_name=dir_name, bundle=bundle)
+        # Check the round arithmetic of every contest at once, and stop
+        # before generating any html if a check fails.
+        validate_all_contests(
+            registry, dir_names=dir_names, report_path=args.validation_report,
+        )
+        # Only record the snapshots once every contest has been checked.
+        if args.snapshot_db is not None:
+            with snapshots.SnapshotStore(args.snapshot_db) as store:
+                record_snapshots(
+                    store, registry=registry, dir_names=dir_names,
+                    label=args.build_time,
+                )
+
+        # Precompile the templates (if they changed since the last build),
+        # so the renderer below doesn't compile them again.
+        if not template_cache.is_precompiled(
+            env_options=election_mod.ENVIRONMENT_OPTIONS,
+        ):
+            env = election_mod.make_environment(
+                TRANSLATIONS_PATH, compiled=False,
+            )
+            template_cache.precompile_templates(env)
+        # A single renderer (and Jinja2 environment) is used for all the
+        # html below.
+        renderer = make_renderer(TRANSLATIONS_PATH)
+        # Next generate the RCV summary html snippets for all the elections.
+        config_paths = {
+            dir_name: get_config_path(dir_name) for dir_name in dir_names
+        }
+        make_all_rcv_snippets(
+            renderer, registry=registry, config_paths=config_paths,
+            parent_snippets_dir=snippets_dir, force=args.force, jobs=args.jobs,
+        )
+        # Finally, generate the index html pages.
+        # TODO: check that this still works.
+        make_test_index_html(
+            renderer, output_dir=html_output_dir, snippets_dir=snippets_dir,
+            js_dir=js_dir,
+        )
+        make_rcv_demo(
+            renderer, config_paths, snippets_dir=snippets_dir, js_dir=js_dir,
+            registry=registry, output_dir=html_output_dir,
+            build_dt=build_dt, commit_hash=commit_hash,
+        )
+    registry.log_counts()
 
 
 if __name__ == '__main__':
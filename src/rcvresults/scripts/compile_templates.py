@@ -0,0 +1,65 @@
+"""
+Script to precompile the Jinja2 templates to Python modules, so the
+scripts that render html don't have to compile them on every run.
+
+Usage:
+
+  $ python src/rcvresults/scripts/compile_templates.py --help
+
+For example (this works from any directory):
+
+  $ python src/rcvresults/scripts/compile_templates.py
+
+"""
+
+import argparse
+from argparse import RawDescriptionHelpFormatter
+import logging
+from pathlib import Path
+
+import rcvresults.election as election
+import rcvresults.template_cache as template_cache
+from rcvresults.template_cache import CACHE_DIR_ENV_VAR, TEMPLATES_DIR
+
+
+_log = logging.getLogger('compile-templates')
+
+DESCRIPTION = f"""\
+Precompile the html templates to Python modules.
+
+The modules are written to a subdirectory of the template cache
+directory named after the hash of the template sources, so they are
+only used while the templates are unchanged (after changing them, run
+this script again). The cache directory defaults to
+{template_cache.DEFAULT_CACHE_DIR}, and can be changed by setting the
+{CACHE_DIR_ENV_VAR} environment variable.
+"""
+
+
+def make_arg_parser():
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION, formatter_class=RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '--translations', metavar='PATH', dest='translations_path',
+        type=Path, default=TEMPLATES_DIR.parent / 'translations.yml', help=(
+            'path to the translations.yml file (default: %(default)s).'
+        ),
+    )
+    return parser
+
+
+def main():
+    parser = make_arg_parser()
+    args = parser.parse_args()
+
+    log_format = '[{levelname}] {name}: {message}'
+    logging.basicConfig(format=log_format, style='{', level=logging.INFO)
+
+    env = election.make_environment(args.translations_path, compiled=False)
+    compiled_dir = template_cache.precompile_templates(env)
+    _log.info(f'precompiled templates are in: {compiled_dir}')
+
+
+if __name__ == '__main__':
+    main()
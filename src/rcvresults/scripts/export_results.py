@@ -0,0 +1,115 @@
+"""
+Script to export the round values of every contest in one or more
+elections as a single long-format table (CSV or NDJSON).
+
+Usage:
+
+  $ python src/rcvresults/scripts/export_results.py --help
+
+For example (this should work from the repo root):
+
+  $ python src/rcvresults/scripts/export_results.py data/input-reports/* \\
+        --output all-rounds.csv
+
+"""
+
+import argparse
+from argparse import RawDescriptionHelpFormatter
+import contextlib
+import logging
+from pathlib import Path
+import sys
+
+import rcvresults.export as export
+import rcvresults.parsers.xml as xml_parsing
+
+
+_log = logging.getLogger('export-results')
+
+DESCRIPTION = f"""\
+Export the round values of every contest in one or more elections as a
+single long-format table, with one row per contest, row (candidate or
+non-candidate subtotal), and round. The columns are:
+
+  {", ".join(export.EXPORT_COLUMNS)}
+
+Each election is a directory (or zip bundle) of result reports, named
+after the election (e.g. "2022-11-08"). The XML reports are used if there
+are any, and otherwise the Excel reports. A directory of files written by
+parse_results.py (e.g. JSON files) can also be given.
+
+The contests are parsed and written one at a time, so memory use doesn't
+grow with the number of elections exported.
+"""
+
+
+def make_arg_parser():
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION, formatter_class=RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        'election_paths', metavar='PATH', type=Path, nargs='+', help=(
+            'path to one or more election directories or zip bundles.'
+        ),
+    )
+    parser.add_argument(
+        '--format', metavar='NAME', dest='export_format',
+        choices=export.FORMAT_NAMES, help=(
+            f'the format to write. One of: {", ".join(export.FORMAT_NAMES)}. '
+            'Defaults to the suffix of --output, or to csv.'
+        ),
+    )
+    parser.add_argument(
+        '--output', metavar='PATH', type=Path, help=(
+            'the path to which to write the table. Defaults to stdout.'
+        ),
+    )
+    parser.add_argument(
+        '--xml-parser', metavar='NAME', choices=xml_parsing.PARSER_NAMES,
+        default=xml_parsing.DEFAULT_PARSER_NAME, help=(
+            'the parser to use for XML reports. One of: '
+            f'{", ".join(xml_parsing.PARSER_NAMES)}. '
+            f'Defaults to: {xml_parsing.DEFAULT_PARSER_NAME}.'
+        ),
+    )
+    return parser
+
+
+def get_export_format(export_format, output_path):
+    if export_format is not None:
+        return export_format
+    if output_path is not None:
+        suffix = output_path.suffix.removeprefix('.')
+        if suffix in export.FORMAT_NAMES:
+            return suffix
+
+    return export.FORMAT_CSV
+
+
+def main():
+    parser = make_arg_parser()
+    args = parser.parse_args()
+
+    log_format = '[{levelname}] {name}: {message}'
+    logging.basicConfig(format=log_format, style='{', level=logging.INFO)
+
+    output_path = args.output
+    export_format = get_export_format(args.export_format, output_path)
+    rows = export.iter_election_rows(
+        args.election_paths, xml_parser=args.xml_parser,
+    )
+    with contextlib.ExitStack() as stack:
+        if output_path is None:
+            f = sys.stdout
+        else:
+            f = stack.enter_context(
+                output_path.open('w', encoding='utf-8', newline='')
+            )
+        count = export.write_rows(rows, f, format_name=export_format)
+
+    destination = 'stdout' if output_path is None else output_path
+    _log.info(f'wrote {count} {export_format} rows to: {destination}')
+
+
+if __name__ == '__main__':
+    main()
@@ -19,7 +19,10 @@ import logging
 from pathlib import Path
 import sys
 
-import rcvresults.election as election_mod
+import rcvresults.election_bundle as election_bundle
+import rcvresults.formats as formats
+import rcvresults.intermediate as intermediate
+import rcvresults.validation as validation
 
 
 _log = logging.getLogger(__name__)
@@ -41,11 +44,12 @@ class ArgumentError(Exception):
 
 # This is used to create functions to pass as the "type" argument to
 # ArgumentParser.add_argument().
-def _file_with_suffix(path, suffix, metavar):
+def _file_with_suffix(path, suffixes, metavar):
     path = Path(path)
-    if path.suffix != suffix:
+    if path.suffix not in suffixes:
         raise ArgumentError(
-            metavar, str(path), f'File path does not have suffix {suffix}',
+            metavar, str(path),
+            f'File path does not have suffix {" or ".join(suffixes)}',
         )
     if not path.exists():
         raise ArgumentError(
@@ -54,12 +58,17 @@ def _file_with_suffix(path, suffix, metavar):
     return path
 
 
-def _make_file_type(suffix, metavar):
+def _make_file_type(suffixes, metavar):
     """
     Return a function that can be passed as a "type" argument to
     ArgumentParser.add_argument().
+
+    Args:
+      suffixes: the allowed suffixes (e.g. [".yml"]).
     """
-    return functools.partial(_file_with_suffix, suffix=suffix, metavar=metavar)
+    return functools.partial(
+        _file_with_suffix, suffixes=suffixes, metavar=metavar,
+    )
 
 
 def make_arg_parser():
@@ -69,23 +78,43 @@ def make_arg_parser():
         'config_path', metavar='CONFIG_PATH', help=(
             'path to an election.yml file configuring results reporting '
             'for the election.'
-        ), type=_make_file_type('.yml', 'CONFIG_PATH'),
+        ), type=_make_file_type(['.yml'], 'CONFIG_PATH'),
     )
     parser.add_argument(
         'translations_path', metavar='TRANSLATIONS_PATH', help=(
             'path to a translations.yml file to use.'
-        ), type=_make_file_type('.yml', 'TRANSLATIONS_PATH'),
+        ), type=_make_file_type(['.yml'], 'TRANSLATIONS_PATH'),
     )
     parser.add_argument(
         'json_paths', metavar='JSON_PATH', nargs='*', help=(
-            'path to one or more json files, one per contest.'
-        ), type=_make_file_type('.json', 'JSON_PATH'),
+            'path to one or more json files, one per contest. These can '
+            'also be files in another intermediate format written by '
+            'parse_results.py (e.g. ".rcvcols" files), or election bundles '
+            '(".rcvbundle" files) of many contests.'
+        ), type=_make_file_type(
+            sorted({
+                *intermediate.FORMAT_SUFFIXES.values(),
+                election_bundle.BUNDLE_SUFFIX,
+            }), 'JSON_PATH',
+        ),
     )
     parser.add_argument(
         '--output-dir', default='output', type=Path, help=(
             'the directory to which to write the output files.'
         )
     )
+    parser.add_argument(
+        '--force', action='store_true', help=(
+            'render every contest, even contests whose data is unchanged '
+            'since they were last rendered into the output directory.'
+        ),
+    )
+    parser.add_argument(
+        '--jobs', metavar='N', type=int, default=1, help=(
+            'the number of contests to render in parallel (in separate '
+            'processes), or 0 to use one process per CPU. Defaults to: 1.'
+        ),
+    )
     return parser
 
 
@@ -110,10 +139,21 @@ def main():
     json_paths = args.json_paths
     output_dir = args.output_dir
 
+    # Check the round arithmetic before publishing anything.
+    try:
+        validation.validate_json_files(json_paths)
+    except validation.ValidationError as exc:
+        _log.error(str(exc))
+        sys.exit(1)
+
+    # Jinja2 is only imported here (when the renderer is loaded), so that
+    # e.g. --help stays fast.
+    renderer = formats.get_renderer()
     # TODO: pass css_dir.
-    election_mod.process_election(
+    renderer.process_election(
         json_paths, config_path=config_path,
         translations_path=translations_path, output_dir=output_dir,
+        force=args.force, jobs=args.jobs,
     )
 
 
@@ -11,8 +11,17 @@ import argparse
 from argparse import RawDescriptionHelpFormatter
 import logging
 from pathlib import Path
+import sys
 
+import rcvresults.archives as archives
+import rcvresults.election_bundle as election_bundle
+import rcvresults.formats as formats
+import rcvresults.intermediate as intermediate
+import rcvresults.parsers.xml as xml_parsing
 import rcvresults.parsing as parsing
+from rcvresults.results import as_contest_results
+import rcvresults.snapshots as snapshots
+import rcvresults.validation as validation
 
 
 _log = logging.getLogger('parse-results')
@@ -24,6 +33,17 @@ Generate JSON files from RCV result reports.
 
 This script parses XML or Excel result reports generated by the Dominion
 system and saves the resulting data as JSON files, one per contest.
+
+After parsing, the round arithmetic of every contest is checked (see
+rcvresults/validation.py), and the script exits with an error if any
+check fails.
+
+Reports can also be compressed (e.g. "d1_short.xml.gz" or ".xml.zst"), or
+bundled in a zip file, in which case every report in the bundle is parsed.
+
+RCTab summary files in CSV format are parsed like the other reports. To
+parse RCTab summary files in JSON format, pass "--report-format rctab"
+(which parses every report as an RCTab summary file).
 """
 
 
@@ -33,7 +53,8 @@ def make_arg_parser():
     )
     parser.add_argument(
         'report_paths', metavar='PATH', type=Path, nargs='*', help=(
-            'path to one or more XML or Excel result reports.'
+            'path to one or more XML or Excel result reports, or zip '
+            'bundles of reports.'
         ),
     )
     parser.add_argument(
@@ -42,9 +63,136 @@ def make_arg_parser():
             f'Defaults to: {DEFAULT_OUTPUT_DIR}.'
         ), default=DEFAULT_OUTPUT_DIR,
     )
+    parser.add_argument(
+        '--xml-parser', metavar='NAME', choices=xml_parsing.PARSER_NAMES,
+        default=xml_parsing.DEFAULT_PARSER_NAME, help=(
+            'the parser to use for XML reports. One of: '
+            f'{", ".join(xml_parsing.PARSER_NAMES)}. The "lxml" parser '
+            f'requires lxml to be installed. '
+            f'Defaults to: {xml_parsing.DEFAULT_PARSER_NAME}.'
+        ),
+    )
+    parser.add_argument(
+        '--report-format', metavar='NAME', choices=formats.get_format_names(),
+        help=(
+            'the format to parse every report with, instead of choosing '
+            'it by suffix. One of: '
+            f'{", ".join(formats.get_format_names())}. This is needed for '
+            'RCTab summary files in JSON format ("rctab"), since ".json" '
+            'is otherwise the suffix of the files this script writes.'
+        ),
+    )
+    parser.add_argument(
+        '--jobs', metavar='N', type=int, default=1, help=(
+            'the number of reports to parse in parallel (in separate '
+            'processes), or 0 to use one process per CPU. Defaults to: 1.'
+        ),
+    )
+    parser.add_argument(
+        '--force', action='store_true', help=(
+            'parse every report, even reports that are unchanged since '
+            'they were last parsed into the output directory.'
+        ),
+    )
+    parser.add_argument(
+        '--format', metavar='NAME', dest='output_format',
+        choices=intermediate.FORMAT_NAMES, default=intermediate.DEFAULT_FORMAT,
+        help=(
+            'the format of the files to write, one per contest. One of: '
+            f'{", ".join(intermediate.FORMAT_NAMES)}. The "json" format is '
+            'pretty-printed for reading, while "compact-json" (which uses '
+            'orjson if installed) and "columnar" (a binary format) are '
+            'faster to write and read back when rendering. '
+            f'Defaults to: {intermediate.DEFAULT_FORMAT}.'
+        ),
+    )
+    parser.add_argument(
+        '--bundle', metavar='PATH', type=Path, dest='bundle_path', help=(
+            'an optional path to which to also write an election bundle '
+            '(a single ".rcvbundle" file of all the contests, indexed by '
+            'file stem), e.g. for passing to make_reports.py. The bundle '
+            'is written only if validation passes. The election name '
+            'recorded is the name of the output directory.'
+        ),
+    )
+    parser.add_argument(
+        '--snapshot-db', metavar='PATH', type=Path, help=(
+            'an optional path to a SQLite database (created if needed) in '
+            'which to record a snapshot of every contest, as a new results '
+            'cycle. The cycle is recorded only if every report parses and '
+            'validation passes. The election name recorded is the name of '
+            'the output directory. See query_snapshots.py.'
+        ),
+    )
+    parser.add_argument(
+        '--cycle-label', metavar='LABEL', help=(
+            'an optional label for the results cycle recorded with '
+            '--snapshot-db (e.g. the release time of the reports).'
+        ),
+    )
+    parser.add_argument(
+        '--validation-report', metavar='PATH', type=Path, help=(
+            'an optional path to which to write the validation report, as '
+            'JSON.'
+        ),
+    )
     return parser
 
 
+def process_reports(
+    report_paths, output_dir, xml_parser=None, jobs=1, force=False,
+    output_format=None, validation_report=None, snapshot_db=None,
+    cycle_label=None, report_format=None,
+):
+    """
+    Parse the reports to output_dir, check the contests, and return the
+    JSON paths.
+
+    Raises parsing.ReportErrors if any report fails to parse, and
+    validation.ValidationError if any check fails. In either case,
+    nothing is recorded in the snapshot database.
+
+    Args:
+      snapshot_db: an optional path to a snapshot database in which to
+        record a snapshot of every contest, as a new results cycle, once
+        all the checks pass.
+      cycle_label: the label of the results cycle.
+      report_format: the name of the report format to parse the reports
+        with (see parsing.parse_report()).
+    """
+    # The parsed contests, keyed by JSON path. Reports skipped by the
+    # parse cache are read back from their files.
+    contests = {}
+    json_paths = parsing.make_jsons(
+        report_paths, output_dir=output_dir, xml_parser=xml_parser,
+        jobs=jobs, force=force, output_format=output_format,
+        on_parsed=contests.__setitem__, report_format=report_format,
+    )
+    # Build a ContestResults object for each contest once, for both the
+    # checks (so they run on all the contests at once with the NumPy
+    # engine, if installed) and the snapshots.
+    results_list = [
+        as_contest_results(
+            contests[path] if path in contests
+            else intermediate.read_contest(path)
+        ) for path in json_paths
+    ]
+    validation.check_contests(
+        results_list, labels=[str(path) for path in json_paths],
+        report_path=validation_report,
+    )
+
+    if snapshot_db is not None:
+        election = output_dir.name
+        with snapshots.SnapshotStore(snapshot_db) as store:
+            store.record_cycle((
+                (election, path.stem, results)
+                for path, results in zip(json_paths, results_list)
+            ), label=cycle_label)
+
+    return json_paths
+
+
 def main():
     parser = make_arg_parser()
     args = parser.parse_args()
@@ -52,10 +200,32 @@ def main():
     log_format = '[{levelname}] {name}: {message}'
     logging.basicConfig(format=log_format, style='{', level=logging.INFO)
 
-    report_paths = args.report_paths
+    suffixes = formats.get_report_suffixes(args.report_format)
+    report_paths = list(
+        archives.expand_bundles(args.report_paths, suffixes=suffixes)
+    )
     output_dir = Path(args.output_dir)
 
-    parsing.make_jsons(report_paths, output_dir=output_dir)
+    try:
+        json_paths = process_reports(
+            report_paths, output_dir=output_dir, xml_parser=args.xml_parser,
+            jobs=args.jobs, force=args.force,
+            output_format=args.output_format,
+            validation_report=args.validation_report,
+            snapshot_db=args.snapshot_db, cycle_label=args.cycle_label,
+            report_format=args.report_format,
+        )
+    except parsing.ReportErrors as exc:
+        _log.error(exc.make_report())
+        sys.exit(1)
+    except validation.ValidationError as exc:
+        _log.error(str(exc))
+        sys.exit(1)
+
+    if args.bundle_path is not None:
+        election_bundle.write_bundle_from_files(
+            args.bundle_path, json_paths, election=output_dir.name,
+        )
 
 
 if __name__ == '__main__':
@@ -0,0 +1,158 @@
+"""
+Script to query a snapshot database written by parse_results.py or
+build_demo.py (with the --snapshot-db option).
+
+Usage:
+
+  $ python src/rcvresults/scripts/query_snapshots.py --help
+
+For example (this should work from the repo root):
+
+  $ python src/rcvresults/scripts/query_snapshots.py --db snapshots.db \\
+        series 2019-11-05 20191125_d5_short --row "DEAN PRESTON"
+
+"""
+
+import argparse
+from argparse import RawDescriptionHelpFormatter
+import json
+import logging
+from pathlib import Path
+import sys
+
+from rcvresults.results import ROUND_FIELDS
+from rcvresults.snapshots import SnapshotStore
+
+
+_log = logging.getLogger('query-snapshots')
+
+DESCRIPTION = """\
+Query a snapshot database, and write the result to stdout as JSON.
+
+The subcommands are:
+
+  cycles: list the results cycles.
+  contests: list the (election, contest) pairs with snapshots.
+  latest: show the most recent snapshot of a contest.
+  deltas: show how a contest's values changed from cycle to cycle.
+  series: show the value of a row (e.g. a candidate) across cycles.
+"""
+
+
+def _add_contest_args(parser):
+    parser.add_argument(
+        'election', help='the election name, e.g. "2022-11-08".',
+    )
+    parser.add_argument(
+        'contest', help='the contest file stem, e.g. "da_short".',
+    )
+
+
+def _add_value_args(parser, row_required=False):
+    parser.add_argument(
+        '--row', metavar='NAME', dest='row_name', required=row_required,
+        help='the row name (e.g. a candidate name or "exhausted").',
+    )
+    parser.add_argument(
+        '--round', metavar='NUMBER', dest='round_number', type=int,
+        help='the 1-based round number.',
+    )
+    parser.add_argument(
+        '--field', choices=ROUND_FIELDS, default='votes',
+        help='the round field to query. Defaults to: %(default)s.',
+    )
+
+
+def make_arg_parser():
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION, formatter_class=RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '--db', metavar='PATH', type=Path, required=True,
+        help='the path to the snapshot database.',
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('cycles', help='list the results cycles.')
+
+    contests_parser = subparsers.add_parser(
+        'contests', help='list the contests with snapshots.',
+    )
+    contests_parser.add_argument(
+        'election', nargs='?', help='an optional election to restrict to.',
+    )
+
+    latest_parser = subparsers.add_parser(
+        'latest', help='show the most recent snapshot of a contest.',
+    )
+    _add_contest_args(latest_parser)
+
+    deltas_parser = subparsers.add_parser(
+        'deltas', help="show how a contest's values changed across cycles.",
+    )
+    _add_contest_args(deltas_parser)
+    _add_value_args(deltas_parser)
+    deltas_parser.add_argument(
+        '--changed-only', action='store_true',
+        help='include only the values that changed.',
+    )
+
+    series_parser = subparsers.add_parser(
+        'series', help='show the value of a row across cycles.',
+    )
+    _add_contest_args(series_parser)
+    _add_value_args(series_parser, row_required=True)
+
+    return parser
+
+
+def run_query(store, args):
+    """
+    Run the query given by the command-line args, and return the result.
+    """
+    command = args.command
+    if command == 'cycles':
+        return store.get_cycles()
+    if command == 'contests':
+        return store.get_contests(election=args.election)
+    if command == 'latest':
+        return store.get_latest_snapshot(args.election, args.contest)
+    if command == 'deltas':
+        return store.get_deltas(
+            args.election, args.contest, field=args.field,
+            row_name=args.row_name, round_number=args.round_number,
+            changed_only=args.changed_only,
+        )
+    if command == 'series':
+        return store.get_time_series(
+            args.election, args.contest, row_name=args.row_name,
+            round_number=args.round_number, field=args.field,
+        )
+
+    raise RuntimeError(f'unknown command: {command!r}')
+
+
+def main():
+    parser = make_arg_parser()
+    args = parser.parse_args()
+
+    log_format = '[{levelname}] {name}: {message}'
+    logging.basicConfig(format=log_format, style='{', level=logging.WARNING)
+
+    if not args.db.exists():
+        _log.error(f'snapshot database not found: {args.db}')
+        sys.exit(1)
+
+    with SnapshotStore(args.db) as store:
+        result = run_query(store, args)
+
+    if result is None:
+        _log.error(f'no snapshots of contest: {args.election}/{args.contest}')
+        sys.exit(1)
+
+    json.dump(result, sys.stdout, indent='    ', ensure_ascii=False)
+    print()
+
+
+if __name__ == '__main__':
+    main()
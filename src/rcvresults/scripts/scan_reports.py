@@ -0,0 +1,114 @@
+"""
+Script to list the contest and candidate names in RCV result reports,
+without parsing the vote totals.
+
+Usage:
+
+  $ python src/rcvresults/scripts/scan_reports.py --help
+
+For example (this should work from the repo root):
+
+  $ python src/rcvresults/scripts/scan_reports.py data/input-reports/2022-11-08
+
+"""
+
+import argparse
+from argparse import RawDescriptionHelpFormatter
+import json
+import logging
+from pathlib import Path
+import sys
+
+import rcvresults.archives as archives
+import rcvresults.formats as formats
+import rcvresults.parsing as parsing
+import rcvresults.utils as utils
+
+
+_log = logging.getLogger('scan-reports')
+
+DESCRIPTION = """\
+List the contest and candidate names in RCV result reports.
+
+Only the start of each report is read (up to the candidate names), so
+this is much faster than parsing the reports, e.g. for checking what a
+directory of reports contains before generating the JSON.
+"""
+
+
+def iter_report_paths(paths, report_format=None):
+    """
+    Yield the report paths, expanding any directories and zip bundles
+    into the reports they contain.
+
+    Args:
+      report_format: the name of the report format selected explicitly
+        (e.g. "rctab"), if any, in which case the reports are the files
+        with the suffixes of that format. Otherwise, they are the files
+        with the suffix of any report format (see
+        formats.get_report_suffixes()).
+    """
+    suffixes = formats.get_report_suffixes(report_format)
+    for path in archives.expand_bundles(paths, suffixes=suffixes):
+        if not (isinstance(path, Path) and path.is_dir()):
+            yield path
+            continue
+
+        for suffix in suffixes:
+            yield from utils.get_paths(path, suffix=suffix)
+
+
+def make_arg_parser():
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION, formatter_class=RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        'paths', metavar='PATH', type=Path, nargs='+', help=(
+            'path to one or more XML or Excel result reports, or to a '
+            'directory or zip bundle containing them.'
+        ),
+    )
+    parser.add_argument(
+        '--report-format', metavar='NAME', choices=formats.get_format_names(),
+        help=(
+            'the format to read every report with, instead of choosing it '
+            'by suffix. One of: '
+            f'{", ".join(formats.get_format_names())}, e.g. "rctab" for '
+            'RCTab summary files in JSON format.'
+        ),
+    )
+    parser.add_argument(
+        '--json', action='store_true', help=(
+            'write the metadata as a JSON list instead of as text.'
+        ),
+    )
+    return parser
+
+
+def main():
+    parser = make_arg_parser()
+    args = parser.parse_args()
+
+    log_format = '[{levelname}] {name}: {message}'
+    logging.basicConfig(format=log_format, style='{', level=logging.WARNING)
+
+    all_metadata = []
+    report_format = args.report_format
+    for path in iter_report_paths(args.paths, report_format=report_format):
+        metadata = parsing.scan_report_metadata(
+            path, report_format=report_format,
+        )
+        if args.json:
+            all_metadata.append({'path': str(path), **metadata})
+            continue
+
+        candidates = ', '.join(metadata['candidate_names'])
+        print(f'{path}: {metadata["contest_name"]} ({candidates})')
+
+    if args.json:
+        json.dump(all_metadata, sys.stdout, indent='    ', ensure_ascii=False)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,455 @@
+"""
+Supports keeping the results of every results cycle in an append-only
+SQLite database, so the results of a contest can be compared across
+cycles (e.g. how the final round of a contest changed).
+
+Each call to SnapshotStore.record_cycle() records a cycle, in which each
+contest is recorded as one snapshot, with its rows and round values
+stored in indexed tables. Rows are never updated or deleted
+(triggers in the database enforce this), so the database keeps the full
+history. The query methods (e.g. get_latest_snapshot(), get_deltas(), and
+get_time_series()) look up a contest by its election and file stem using
+the indexes, rather than scanning any files.
+
+This uses only the sqlite3 module in the standard library, so it works
+locally with no database server.
+"""
+
+from datetime import datetime, timezone
+import json
+import logging
+import sqlite3
+
+from rcvresults.results import as_mapping, ROUND_FIELDS
+
+
+_log = logging.getLogger(__name__)
+
+# The version of the database schema, stored in "PRAGMA user_version".
+SCHEMA_VERSION = 1
+
+_TABLES = ['cycles', 'snapshots', 'snapshot_rows', 'round_values']
+
+_SCHEMA = """\
+CREATE TABLE IF NOT EXISTS cycles (
+    cycle_id INTEGER PRIMARY KEY,
+    label TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    snapshot_id INTEGER PRIMARY KEY,
+    cycle_id INTEGER NOT NULL REFERENCES cycles (cycle_id),
+    election TEXT NOT NULL,
+    contest TEXT NOT NULL,
+    contest_name TEXT,
+    round_count INTEGER NOT NULL,
+    highest_round INTEGER,
+    leading_candidates TEXT,
+    -- This is also the index for looking up a contest's snapshots.
+    UNIQUE (election, contest, cycle_id)
+);
+CREATE TABLE IF NOT EXISTS snapshot_rows (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (snapshot_id),
+    row_index INTEGER NOT NULL,
+    row_name TEXT NOT NULL,
+    -- The index in candidate_names, or NULL if the row isn't a candidate.
+    candidate_index INTEGER,
+    PRIMARY KEY (snapshot_id, row_index)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS round_values (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (snapshot_id),
+    row_name TEXT NOT NULL,
+    round_number INTEGER NOT NULL,
+    votes REAL,
+    percent REAL,
+    transfer REAL,
+    PRIMARY KEY (snapshot_id, row_name, round_number)
+) WITHOUT ROWID;
+"""
+
+_TRIGGER_TEMPLATE = """\
+CREATE TRIGGER IF NOT EXISTS {table}_no_{action}
+BEFORE {action} ON {table}
+BEGIN
+    SELECT RAISE(ABORT, 'snapshots are append-only');
+END;
+"""
+
+_SNAPSHOT_COLUMNS = (
+    'snapshot_id', 'cycle_id', 'election', 'contest', 'contest_name',
+    'round_count', 'highest_round', 'leading_candidates',
+)
+
+
+def _make_schema():
+    triggers = ''.join(
+        _TRIGGER_TEMPLATE.format(table=table, action=action)
+        for table in _TABLES for action in ('UPDATE', 'DELETE')
+    )
+    return _SCHEMA + triggers
+
+
+def _to_real(value):
+    """
+    Return a round value as a float, or None if it isn't a number (e.g.
+    None or an empty string).
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def _check_field(field):
+    # Field names are put directly into the SQL, so check them first.
+    if field not in ROUND_FIELDS:
+        raise ValueError(f'unknown field: {field!r}')
+
+
+class SnapshotCycle:
+
+    """
+    A results cycle that snapshots are being added to.
+
+    Attributes:
+      store: the SnapshotStore.
+      cycle_id: the integer id of the cycle.
+    """
+
+    def __init__(self, store, cycle_id):
+        self.store = store
+        self.cycle_id = cycle_id
+
+    def __repr__(self):
+        return f'<SnapshotCycle: {self.cycle_id}>'
+
+    def add(self, election, contest, results):
+        """
+        Record a snapshot of a contest in this cycle.
+
+        Args:
+          election: the election the contest is in (e.g. its directory
+            name, like "2022-11-08").
+          contest: the contest's file stem (e.g. "d5_short").
+          results: a results dict or ContestResults object.
+        """
+        return self.store.add_snapshot(
+            self.cycle_id, election=election, contest=contest, results=results,
+        )
+
+
+class SnapshotStore:
+
+    """
+    An append-only SQLite database of contest snapshots, one per contest
+    per results cycle.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+          path: the path to the database file, which is created if it
+            doesn't exist (or ":memory:" for an in-memory database).
+        """
+        self.path = path
+        self.connection = sqlite3.connect(str(path))
+        self.connection.row_factory = sqlite3.Row
+        self._initialize()
+
+    def __repr__(self):
+        return f'<SnapshotStore: {self.path}>'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _initialize(self):
+        connection = self.connection
+        connection.execute('PRAGMA foreign_keys = ON')
+        version = connection.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise RuntimeError(
+                f'unsupported snapshot database version {version} '
+                f'(expected {SCHEMA_VERSION}): {self.path}'
+            )
+        with connection:
+            connection.executescript(_make_schema())
+            connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _insert_cycle(self, connection, label, created_at):
+        if created_at is None:
+            created_at = datetime.now(timezone.utc)
+        cursor = connection.execute(
+            'INSERT INTO cycles (label, created_at) VALUES (?, ?)',
+            (label, created_at.isoformat()),
+        )
+        return cursor.lastrowid
+
+    def _insert_snapshot(self, connection, cycle_id, election, contest, results):
+        results = as_mapping(results)
+        row_names = results['row_names']
+        candidate_indexes = {
+            name: index for index, name in enumerate(results['candidate_names'])
+        }
+        rounds = results['rounds']
+        round_count = max((len(rounds[name]) for name in row_names), default=0)
+        leading_candidates = results.get('leading_candidates')
+        if leading_candidates is not None:
+            leading_candidates = json.dumps(leading_candidates)
+
+        cursor = connection.execute(
+            'INSERT INTO snapshots (cycle_id, election, contest, '
+            'contest_name, round_count, highest_round, leading_candidates) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', (
+                cycle_id, election, contest,
+                results['_metadata'].get('contest_name'), round_count,
+                results.get('highest_round'), leading_candidates,
+            ),
+        )
+        snapshot_id = cursor.lastrowid
+        connection.executemany(
+            'INSERT INTO snapshot_rows VALUES (?, ?, ?, ?)', (
+                (snapshot_id, row_index, name, candidate_indexes.get(name))
+                for row_index, name in enumerate(row_names)
+            ),
+        )
+        connection.executemany(
+            'INSERT INTO round_values VALUES (?, ?, ?, ?, ?, ?)', (
+                (snapshot_id, name, round_number,
+                 *(_to_real(round_data[field]) for field in ROUND_FIELDS))
+                for name in row_names
+                for round_number, round_data in enumerate(rounds[name], start=1)
+            ),
+        )
+        return snapshot_id
+
+    def start_cycle(self, label=None, created_at=None):
+        """
+        Start a new results cycle, and return a SnapshotCycle object.
+
+        To record a whole cycle at once (so a failure part way through
+        leaves no partial cycle behind), use record_cycle() instead.
+
+        Args:
+          label: an optional label for the cycle (e.g. the report
+            release time).
+          created_at: the time of the cycle, as a datetime. Defaults to
+            the current time (in UTC).
+        """
+        with self.connection as connection:
+            cycle_id = self._insert_cycle(
+                connection, label=label, created_at=created_at,
+            )
+        _log.info(f'started snapshot cycle {cycle_id} (label: {label!r})')
+        return SnapshotCycle(self, cycle_id)
+
+    def add_snapshot(self, cycle_id, election, contest, results):
+        """
+        Record a snapshot of a contest, and return its snapshot id.
+
+        See SnapshotCycle.add() for the arguments.
+        """
+        with self.connection as connection:
+            return self._insert_snapshot(
+                connection, cycle_id, election=election, contest=contest,
+                results=results,
+            )
+
+    def record_cycle(self, contests, label=None, created_at=None):
+        """
+        Record a new results cycle with a snapshot of each of the given
+        contests, in a single transaction, and return the cycle id.
+
+        If recording any snapshot fails, nothing is recorded (not even
+        the cycle).
+
+        Args:
+          contests: an iterable of (election, contest, results) tuples
+            (see SnapshotCycle.add()).
+          label: see start_cycle().
+          created_at: see start_cycle().
+        """
+        count = 0
+        with self.connection as connection:
+            cycle_id = self._insert_cycle(
+                connection, label=label, created_at=created_at,
+            )
+            for election, contest, results in contests:
+                self._insert_snapshot(
+                    connection, cycle_id, election=election, contest=contest,
+                    results=results,
+                )
+                count += 1
+
+        _log.info(
+            f'recorded {count} snapshots in cycle {cycle_id} (label: {label!r})'
+        )
+        return cycle_id
+
+    def get_cycles(self):
+        """
+        Return the cycles, as a list of dicts, from oldest to newest.
+        """
+        cursor = self.connection.execute(
+            'SELECT cycle_id, label, created_at FROM cycles ORDER BY cycle_id'
+        )
+        return [dict(row) for row in cursor]
+
+    def get_contests(self, election=None):
+        """
+        Return the (election, contest) pairs that have snapshots, sorted.
+        """
+        sql = 'SELECT DISTINCT election, contest FROM snapshots'
+        params = ()
+        if election is not None:
+            sql += ' WHERE election = ?'
+            params = (election, )
+        sql += ' ORDER BY election, contest'
+        return [tuple(row) for row in self.connection.execute(sql, params)]
+
+    def _read_snapshot(self, row):
+        snapshot = {name: row[name] for name in _SNAPSHOT_COLUMNS}
+        leading_candidates = snapshot['leading_candidates']
+        if leading_candidates is not None:
+            snapshot['leading_candidates'] = json.loads(leading_candidates)
+        snapshot['cycle_label'] = row['label']
+        snapshot['created_at'] = row['created_at']
+
+        snapshot_id = snapshot['snapshot_id']
+        cursor = self.connection.execute(
+            'SELECT row_name, candidate_index FROM snapshot_rows '
+            'WHERE snapshot_id = ? ORDER BY row_index', (snapshot_id, ),
+        )
+        row_names = []
+        candidate_indexes = {}
+        for row_name, candidate_index in cursor:
+            row_names.append(row_name)
+            if candidate_index is not None:
+                candidate_indexes[row_name] = candidate_index
+        candidate_names = sorted(candidate_indexes, key=candidate_indexes.get)
+        rounds = {name: [] for name in row_names}
+        cursor = self.connection.execute(
+            'SELECT row_name, votes, percent, transfer FROM round_values '
+            'WHERE snapshot_id = ? ORDER BY row_name, round_number',
+            (snapshot_id, ),
+        )
+        for row_name, *values in cursor:
+            rounds[row_name].append(dict(zip(ROUND_FIELDS, values)))
+
+        snapshot.update({
+            'candidate_names': candidate_names,
+            'row_names': row_names,
+            'rounds': rounds,
+        })
+        return snapshot
+
+    def get_latest_snapshot(self, election, contest):
+        """
+        Return the most recent snapshot of a contest, as a dict (or None
+        if there are none).
+
+        The dict has the snapshot's columns (e.g. "cycle_id" and
+        "contest_name"), the cycle's "cycle_label" and "created_at", and
+        "candidate_names", "row_names", and "rounds" values like those of
+        a results dict (with None for values that weren't numbers).
+        """
+        row = self.connection.execute(
+            'SELECT snapshots.*, cycles.label, cycles.created_at '
+            'FROM snapshots JOIN cycles USING (cycle_id) '
+            'WHERE election = ? AND contest = ? '
+            'ORDER BY cycle_id DESC LIMIT 1', (election, contest),
+        ).fetchone()
+        if row is None:
+            return None
+
+        return self._read_snapshot(row)
+
+    def get_deltas(
+        self, election, contest, field='votes', row_name=None,
+        round_number=None, changed_only=False,
+    ):
+        """
+        Return how a contest's values changed from each cycle to the next
+        cycle with a snapshot of the contest, as a list of dicts ordered
+        by cycle, row name, and round number.
+
+        Each dict has keys "cycle_id", "previous_cycle_id", "row_name",
+        "round_number", "value", "previous_value", and "delta" (which is
+        None if either value is None).
+
+        Args:
+          field: the field to compare, e.g. "votes" or "percent".
+          row_name: an optional row name (e.g. a candidate) to restrict to.
+          round_number: an optional 1-based round number to restrict to.
+          changed_only: whether to include only the values that changed.
+        """
+        _check_field(field)
+        conditions = ['election = ?', 'contest = ?']
+        params = [election, contest]
+        if row_name is not None:
+            conditions.append('row_name = ?')
+            params.append(row_name)
+        if round_number is not None:
+            conditions.append('round_number = ?')
+            params.append(round_number)
+
+        sql = (
+            f'SELECT cycle_id, row_name, round_number, {field} AS value, '
+            f'LAG(cycle_id) OVER w AS previous_cycle_id, '
+            f'LAG({field}) OVER w AS previous_value '
+            'FROM snapshots JOIN round_values USING (snapshot_id) '
+            f'WHERE {" AND ".join(conditions)} '
+            'WINDOW w AS (PARTITION BY row_name, round_number ORDER BY cycle_id) '
+            'ORDER BY cycle_id, row_name, round_number'
+        )
+        deltas = []
+        for row in self.connection.execute(sql, params):
+            if row['previous_cycle_id'] is None:
+                # Then this is the contest's first snapshot.
+                continue
+            value, previous_value = row['value'], row['previous_value']
+            if value is None or previous_value is None:
+                delta = None
+            else:
+                delta = value - previous_value
+            if changed_only and value == previous_value:
+                continue
+            deltas.append({
+                'cycle_id': row['cycle_id'],
+                'delta': delta,
+                'previous_cycle_id': row['previous_cycle_id'],
+                'previous_value': previous_value,
+                'round_number': row['round_number'],
+                'row_name': row['row_name'],
+                'value': value,
+            })
+
+        return deltas
+
+    def get_time_series(
+        self, election, contest, row_name, round_number=None, field='votes',
+    ):
+        """
+        Return the value of a row in a round across cycles, as a list of
+        (cycle_id, cycle_label, value) tuples from oldest to newest.
+
+        Args:
+          round_number: the 1-based round number. Defaults to the final
+            round of each snapshot (its highest round).
+          field: the field to return, e.g. "votes" or "percent".
+        """
+        _check_field(field)
+        sql = (
+            f'SELECT cycle_id, cycles.label, round_values.{field} '
+            'FROM snapshots JOIN cycles USING (cycle_id) '
+            'JOIN round_values ON round_values.snapshot_id = snapshots.snapshot_id '
+            'AND round_values.row_name = ? AND round_values.round_number = '
+            'COALESCE(?, snapshots.highest_round, snapshots.round_count) '
+            'WHERE election = ? AND contest = ? ORDER BY cycle_id'
+        )
+        params = (row_name, round_number, election, contest)
+        return [tuple(row) for row in self.connection.execute(sql, params)]
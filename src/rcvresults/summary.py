@@ -0,0 +1,300 @@
+"""
+Supports computing the summary data of RCV contests, e.g. each
+candidate's highest round and vote total, and the leading candidates.
+
+There are two engines. The NumPy engine computes the summaries of any
+number of contests at once, from a single contests x candidates x rounds
+array of vote totals (padded with NaN). The Python engine loops over the
+rounds of each candidate, and is used if NumPy isn't installed (see
+get_default_engine() for when each is used by default). Both give the
+same results, including raising AssertionError if a candidate's vote
+total decreases from one round to the next.
+"""
+
+from rcvresults.results import as_mapping, ContestResults, to_number
+from rcvresults.utils import import_numpy
+
+
+ENGINE_NUMPY = 'numpy'
+ENGINE_PYTHON = 'python'
+
+
+def make_candidate_summary(rounds, name):
+    # Initialize highest_round to 1 in case the candidate has zero
+    # votes in the first round.
+    highest_round = 1
+    highest_vote = 0
+    for round_number, round_data in enumerate(rounds, start=1):
+        votes = round_data['votes']
+        if not votes:
+            # Then the candidate had zero votes in the first round or is
+            # eliminated in this round.
+            break
+
+        highest_round = round_number
+        # The vote totals should only stay the same or increase.
+        if votes < highest_vote:
+            raise AssertionError(
+                f'votes decreased in round {round_number} for {name!r}: '
+                f'{votes} < {highest_vote}'
+            )
+        highest_vote = votes
+
+    summary = {
+        'highest_round': highest_round,
+        'highest_vote': highest_vote,
+    }
+    return summary
+
+
+def _finish_summary(candidates, candidate_summaries, highest_round):
+    """
+    Set the elimination rounds, and return the contest summary dict.
+
+    Args:
+      candidates: the candidate names, in report order.
+      candidate_summaries: a dict mapping candidate name to the dict
+        returned by make_candidate_summary().
+    """
+    # Set the elimination_round for each candidate.
+    for name, candidate_summary in candidate_summaries.items():
+        highest_candidate_round = candidate_summary['highest_round']
+        if highest_candidate_round != highest_round:
+            # Then the candidate was eliminated in their highest round.
+            candidate_summary['elimination_round'] = highest_candidate_round
+
+    vote_totals = {
+        name: summary['highest_vote'] for name, summary in
+        candidate_summaries.items()
+    }
+    def sort_key(name):
+        return vote_totals[name]
+
+    # Sort candidates from highest to lowest vote total.
+    candidates = sorted(candidates, key=sort_key, reverse=True)
+
+    highest_vote = max(vote_totals.values())
+    # Use a list in case more than one candidate is tied.
+    leading_candidates = [
+        name for name, total in vote_totals.items() if total == highest_vote
+    ]
+    return {
+        'candidate_summaries': candidate_summaries,
+        'candidate_names': candidates,
+        'highest_round': highest_round,
+        'leading_candidates': leading_candidates,
+    }
+
+
+def _summarize_contest_python(results):
+    candidates = results['candidate_names']
+    rounds = results['rounds']
+    candidate_summaries = {}
+    for name in candidates:
+        candidate_rounds = rounds[name]
+        candidate_summaries[name] = make_candidate_summary(
+            candidate_rounds, name=name,
+        )
+
+    highest_round = max(
+        summary['highest_round'] for summary in candidate_summaries.values()
+    )
+    return _finish_summary(
+        candidates, candidate_summaries=candidate_summaries,
+        highest_round=highest_round,
+    )
+
+
+class _ContestVotes:
+
+    """
+    The candidate vote totals of a contest, for the NumPy engine.
+
+    Attributes:
+      candidates: the candidate names.
+      matrix: a candidates x rounds array of the vote totals, with NaN
+        for values that aren't numbers.
+    """
+
+    def __init__(self, np, results):
+        self.results = results
+        mapping = as_mapping(results)
+        self.candidates = mapping['candidate_names']
+        if not self.candidates:
+            raise ValueError(
+                f'contest has no candidates: {mapping["_metadata"]}'
+            )
+
+        if isinstance(results, ContestResults):
+            # Read the candidate rows of the votes column without copying.
+            all_rows = np.frombuffer(results.votes).reshape(
+                len(results.row_names), results.round_count,
+            )
+            row_indexes = [
+                results.get_row_index(name) for name in self.candidates
+            ]
+            self.matrix = all_rows[row_indexes]
+            return
+
+        rounds = results['rounds']
+        self.vote_rows = [
+            [round_data['votes'] for round_data in rounds[name]]
+            for name in self.candidates
+        ]
+        round_count = max(len(row) for row in self.vote_rows)
+        matrix = np.full((len(self.candidates), round_count), np.nan)
+        for candidate_index, row in enumerate(self.vote_rows):
+            matrix[candidate_index, :len(row)] = [
+                to_number(value) for value in row
+            ]
+        self.matrix = matrix
+
+    def get_votes(self, candidate_index, round_index):
+        """
+        Return the original vote value (e.g. rather than the float in the
+        matrix), so the output is the same as the Python engine's.
+        """
+        if isinstance(self.results, ContestResults):
+            name = self.candidates[candidate_index]
+            return self.results.get_value('votes', name, round_index)
+
+        return self.vote_rows[candidate_index][round_index]
+
+
+def _make_vote_array(np, contest_votes_list):
+    """
+    Return a contests x candidates x rounds array of the vote totals,
+    padded with NaN.
+    """
+    candidate_count = max(
+        votes.matrix.shape[0] for votes in contest_votes_list
+    )
+    # Include at least one round so the argmin() below is defined.
+    round_count = max(
+        max(votes.matrix.shape[1] for votes in contest_votes_list), 1,
+    )
+    shape = (len(contest_votes_list), candidate_count, round_count)
+    array = np.full(shape, np.nan)
+    for contest_index, contest_votes in enumerate(contest_votes_list):
+        rows, columns = contest_votes.matrix.shape
+        array[contest_index, :rows, :columns] = contest_votes.matrix
+    return array
+
+
+def _summarize_contests_numpy(np, results_list):
+    contest_votes_list = [_ContestVotes(np, results) for results in results_list]
+    votes = _make_vote_array(np, contest_votes_list)
+    contest_count, candidate_count, round_count = votes.shape
+    # Whether each candidate has a (non-zero) vote total in each round.
+    # A candidate's rounds end at their first round without one.
+    has_votes = ~np.isnan(votes) & (votes != 0)
+    # The number of rounds each candidate has votes in (before their
+    # first round without votes).
+    vote_round_counts = np.where(
+        has_votes.all(axis=2), round_count, has_votes.argmin(axis=2),
+    )
+
+    # The vote totals should only stay the same or increase.
+    round_indexes = np.arange(1, round_count)
+    decreased = (
+        (votes[..., 1:] < votes[..., :-1])
+        & (round_indexes < vote_round_counts[..., None])
+    )
+    if decreased.any():
+        # Report the same error as make_candidate_summary() would for the
+        # first decrease (by contest, then candidate, then round).
+        contest_index, candidate_index, round_index = np.argwhere(decreased)[0]
+        contest_votes = contest_votes_list[contest_index]
+        name = contest_votes.candidates[candidate_index]
+        round_votes, highest_vote = (
+            contest_votes.get_votes(candidate_index, round_index=index)
+            for index in (round_index + 1, round_index)
+        )
+        round_number = round_index + 2
+        raise AssertionError(
+            f'votes decreased in round {round_number} for {name!r}: '
+            f'{round_votes} < {highest_vote}'
+        )
+
+    highest_rounds = np.maximum(vote_round_counts, 1)
+    # Exclude the padding rows when taking the maximum.
+    candidate_counts = np.array([
+        len(contest_votes.candidates) for contest_votes in contest_votes_list
+    ])
+    is_candidate = np.arange(candidate_count) < candidate_counts[:, None]
+    contest_highest_rounds = np.where(is_candidate, highest_rounds, 0).max(axis=1)
+
+    # Convert to lists once, rather than indexing the arrays per item.
+    vote_round_counts = vote_round_counts.tolist()
+    highest_rounds = highest_rounds.tolist()
+    contest_highest_rounds = contest_highest_rounds.tolist()
+
+    summaries = []
+    for contest_index, contest_votes in enumerate(contest_votes_list):
+        candidate_summaries = {}
+        for candidate_index, name in enumerate(contest_votes.candidates):
+            count = vote_round_counts[contest_index][candidate_index]
+            if count:
+                highest_vote = contest_votes.get_votes(
+                    candidate_index, round_index=count - 1,
+                )
+            else:
+                highest_vote = 0
+            candidate_summaries[name] = {
+                'highest_round': highest_rounds[contest_index][candidate_index],
+                'highest_vote': highest_vote,
+            }
+
+        summary = _finish_summary(
+            contest_votes.candidates, candidate_summaries=candidate_summaries,
+            highest_round=contest_highest_rounds[contest_index],
+        )
+        summaries.append(summary)
+
+    return summaries
+
+
+def get_default_engine(results_list):
+    """
+    Return the engine to use by default for the given contests.
+
+    The NumPy engine is used for ContestResults objects (whose vote
+    columns it reads without copying) if NumPy is installed. For results
+    dicts, the vote values have to be read one at a time anyway, and the
+    Python engine is faster than building the arrays.
+    """
+    if not all(isinstance(results, ContestResults) for results in results_list):
+        return ENGINE_PYTHON
+
+    return ENGINE_PYTHON if import_numpy() is None else ENGINE_NUMPY
+
+
+def summarize_contests(results_list, engine=None):
+    """
+    Compute the summary data of one or more contests, and return a list
+    of dicts, one per contest, of the keys to add to each results dict.
+
+    Args:
+      results_list: a list of results dicts (as returned by the parsers)
+        or ContestResults objects.
+      engine: ENGINE_NUMPY or ENGINE_PYTHON. Defaults to the return value
+        of get_default_engine().
+    """
+    if engine is None:
+        engine = get_default_engine(results_list)
+
+    if engine == ENGINE_PYTHON:
+        return [
+            _summarize_contest_python(as_mapping(results))
+            for results in results_list
+        ]
+    if engine != ENGINE_NUMPY:
+        raise ValueError(f'unknown summary engine: {engine!r}')
+
+    np = import_numpy()
+    if np is None:
+        raise RuntimeError('NumPy must be installed to use the numpy engine')
+    if not results_list:
+        return []
+
+    return _summarize_contests_numpy(np, results_list)
@@ -0,0 +1,264 @@
+"""
+Supports loading the Jinja2 templates without compiling them from
+scratch on every run.
+
+The templates are loaded in one of two ways:
+
+  * From precompiled modules, if precompile_templates() has been run for
+    the current template sources. It compiles the templates to Python
+    modules in a subdirectory of the cache directory named after the
+    hash of all the template sources (see hash_templates()), which are
+    then loaded with a jinja2.ModuleLoader. Since the name depends on
+    the sources, modules compiled from older sources are never used.
+  * Otherwise, from the templates directory, with a bytecode cache
+    (SourceHashBytecodeCache) that stores the compiled code of each
+    template in a file named after the hash of the template's source.
+    So each version of a template is only compiled once.
+
+Both hashes also include the Environment options that change the
+compiled code (see describe_compile_options()), e.g. autoescape, so
+code compiled with other options is never used either.
+
+The templates directory is found relative to this file (rather than to
+the current working directory), so the code can be run from anywhere.
+"""
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+import shutil
+import sys
+
+import jinja2
+from jinja2 import (
+    ChoiceLoader, FileSystemBytecodeCache, FileSystemLoader, ModuleLoader,
+)
+from jinja2.bccache import Bucket
+
+
+_log = logging.getLogger(__name__)
+
+# The repo's "templates" directory.
+TEMPLATES_DIR = Path(__file__).resolve().parents[2] / 'templates'
+
+# The environment variable to set to use a different cache directory.
+CACHE_DIR_ENV_VAR = 'RCVRESULTS_TEMPLATE_CACHE'
+DEFAULT_CACHE_DIR = TEMPLATES_DIR.parent / '.template-cache'
+
+BYTECODE_DIR_NAME = 'bytecode'
+COMPILED_DIR_NAME = 'compiled'
+
+# The attributes of a jinja2.Environment that the compiled code of its
+# templates depends on, other than the autoescape setting, finalize
+# function, and extensions (see describe_compile_options()).
+COMPILE_OPTION_NAMES = [
+    'block_start_string', 'block_end_string', 'variable_start_string',
+    'variable_end_string', 'comment_start_string', 'comment_end_string',
+    'line_statement_prefix', 'line_comment_prefix', 'trim_blocks',
+    'lstrip_blocks', 'newline_sequence', 'keep_trailing_newline',
+    'optimized', 'is_async',
+]
+
+
+def get_cache_dir():
+    """
+    Return the cache directory, as a Path object.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if cache_dir:
+        return Path(cache_dir)
+    return DEFAULT_CACHE_DIR
+
+
+def iter_template_sources(templates_dir=None):
+    """
+    Yield a (name, source) pair for each template in the templates
+    directory, in name order.
+    """
+    if templates_dir is None:
+        templates_dir = TEMPLATES_DIR
+    loader = FileSystemLoader(templates_dir)
+    for name in loader.list_templates():
+        source, _, _ = loader.get_source(None, name)
+        yield (name, source)
+
+
+def _make_options_env(env_options=None):
+    """
+    Return a jinja2.Environment with the given options, for passing to
+    describe_compile_options().
+    """
+    if env_options is None:
+        env_options = {}
+    return jinja2.Environment(**env_options)
+
+
+def describe_compile_options(env, name):
+    """
+    Return a string describing the options of a jinja2.Environment that
+    the compiled code of a template depends on (e.g. the delimiters, the
+    whitespace settings, autoescape, and the extensions).
+
+    Args:
+      name: the name of the template, since autoescape can depend on it
+        (e.g. if it was set with jinja2.select_autoescape()).
+    """
+    autoescape = env.autoescape
+    if callable(autoescape):
+        autoescape = autoescape(name)
+    values = [getattr(env, option) for option in COMPILE_OPTION_NAMES]
+    values.extend([
+        bool(autoescape),
+        getattr(env.finalize, '__qualname__', None),
+        # The extensions are keyed by their import names.
+        sorted(env.extensions),
+    ])
+    return repr(values)
+
+
+def hash_templates(templates_dir=None, env=None):
+    """
+    Return the SHA-256 hex digest of the template sources, together with
+    the Jinja2 and Python versions and the options of the environment
+    (which the compiled code depends on).
+
+    Args:
+      env: the jinja2.Environment the templates are compiled with.
+        Defaults to an environment with the default options.
+    """
+    if env is None:
+        env = _make_options_env()
+    digest = hashlib.sha256()
+    versions = f'{jinja2.__version__}\0{sys.implementation.cache_tag}'
+    digest.update(versions.encode())
+    for name, source in iter_template_sources(templates_dir):
+        options = describe_compile_options(env, name)
+        digest.update(f'\0{name}\0{options}\0{source}'.encode())
+    return digest.hexdigest()
+
+
+class SourceHashBytecodeCache(FileSystemBytecodeCache):
+
+    """
+    A bytecode cache that stores each template's compiled code under the
+    hash of the template's name and source (and the environment's
+    options), rather than just its name.
+
+    This way, the cached code of different versions of a template (e.g.
+    on different branches) doesn't overwrite each other.
+    """
+
+    def get_bucket(self, environment, name, filename, source):
+        options = describe_compile_options(environment, name)
+        key = hashlib.sha256(
+            f'{name}\0{options}\0{source}'.encode(),
+        ).hexdigest()
+        checksum = self.get_source_checksum(source)
+        bucket = Bucket(environment, key, checksum)
+        self.load_bytecode(bucket)
+        return bucket
+
+
+def get_compiled_dir(templates_dir=None, cache_dir=None, env=None):
+    """
+    Return the directory of the modules precompiled from the current
+    template sources with the given environment (which may not exist).
+    """
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    template_hash = hash_templates(templates_dir, env=env)
+    return cache_dir / COMPILED_DIR_NAME / template_hash
+
+
+def is_precompiled(templates_dir=None, cache_dir=None, env_options=None):
+    """
+    Return whether precompile_templates() has been run for the current
+    template sources, with an environment with the given options.
+
+    Args:
+      env_options: see make_loader().
+    """
+    compiled_dir = get_compiled_dir(
+        templates_dir, cache_dir=cache_dir,
+        env=_make_options_env(env_options),
+    )
+    return compiled_dir.is_dir()
+
+
+def make_loader(
+    templates_dir=None, cache_dir=None, compiled=True, env_options=None,
+):
+    """
+    Return a (loader, bytecode_cache) pair to pass to jinja2.Environment.
+
+    Args:
+      compiled: whether to load any precompiled modules. Templates that
+        weren't precompiled are loaded from the templates directory.
+      env_options: a dict of the other keyword arguments the
+        jinja2.Environment will be created with (e.g. autoescape), since
+        the modules are only loaded if they were precompiled with the
+        same options.
+    """
+    if templates_dir is None:
+        templates_dir = TEMPLATES_DIR
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+
+    bytecode_dir = cache_dir / BYTECODE_DIR_NAME
+    bytecode_dir.mkdir(parents=True, exist_ok=True)
+    bytecode_cache = SourceHashBytecodeCache(str(bytecode_dir))
+    loader = FileSystemLoader(templates_dir)
+    if not compiled:
+        return (loader, bytecode_cache)
+
+    compiled_dir = get_compiled_dir(
+        templates_dir, cache_dir=cache_dir,
+        env=_make_options_env(env_options),
+    )
+    if compiled_dir.is_dir():
+        _log.debug(f'loading precompiled templates from: {compiled_dir}')
+        loader = ChoiceLoader([ModuleLoader(compiled_dir), loader])
+
+    return (loader, bytecode_cache)
+
+
+def precompile_templates(env, templates_dir=None, cache_dir=None):
+    """
+    Compile every template in the templates directory to a Python module,
+    and return the directory of the modules.
+
+    Templates that can't be compiled with the given environment (e.g.
+    because they use filters it doesn't define) are skipped, and are
+    loaded from the templates directory instead.
+
+    Args:
+      env: the jinja2.Environment to compile with, which should have the
+        same filters as the environments that load the modules, and load
+        the templates from the templates directory. (The modules are only
+        loaded by environments with the same options.)
+    """
+    compiled_dir = get_compiled_dir(
+        templates_dir, cache_dir=cache_dir, env=env,
+    )
+    if compiled_dir.is_dir():
+        _log.info(f'templates already precompiled in: {compiled_dir}')
+        return compiled_dir
+
+    def log_message(message):
+        _log.info(f'precompiling templates: {message}')
+
+    # Compile to a temporary directory first so an interrupted run (or
+    # another process) can't leave a partial directory.
+    temp_dir = compiled_dir.with_name(f'{compiled_dir.name}.{os.getpid()}.tmp')
+    try:
+        env.compile_templates(temp_dir, zip=None, log_function=log_message)
+        temp_dir.replace(compiled_dir)
+    except OSError:
+        # Then another process finished first.
+        if not compiled_dir.is_dir():
+            raise
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return compiled_dir
@@ -0,0 +1,121 @@
+"""
+Unit tests of rcvresults/archives.py.
+"""
+
+import gzip
+from importlib.util import find_spec
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import skipUnless, TestCase
+import zipfile
+
+import rcvresults.archives as archives
+from rcvresults.archives import ZipMember
+import rcvresults.parsing as parsing
+from rcvresults.scripts.build_demo import DATA_DIR_JSON, DATA_DIR_REPORTS
+import rcvresults.utils as utils
+
+
+XML_PATH = DATA_DIR_REPORTS / '2020-11-03' / '20201201_d9_short.xml'
+EXCEL_PATH = DATA_DIR_REPORTS / '2022-11-08' / 'd4_short.xlsx'
+
+
+def get_reference_text(report_path):
+    """
+    Return the expected JSON text for one of the real reports.
+    """
+    election_dir_name = report_path.parent.name
+    path = DATA_DIR_JSON / election_dir_name / f'{report_path.stem}.json'
+    return path.read_text()
+
+
+class FunctionTestCase(TestCase):
+
+    def test_get_report_suffix_and_stem(self):
+        cases = [
+            ('d1_short.xml', '.xml', 'd1_short'),
+            ('d1_short.xml.gz', '.xml', 'd1_short'),
+            ('d1_short.xml.zst', '.xml', 'd1_short'),
+            ('d4_short.xlsx.gz', '.xlsx', 'd4_short'),
+        ]
+        for name, expected_suffix, expected_stem in cases:
+            with self.subTest(name=name):
+                path = Path(name)
+                self.assertEqual(archives.get_report_suffix(path), expected_suffix)
+                self.assertEqual(archives.get_report_stem(path), expected_stem)
+
+
+class CompressedReportTestCase(TestCase):
+
+    def _check_json_file(self, path, report_path):
+        """
+        Check that parsing a (compressed or bundled) copy of a report gives
+        the reference JSON.
+
+        Args:
+          path: the copy of the report.
+          report_path: the path to the original report.
+        """
+        with TemporaryDirectory() as temp_dir:
+            json_path = parsing.make_json_file(path, output_dir=Path(temp_dir))
+            self.assertEqual(json_path.name, f'{report_path.stem}.json')
+            self.assertEqual(json_path.read_text(), get_reference_text(report_path))
+
+    def test_make_json_file__gzip(self):
+        with TemporaryDirectory() as temp_dir:
+            for report_path in (XML_PATH, EXCEL_PATH):
+                with self.subTest(report_path=report_path):
+                    path = Path(temp_dir) / f'{report_path.name}.gz'
+                    path.write_bytes(gzip.compress(report_path.read_bytes()))
+                    self._check_json_file(path, report_path=report_path)
+
+    @skipUnless(find_spec('zstandard'), 'zstandard is not installed')
+    def test_make_json_file__zstd(self):
+        import zstandard
+
+        compressor = zstandard.ZstdCompressor()
+        with TemporaryDirectory() as temp_dir:
+            for report_path in (XML_PATH, EXCEL_PATH):
+                with self.subTest(report_path=report_path):
+                    path = Path(temp_dir) / f'{report_path.name}.zst'
+                    path.write_bytes(compressor.compress(report_path.read_bytes()))
+                    self._check_json_file(path, report_path=report_path)
+
+    def test_zip_bundle(self):
+        with TemporaryDirectory() as temp_dir:
+            bundle_path = Path(temp_dir) / 'bundle.zip'
+            with zipfile.ZipFile(bundle_path, 'w') as archive:
+                archive.write(XML_PATH, arcname=XML_PATH.name)
+                archive.write(EXCEL_PATH, arcname=EXCEL_PATH.name)
+                archive.writestr(
+                    'other.xml.gz', gzip.compress(XML_PATH.read_bytes()),
+                )
+
+            actual = utils.get_paths(bundle_path, suffix='xml')
+            self.assertEqual(actual, [
+                ZipMember(bundle_path, XML_PATH.name),
+                ZipMember(bundle_path, 'other.xml.gz'),
+            ])
+            members = list(archives.expand_bundles(
+                [bundle_path], suffixes=['xlsx', 'xml'],
+            ))
+            self.assertEqual(len(members), 3)
+
+            for member in members:
+                with self.subTest(member=member):
+                    report_path = (
+                        EXCEL_PATH if member.suffix == '.xlsx' else XML_PATH
+                    )
+                    if member.name == 'other.xml.gz':
+                        with TemporaryDirectory() as temp_dir:
+                            json_path = parsing.make_json_file(
+                                member, output_dir=Path(temp_dir),
+                            )
+                            self.assertEqual(json_path.name, 'other.json')
+                            self.assertEqual(
+                                json_path.read_text(),
+                                get_reference_text(report_path),
+                            )
+                        continue
+
+                    self._check_json_file(member, report_path=report_path)
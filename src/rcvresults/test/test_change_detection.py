@@ -0,0 +1,115 @@
+"""
+Unit tests of rcvresults/change_detection.py.
+"""
+
+import json
+from pathlib import Path
+import shutil
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import rcvresults.change_detection as change_detection
+from rcvresults.change_detection import ChangeDetector, MANIFEST_NAME
+import rcvresults.election as election_mod
+from rcvresults.results import ContestResults
+from rcvresults.scripts.build_demo import DIR_NAME_2019_NOV, get_config_path
+from rcvresults.testing import get_json_paths, TRANSLATIONS_PATH
+import rcvresults.utils as utils
+
+
+class FingerprintContestTestCase(TestCase):
+
+    def test_normalized(self):
+        """
+        Check that equivalent forms of a contest have the same fingerprint.
+        """
+        path = get_json_paths(DIR_NAME_2019_NOV)[0]
+        results = utils.read_json(path)
+        expected = change_detection.fingerprint_contest(results)
+        # Reverse the order of the dict keys.
+        reordered = json.loads(
+            json.dumps(results),
+            object_pairs_hook=lambda pairs: dict(reversed(pairs)),
+        )
+        self.assertNotEqual(list(reordered), list(results))
+        contest_results = ContestResults.from_results(results)
+        for equivalent in (reordered, contest_results):
+            with self.subTest(equivalent=type(equivalent)):
+                actual = change_detection.fingerprint_contest(equivalent)
+                self.assertEqual(actual, expected)
+
+    def test_changed(self):
+        path = get_json_paths(DIR_NAME_2019_NOV)[0]
+        results = utils.read_json(path)
+        expected = change_detection.fingerprint_contest(results)
+        name = results['candidate_names'][0]
+        results['rounds'][name][0]['votes'] += 1
+        actual = change_detection.fingerprint_contest(results)
+        self.assertNotEqual(actual, expected)
+
+
+class ProcessElectionTestCase(TestCase):
+
+    def _process_election(self, json_paths, output_dir, **kwargs):
+        return election_mod.process_contests(
+            ((path.stem, utils.read_json(path)) for path in json_paths),
+            config_path=get_config_path(DIR_NAME_2019_NOV),
+            translations_path=TRANSLATIONS_PATH, output_dir=output_dir,
+            **kwargs,
+        )
+
+    def test_process_contests(self):
+        json_paths = get_json_paths(DIR_NAME_2019_NOV)
+        with TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            json_dir = temp_dir / 'json'
+            json_dir.mkdir()
+            for path in json_paths:
+                shutil.copy(path, json_dir / path.name)
+            json_paths = utils.get_paths(json_dir, suffix='json')
+            output_dir = temp_dir / 'output'
+
+            count = self._process_election(json_paths, output_dir=output_dir)
+            self.assertEqual(count, 3)
+            self.assertTrue((output_dir / MANIFEST_NAME).exists())
+            count = self._process_election(json_paths, output_dir=output_dir)
+            self.assertEqual(count, 0)
+
+            # Change the data of one contest.
+            json_path = json_paths[0]
+            results = utils.read_json(json_path)
+            name = results['candidate_names'][0]
+            results['rounds'][name][0]['votes'] += 1
+            utils.write_json(results, json_path)
+            count = self._process_election(json_paths, output_dir=output_dir)
+            self.assertEqual(count, 1)
+
+            # Delete one of the rendered files of a contest.
+            html_name = f'{json_paths[1].stem}-summary-en.html'
+            html_path = output_dir / 'summary-tables' / html_name
+            html_path.unlink()
+            count = self._process_election(json_paths, output_dir=output_dir)
+            self.assertEqual(count, 1)
+            self.assertTrue(html_path.exists())
+
+            count = self._process_election(
+                json_paths, output_dir=output_dir, force=True,
+            )
+            self.assertEqual(count, 3)
+
+    def test_render_inputs_changed(self):
+        with TemporaryDirectory() as temp_dir:
+            output_dir = Path(temp_dir)
+            detector = ChangeDetector(output_dir, render_key='a')
+            self.assertTrue(detector.check('da_short', {}, output_paths=[]))
+            detector.save()
+
+            detector = ChangeDetector(output_dir, render_key='a')
+            self.assertFalse(detector.check('da_short', {}, output_paths=[]))
+            self.assertEqual(detector.unchanged, ['da_short'])
+
+            detector = ChangeDetector(output_dir, render_key='b')
+            self.assertTrue(detector.check('da_short', {}, output_paths=[]))
+            self.assertEqual(detector.reasons, {
+                'da_short': change_detection.REASON_INPUTS_CHANGED,
+            })
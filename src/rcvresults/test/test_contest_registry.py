@@ -0,0 +1,170 @@
+"""
+Unit tests of rcvresults/contest_registry.py.
+"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from rcvresults.contest_registry import ContestRegistry
+import rcvresults.parsing as parsing
+from rcvresults.results import ContestResults
+import rcvresults.scripts.build_demo as demo_mod
+from rcvresults.scripts.build_demo import (
+    DATA_DIR_JSON, DATA_DIR_REPORTS, DIR_NAME_2019_NOV,
+)
+import rcvresults.utils as utils
+
+
+class ContestRegistryTestCase(TestCase):
+
+    def _make_registry(self, max_size):
+        registry = ContestRegistry(max_size=max_size)
+        # The number of times each contest is loaded.
+        load_counts = {}
+
+        def make_loader(stem):
+            def load():
+                load_counts[stem] = load_counts.get(stem, 0) + 1
+                return {'stem': stem}
+            return load
+
+        for stem in ('a', 'b', 'c'):
+            registry.register('2022', stem, loader=make_loader(stem))
+        return registry, load_counts
+
+    def test_get(self):
+        registry, load_counts = self._make_registry(max_size=3)
+        self.assertEqual(len(registry), 3)
+        self.assertIn(('2022', 'a'), registry)
+        for _ in range(2):
+            self.assertEqual(registry.get('2022', 'b'), {'stem': 'b'})
+        self.assertEqual(load_counts, {'b': 1})
+        self.assertEqual((registry.hits, registry.misses), (1, 1))
+        with self.assertRaisesRegex(KeyError, 'contest not registered'):
+            registry.get('2022', 'd')
+
+    def test_register__contest(self):
+        registry, load_counts = self._make_registry(max_size=3)
+        registry.register('2022', 'a', loader=None, contest={'stem': 'A'})
+        self.assertEqual(registry.get('2022', 'a'), {'stem': 'A'})
+        self.assertEqual(load_counts, {})
+
+    def test_eviction(self):
+        registry, load_counts = self._make_registry(max_size=2)
+        for stem in ('a', 'b', 'a', 'c'):
+            registry.get('2022', stem)
+        # Getting "c" should have evicted "b" (the least recently used)
+        # rather than "a".
+        self.assertEqual(registry.evictions, 1)
+        registry.get('2022', 'a')
+        self.assertEqual(load_counts, {'a': 1, 'b': 1, 'c': 1})
+        registry.get('2022', 'b')
+        self.assertEqual(load_counts, {'a': 1, 'b': 2, 'c': 1})
+
+    def test_iter_contests(self):
+        registry, _ = self._make_registry(max_size=1)
+        registry.register('2023', 'x', loader=lambda: {'stem': 'x'})
+        actual = list(registry.iter_contests('2022'))
+        self.assertEqual(actual, [
+            ('a', {'stem': 'a'}), ('b', {'stem': 'b'}), ('c', {'stem': 'c'}),
+        ])
+        self.assertEqual(registry.get_stems('2023'), ['x'])
+
+
+class ParseAllContestsTestCase(TestCase):
+
+    """
+    Test build_demo.parse_all_contests(), which fills a registry.
+    """
+
+    def _check_registry(self, registry):
+        reference_dir = DATA_DIR_JSON / DIR_NAME_2019_NOV
+        reference_paths = utils.get_paths(reference_dir, suffix='json')
+        self.assertEqual(
+            registry.get_stems(DIR_NAME_2019_NOV),
+            [path.stem for path in reference_paths],
+        )
+        for path in reference_paths:
+            with self.subTest(path=path):
+                actual = registry.get(DIR_NAME_2019_NOV, path.stem)
+                # The contests are registered as ContestResults objects,
+                # so they can be validated with the NumPy engine.
+                self.assertIsInstance(actual, ContestResults)
+                self.assertEqual(actual.to_results(), utils.read_json(path))
+
+    def test_without_files(self):
+        registry = ContestRegistry()
+        demo_mod.parse_all_contests(
+            DATA_DIR_REPORTS, dir_names=[DIR_NAME_2019_NOV], registry=registry,
+        )
+        self._check_registry(registry)
+        # The contests were all in memory already.
+        self.assertEqual(registry.misses, 0)
+
+    def test_with_files(self):
+        with TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            # Parse twice, so the second time uses the parse cache and the
+            # contests are read from the files.
+            for i in range(2):
+                registry = ContestRegistry()
+                demo_mod.parse_all_contests(
+                    DATA_DIR_REPORTS, dir_names=[DIR_NAME_2019_NOV],
+                    registry=registry, parent_output_dir=temp_dir,
+                )
+                self._check_registry(registry)
+                expected_misses = 0 if i == 0 else 3
+                self.assertEqual(registry.misses, expected_misses)
+
+            json_paths = utils.get_paths(
+                temp_dir / DIR_NAME_2019_NOV, suffix='json',
+            )
+            self.assertEqual(len(json_paths), 3)
+
+    def test_eviction_while_parsing(self):
+        """
+        Check that the contests are registered as they are parsed, so
+        contests are evicted before every report is parsed.
+        """
+        for write_files in (False, True):
+            with self.subTest(write_files=write_files):
+                registry = ContestRegistry(max_size=1)
+                # The number of evictions when each report is parsed.
+                evictions = []
+
+                def parse_report(path, **kwargs):
+                    evictions.append(registry.evictions)
+                    return original_parse_report(path, **kwargs)
+
+                original_parse_report = parsing.parse_report
+                with TemporaryDirectory() as temp_dir:
+                    parent_output_dir = Path(temp_dir) if write_files else None
+                    with patch.object(parsing, 'parse_report', parse_report):
+                        demo_mod.parse_all_contests(
+                            DATA_DIR_REPORTS, dir_names=[DIR_NAME_2019_NOV],
+                            registry=registry,
+                            parent_output_dir=parent_output_dir,
+                        )
+                    self._check_registry(registry)
+
+                # Only check the parsing (rather than the reloading of the
+                # evicted contests by _check_registry()).
+                self.assertEqual(evictions[:3], [0, 0, 1])
+
+    def test_validate_all_contests(self):
+        registry = ContestRegistry(max_size=2)
+        demo_mod.parse_all_contests(
+            DATA_DIR_REPORTS, dir_names=[DIR_NAME_2019_NOV], registry=registry,
+        )
+        with TemporaryDirectory() as temp_dir:
+            report_path = Path(temp_dir) / 'report.json'
+            demo_mod.validate_all_contests(
+                registry, dir_names=[DIR_NAME_2019_NOV], report_path=report_path,
+            )
+            data = utils.read_json(report_path)
+
+        # The 3 contests are checked in two batches.
+        self.assertEqual(data['contest_count'], 3)
+        self.assertIs(data['is_valid'], True)
@@ -1,7 +1,13 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 
 import rcvresults.election as election
+from rcvresults.scripts.build_demo import (
+    DATA_DIR_JSON, DIR_NAME_2019_NOV, get_config_path,
+)
 from rcvresults.testing import TRANSLATIONS_PATH
+import rcvresults.utils as utils
 
 
 class ModuleTestCase(TestCase):
@@ -46,3 +52,58 @@ class ModuleTestCase(TestCase):
         self.assertEqual(sorted(actual), [
             'blanks', 'continuing', 'exhausted', 'non_transferable', 'overvotes',
         ])
+
+
+class ProcessElectionTestCase(TestCase):
+
+    def test_jobs(self):
+        """
+        Check that rendering in parallel gives the same html as rendering
+        serially.
+        """
+        json_paths = utils.get_paths(
+            DATA_DIR_JSON / DIR_NAME_2019_NOV, suffix='json',
+        )
+        texts = []
+        with TemporaryDirectory() as temp_dir:
+            for jobs in (1, 2):
+                output_dir = Path(temp_dir) / str(jobs)
+                election.process_election(
+                    json_paths, config_path=get_config_path(DIR_NAME_2019_NOV),
+                    translations_path=TRANSLATIONS_PATH, output_dir=output_dir,
+                    jobs=jobs,
+                )
+                texts.append({
+                    path.relative_to(output_dir): path.read_text()
+                    for path in sorted(output_dir.glob('*/*.html'))
+                })
+
+        self.assertEqual(len(texts[0]), 2 * 4 * len(json_paths))
+        self.assertEqual(texts[1], texts[0])
+
+    def test_single_pass(self):
+        """
+        Check that rendering every language in a single pass gives the
+        same html as rendering each language separately.
+        """
+        json_paths = utils.get_paths(
+            DATA_DIR_JSON / DIR_NAME_2019_NOV, suffix='json',
+        )
+        texts = []
+        with TemporaryDirectory() as temp_dir:
+            for single_pass in (False, True):
+                output_dir = Path(temp_dir) / str(single_pass)
+                renderer = election.Renderer(
+                    TRANSLATIONS_PATH, single_pass=single_pass,
+                )
+                renderer.process_election(
+                    json_paths, config_path=get_config_path(DIR_NAME_2019_NOV),
+                    output_dir=output_dir,
+                )
+                texts.append({
+                    path.relative_to(output_dir): path.read_text()
+                    for path in sorted(output_dir.glob('*/*.html'))
+                })
+
+        self.assertEqual(len(texts[0]), 2 * 4 * len(json_paths))
+        self.assertEqual(texts[1], texts[0])
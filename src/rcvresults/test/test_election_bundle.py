@@ -0,0 +1,95 @@
+"""
+Unit tests of rcvresults/election_bundle.py.
+"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import rcvresults.election as election_mod
+import rcvresults.election_bundle as election_bundle
+from rcvresults.election_bundle import BUNDLE_FORMAT_NAMES, ElectionBundle
+from rcvresults.scripts.build_demo import DIR_NAME_2022_NOV, get_config_path
+from rcvresults.testing import get_json_paths, to_results, TRANSLATIONS_PATH
+import rcvresults.utils as utils
+import rcvresults.validation as validation
+
+
+class ElectionBundleTestCase(TestCase):
+
+    def test_round_trip(self):
+        json_paths = get_json_paths(DIR_NAME_2022_NOV)
+        for format_name in BUNDLE_FORMAT_NAMES:
+            with self.subTest(format_name=format_name):
+                with TemporaryDirectory() as temp_dir:
+                    path = Path(temp_dir) / f'{DIR_NAME_2022_NOV}.rcvbundle'
+                    count = election_bundle.write_bundle_from_files(
+                        path, json_paths, format_name=format_name,
+                    )
+                    self.assertEqual(count, len(json_paths))
+                    with ElectionBundle(path) as bundle:
+                        self.assertEqual(bundle.election, DIR_NAME_2022_NOV)
+                        self.assertEqual(
+                            bundle.stems, [path.stem for path in json_paths],
+                        )
+                        # Read the contests in the reverse order, to check
+                        # that each is read independently of the others.
+                        for json_path in reversed(json_paths):
+                            contest = bundle.read_contest(json_path.stem)
+                            self.assertEqual(
+                                to_results(contest), utils.read_json(json_path),
+                            )
+                        with self.assertRaisesRegex(KeyError, 'not in bundle'):
+                            bundle.read_contest('unknown')
+
+    def test_errors(self):
+        results = utils.read_json(get_json_paths(DIR_NAME_2022_NOV)[0])
+        with TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'test.rcvbundle'
+            with self.assertRaisesRegex(ValueError, 'duplicate contest stems'):
+                election_bundle.write_bundle(
+                    path, contests=[('a', results), ('a', results)],
+                )
+            with self.assertRaisesRegex(ValueError, 'unsupported bundle format'):
+                election_bundle.write_bundle(
+                    path, contests=[], format_name='json',
+                )
+
+            election_bundle.write_bundle(path, contests=[('a', results)])
+            data = path.read_bytes()
+            path.write_bytes(data[:-10])
+            with self.assertRaisesRegex(ValueError, 'bundle is truncated'):
+                ElectionBundle(path)
+            path.write_bytes(b'x' * len(data))
+            with self.assertRaisesRegex(ValueError, 'not an election bundle'):
+                ElectionBundle(path)
+
+    def test_process_election(self):
+        """
+        Check that rendering from a bundle gives the same html as
+        rendering from the JSON files, and that validation accepts a
+        bundle.
+        """
+        json_paths = get_json_paths(DIR_NAME_2022_NOV)
+        with TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            bundle_path = temp_dir / f'{DIR_NAME_2022_NOV}.rcvbundle'
+            election_bundle.write_bundle_from_files(bundle_path, json_paths)
+            report = validation.validate_json_files([bundle_path])
+            self.assertEqual(report.contest_count, len(json_paths))
+
+            texts = []
+            for name, paths in (('json', json_paths), ('bundle', [bundle_path])):
+                output_dir = temp_dir / name
+                election_mod.process_election(
+                    paths, config_path=get_config_path(DIR_NAME_2022_NOV),
+                    translations_path=TRANSLATIONS_PATH, output_dir=output_dir,
+                )
+                html_paths = sorted(output_dir.glob('*/*.html'))
+                texts.append({
+                    path.relative_to(output_dir): path.read_text()
+                    for path in html_paths
+                })
+
+        self.assertEqual(len(texts[0]), 2 * 4 * len(json_paths))
+        self.assertEqual(texts[1], texts[0])
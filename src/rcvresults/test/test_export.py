@@ -0,0 +1,109 @@
+"""
+Unit tests of rcvresults/export.py.
+"""
+
+import csv
+import io
+import json
+import os
+import tracemalloc
+from unittest import TestCase
+
+import rcvresults.export as export
+from rcvresults.export import (
+    EXPORT_COLUMNS, FORMAT_CSV, FORMAT_NDJSON, ROW_TYPE_CANDIDATE,
+    ROW_TYPE_NON_CANDIDATE,
+)
+from rcvresults.scripts.build_demo import (
+    DATA_DIR_JSON, DATA_DIR_REPORTS, DIR_NAME_2019_NOV, DIR_NAME_2022_NOV,
+)
+import rcvresults.utils as utils
+
+
+class ExportTestCase(TestCase):
+
+    def test_iter_contest_rows(self):
+        path = DATA_DIR_JSON / DIR_NAME_2019_NOV / '20191125_d5_short.json'
+        results = utils.read_json(path)
+        rows = list(export.iter_contest_rows('2019', 'd5', results=results))
+        # There are 9 rows (4 candidates and 5 subtotals) and 3 rounds.
+        self.assertEqual(len(rows), 9 * 3)
+        name = results['row_names'][0]
+        round_data = results['rounds'][name][1]
+        self.assertEqual(rows[1], (
+            '2019', 'd5', name, ROW_TYPE_CANDIDATE, 2, round_data['votes'],
+            round_data['percent'], round_data['transfer'],
+        ))
+        self.assertEqual(rows[-1][3], ROW_TYPE_NON_CANDIDATE)
+
+    def test_reports_match_json(self):
+        """
+        Check that exporting the reports gives the same table as exporting
+        the reference JSON files, in both formats.
+        """
+        for election in (DIR_NAME_2019_NOV, DIR_NAME_2022_NOV):
+            with self.subTest(election=election):
+                rows = list(export.iter_election_rows(
+                    [DATA_DIR_REPORTS / election],
+                ))
+                expected = list(export.iter_election_rows(
+                    [DATA_DIR_JSON / election],
+                ))
+                self.assertEqual(rows, expected)
+                self.assertEqual({row[0] for row in rows}, {election})
+
+    def test_write_rows(self):
+        election_path = DATA_DIR_JSON / DIR_NAME_2022_NOV
+        rows = list(export.iter_election_rows([election_path]))
+
+        f = io.StringIO()
+        count = export.write_rows(iter(rows), f, format_name=FORMAT_CSV)
+        self.assertEqual(count, len(rows))
+        csv_rows = list(csv.DictReader(io.StringIO(f.getvalue())))
+        self.assertEqual(len(csv_rows), len(rows))
+
+        f = io.StringIO()
+        count = export.write_rows(iter(rows), f, format_name=FORMAT_NDJSON)
+        self.assertEqual(count, len(rows))
+        json_rows = [json.loads(line) for line in f.getvalue().splitlines()]
+        self.assertEqual(len(json_rows), len(rows))
+
+        for row, csv_row, json_row in zip(rows, csv_rows, json_rows):
+            self.assertEqual(list(json_row), list(EXPORT_COLUMNS))
+            votes = row[5]
+            if isinstance(votes, float):
+                self.assertEqual(float(csv_row['votes']), votes)
+                self.assertEqual(json_row['votes'], votes)
+            else:
+                # Values that aren't numbers are written as empty cells
+                # and nulls.
+                self.assertEqual(csv_row['votes'], '')
+                self.assertIsNone(json_row['votes'])
+
+        with self.assertRaisesRegex(ValueError, 'unknown export format'):
+            export.write_rows(rows, f, format_name='xml')
+
+    def test_constant_memory(self):
+        """
+        Check that the peak memory of an export doesn't grow with the
+        number of elections exported.
+        """
+        def get_peak_size(election_count):
+            election_path = DATA_DIR_JSON / DIR_NAME_2022_NOV
+            election_paths = [election_path] * election_count
+            rows = export.iter_election_rows(election_paths)
+            # Discard the output, so only the memory of the export counts.
+            with open(os.devnull, 'w') as f:
+                tracemalloc.start()
+                try:
+                    export.write_rows(rows, f, format_name=FORMAT_CSV)
+                    _, peak_size = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+            return peak_size
+
+        # Warm up first, so e.g. lazy imports aren't counted.
+        get_peak_size(1)
+        single_size = get_peak_size(1)
+        many_size = get_peak_size(20)
+        self.assertLess(many_size, 2 * single_size)
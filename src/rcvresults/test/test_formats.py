@@ -0,0 +1,67 @@
+"""
+Unit tests of rcvresults/formats.py.
+"""
+
+from importlib.metadata import EntryPoint
+import sys
+from unittest import TestCase
+from unittest.mock import patch
+
+import rcvresults.formats as formats
+from rcvresults.formats import Registry
+import rcvresults.parsers.xml as xml_parsing
+
+
+class RegistryTestCase(TestCase):
+
+    def test_get__builtin(self):
+        registry = Registry(
+            {'.xml': 'rcvresults.parsers.xml'}, group='test', kind='format',
+        )
+        self.assertIs(registry.get('.xml'), xml_parsing)
+
+    def test_get__unknown(self):
+        registry = Registry({}, group='rcvresults.test-formats', kind='format')
+        with self.assertRaisesRegex(ValueError, "unknown format: '.csv'"):
+            registry.get('.csv')
+
+    def test_get__entry_point(self):
+        entry_point = EntryPoint(
+            name='.csv', value='rcvresults.parsers.common',
+            group='rcvresults.test-formats',
+        )
+        group = 'rcvresults.test-formats'
+        registry = Registry({}, group=group, kind='format')
+        if sys.version_info >= (3, 10):
+            return_value = [entry_point]
+            expected_kwargs = {'group': group}
+        else:
+            return_value = {group: [entry_point]}
+            expected_kwargs = {}
+        with patch(
+            'importlib.metadata.entry_points', return_value=return_value,
+        ) as mock_entry_points:
+            backend = registry.get('.csv')
+            # Check that the backend is cached.
+            self.assertIs(registry.get('.csv'), backend)
+            self.assertEqual(registry.names(), ['.csv'])
+
+        self.assertIs(backend, sys.modules['rcvresults.parsers.common'])
+        mock_entry_points.assert_called_with(**expected_kwargs)
+
+    def test_report_formats(self):
+        for suffix in ('.xlsx', '.xml'):
+            with self.subTest(suffix=suffix):
+                report_format = formats.get_report_format(suffix)
+                for name in ('SEEKABLE', 'get_report_parser', 'scan_report'):
+                    self.assertTrue(hasattr(report_format, name))
+
+    def test_get_report_suffixes(self):
+        self.assertEqual(formats.get_report_suffixes(), ['csv', 'xlsx', 'xml'])
+        self.assertEqual(
+            formats.get_report_suffixes(formats.REPORT_FORMAT_RCTAB),
+            ['csv', 'json'],
+        )
+        self.assertEqual(formats.get_format_names(), ['rctab'])
+        # The ".json" suffix is reserved for the intermediate files.
+        self.assertNotIn('.json', formats.REPORT_FORMATS.names())
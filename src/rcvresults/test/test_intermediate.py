@@ -0,0 +1,158 @@
+"""
+Unit tests of rcvresults/intermediate.py.
+"""
+
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock, TestCase
+
+import rcvresults.intermediate as intermediate
+from rcvresults.intermediate import (
+    FORMAT_COLUMNAR, FORMAT_COMPACT_JSON, FORMAT_JSON,
+)
+import rcvresults.parsing as parsing
+from rcvresults.results import ContestResults
+import rcvresults.scripts.build_demo as demo_mod
+from rcvresults.scripts.build_demo import (
+    DATA_DIR_JSON, DATA_DIR_REPORTS, DIR_NAME_2022_NOV,
+)
+from rcvresults.testing import get_json_paths, to_results
+import rcvresults.utils as utils
+
+
+def get_file_names(dir_path):
+    """
+    Return the names of the files in a directory, except for hidden files
+    like the parse manifest.
+    """
+    return sorted(
+        path.name for path in dir_path.iterdir()
+        if not path.name.startswith('.')
+    )
+
+
+class IntermediateTestCase(TestCase):
+
+    def _check_round_trip(self, format_name):
+        paths = get_json_paths()
+        self.assertGreater(len(paths), 0)
+        with TemporaryDirectory() as temp_dir:
+            suffix = intermediate.get_suffix(format_name)
+            for path in paths:
+                with self.subTest(path=path):
+                    expected = utils.read_json(path)
+                    output_path = Path(temp_dir) / f'{path.stem}{suffix}'
+                    intermediate.write_contest(
+                        expected, path=output_path, format_name=format_name,
+                    )
+                    actual = to_results(intermediate.read_contest(output_path))
+                    # Compare the JSON so the types are checked too (e.g.
+                    # that ints and empty strings were preserved).
+                    self.assertEqual(
+                        json.dumps(actual, sort_keys=True),
+                        json.dumps(expected, sort_keys=True),
+                    )
+
+    def test_json(self):
+        self._check_round_trip(FORMAT_JSON)
+        # The pretty format is the same as the reference files.
+        path = get_json_paths()[0]
+        with TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir) / path.name
+            intermediate.write_contest(
+                utils.read_json(path), path=output_path,
+            )
+            self.assertEqual(output_path.read_text(), path.read_text())
+
+    def test_compact_json(self):
+        self._check_round_trip(FORMAT_COMPACT_JSON)
+        # Also check the fallback for when orjson isn't installed.
+        with mock.patch.object(intermediate, '_import_orjson', lambda: None):
+            self._check_round_trip(FORMAT_COMPACT_JSON)
+
+    def test_columnar(self):
+        self._check_round_trip(FORMAT_COLUMNAR)
+
+    def test_read_contest__columnar(self):
+        path = DATA_DIR_JSON / '2022-11-08' / 'd4_short.json'
+        with TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir) / 'd4_short.rcvcols'
+            intermediate.write_contest(
+                utils.read_json(path), path=output_path,
+                format_name=FORMAT_COLUMNAR,
+            )
+            contest = intermediate.read_contest(output_path)
+            self.assertIsInstance(contest, ContestResults)
+            self.assertEqual(contest.get_value('votes', 'blanks', 0), 3003.0)
+
+            bad_path = Path(temp_dir) / 'bad.rcvcols'
+            bad_path.write_bytes(b'{}')
+            with self.assertRaisesRegex(ValueError, 'not in the ContestResults'):
+                intermediate.read_contest(bad_path)
+
+    def test_get_suffix(self):
+        self.assertEqual(intermediate.get_suffix(), '.json')
+        self.assertEqual(intermediate.get_suffix(FORMAT_COLUMNAR), '.rcvcols')
+        with self.assertRaisesRegex(ValueError, 'unknown intermediate format'):
+            intermediate.get_suffix('yaml')
+
+    def test_make_jsons(self):
+        """
+        Check passing an output format to make_jsons().
+        """
+        report_paths = demo_mod.get_demo_report_paths(
+            DATA_DIR_REPORTS, dir_name=DIR_NAME_2022_NOV,
+        )
+        with TemporaryDirectory() as temp_dir:
+            output_dir = Path(temp_dir)
+            paths = parsing.make_jsons(
+                report_paths, output_dir=output_dir,
+                output_format=FORMAT_COLUMNAR,
+            )
+            self.assertEqual(
+                [path.name for path in paths],
+                [f'{path.stem}.rcvcols' for path in report_paths],
+            )
+            for path in paths:
+                with self.subTest(path=path):
+                    reference_path = (
+                        DATA_DIR_JSON / DIR_NAME_2022_NOV / f'{path.stem}.json'
+                    )
+                    actual = intermediate.read_contest(path).to_results()
+                    self.assertEqual(actual, utils.read_json(reference_path))
+
+            # Changing the format should re-parse rather than using the
+            # files of the previous format.
+            paths = parsing.make_jsons(
+                report_paths, output_dir=output_dir,
+                output_format=FORMAT_COMPACT_JSON,
+            )
+            self.assertTrue(all(path.exists() for path in paths))
+            self.assertEqual({path.suffix for path in paths}, {'.json'})
+            # The files of the previous format should have been removed.
+            self.assertEqual(
+                get_file_names(output_dir),
+                sorted(path.name for path in paths),
+            )
+
+    def test_make_jsons__cached_format(self):
+        """
+        Check that switching back to a cached format still removes the
+        files of the other format.
+        """
+        report_paths = demo_mod.get_demo_report_paths(
+            DATA_DIR_REPORTS, dir_name=DIR_NAME_2022_NOV,
+        )
+        with TemporaryDirectory() as temp_dir:
+            output_dir = Path(temp_dir)
+            for output_format in (FORMAT_JSON, FORMAT_COLUMNAR, FORMAT_JSON):
+                paths = parsing.make_jsons(
+                    report_paths, output_dir=output_dir,
+                    output_format=output_format,
+                )
+                with self.subTest(output_format=output_format):
+                    self.assertEqual(
+                        get_file_names(output_dir),
+                        sorted(path.name for path in paths),
+                    )
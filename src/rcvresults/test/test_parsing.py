@@ -0,0 +1,151 @@
+"""
+Unit tests of rcvresults/parsing.py.
+"""
+
+import gzip
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import rcvresults.parse_cache as parse_cache
+from rcvresults.parse_cache import ParseCache
+import rcvresults.parsers.xml as xml_parsing
+import rcvresults.parsing as parsing
+import rcvresults.scripts.build_demo as demo_mod
+from rcvresults.scripts.build_demo import DATA_DIR_REPORTS, DIR_NAME_2020_NOV
+import rcvresults.utils as utils
+
+
+def get_report_paths():
+    return demo_mod.get_demo_report_paths(
+        DATA_DIR_REPORTS, dir_name=DIR_NAME_2020_NOV,
+    )
+
+
+class MakeJsonsTestCase(TestCase):
+
+    def test_make_jsons__jobs(self):
+        report_paths = get_report_paths()
+        for jobs in (1, 3):
+            with self.subTest(jobs=jobs):
+                with TemporaryDirectory() as temp_dir:
+                    output_dir = Path(temp_dir)
+                    actual = parsing.make_jsons(
+                        report_paths, output_dir=output_dir, jobs=jobs,
+                    )
+                    expected = [
+                        output_dir / f'{path.stem}.json'
+                        for path in report_paths
+                    ]
+                    self.assertEqual(actual, expected)
+
+    def test_make_jsons__errors(self):
+        report_paths = get_report_paths()
+        for jobs in (1, 3):
+            with self.subTest(jobs=jobs):
+                with TemporaryDirectory() as temp_dir:
+                    temp_dir = Path(temp_dir)
+                    bad_paths = [temp_dir / 'bad1.xml', temp_dir / 'bad2.xml']
+                    for path in bad_paths:
+                        path.write_text('<Report>')
+                    paths = [bad_paths[0], *report_paths, bad_paths[1]]
+                    output_dir = temp_dir / 'output'
+                    with self.assertRaises(parsing.ReportErrors) as cm:
+                        parsing.make_jsons(
+                            paths, output_dir=output_dir, jobs=jobs,
+                        )
+                    # The other reports should still have been parsed.
+                    json_paths = utils.get_paths(output_dir, suffix='json')
+                    self.assertEqual(len(json_paths), len(report_paths))
+
+                exc = cm.exception
+                self.assertEqual([path for path, _ in exc.errors], bad_paths)
+                self.assertIn('error parsing report file', str(exc))
+
+
+    def test_make_jsons__duplicate_stems(self):
+        """
+        Check that reports with the same stem (e.g. a compressed copy)
+        are rejected before anything is parsed or written.
+        """
+        report_path = get_report_paths()[0]
+        with TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            gzip_path = temp_dir / f'{report_path.name}.gz'
+            with gzip.open(gzip_path, 'wb') as f:
+                f.write(report_path.read_bytes())
+            output_dir = temp_dir / 'output'
+            with self.assertRaisesRegex(
+                ValueError, 'reports have the same file stem',
+            ):
+                parsing.make_jsons(
+                    [report_path, gzip_path], output_dir=output_dir,
+                )
+            self.assertFalse(output_dir.exists())
+
+            with self.assertRaisesRegex(
+                ValueError, 'reports have the same file stem',
+            ):
+                parsing.parse_reports([report_path, gzip_path])
+
+
+class ParseCacheTestCase(TestCase):
+
+    def test_make_jsons__cache(self):
+        report_paths = get_report_paths()
+        count = len(report_paths)
+        with TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            # Copy the reports so one can be changed.
+            reports_dir = temp_dir / 'reports'
+            reports_dir.mkdir()
+            paths = []
+            for path in report_paths:
+                new_path = reports_dir / path.name
+                new_path.write_bytes(path.read_bytes())
+                paths.append(new_path)
+            output_dir = temp_dir / 'output'
+
+            cases = [
+                # The first run parses everything.
+                ({}, (0, count)),
+                ({}, (count, 0)),
+                ({'force': True}, (0, count)),
+                ({'xml_parser': xml_parsing.BACKEND_ETREE}, (0, count)),
+                ({}, (0, count)),
+            ]
+            for i, (kwargs, expected) in enumerate(cases):
+                with self.subTest(i=i, kwargs=kwargs):
+                    with self.assertLogs(parse_cache._log) as cm:
+                        parsing.make_jsons(paths, output_dir=output_dir, **kwargs)
+                    hits, misses = expected
+                    self.assertEqual(cm.output, [
+                        f'INFO:{parse_cache._log.name}:parse cache: '
+                        f'{hits} hit(s), {misses} miss(es)'
+                    ])
+
+            # Change one report, and delete the JSON file of another.
+            paths[0].write_bytes(paths[0].read_bytes() + b'\n')
+            parsing.get_json_path(paths[1], output_dir=output_dir).unlink()
+            with self.assertLogs(parse_cache._log) as cm:
+                json_paths = parsing.make_jsons(paths, output_dir=output_dir)
+            self.assertEqual(cm.output, [
+                f'INFO:{parse_cache._log.name}:parse cache: '
+                f'{count - 2} hit(s), 2 miss(es)'
+            ])
+            self.assertTrue(all(path.exists() for path in json_paths))
+            # The manifest shouldn't be picked up as a JSON file.
+            self.assertEqual(len(utils.get_paths(output_dir, suffix='json')), count)
+
+    def test_make_json_file__cache(self):
+        path = get_report_paths()[0]
+        with TemporaryDirectory() as temp_dir:
+            output_dir = Path(temp_dir)
+            for expected in [(0, 1), (1, 0)]:
+                cache = ParseCache(output_dir)
+                json_path = parsing.make_json_file(
+                    path, output_dir=output_dir, cache=cache,
+                )
+                cache.save()
+                self.assertEqual((cache.hits, cache.misses), expected)
+                self.assertEqual(json_path, output_dir / f'{path.stem}.json')
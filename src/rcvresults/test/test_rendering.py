@@ -0,0 +1,150 @@
+"""
+Unit tests of rcvresults/rendering.py.
+"""
+
+import functools
+from unittest import TestCase
+
+import jinja2
+from jinja2 import Environment
+
+import rcvresults.rendering as rendering
+from rcvresults.rendering import EMPTY_CELL, TABLE_LABELS, TranslationSlots
+import rcvresults.utils as utils
+from rcvresults.utils import LANGUAGES
+
+
+# A template using the translation filter both with and without a
+# language, and the current language inside a per_language() block.
+TEMPLATE_TEXT = """\
+{{ 'greeting'|TL }}, {{ name }}!
+{% call(current_lang) per_language() -%}
+[{{ current_lang }}: {{ 'greeting'|TL(lang=current_lang) }}]
+{%- endcall %} {{ 'greeting'|TL(lang='en') }}"""
+
+LABEL_TRANSLATIONS = {
+    'greeting': {'en': 'Hi', 'es': '<Hola>'},
+}
+
+
+def make_context():
+    """
+    Return the context of a 3-round contest, where Carol is eliminated in
+    round 1 and Bob in round 2.
+    """
+    votes = {
+        'Alice': [10, 12, 15],
+        'Bob': [8, 9, 0],
+        'Carol': [3, 0, 0],
+    }
+    rounds = {
+        name: [
+            {'votes': value, 'percent': value / 21, 'transfer': 1000}
+            for value in values
+        ] for name, values in votes.items()
+    }
+    for label in utils.NON_CANDIDATE_SUBTOTAL_LABELS:
+        rounds[label] = [
+            {'votes': 1, 'percent': None, 'transfer': 2}
+        ] * 3
+
+    return {
+        'candidate_names': list(votes),
+        'non_candidate_names': utils.NON_CANDIDATE_SUBTOTAL_LABELS,
+        'rounds': rounds,
+        'highest_round': 3,
+        'leading_candidates': ['Alice'],
+        'candidate_summaries': {
+            'Alice': {},
+            'Bob': {'elimination_round': 2},
+            'Carol': {'elimination_round': 1},
+        },
+    }
+
+
+class RenderingTestCase(TestCase):
+
+    def test_make_rounds_table(self):
+        table = rendering.make_rounds_table(make_context())
+        candidate_rows = table['candidate_rows']
+        self.assertEqual(
+            [row[:2] for row in candidate_rows], [
+                ('Alice', 'CandidateRow'),
+                ('Bob', 'AlternateCandidateRow'),
+                ('Carol', 'CandidateRow LastCandidateRow'),
+            ],
+        )
+        alice_cells, bob_cells, carol_cells = (
+            row[2] for row in candidate_rows
+        )
+        self.assertEqual(alice_cells[0], (
+            'LeaderVotesCell', '10', 'LeaderPercentageCell', '47.62%',
+            'LeaderVotesTransferredCell', '1,000',
+        ))
+        self.assertEqual(alice_cells[2], (
+            'WinnerVotesCell', '15', 'WinnerPercentageCell', '71.43%',
+            'VotesTransferredCell', EMPTY_CELL,
+        ))
+        self.assertEqual(bob_cells[0][0], 'VotesCell')
+        self.assertEqual(bob_cells[1][0], 'EliminatedVotesCell')
+        # Check the cells after the elimination round.
+        self.assertEqual(bob_cells[2], (
+            'VotesCell', EMPTY_CELL, 'PercentageCell', EMPTY_CELL,
+            'VotesTransferredCell', EMPTY_CELL,
+        ))
+        self.assertEqual(carol_cells[1], bob_cells[2])
+
+        non_candidate_rows = dict(table['non_candidate_rows'])
+        self.assertEqual(
+            list(non_candidate_rows), utils.NON_CANDIDATE_SUBTOTAL_LABELS,
+        )
+        self.assertEqual(non_candidate_rows['continuing'][0], (
+            'VotesCell', '1', 'PercentageCell', '100%',
+            'VotesTransferredCell', EMPTY_CELL,
+        ))
+        self.assertEqual(
+            [cells[4:] for cells in non_candidate_rows['exhausted']], [
+                ('VotesTransferredCell', '2'),
+                ('VotesTransferredCell', '2'),
+                ('VotesTransferredCell', EMPTY_CELL),
+            ],
+        )
+        self.assertEqual(
+            non_candidate_rows['non_transferable'][0][5], EMPTY_CELL,
+        )
+
+    def test_render_all_languages(self):
+        """
+        Check that rendering in a single pass gives the same html as
+        rendering each language separately.
+        """
+        env = Environment(autoescape=True)
+        translate_label = functools.partial(
+            rendering.translate_label, label_translations=LABEL_TRANSLATIONS,
+        )
+        env.filters['TL'] = jinja2.pass_context(translate_label)
+        env.globals['per_language'] = jinja2.pass_context(
+            rendering.per_language
+        )
+        template = env.from_string(TEMPLATE_TEXT)
+        translation_slots = TranslationSlots({
+            TABLE_LABELS: LABEL_TRANSLATIONS,
+        })
+        context = {'name': 'A & B'}
+
+        actual = rendering.render_all_languages(
+            template, translation_slots=translation_slots, context=context,
+        )
+        self.assertEqual(list(actual), list(LANGUAGES))
+        for lang_code in LANGUAGES:
+            with self.subTest(lang_code=lang_code):
+                expected = rendering.render_html(
+                    template, context=context, lang_code=lang_code,
+                )
+                self.assertEqual(actual[lang_code], expected)
+
+        self.assertEqual(
+            actual['es'], '&lt;Hola&gt;, A &amp; B!\n[es: &lt;Hola&gt;] Hi',
+        )
+        with self.assertRaises(KeyError):
+            translation_slots.get_marker(TABLE_LABELS, 'unknown')
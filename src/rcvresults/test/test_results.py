@@ -0,0 +1,115 @@
+"""
+Unit tests of rcvresults/results.py.
+"""
+
+import json
+import math
+import pickle
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import rcvresults.election as election
+from rcvresults.results import ContestResults
+from rcvresults.scripts.build_demo import DATA_DIR_JSON
+from rcvresults.testing import get_json_paths, TRANSLATIONS_PATH
+import rcvresults.utils as utils
+
+
+class ContestResultsTestCase(TestCase):
+
+    def test_from_results__round_trip(self):
+        paths = get_json_paths()
+        self.assertGreater(len(paths), 0)
+        for path in paths:
+            with self.subTest(path=path):
+                expected = utils.read_json(path)
+                contest_results = ContestResults.from_results(expected)
+                actual = contest_results.to_results()
+                self.assertEqual(actual, expected)
+                # Also check that the JSON is identical, e.g. that ints
+                # and empty strings were preserved.
+                self.assertEqual(
+                    json.dumps(actual, sort_keys=True),
+                    json.dumps(expected, sort_keys=True),
+                )
+
+    def test_columns(self):
+        contest_results = ContestResults(
+            ['A', 'B'], ['continuing'], round_count=2,
+        )
+        contest_results.set_round('A', 0, votes=10.0, percent=0.5, transfer=0)
+        contest_results.set_round('B', 1, votes=20.0, percent='')
+        # The rounds of each row are contiguous (row-major order).
+        self.assertEqual(len(contest_results.votes), 6)
+        self.assertEqual(contest_results.votes[0], 10.0)
+        self.assertEqual(contest_results.votes[3], 20.0)
+        self.assertEqual(contest_results.get_row_values('votes', 'B')[1], 20.0)
+        self.assertTrue(math.isnan(contest_results.percents[3]))
+        self.assertEqual(contest_results.get_value('percent', 'B', 1), '')
+        self.assertEqual(contest_results.get_value('transfer', 'A', 0), 0)
+        self.assertIs(type(contest_results.get_value('transfer', 'A', 0)), int)
+        self.assertEqual(contest_results.rounds['A'][0], {
+            'votes': 10.0, 'percent': 0.5, 'transfer': 0,
+        })
+        self.assertEqual(contest_results.rounds['continuing'][-1], {
+            'votes': None, 'percent': None, 'transfer': None,
+        })
+        with self.assertRaises(IndexError):
+            contest_results.rounds['A'][2]
+
+    def test_rounds(self):
+        """
+        Check that the round records of a row are reused until one of its
+        values is set.
+        """
+        contest_results = ContestResults(['A'], ['continuing'], round_count=2)
+        contest_results.set_round('A', 0, votes=10.0)
+        row_rounds = contest_results.rounds['A']
+        self.assertIs(contest_results.rounds['A'], row_rounds)
+        self.assertIs(contest_results.make_context()['rounds']['A'], row_rounds)
+        with self.assertRaises(TypeError):
+            row_rounds[0]['votes'] = 5.0
+
+        # The object can still be pickled after its rounds are read.
+        copied = pickle.loads(pickle.dumps(contest_results))
+        self.assertEqual(copied.rounds['A'], row_rounds)
+
+        contest_results.set_value('votes', 'A', 1, 12.0)
+        new_row_rounds = contest_results.rounds['A']
+        self.assertIsNot(new_row_rounds, row_rounds)
+        self.assertEqual(new_row_rounds[1]['votes'], 12.0)
+        # Rows whose values didn't change are still reused.
+        self.assertIs(
+            contest_results.rounds['continuing'],
+            contest_results.rounds['continuing'],
+        )
+
+    def test_make_rcv_contest_html(self):
+        """
+        Check that rendering from a ContestResults object gives the same
+        html as rendering from a dict.
+        """
+        renderer = election.Renderer(TRANSLATIONS_PATH)
+        election_vars = {'election': {}, 'css_dir': '.'}
+        path = DATA_DIR_JSON / '2020-11-03' / '20201201_d1_short.json'
+        rcv_data = utils.read_json(path)
+        contest_results = ContestResults.from_results(rcv_data)
+        for template in renderer.templates.values():
+            with self.subTest(template=template.name):
+                with TemporaryDirectory() as temp_dir:
+                    temp_dir = Path(temp_dir)
+                    html_texts = []
+                    for i, data in enumerate([rcv_data, contest_results]):
+                        output_dir = temp_dir / str(i)
+                        output_dir.mkdir()
+                        election.make_rcv_contest_html(
+                            template, rcv_data=data, output_dir=output_dir,
+                            contest_base='d1_short',
+                            election_vars=election_vars,
+                        )
+                        html_texts.append(sorted(
+                            (path.name, path.read_text())
+                            for path in output_dir.iterdir()
+                        ))
+                self.assertEqual(html_texts[0], html_texts[1])
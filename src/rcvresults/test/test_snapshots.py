@@ -0,0 +1,293 @@
+"""
+Unit tests of rcvresults/snapshots.py.
+"""
+
+import copy
+from pathlib import Path
+import sqlite3
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from rcvresults.results import ContestResults
+import rcvresults.parsing as parsing
+import rcvresults.scripts.build_demo as demo_mod
+import rcvresults.scripts.parse_results as parse_results
+from rcvresults.scripts.build_demo import (
+    DATA_DIR_JSON, DATA_DIR_REPORTS, DIR_NAME_2019_NOV,
+)
+from rcvresults.snapshots import SnapshotStore
+import rcvresults.utils as utils
+from rcvresults.validation import ValidationError
+
+
+ELECTION = DIR_NAME_2019_NOV
+CONTEST = '20191125_d5_short'
+CANDIDATE = 'DEAN PRESTON'
+
+
+def read_results():
+    return utils.read_json(DATA_DIR_JSON / ELECTION / f'{CONTEST}.json')
+
+
+def make_updated_results():
+    """
+    Return a copy of the reference contest with more votes for a
+    candidate in the final round.
+    """
+    results = read_results()
+    results['rounds'][CANDIDATE][2]['votes'] += 100
+    return results
+
+
+def clean_rounds(rounds):
+    """
+    Return the rounds with the non-number values replaced by None.
+    """
+    return {
+        name: [
+            {
+                field: value if isinstance(value, (int, float)) else None
+                for field, value in round_data.items()
+            }
+            for round_data in round_list
+        ] for name, round_list in rounds.items()
+    }
+
+
+class SnapshotStoreTestCase(TestCase):
+
+    def _make_store(self):
+        """
+        Return a store with two cycles of the contest (the second with
+        updated votes).
+        """
+        store = SnapshotStore(':memory:')
+        cycle = store.start_cycle(label='first')
+        cycle.add(ELECTION, contest=CONTEST, results=read_results())
+        cycle = store.start_cycle(label='second')
+        results = ContestResults.from_results(make_updated_results())
+        cycle.add(ELECTION, contest=CONTEST, results=results)
+        return store
+
+    def test_get_latest_snapshot(self):
+        expected = make_updated_results()
+        with self._make_store() as store:
+            self.assertEqual(store.get_contests(), [(ELECTION, CONTEST)])
+            self.assertEqual(
+                [cycle['label'] for cycle in store.get_cycles()],
+                ['first', 'second'],
+            )
+            snapshot = store.get_latest_snapshot(ELECTION, CONTEST)
+            self.assertIsNone(store.get_latest_snapshot(ELECTION, 'unknown'))
+
+        self.assertEqual(snapshot['cycle_id'], 2)
+        self.assertEqual(snapshot['cycle_label'], 'second')
+        self.assertEqual(
+            snapshot['contest_name'], expected['_metadata']['contest_name'],
+        )
+        self.assertEqual(snapshot['highest_round'], 3)
+        self.assertEqual(
+            snapshot['leading_candidates'], expected['leading_candidates'],
+        )
+        self.assertEqual(snapshot['row_names'], expected['row_names'])
+        self.assertEqual(
+            snapshot['candidate_names'], expected['candidate_names'],
+        )
+        self.assertEqual(snapshot['rounds'], clean_rounds(expected['rounds']))
+
+    def test_get_deltas(self):
+        with self._make_store() as store:
+            deltas = store.get_deltas(ELECTION, CONTEST, changed_only=True)
+            all_deltas = store.get_deltas(ELECTION, CONTEST)
+            percent_deltas = store.get_deltas(
+                ELECTION, CONTEST, field='percent', row_name=CANDIDATE,
+                round_number=1,
+            )
+            with self.assertRaisesRegex(ValueError, 'unknown field'):
+                store.get_deltas(ELECTION, CONTEST, field='votes; DROP')
+
+        self.assertEqual(len(deltas), 1)
+        delta = deltas[0]
+        self.assertEqual(delta['delta'], 100)
+        self.assertEqual(
+            (delta['cycle_id'], delta['previous_cycle_id']), (2, 1),
+        )
+        self.assertEqual(
+            (delta['row_name'], delta['round_number']), (CANDIDATE, 3),
+        )
+        self.assertEqual(delta['value'] - delta['previous_value'], 100)
+        # There is one delta per row per round.
+        self.assertEqual(len(all_deltas), 9 * 3)
+        self.assertEqual(len(percent_deltas), 1)
+        self.assertEqual(percent_deltas[0]['delta'], 0)
+
+    def test_get_time_series(self):
+        votes = read_results()['rounds'][CANDIDATE][2]['votes']
+        with self._make_store() as store:
+            series = store.get_time_series(ELECTION, CONTEST, CANDIDATE)
+            first_round = store.get_time_series(
+                ELECTION, CONTEST, CANDIDATE, round_number=1,
+            )
+
+        self.assertEqual(series, [
+            (1, 'first', votes), (2, 'second', votes + 100),
+        ])
+        self.assertEqual(first_round[0][2], first_round[1][2])
+
+    def test_append_only(self):
+        with self._make_store() as store:
+            connection = store.connection
+            for sql in (
+                'UPDATE round_values SET votes = 0',
+                'DELETE FROM snapshots',
+                'DELETE FROM cycles',
+            ):
+                with self.subTest(sql=sql):
+                    with self.assertRaisesRegex(
+                        sqlite3.IntegrityError, 'append-only',
+                    ):
+                        connection.execute(sql)
+
+    def test_duplicate_snapshot(self):
+        with self._make_store() as store:
+            with self.assertRaises(sqlite3.IntegrityError):
+                store.add_snapshot(
+                    1, election=ELECTION, contest=CONTEST,
+                    results=read_results(),
+                )
+            # The failed snapshot shouldn't have left any rows behind.
+            count = store.connection.execute(
+                'SELECT COUNT(*) FROM snapshot_rows',
+            ).fetchone()[0]
+
+        self.assertEqual(count, 2 * 9)
+
+    def test_record_cycle(self):
+        """
+        Check that a cycle is recorded all at once, or not at all.
+        """
+        with self._make_store() as store:
+            expected = store.get_cycles()
+            # A duplicate contest makes the last snapshot fail.
+            contests = [(ELECTION, CONTEST, read_results())] * 2
+            with self.assertRaises(sqlite3.IntegrityError):
+                store.record_cycle(contests, label='third')
+            self.assertEqual(store.get_cycles(), expected)
+            count = store.connection.execute(
+                'SELECT COUNT(*) FROM snapshots',
+            ).fetchone()[0]
+            self.assertEqual(count, 2)
+
+            cycle_id = store.record_cycle(contests[:1], label='third')
+            snapshot = store.get_latest_snapshot(ELECTION, CONTEST)
+
+        self.assertEqual(cycle_id, 3)
+        self.assertEqual(snapshot['cycle_label'], 'third')
+
+    def test_query_plan(self):
+        """
+        Check that looking up a contest's snapshots uses an index rather
+        than scanning the tables.
+        """
+        with self._make_store() as store:
+            rows = store.connection.execute(
+                'EXPLAIN QUERY PLAN SELECT * FROM snapshots '
+                'JOIN round_values USING (snapshot_id) '
+                'WHERE election = ? AND contest = ?', (ELECTION, CONTEST),
+            ).fetchall()
+
+        details = [row['detail'] for row in rows]
+        self.assertTrue(all(detail.startswith('SEARCH') for detail in details))
+
+    def test_reopen(self):
+        with TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'snapshots.db'
+            for label in ('first', 'second'):
+                with SnapshotStore(path) as store:
+                    cycle = store.start_cycle(label=label)
+                    cycle.add(ELECTION, contest=CONTEST, results=read_results())
+            with SnapshotStore(path) as store:
+                series = store.get_time_series(ELECTION, CONTEST, CANDIDATE)
+
+        self.assertEqual([label for _, label, _ in series], ['first', 'second'])
+
+
+class ProcessReportsTestCase(TestCase):
+
+    """
+    Test the snapshots recorded by parse_results.process_reports().
+    """
+
+    def setUp(self):
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        temp_dir = Path(temp_dir.name)
+        self.output_dir = temp_dir / ELECTION
+        self.db_path = temp_dir / 'snapshots.db'
+        self.report_paths = demo_mod.get_demo_report_paths(
+            DATA_DIR_REPORTS, dir_name=ELECTION,
+        )
+
+    def process_reports(self, report_paths=None, **kwargs):
+        if report_paths is None:
+            report_paths = self.report_paths
+        return parse_results.process_reports(
+            report_paths, output_dir=self.output_dir,
+            snapshot_db=self.db_path, **kwargs,
+        )
+
+    def get_cycles(self):
+        with SnapshotStore(self.db_path) as store:
+            return store.get_cycles()
+
+    def test_process_reports(self):
+        """
+        Check that every contest is recorded, including the ones skipped
+        by the parse cache.
+        """
+        for label in ('first', 'second'):
+            self.process_reports(cycle_label=label)
+        with SnapshotStore(self.db_path) as store:
+            contests = store.get_contests()
+            snapshot = store.get_latest_snapshot(ELECTION, CONTEST)
+            deltas = store.get_deltas(ELECTION, CONTEST, changed_only=True)
+
+        stems = [path.stem for path in self.report_paths]
+        self.assertEqual(contests, [(ELECTION, stem) for stem in sorted(stems)])
+        self.assertEqual(snapshot['cycle_id'], 2)
+        self.assertEqual(snapshot['cycle_label'], 'second')
+        self.assertEqual(snapshot['rounds'], clean_rounds(read_results()['rounds']))
+        self.assertEqual(deltas, [])
+
+    def test_process_reports__invalid(self):
+        """
+        Check that nothing is recorded if a contest fails validation.
+        """
+        self.process_reports(cycle_label='first')
+        expected = self.get_cycles()
+
+        bad_results = read_results()
+        bad_results['rounds'][CANDIDATE][1]['votes'] += 1
+        with patch.object(parsing, 'parse_report', return_value=bad_results):
+            with self.assertRaises(ValidationError):
+                self.process_reports(force=True, cycle_label='second')
+
+        self.assertEqual(self.get_cycles(), expected)
+
+    def test_process_reports__report_error(self):
+        """
+        Check that nothing is recorded (not even an empty cycle) if a
+        report fails to parse.
+        """
+        self.process_reports(cycle_label='first')
+        expected = self.get_cycles()
+
+        bad_path = self.output_dir.parent / 'bad.xml'
+        bad_path.write_text('<not a report>')
+        with self.assertRaises(parsing.ReportErrors):
+            self.process_reports(
+                [*self.report_paths, bad_path], cycle_label='second',
+            )
+
+        self.assertEqual(self.get_cycles(), expected)
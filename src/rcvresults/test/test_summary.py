@@ -0,0 +1,100 @@
+"""
+Unit tests of rcvresults/summary.py.
+"""
+
+import copy
+from importlib.util import find_spec
+from unittest import skipUnless, TestCase
+
+from rcvresults.results import ContestResults
+import rcvresults.summary as summary_mod
+from rcvresults.summary import ENGINE_NUMPY, ENGINE_PYTHON
+from rcvresults.scripts.build_demo import DATA_DIR_JSON
+import rcvresults.utils as utils
+
+
+SUMMARY_KEYS = [
+    'candidate_names', 'candidate_summaries', 'highest_round',
+    'leading_candidates',
+]
+
+
+def read_unsummarized_results():
+    """
+    Read the reference JSON files, and return a list of (results, expected)
+    pairs, where results is the results dict without the summary data, and
+    expected is the dict of summary data.
+    """
+    pairs = []
+    for path in utils.get_paths(DATA_DIR_JSON / '*', suffix='json'):
+        results = utils.read_json(path)
+        expected = {key: results.pop(key) for key in SUMMARY_KEYS}
+        candidate_count = len(expected['candidate_names'])
+        # Restore the candidates to their report order.
+        results['candidate_names'] = results['row_names'][:candidate_count]
+        pairs.append((results, expected))
+
+    return pairs
+
+
+def make_decreasing_results():
+    results = {
+        '_metadata': {'contest_name': 'TEST'},
+        'candidate_names': ['A', 'B'],
+        'non_candidate_names': [],
+        'row_names': ['A', 'B'],
+        'rounds': {
+            'A': [{'votes': 5.0, 'percent': None, 'transfer': None}] * 3,
+            'B': [
+                {'votes': votes, 'percent': None, 'transfer': None}
+                for votes in (4.0, 3.0, 0.0)
+            ],
+        },
+    }
+    return results
+
+
+class SummarizeContestsTestCase(TestCase):
+
+    def _test_engine(self, engine, use_contest_results=False):
+        pairs = read_unsummarized_results()
+        self.assertGreater(len(pairs), 0)
+        results_list = [results for results, _ in pairs]
+        if use_contest_results:
+            results_list = [
+                ContestResults.from_results(results) for results in results_list
+            ]
+        # Summarize all the contests at once.
+        actual = summary_mod.summarize_contests(results_list, engine=engine)
+        for (results, expected), summary in zip(pairs, actual):
+            with self.subTest(contest=results['_metadata']['contest_name']):
+                self.assertEqual(summary, expected)
+
+    def _test_votes_decreased(self, engine):
+        results = make_decreasing_results()
+        with self.assertRaisesRegex(
+            AssertionError, r"votes decreased in round 2 for 'B': 3.0 < 4.0",
+        ):
+            summary_mod.summarize_contests([copy.deepcopy(results)], engine=engine)
+
+    def test_python_engine(self):
+        self._test_engine(ENGINE_PYTHON)
+        self._test_engine(ENGINE_PYTHON, use_contest_results=True)
+        self._test_votes_decreased(ENGINE_PYTHON)
+
+    @skipUnless(find_spec('numpy'), 'numpy is not installed')
+    def test_numpy_engine(self):
+        self._test_engine(ENGINE_NUMPY)
+        self._test_engine(ENGINE_NUMPY, use_contest_results=True)
+        self._test_votes_decreased(ENGINE_NUMPY)
+
+    def test_get_default_engine(self):
+        results, _ = read_unsummarized_results()[0]
+        self.assertEqual(
+            summary_mod.get_default_engine([results]), ENGINE_PYTHON,
+        )
+        expected = ENGINE_NUMPY if find_spec('numpy') else ENGINE_PYTHON
+        contest_results = ContestResults.from_results(results)
+        self.assertEqual(
+            summary_mod.get_default_engine([contest_results]), expected,
+        )
@@ -0,0 +1,147 @@
+"""
+Unit tests of rcvresults/template_cache.py.
+"""
+
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock, TestCase
+
+from jinja2 import ChoiceLoader, Environment, select_autoescape
+
+import rcvresults.template_cache as template_cache
+from rcvresults.template_cache import (
+    BYTECODE_DIR_NAME, SourceHashBytecodeCache, TEMPLATES_DIR,
+)
+
+
+def make_env(templates_dir, cache_dir, compiled=True, **env_options):
+    env_options = {'autoescape': True, **env_options}
+    loader, bytecode_cache = template_cache.make_loader(
+        templates_dir, cache_dir=cache_dir, compiled=compiled,
+        env_options=env_options,
+    )
+    env = Environment(
+        loader=loader, bytecode_cache=bytecode_cache, **env_options,
+    )
+    env.filters['shout'] = str.upper
+    return env
+
+
+class TemplateCacheTestCase(TestCase):
+
+    def setUp(self):
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        temp_dir = Path(temp_dir.name)
+        self.templates_dir = temp_dir / 'templates'
+        self.templates_dir.mkdir()
+        self.cache_dir = temp_dir / 'cache'
+        self.write_template('hello.html', 'Hello, {{ name|shout }}!')
+
+    def write_template(self, name, source):
+        (self.templates_dir / name).write_text(source)
+
+    def render(self, template_name, compiled=True, **context):
+        env = make_env(self.templates_dir, self.cache_dir, compiled=compiled)
+        return env.get_template(template_name).render(**context)
+
+    def test_templates_dir(self):
+        self.assertTrue((TEMPLATES_DIR / 'rcv-complete.html').exists())
+
+    def test_hash_templates(self):
+        old_hash = template_cache.hash_templates(self.templates_dir)
+        self.assertEqual(template_cache.hash_templates(self.templates_dir), old_hash)
+        self.write_template('hello.html', 'Bye, {{ name }}.')
+        self.assertNotEqual(
+            template_cache.hash_templates(self.templates_dir), old_hash,
+        )
+
+    def test_hash_templates__options(self):
+        """
+        Check that the hash depends on the options that change the
+        compiled code.
+        """
+        hashes = set()
+        for env in [
+            Environment(),
+            Environment(autoescape=True),
+            Environment(autoescape=select_autoescape(['html'])),
+            Environment(trim_blocks=True),
+            Environment(block_start_string='<%', block_end_string='%>'),
+            Environment(extensions=['jinja2.ext.i18n']),
+        ]:
+            hashes.add(
+                template_cache.hash_templates(self.templates_dir, env=env)
+            )
+        # select_autoescape() turns on autoescape for the .html template.
+        self.assertEqual(len(hashes), 5)
+        # Options that don't change the compiled code don't change the hash.
+        env = Environment(autoescape=True, cache_size=10)
+        self.assertIn(
+            template_cache.hash_templates(self.templates_dir, env=env), hashes,
+        )
+
+    def test_bytecode_cache(self):
+        """
+        Check that each version of a template gets its own cache file.
+        """
+        bytecode_dir = self.cache_dir / BYTECODE_DIR_NAME
+        self.assertEqual(self.render('hello.html', name='a'), 'Hello, A!')
+        self.assertEqual(len(list(bytecode_dir.iterdir())), 1)
+        # Check that the cached code is used.
+        self.assertEqual(self.render('hello.html', name='b'), 'Hello, B!')
+        self.assertEqual(len(list(bytecode_dir.iterdir())), 1)
+
+        self.write_template('hello.html', 'Bye, {{ name }}.')
+        self.assertEqual(self.render('hello.html', name='c'), 'Bye, c.')
+        self.assertEqual(len(list(bytecode_dir.iterdir())), 2)
+
+        env = make_env(self.templates_dir, self.cache_dir)
+        self.assertIsInstance(env.bytecode_cache, SourceHashBytecodeCache)
+
+    def test_precompile_templates(self):
+        # A template using a filter the environment doesn't have.
+        self.write_template('other.html', '{{ name|unknown }}')
+        env = make_env(self.templates_dir, self.cache_dir, compiled=False)
+        compiled_dir = template_cache.precompile_templates(
+            env, templates_dir=self.templates_dir, cache_dir=self.cache_dir,
+        )
+        self.assertEqual(len(list(compiled_dir.glob('tmpl_*.py'))), 1)
+
+        env = make_env(self.templates_dir, self.cache_dir)
+        self.assertIsInstance(env.loader, ChoiceLoader)
+        self.assertEqual(
+            env.get_template('hello.html').render(name='a'), 'Hello, A!',
+        )
+        # Check that the template that wasn't compiled is still found.
+        env.filters['unknown'] = str.lower
+        self.assertEqual(env.get_template('other.html').render(name='A'), 'a')
+
+        # Check that the modules aren't used with other options.
+        env = make_env(self.templates_dir, self.cache_dir, autoescape=False)
+        self.assertNotIsInstance(env.loader, ChoiceLoader)
+        self.assertFalse(template_cache.is_precompiled(
+            self.templates_dir, cache_dir=self.cache_dir,
+            env_options={'trim_blocks': True, 'autoescape': True},
+        ))
+        self.assertTrue(template_cache.is_precompiled(
+            self.templates_dir, cache_dir=self.cache_dir,
+            env_options={'autoescape': True},
+        ))
+
+        # Check that changing a template stops the modules being used.
+        self.write_template('hello.html', 'Bye, {{ name }}.')
+        env = make_env(self.templates_dir, self.cache_dir)
+        self.assertNotIsInstance(env.loader, ChoiceLoader)
+        self.assertEqual(self.render('hello.html', name='a'), 'Bye, a.')
+
+    def test_get_cache_dir(self):
+        env_var = template_cache.CACHE_DIR_ENV_VAR
+        with mock.patch.dict(os.environ):
+            os.environ.pop(env_var, None)
+            self.assertEqual(
+                template_cache.get_cache_dir(), template_cache.DEFAULT_CACHE_DIR,
+            )
+            os.environ[env_var] = str(self.cache_dir)
+            self.assertEqual(template_cache.get_cache_dir(), self.cache_dir)
@@ -0,0 +1,174 @@
+"""
+Unit tests of rcvresults/validation.py.
+"""
+
+from importlib.util import find_spec
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import skipUnless, TestCase
+from unittest.mock import patch
+
+from rcvresults.results import ContestResults
+import rcvresults.scripts.build_demo as demo_mod
+from rcvresults.scripts.build_demo import (
+    DATA_DIR_JSON, DATA_DIR_REPORTS, DIR_NAME_2019_NOV,
+)
+import rcvresults.scripts.parse_results as parse_results
+import rcvresults.summary as summary_mod
+from rcvresults.testing import get_json_paths
+import rcvresults.utils as utils
+import rcvresults.validation as validation
+from rcvresults.validation import (
+    CHECK_NON_TRANSFERABLE, CHECK_PERCENT, CHECK_TOTAL_VOTES, CHECK_TRANSFERS,
+    ENGINE_NUMPY, ENGINE_PYTHON, ValidationError,
+)
+
+
+def read_results_list():
+    return [utils.read_json(path) for path in get_json_paths()]
+
+
+def make_bad_results():
+    """
+    Return a copy of a reference contest with arithmetic errors.
+    """
+    results = utils.read_json(
+        DATA_DIR_JSON / '2019-11-05' / '20191125_d5_short.json'
+    )
+    rounds = results['rounds']
+    name = results['row_names'][0]
+    # This breaks the first-round percent of the candidate, and the vote
+    # total of the later rounds.
+    rounds[name][0]['votes'] += 1
+    rounds['blanks'][1]['transfer'] = 5.0
+    # This breaks the percent of the overvotes and the non-transferable
+    # total in round 3.
+    rounds['overvotes'][2]['votes'] += 2
+    return results
+
+
+class ValidateContestsTestCase(TestCase):
+
+    def _test_engine(self, engine, use_contest_results=False):
+        results_list = read_results_list()
+        self.assertGreater(len(results_list), 0)
+        bad_results = make_bad_results()
+        results_list.append(bad_results)
+        if use_contest_results:
+            results_list = [
+                ContestResults.from_results(results) for results in results_list
+            ]
+        # Validate all the contests at once.
+        report = validation.validate_contests(results_list, engine=engine)
+        self.assertEqual(report.contest_count, len(results_list))
+        self.assertFalse(report.is_valid)
+
+        name = bad_results['row_names'][0]
+        contest_name = bad_results['_metadata']['contest_name']
+        actual = [
+            (failure['contest'], failure['round'], failure['check'], failure['row'])
+            for failure in report.failures
+        ]
+        expected = [
+            (contest_name, 1, CHECK_PERCENT, name),
+            (contest_name, 2, CHECK_TOTAL_VOTES, None),
+            (contest_name, 2, CHECK_TRANSFERS, None),
+            (contest_name, 3, CHECK_TOTAL_VOTES, None),
+            (contest_name, 3, CHECK_PERCENT, 'overvotes'),
+            (contest_name, 3, CHECK_NON_TRANSFERABLE, None),
+        ]
+        self.assertEqual(actual, expected)
+        failure = report.failures[2]
+        self.assertEqual(failure['expected'], 0.0)
+        self.assertEqual(failure['actual'], 5.0)
+        return report.failures
+
+    def test_python_engine(self):
+        self._test_engine(ENGINE_PYTHON)
+        self._test_engine(ENGINE_PYTHON, use_contest_results=True)
+
+    @skipUnless(find_spec('numpy'), 'numpy is not installed')
+    def test_numpy_engine(self):
+        failures = self._test_engine(ENGINE_NUMPY)
+        self._test_engine(ENGINE_NUMPY, use_contest_results=True)
+        # Check that the two engines give exactly the same failures.
+        self.assertEqual(failures, self._test_engine(ENGINE_PYTHON))
+
+    @skipUnless(find_spec('numpy'), 'numpy is not installed')
+    def test_process_reports__numpy(self):
+        """
+        Check that the contests parsed by parse_results.py are checked
+        with the NumPy engine by default.
+        """
+        self.assertIs(
+            validation.get_default_engine, summary_mod.get_default_engine,
+        )
+        report_paths = demo_mod.get_demo_report_paths(
+            DATA_DIR_REPORTS, dir_name=DIR_NAME_2019_NOV,
+        )
+        validate_numpy = validation._validate_contests_numpy
+        with TemporaryDirectory() as temp_dir:
+            output_dir = Path(temp_dir)
+            # Process twice, so the second time the contests are read
+            # from the files.
+            for i in range(2):
+                with self.subTest(i=i):
+                    with patch.object(
+                        validation, '_validate_contests_numpy',
+                        wraps=validate_numpy,
+                    ) as mock_validate:
+                        parse_results.process_reports(
+                            report_paths, output_dir=output_dir,
+                        )
+                    mock_validate.assert_called_once()
+
+    def test_reference_files(self):
+        """
+        Check that the reference JSON files pass validation, including
+        the Excel contests whose second round is empty.
+        """
+        results_list = read_results_list()
+        for results in results_list:
+            contest_name = results['_metadata']['contest_name']
+            with self.subTest(contest=contest_name):
+                report = validation.validate_contests([results])
+                self.assertEqual(report.failures, [])
+
+
+class ValidateJsonFilesTestCase(TestCase):
+
+    def test_valid(self):
+        json_paths = get_json_paths()
+        with TemporaryDirectory() as temp_dir:
+            report_path = Path(temp_dir) / 'report.json'
+            report = validation.validate_json_files(
+                json_paths, report_path=report_path,
+            )
+            data = utils.read_json(report_path)
+
+        self.assertTrue(report.is_valid)
+        self.assertEqual(data, {
+            'contest_count': len(json_paths), 'failures': [],
+            'is_valid': True, 'version': 1,
+        })
+
+    def test_invalid(self):
+        with TemporaryDirectory() as temp_dir:
+            json_path = Path(temp_dir) / 'bad.json'
+            utils.write_json(make_bad_results(), json_path)
+            report_path = Path(temp_dir) / 'report.json'
+            with self.assertRaisesRegex(
+                ValidationError, r'6 validation failure\(s\) in 1 contest',
+            ) as cm:
+                validation.validate_json_files(
+                    [json_path], report_path=report_path,
+                )
+            # The report is also written if validation fails.
+            data = json.loads(report_path.read_text())
+
+        self.assertEqual(len(cm.exception.report.failures), 6)
+        self.assertIs(data['is_valid'], False)
+        failure = data['failures'][0]
+        self.assertEqual(failure['contest'], str(json_path))
+        self.assertEqual(failure['check'], CHECK_PERCENT)
@@ -4,4 +4,32 @@ Supports testing and the demo page.
 
 from pathlib import Path
 
+from rcvresults.results import ContestResults
+import rcvresults.utils as utils
+
+
 TRANSLATIONS_PATH = Path('translations.yml')
+
+# The directory of the reference JSON files, one subdirectory per
+# election (the same as build_demo.DATA_DIR_JSON).
+REFERENCE_JSON_DIR = Path('data') / 'output-json'
+
+
+def get_json_paths(dir_name='*'):
+    """
+    Return the paths of the reference JSON files.
+
+    Args:
+      dir_name: the name of an election directory (e.g. "2022-11-08").
+        Defaults to all the elections.
+    """
+    return utils.get_paths(REFERENCE_JSON_DIR / dir_name, suffix='json')
+
+
+def to_results(contest):
+    """
+    Return a results dict or ContestResults object as a results dict.
+    """
+    if isinstance(contest, ContestResults):
+        return contest.to_results()
+    return contest
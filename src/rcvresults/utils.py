@@ -1,8 +1,9 @@
+import functools
 import glob
 import json
 from pathlib import Path
 
-import yaml
+import rcvresults.archives as archives
 
 
 LANG_CODE_ENGLISH = 'en'
@@ -43,6 +44,19 @@ NON_CANDIDATE_SUBTOTAL_LABELS = [
 ]
 
 
+@functools.cache
+def import_numpy():
+    """
+    Return the numpy module, or None if NumPy isn't installed.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+
+    return numpy
+
+
 def read_json(path):
     with path.open() as f:
         data = json.load(f)
@@ -50,6 +64,10 @@ def read_json(path):
 
 
 def read_yaml(path):
+    # Import this lazily to speed up the startup of scripts that don't
+    # read YAML.
+    import yaml
+
     with path.open() as f:
         data = yaml.safe_load(f)
     return data
@@ -91,9 +109,18 @@ def make_page_names(base_name):
 def get_paths(dir_path, suffix):
     """
     Return the paths in the given directory, as a sorted list of Path objects.
+
+    Compressed files (e.g. "*.xml.gz" or "*.xml.zst" for suffix "xml") are
+    also included. If dir_path is a zip bundle, the matching members of
+    the bundle are returned instead, as archives.ZipMember objects.
     """
-    glob_path = dir_path / f'*.{suffix}'
-    raw_paths = glob.glob(str(glob_path))
+    if archives.is_zip_bundle(dir_path) and dir_path.is_file():
+        return list(archives.iter_zip_members(dir_path, suffix=suffix))
+
+    raw_paths = []
+    for compression_suffix in ['', *archives.COMPRESSION_SUFFIXES]:
+        glob_path = dir_path / f'*.{suffix}{compression_suffix}'
+        raw_paths.extend(glob.glob(str(glob_path)))
     paths = [Path(raw_path) for raw_path in sorted(raw_paths)]
     return paths
 
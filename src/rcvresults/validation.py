@@ -0,0 +1,483 @@
+"""
+Supports checking the round arithmetic of parsed RCV contests.
+
+The checks run on each round of each contest:
+
+  * "total_votes": the candidate votes plus the non-transferable total
+    equal the first-round total.
+  * "transfers": the transfers (of the candidates, blanks, exhausted
+    ballots, and overvotes) sum to zero.
+  * "percent": each percent equals the row's votes divided by the
+    continuing votes.
+  * "non_transferable": blanks + exhausted + overvotes equal the
+    non-transferable total.
+
+Rounds without a continuing vote total (e.g. the empty second round of
+some Excel reports) are skipped, as are values that aren't numbers (e.g.
+the empty-string percents of the non-candidate rows in Excel reports).
+
+Like summary.py, there are two engines that give the same results (and
+the same rules for which is used by default, see
+summary.get_default_engine()). The NumPy engine runs each check on every
+contest at once, using a single contests x rows x rounds array per field
+(padded with NaN). The Python engine loops over the contests, and is used
+if NumPy isn't installed.
+"""
+
+import logging
+import math
+
+import rcvresults.election_bundle as election_bundle
+import rcvresults.intermediate as intermediate
+from rcvresults.results import as_mapping, ContestResults, to_number
+from rcvresults.summary import ENGINE_NUMPY, ENGINE_PYTHON, get_default_engine
+import rcvresults.utils as utils
+from rcvresults.utils import NonCandidateLabel
+
+
+_log = logging.getLogger(__name__)
+
+CHECK_TOTAL_VOTES = 'total_votes'
+CHECK_TRANSFERS = 'transfers'
+CHECK_PERCENT = 'percent'
+CHECK_NON_TRANSFERABLE = 'non_transferable'
+
+# The checks, in the order failures are reported within a round.
+CHECKS = [
+    CHECK_TOTAL_VOTES, CHECK_TRANSFERS, CHECK_PERCENT, CHECK_NON_TRANSFERABLE,
+]
+
+# The version of the report format returned by ValidationReport.to_dict().
+REPORT_VERSION = 1
+
+# The largest allowed difference between two vote totals. This allows for
+# reports whose vote totals include fractional votes.
+VOTE_TOLERANCE = 1e-6
+# The largest allowed difference between a percent and the value computed
+# from the vote totals (where percents are fractions, e.g. 0.5).
+PERCENT_TOLERANCE = 1e-9
+
+# The non-candidate rows, in the order the engines store them (before the
+# candidate rows).
+_NON_CANDIDATE_ROWS = [
+    NonCandidateLabel.CONTINUING,
+    NonCandidateLabel.BLANK,
+    NonCandidateLabel.EXHAUSTED,
+    NonCandidateLabel.OVERVOTE,
+    NonCandidateLabel.NON_TRANSFERABLE,
+]
+_CONTINUING_INDEX = 0
+_NON_TRANSFERABLE_INDEX = 4
+# The indexes of the blanks, exhausted, and overvotes rows.
+_SUBTOTAL_INDEXES = [1, 2, 3]
+_CANDIDATE_START = len(_NON_CANDIDATE_ROWS)
+
+
+class ValidationReport:
+
+    """
+    The result of validating a list of contests.
+
+    Attributes:
+      contest_count: the number of contests checked.
+      failures: a list of dicts, one per failed check, in order of
+        contest, then round, then check (see make_failure()).
+    """
+
+    def __init__(self, contest_count, failures):
+        self.contest_count = contest_count
+        self.failures = failures
+
+    def __repr__(self):
+        return (
+            f'<ValidationReport: {self.contest_count} contests, '
+            f'{len(self.failures)} failures>'
+        )
+
+    @property
+    def is_valid(self):
+        return not self.failures
+
+    def add(self, report):
+        """
+        Add the contests and failures of another report (e.g. of the next
+        batch of contests) to this one.
+        """
+        self.contest_count += report.contest_count
+        self.failures.extend(report.failures)
+
+    def to_dict(self):
+        """
+        Return the report as a JSON-serializable dict.
+        """
+        return {
+            'contest_count': self.contest_count,
+            'failures': self.failures,
+            'is_valid': self.is_valid,
+            'version': REPORT_VERSION,
+        }
+
+    def write(self, path):
+        utils.write_json(self.to_dict(), path)
+
+    def make_message(self):
+        """
+        Return a human-readable description of the failures.
+        """
+        lines = [
+            f'{len(self.failures)} validation failure(s) in '
+            f'{self.contest_count} contest(s):'
+        ]
+        for failure in self.failures:
+            row = failure['row']
+            row_text = '' if row is None else f' {row!r}'
+            lines.append(
+                f'  {failure["contest"]}: round {failure["round"]}{row_text}: '
+                f'{failure["check"]}: expected {failure["expected"]}, '
+                f'got {failure["actual"]}'
+            )
+        return '\n'.join(lines)
+
+
+class ValidationError(RuntimeError):
+
+    """
+    Raised if contests fail validation (e.g. to stop publishing).
+
+    Attributes:
+      report: the ValidationReport.
+    """
+
+    def __init__(self, report):
+        super().__init__(report.make_message())
+        self.report = report
+
+
+def make_failure(contest, check, round_number, expected, actual, row=None):
+    """
+    Return a dict describing a failed check.
+
+    Args:
+      contest: a label for the contest (e.g. its JSON path or name).
+      round_number: the 1-based round number.
+      row: the name of the row the check is for, for the "percent" check.
+    """
+    return {
+        'actual': actual,
+        'check': check,
+        'contest': contest,
+        'expected': expected,
+        'round': round_number,
+        'row': row,
+    }
+
+
+def _get_contest_label(results):
+    return results['_metadata'].get('contest_name')
+
+
+def _get_row_order(mapping):
+    """
+    Return the names of a contest's rows in the order the engines store
+    them: the non-candidate rows, then the candidate rows.
+    """
+    return [*_NON_CANDIDATE_ROWS, *mapping['candidate_names']]
+
+
+def _read_row(rounds, name, field):
+    return [to_number(round_data[field]) for round_data in rounds[name]]
+
+
+def _validate_contest_python(mapping, label):
+    rounds = mapping['rounds']
+    # Each of these is a list of rows, where each row is a list of numbers
+    # (NaN for values that aren't numbers), one per round.
+    row_names = _get_row_order(mapping)
+    votes, percents, transfers = (
+        [_read_row(rounds, name, field) for name in row_names]
+        for field in ('votes', 'percent', 'transfer')
+    )
+    continuing = votes[_CONTINUING_INDEX]
+    non_transferable = votes[_NON_TRANSFERABLE_INDEX]
+    candidate_votes = votes[_CANDIDATE_START:]
+    # The rows whose transfers and percents are checked.
+    checked_indexes = [*_SUBTOTAL_INDEXES, *range(_CANDIDATE_START, len(votes))]
+
+    def nansum(values):
+        return sum(value for value in values if not math.isnan(value))
+
+    failures = []
+    first_total = None
+    for round_index, continuing_votes in enumerate(continuing):
+        if math.isnan(continuing_votes):
+            continue
+        round_number = round_index + 1
+
+        def add_failure(check, expected, actual, row=None):
+            failures.append(make_failure(
+                label, check=check, round_number=round_number,
+                expected=expected, actual=actual, row=row,
+            ))
+
+        total = (
+            nansum(row[round_index] for row in candidate_votes)
+            + non_transferable[round_index]
+        )
+        if first_total is None:
+            first_total = total
+        if not abs(total - first_total) <= VOTE_TOLERANCE:
+            add_failure(CHECK_TOTAL_VOTES, expected=first_total, actual=total)
+
+        transfer_sum = nansum(
+            transfers[index][round_index] for index in checked_indexes
+        )
+        if not abs(transfer_sum) <= VOTE_TOLERANCE:
+            add_failure(CHECK_TRANSFERS, expected=0.0, actual=transfer_sum)
+
+        if continuing_votes > 0:
+            for index in checked_indexes:
+                percent = percents[index][round_index]
+                if math.isnan(percent):
+                    continue
+                expected = votes[index][round_index] / continuing_votes
+                if not abs(percent - expected) <= PERCENT_TOLERANCE:
+                    add_failure(
+                        CHECK_PERCENT, expected=expected, actual=percent,
+                        row=row_names[index],
+                    )
+
+        subtotal = sum(
+            votes[index][round_index] for index in _SUBTOTAL_INDEXES
+        )
+        expected = non_transferable[round_index]
+        if not abs(subtotal - expected) <= VOTE_TOLERANCE:
+            add_failure(CHECK_NON_TRANSFERABLE, expected=expected, actual=subtotal)
+
+    return failures
+
+
+def _make_contest_arrays(np, results):
+    """
+    Return a 3 x rows x rounds array of a contest's votes, percents, and
+    transfers, with the rows in the order returned by _get_row_order().
+    """
+    mapping = as_mapping(results)
+    row_names = _get_row_order(mapping)
+    if isinstance(results, ContestResults):
+        row_indexes = [results.get_row_index(name) for name in row_names]
+        shape = (len(results.row_names), results.round_count)
+        # Read the columns without copying, and then select the rows.
+        return np.stack([
+            np.frombuffer(results.get_column(field)).reshape(shape)[row_indexes]
+            for field in ('votes', 'percent', 'transfer')
+        ])
+
+    rounds = mapping['rounds']
+    return np.array([
+        [_read_row(rounds, name, field) for name in row_names]
+        for field in ('votes', 'percent', 'transfer')
+    ], dtype=float)
+
+
+def _make_padded_array(np, arrays):
+    """
+    Return a 3 x contests x rows x rounds array, padded with NaN.
+    """
+    row_count = max(array.shape[1] for array in arrays)
+    round_count = max(array.shape[2] for array in arrays)
+    padded = np.full((3, len(arrays), row_count, round_count), np.nan)
+    for contest_index, array in enumerate(arrays):
+        _, rows, columns = array.shape
+        padded[:, contest_index, :rows, :columns] = array
+    return padded
+
+
+def _validate_contests_numpy(np, results_list, labels):
+    arrays = [_make_contest_arrays(np, results) for results in results_list]
+    votes, percents, transfers = _make_padded_array(np, arrays)
+    continuing = votes[:, _CONTINUING_INDEX]
+    non_transferable = votes[:, _NON_TRANSFERABLE_INDEX]
+    # A contests x rounds array of whether to check each round.
+    checked_rounds = ~np.isnan(continuing)
+
+    totals = (
+        np.nansum(votes[:, _CANDIDATE_START:], axis=1) + non_transferable
+    )
+    # The total of each contest's first checked round.
+    first_round_indexes = checked_rounds.argmax(axis=1)
+    first_totals = np.take_along_axis(
+        totals, first_round_indexes[:, None], axis=1,
+    )
+    first_totals = np.broadcast_to(first_totals, totals.shape)
+    total_failed = checked_rounds & ~(
+        np.abs(totals - first_totals) <= VOTE_TOLERANCE
+    )
+
+    # The rows whose transfers and percents are checked (the padding rows
+    # are NaN, so they are skipped).
+    checked_rows = [*_SUBTOTAL_INDEXES, *range(_CANDIDATE_START, votes.shape[1])]
+    transfer_sums = np.nansum(transfers[:, checked_rows], axis=1)
+    transfer_failed = checked_rounds & ~(np.abs(transfer_sums) <= VOTE_TOLERANCE)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected_percents = votes[:, checked_rows] / continuing[:, None]
+    checked_percents = percents[:, checked_rows]
+    percent_failed = (
+        (checked_rounds & (continuing > 0))[:, None]
+        & ~np.isnan(checked_percents)
+        & ~(np.abs(checked_percents - expected_percents) <= PERCENT_TOLERANCE)
+    )
+
+    subtotals = votes[:, _SUBTOTAL_INDEXES].sum(axis=1)
+    non_transferable_failed = checked_rounds & ~(
+        np.abs(subtotals - non_transferable) <= VOTE_TOLERANCE
+    )
+
+    # Collect the failures as (contest_index, round_index, check_index,
+    # row_index, failure) tuples, and then sort them.
+    items = []
+
+    def add_failures(check, failed, expected, actual):
+        for contest_index, round_index in np.argwhere(failed).tolist():
+            failure = make_failure(
+                labels[contest_index], check=check,
+                round_number=round_index + 1,
+                expected=float(expected[contest_index, round_index]),
+                actual=float(actual[contest_index, round_index]),
+            )
+            items.append((contest_index, round_index, check, -1, failure))
+
+    add_failures(
+        CHECK_TOTAL_VOTES, total_failed, expected=first_totals, actual=totals,
+    )
+    add_failures(
+        CHECK_TRANSFERS, transfer_failed,
+        expected=np.zeros_like(transfer_sums), actual=transfer_sums,
+    )
+    add_failures(
+        CHECK_NON_TRANSFERABLE, non_transferable_failed,
+        expected=non_transferable, actual=subtotals,
+    )
+    for contest_index, row_offset, round_index in (
+        np.argwhere(percent_failed).tolist()
+    ):
+        row_index = checked_rows[row_offset]
+        row_names = _get_row_order(as_mapping(results_list[contest_index]))
+        index = (contest_index, row_offset, round_index)
+        failure = make_failure(
+            labels[contest_index], check=CHECK_PERCENT,
+            round_number=round_index + 1,
+            expected=float(expected_percents[index]),
+            actual=float(checked_percents[index]), row=row_names[row_index],
+        )
+        items.append(
+            (contest_index, round_index, CHECK_PERCENT, row_index, failure)
+        )
+
+    def sort_key(item):
+        contest_index, round_index, check, row_index, _ = item
+        return (contest_index, round_index, CHECKS.index(check), row_index)
+
+    items.sort(key=sort_key)
+    return [item[-1] for item in items]
+
+
+def validate_contests(results_list, labels=None, engine=None):
+    """
+    Check the round arithmetic of one or more contests, and return a
+    ValidationReport.
+
+    Args:
+      results_list: a list of results dicts (e.g. as read from the JSON
+        files) or ContestResults objects.
+      labels: a list of labels to identify the contests in the report
+        (e.g. their JSON paths). Defaults to the contest names.
+      engine: ENGINE_NUMPY or ENGINE_PYTHON. Defaults to the return value
+        of summary.get_default_engine(), i.e. NumPy only if every contest
+        is a ContestResults object and NumPy is installed.
+    """
+    if labels is None:
+        labels = [
+            _get_contest_label(as_mapping(results)) for results in results_list
+        ]
+    if engine is None:
+        engine = get_default_engine(results_list)
+
+    if engine == ENGINE_PYTHON:
+        failures = []
+        for results, label in zip(results_list, labels):
+            failures.extend(
+                _validate_contest_python(as_mapping(results), label=label)
+            )
+    elif engine == ENGINE_NUMPY:
+        np = utils.import_numpy()
+        if np is None:
+            raise RuntimeError('NumPy must be installed to use the numpy engine')
+        if results_list:
+            failures = _validate_contests_numpy(np, results_list, labels=labels)
+        else:
+            failures = []
+    else:
+        raise ValueError(f'unknown validation engine: {engine!r}')
+
+    return ValidationReport(len(results_list), failures=failures)
+
+
+def check_report(report, report_path=None):
+    """
+    Raise ValidationError if a ValidationReport has any failures.
+
+    Args:
+      report_path: an optional path to which to write the report as JSON
+        (whether or not a check fails).
+    """
+    if report_path is not None:
+        _log.info(f'writing validation report to: {report_path}')
+        report.write(report_path)
+
+    if not report.is_valid:
+        raise ValidationError(report)
+
+    _log.info(f'validated {report.contest_count} contest(s)')
+
+
+def check_contests(results_list, labels=None, report_path=None, engine=None):
+    """
+    Validate the given contests, and raise ValidationError if any check
+    fails.
+
+    Args:
+      labels: see validate_contests().
+      report_path: see check_report().
+
+    Returns the ValidationReport.
+    """
+    report = validate_contests(results_list, labels=labels, engine=engine)
+    check_report(report, report_path=report_path)
+    return report
+
+
+def validate_json_files(json_paths, report_path=None, engine=None):
+    """
+    Validate the contests in the given JSON files (or files in another
+    intermediate format, or election bundles), and raise ValidationError
+    if any check fails.
+
+    See check_contests() for the arguments and return value.
+    """
+    results_list = []
+    labels = []
+    for path in json_paths:
+        if not election_bundle.is_bundle(path):
+            results_list.append(intermediate.read_contest(path))
+            labels.append(str(path))
+            continue
+
+        with election_bundle.ElectionBundle(path) as bundle:
+            for stem, results in bundle.iter_contests():
+                results_list.append(results)
+                labels.append(f'{path}/{stem}')
+
+    return check_contests(
+        results_list, labels=labels, report_path=report_path, engine=engine,
+    )